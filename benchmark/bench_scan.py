@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    measures decode_scan, decode_scan_mac and decode_scan_basic on synthetic "iw dev <iface> scan dump" outputs
+
+
+    Usage:
+    python3 -m benchmark.bench_scan [--bss 10 100 500] [--repeat 5]
+"""
+import argparse
+import timeit
+
+from cmd.scan import decode_scan, decode_scan_mac, decode_scan_basic
+from cmd.synthetic import synthetic_scan
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scan decoders.')
+    parser.add_argument('--bss', type=int, nargs='*', default=[10, 100, 500], help='number of BSSes')
+    parser.add_argument('--repeat', type=int, default=5, help='number of decodings per measure')
+    args = parser.parse_args()
+
+    print("{:>6} {:>8} {:>18} {:>18} {:>18}".format('BSSes', 'lines', 'decode_scan ms', 'decode_scan_mac ms',
+                                                    'decode_scan_basic ms'))
+    for n in args.bss:
+        data = synthetic_scan(n)
+        times = []
+        for f in [decode_scan, decode_scan_mac, decode_scan_basic]:
+            times.append(min(timeit.repeat(lambda: f(data), number=args.repeat, repeat=3)) / args.repeat * 1000)
+        print("{:>6} {:>8} {:>18.2f} {:>18.2f} {:>18.2f}".format(n, data.count('\n'), *times))
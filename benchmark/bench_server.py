@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    measures the request latency of get_set.server under N concurrent clients.
+
+    the command layer is replaced by stubs that sleep for a typical duration of each command,
+    so the benchmark runs without a wireless card. Compares the single-threaded server (workers=0)
+    with the thread pool server.
+
+
+    Usage:
+    python3 -m benchmark.bench_server [--clients 8] [--requests 50] [--workers 16]
+"""
+import argparse
+import http.client
+import logging
+import threading
+import time
+
+import get_set.server as server
+
+
+"""simulated duration (in seconds) of each command"""
+stub_latency = {'iw_info': 0.005,
+                'iwconfig': 0.005,
+                'stations': 0.010,
+                'survey': 0.010,
+                'power': 0.005,
+                'scan': 0.050,
+                }
+
+
+def stub_stations(num_stations=30):
+    stations = dict()
+    for i in range(num_stations):
+        stations['00:00:00:00:00:{:02x}'.format(i)] = {'signal avg': -50.0, 'tx failed': 0.0, 'tx retries': 1.0,
+                                                       'tx packets': 100.0, 'tx bytes': 1000.0,
+                                                       'rx drop misc': 0.0, 'rx bytes': 500.0, 'rx packets': 50.0,
+                                                       'tx bitrate': 54.0, 'rx bitrate': 54.0,
+                                                       }
+    return stations
+
+
+def sleeper(name, value):
+    """ @return: a function that sleeps stub_latency[name] and returns value """
+    def f(*args, **kwargs):
+        time.sleep(stub_latency[name])
+        return value() if callable(value) else value
+    return f
+
+
+def install_stubs(num_stations=30):
+    """ replaces the command layer used by the server """
+    survey = {2437: {'in use': True, 'channel active time': 1.0, 'channel busy time': 1.0,
+                     'channel receive time': 1.0, 'channel transmit time': 1.0}}
+    server.get_iw_info = sleeper('iw_info', {'channel': 6, 'txpower': 15.0})
+    server.get_iwconfig_info = sleeper('iwconfig', {'Mode': 'Master'})
+    server.get_iw_stations = sleeper('stations', lambda: stub_stations(num_stations))
+    server.get_iw_survey = sleeper('survey', survey)
+    server.get_power = sleeper('power', 15.0)
+    server.scan_manager.get = sleeper('scan', (0.0, {}))
+
+
+class QuietHandler(server.myHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if len(values) == 0:
+        return float('nan')
+    k = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[k]
+
+
+def client(port, urls, num_requests, latencies, lock):
+    """ sends num_requests requests, cycling through urls, and records the latency of each one """
+    for i in range(num_requests):
+        url = urls[i % len(urls)]
+        t0 = time.perf_counter()
+        conn = http.client.HTTPConnection('localhost', port)
+        conn.request('GET', url)
+        conn.getresponse().read()
+        conn.close()
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.setdefault(url.split('?')[0], []).append(dt)
+
+
+def bench(workers, clients, num_requests, urls, scan_clients=1):
+    """ runs the clients against a server with `workers` threads
+
+        @return: {url: [latencies in seconds]}
+    """
+    httpd = server.create_server(0, workers, handler_class=QuietHandler)
+    port = httpd.server_address[1]
+    t = threading.Thread(target=httpd.serve_forever, daemon=True)
+    t.start()
+
+    latencies = dict()
+    lock = threading.Lock()
+    threads = [threading.Thread(target=client, args=(port, urls, num_requests, latencies, lock))
+               for _ in range(clients)]
+    threads += [threading.Thread(target=client, args=(port, ['/get_scan?iface=wlan0'], max(1, num_requests // 20),
+                                                      latencies, lock))
+                for _ in range(scan_clients)]
+    t0 = time.perf_counter()
+    [th.start() for th in threads]
+    [th.join() for th in threads]
+    elapsed = time.perf_counter() - t0
+
+    httpd.shutdown()
+    httpd.server_close()
+    return latencies, elapsed
+
+
+def report(name, latencies, elapsed):
+    total = sum(len(v) for v in latencies.values())
+    print("{}: {} requests in {:.2f} s ({:.1f} req/s)".format(name, total, elapsed, total / elapsed))
+    print("  {:<20} {:>6} {:>9} {:>9} {:>9} {:>9}".format('url', 'n', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for url in sorted(latencies):
+        v = latencies[url]
+        print("  {:<20} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}".format(url, len(v),
+                                                                          percentile(v, 50) * 1000,
+                                                                          percentile(v, 90) * 1000,
+                                                                          percentile(v, 99) * 1000,
+                                                                          max(v) * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark get_set.server with a stubbed command layer.')
+    parser.add_argument('--clients', type=int, default=8, help='number of concurrent clients')
+    parser.add_argument('--requests', type=int, default=50, help='requests per client')
+    parser.add_argument('--workers', type=int, default=16, help='threads of the pool server')
+    parser.add_argument('--stations', type=int, default=30, help='number of simulated stations')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    install_stubs(args.stations)
+    urls = ['/get_features?iface=wlan0', '/get_info?iface=wlan0', '/get_survey?iface=wlan0',
+            '/get_stations?iface=wlan0']
+    for workers in [0, args.workers]:
+        latencies, elapsed = bench(workers, args.clients, args.requests, urls)
+        report('workers={}'.format(workers), latencies, elapsed)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    measures decode_iw_station and decode_hostapd_station on synthetic "iw dev <iface> station dump"
+    and "hostapd_cli all_sta" outputs
+
+    the previous decoders (a regex per line) are kept below as the reference
+
+
+    Usage:
+    python3 -m benchmark.bench_station [--stations 1 50 500] [--repeat 20]
+"""
+import argparse
+import re
+import timeit
+
+from cmd.station import decode_iw_station, decode_hostapd_station
+from cmd.synthetic import synthetic_iw_station, synthetic_hostapd_station
+
+
+def reference_iw_station(data):
+    """ the previous decoder, including the preprocessing made by get_iw_stations() """
+    result = dict()
+    station = None
+    for _l in data.replace('\t', '').split('\n'):
+        if 'Station' in _l:
+            station = _l.split()[1]
+            result[station] = dict()
+        elif station is not None and len(_l.strip()) > 0:
+            _l = _l.split(':')
+            v = _l[1].strip().split()[0]
+            f = re.findall(r"[-+]?\d*\.\d+|\d+", v)
+            if len(f) > 0:
+                v = f[0]
+            try:
+                v = float(v)
+            except ValueError:
+                pass
+            result[station][_l[0]] = v
+    return result
+
+
+def reference_hostapd_station(data):
+    """ the previous decoder """
+    result = dict()
+    mac = None
+    for _l in data.split('\n'):
+        m = re.search(r'([0-9A-F]{2}[:-]){5}([0-9A-F]{2})', _l, re.I)
+        _mac = None if m is None else m.group()
+        if _mac is None and mac is None:
+            continue
+        if _mac is not None:
+            mac = _mac
+            result[mac] = []
+        else:
+            result[mac].append(_l.split('='))
+    return dict([(k, dict([v for v in result[k] if len(v) == 2])) for k in result])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the station decoders.')
+    parser.add_argument('--stations', type=int, nargs='*', default=[1, 50, 500], help='number of stations')
+    parser.add_argument('--repeat', type=int, default=20, help='number of decodings per measure')
+    args = parser.parse_args()
+
+    decoders = [('iw reference', synthetic_iw_station, reference_iw_station),
+                ('decode_iw_station', synthetic_iw_station, decode_iw_station),
+                ('hostapd reference', synthetic_hostapd_station, reference_hostapd_station),
+                ('decode_hostapd_station', synthetic_hostapd_station, decode_hostapd_station),
+                ]
+    print("{:<24} {:>9} {:>8} {:>12} {:>14}".format('decoder', 'stations', 'lines', 'ms', 'us/station'))
+    for n in args.stations:
+        for name, generate, f in decoders:
+            data = generate(n)
+            assert len(f(data)) == n, '{}: wrong number of stations'.format(name)
+            t = min(timeit.repeat(lambda: f(data), number=args.repeat, repeat=3)) / args.repeat
+            print("{:<24} {:>9} {:>8} {:>12.3f} {:>14.1f}".format(name, n, data.count('\n'), t * 1e3, t * 1e6 / n))
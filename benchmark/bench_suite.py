@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    benchmark suite: the decoders of cmd/ and every endpoint of get_set.server, stored as JSON to compare runs
+
+    decoders: decoding time of decode_scan, decode_scan_basic, decode_iw_station, decode_hostapd_station,
+    decode_survey, decode_xmit, decode_iwconfig and decode_ifconfig on synthetic inputs (see cmd/synthetic.py),
+    scaled by the number of BSSes or stations.
+
+    endpoints: requests/s and latency percentiles of each endpoint of myHandler under N concurrent clients.
+    The commands are served by synthetic_executor() (see cmd/executor.py), with a fixed latency per command,
+    so the server runs its real code without a wireless card.
+
+    --output saves the results, --compare prints the ratio to a previous run and exits with 1 if a measure
+    is worse than --threshold.
+
+
+    Usage:
+    python3 -m benchmark.bench_suite [--output results.json] [--compare previous.json] [--threshold 1.2]
+                                     [--scales 1 50 500] [--clients 4] [--requests 50] [--latency 0.002]
+"""
+import argparse
+import http.client
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import timeit
+
+from cmd import command_ap
+from cmd.executor import synthetic_executor
+from cmd.ifconfig import decode_ifconfig
+from cmd.iwconfig import decode_iwconfig
+from cmd.scan import decode_scan, decode_scan_basic
+from cmd.station import decode_iw_station, decode_hostapd_station
+from cmd.survey import decode_survey
+from cmd.synthetic import synthetic_scan, synthetic_iw_station, synthetic_hostapd_station, synthetic_survey
+from cmd.synthetic import synthetic_xmit, synthetic_ifconfig, synthetic_interface, iwconfig_template
+from cmd.xmit import decode_xmit
+from benchmark.bench_server import QuietHandler, percentile
+
+import get_set.server as server
+
+
+"""name: (function(scale) that returns the decoder's input, decoder, True if the input scales)"""
+decoders = {'decode_scan': (synthetic_scan, decode_scan, True),
+            'decode_scan_basic': (synthetic_scan, decode_scan_basic, True),
+            'decode_iw_station': (synthetic_iw_station, decode_iw_station, True),
+            'decode_hostapd_station': (synthetic_hostapd_station, decode_hostapd_station, True),
+            'decode_survey': (lambda n: synthetic_survey(), decode_survey, False),
+            'decode_xmit': (lambda n: synthetic_xmit(), decode_xmit, False),
+            'decode_iwconfig': (lambda n: iwconfig_template.format(**synthetic_interface()), decode_iwconfig, False),
+            'decode_ifconfig': (lambda n: synthetic_ifconfig().splitlines(True), decode_ifconfig, False),
+            }
+
+"""query of each endpoint, the default is iface=wlan0"""
+endpoint_queries = {'/get_xmit': 'phy=phy0',
+                    '/set_power': 'iface=wlan0&new_power=15',
+                    '/set_channel': 'iface=wlan0&new_channel=6',
+                    '/history': 'iface=wlan0&family=stations&seconds=60&step=1',
+                    '/batch': 'iface=wlan0&cmd=/get_info&cmd=/get_survey&cmd=/get_stations',
+                    }
+
+"""measures where a higher value is worse, the others (requests/s) are better when higher"""
+higher_is_worse = ['ms', 'p50_ms', 'p90_ms', 'p99_ms']
+
+
+def bench_decoders(scales, repeat):
+    """ @return: {'<decoder>/<scale>': {'decoder', 'scale', 'lines', 'ms'}} """
+    results = dict()
+    xmit = tempfile.NamedTemporaryFile('w', suffix='-xmit', delete=False)
+    try:
+        for name, (generate, decode, scalable) in decoders.items():
+            for scale in (scales if scalable else [1]):
+                data = generate(scale)
+                if name == 'decode_xmit':
+                    xmit.write(data)
+                    xmit.flush()
+                    lines, data = data.count('\n'), xmit.name
+                else:
+                    lines = len(data) if isinstance(data, list) else data.count('\n')
+                t = min(timeit.repeat(lambda: decode(data), number=repeat, repeat=3)) / repeat
+                results['{}/{}'.format(name, scale)] = {'decoder': name, 'scale': scale, 'lines': lines,
+                                                        'ms': t * 1e3}
+    finally:
+        xmit.close()
+        os.unlink(xmit.name)
+    return results
+
+
+def client(port, url, num_requests, latencies, errors, lock):
+    """ sends num_requests requests and records the latency of each one """
+    for _ in range(num_requests):
+        t0 = time.perf_counter()
+        conn = http.client.HTTPConnection('localhost', port)
+        conn.request('GET', url)
+        response = conn.getresponse()
+        response.read()
+        conn.close()
+        dt = time.perf_counter() - t0
+        with lock:
+            latencies.append(dt)
+            if response.status >= 400:
+                errors.append(response.status)
+
+
+def bench_endpoint(port, url, clients, num_requests):
+    """ @return: {'url', 'requests', 'errors', 'rps', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms'} """
+    latencies, errors = [], []
+    lock = threading.Lock()
+    threads = [threading.Thread(target=client, args=(port, url, num_requests, latencies, errors, lock))
+               for _ in range(clients)]
+    t0 = time.perf_counter()
+    [th.start() for th in threads]
+    [th.join() for th in threads]
+    elapsed = time.perf_counter() - t0
+    return {'url': url, 'requests': len(latencies), 'errors': len(errors), 'rps': len(latencies) / elapsed,
+            'p50_ms': percentile(latencies, 50) * 1e3, 'p90_ms': percentile(latencies, 90) * 1e3,
+            'p99_ms': percentile(latencies, 99) * 1e3, 'max_ms': max(latencies) * 1e3}
+
+
+def bench_endpoints(stations, clients, num_requests, workers, latency, cache=True):
+    """ runs each endpoint of myHandler against a server whose commands are served by synthetic_executor()
+
+        @param cache: False disables the snapshot cache, so each request runs its commands
+        @return: {endpoint: the measures of bench_endpoint()}
+    """
+    executor = synthetic_executor(['wlan0'], stations=stations, bss=50, latency=latency)
+    command_ap.use_executor(executor)
+    if not cache:
+        for command in command_ap.snapshot_cache.ttls:
+            command_ap.set_cache_ttl(command, 0)
+    server.scan_manager.use_events = False
+    server.scan_manager.interval = 0
+    server.start_history(['wlan0'], seconds=60)
+    httpd = server.create_server(0, workers, handler_class=QuietHandler)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    results = dict()
+    try:
+        time.sleep(0.2)  # a few history samples
+        for endpoint in sorted(list(server.myHandler.function_handler) + ['/batch']):
+            url = '{}?{}'.format(endpoint, endpoint_queries.get(endpoint, 'iface=wlan0'))
+            results[endpoint] = bench_endpoint(port, url, clients, num_requests)
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        server.scheduler.stop()
+        server.scan_manager.stop()
+        command_ap.use_executor()
+        executor.close()
+    return results
+
+
+def compare(results, previous, threshold):
+    """ prints the ratio of each measure to the previous run
+
+        @return: the regressions, [(section, key, measure, ratio)]
+    """
+    regressions = []
+    print("\n{:<34} {:>8} {:>12} {:>12} {:>8}".format('compared to previous', 'measure', 'previous', 'now', 'ratio'))
+    for section, measures in [('decoders', ['ms']), ('endpoints', ['rps', 'p50_ms', 'p99_ms'])]:
+        for key, result in sorted(results.get(section, dict()).items()):
+            old = previous.get(section, dict()).get(key)
+            if old is None:
+                continue
+            for measure in measures:
+                if not old.get(measure):
+                    continue
+                ratio = result[measure] / old[measure]
+                worse = ratio if measure in higher_is_worse else (1 / ratio if ratio > 0 else float('inf'))
+                flag = ' <-- regression' if worse > threshold else ''
+                if worse > threshold:
+                    regressions.append((section, key, measure, ratio))
+                print("{:<34} {:>8} {:>12.3f} {:>12.3f} {:>8.2f}{}".format(key, measure, old[measure], result[measure],
+                                                                           ratio, flag))
+    return regressions
+
+
+def report(results):
+    print("{:<34} {:>8} {:>12}".format('decoder', 'lines', 'ms'))
+    for key, r in sorted(results['decoders'].items()):
+        print("{:<34} {:>8} {:>12.3f}".format(key, r['lines'], r['ms']))
+    print("\n{:<20} {:>6} {:>6} {:>9} {:>9} {:>9} {:>9} {:>9}".format('endpoint', 'n', 'errors', 'req/s',
+                                                                      'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for key, r in sorted(results['endpoints'].items()):
+        print("{:<20} {:>6} {:>6} {:>9.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+            key, r['requests'], r['errors'], r['rps'], r['p50_ms'], r['p90_ms'], r['p99_ms'], r['max_ms']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the decoders and the server endpoints.')
+    parser.add_argument('--scales', type=int, nargs='*', default=[1, 50, 500], help='stations or BSSes of the inputs')
+    parser.add_argument('--repeat', type=int, default=20, help='number of decodings per measure')
+    parser.add_argument('--stations', type=int, default=30, help='stations of the synthetic AP')
+    parser.add_argument('--clients', type=int, default=4, help='concurrent clients per endpoint')
+    parser.add_argument('--requests', type=int, default=50, help='requests per client')
+    parser.add_argument('--workers', type=int, default=16, help='threads of the server')
+    parser.add_argument('--latency', type=float, default=0.002, help='seconds each command takes')
+    parser.add_argument('--no-cache', action='store_true', help='disable the snapshot cache')
+    parser.add_argument('--skip-endpoints', action='store_true', help='only benchmark the decoders')
+    parser.add_argument('--output', type=str, default=None, help='save the results in this JSON file')
+    parser.add_argument('--compare', type=str, default=None, help='JSON file of a previous run')
+    parser.add_argument('--threshold', type=float, default=1.2, help='ratio to the previous run reported as a regression')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    results = {'meta': {'timestamp': time.time(), 'python': platform.python_version(), 'machine': platform.node(),
+                        'args': vars(args)},
+               'decoders': bench_decoders(args.scales, args.repeat),
+               'endpoints': dict(),
+               }
+    if not args.skip_endpoints:
+        results['endpoints'] = bench_endpoints(args.stations, args.clients, args.requests, args.workers, args.latency,
+                                               cache=not args.no_cache)
+    report(results)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if len(regressions) > 0:
+            print("{} regressions".format(len(regressions)))
+            sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    compares the wire formats of get_set/wire.py (pickle, JSON, MessagePack):
+    encode time, decode time and payload size for realistic /get_features and /get_xmit responses.
+
+
+    Usage:
+    python3 -m benchmark.bench_wire [--stations 30] [--repeat 200]
+"""
+import argparse
+import random
+import timeit
+
+from cmd.xmit import lines_with_queue_data
+from get_set import wire
+
+
+def features_response(num_stations=30):
+    """ @return: a /get_features response with num_stations stations """
+    rnd = random.Random(1)
+    result = dict()
+    for i in range(num_stations):
+        result['54:e6:fc:da:{:02x}:{:02x}'.format(i // 256, i % 256)] = {
+            'tx_bitrate': rnd.choice([1.0, 6.0, 54.0, 65.0, 130.0]), 'rx_bitrate': rnd.choice([1.0, 54.0, 65.0]),
+            'tx_power': 15.0, 'avg_signal': float(rnd.randint(30, 90)),
+            'rxdrop': float(rnd.randint(0, 100)), 'rxb': float(rnd.randint(0, 10 ** 9)), 'rxp': float(rnd.randint(0, 10 ** 6)),
+            'txr': float(rnd.randint(0, 10 ** 4)), 'txp': float(rnd.randint(0, 10 ** 6)), 'txf': float(rnd.randint(0, 100)),
+            'txb': float(rnd.randint(0, 10 ** 9)),
+            'crt': 1073085286.0, 'cbt': 1163082876.0, 'ctt': 60749755.0, 'cat': 3626867638.0,
+            'num_stations': num_stations,
+        }
+    return result
+
+
+def xmit_response(numeric=False):
+    """ @return: a /get_xmit response (strings, as decode_xmit() returns them, or numbers) """
+    rnd = random.Random(2)
+    result = dict()
+    for item in lines_with_queue_data:
+        for ac in ['BE', 'BK', 'VI', 'VO']:
+            v = rnd.choice([0, 0, 0, rnd.randint(0, 10 ** 9)])
+            result['{}_{}'.format(item, ac)] = v if numeric else str(v)
+    for q in ['qlen_be', 'qlen_bk', 'qlen_vi', 'qlen_vo']:
+        result[q] = 0 if numeric else '0'
+    return result
+
+
+def measure(name, d, repeat):
+    print(name)
+    print("  {:<28} {:>10} {:>12} {:>12}".format('format', 'bytes', 'encode us', 'decode us'))
+    for fmt in [wire.PICKLE, wire.JSON, wire.MSGPACK]:
+        data = wire.encode(d, fmt)
+        t_enc = min(timeit.repeat(lambda: wire.encode(d, fmt), number=repeat, repeat=3)) / repeat
+        t_dec = min(timeit.repeat(lambda: wire.decode(data, fmt), number=repeat, repeat=3)) / repeat
+        print("  {:<28} {:>10} {:>12.1f} {:>12.1f}".format(fmt, len(data), t_enc * 1e6, t_dec * 1e6))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the wire formats.')
+    parser.add_argument('--stations', type=int, default=30, help='number of stations in /get_features')
+    parser.add_argument('--repeat', type=int, default=200, help='number of encodings per measure')
+    args = parser.parse_args()
+
+    print("msgpack package: {}".format('installed' if wire.msgpack is not None else 'not installed (pure python)'))
+    measure('/get_features ({} stations)'.format(args.stations), features_response(args.stations), args.repeat)
+    measure('/get_xmit (string values)', xmit_response(), args.repeat)
+    measure('/get_xmit (numeric values)', xmit_response(numeric=True), args.repeat)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    measures decode_xmit() against XmitReader on an ath9k xmit file
+
+    without --filename, the file is generated with the layout of ath9k's debugfs xmit
+    (22 counter lines x 4 access categories, followed by the hardware queues)
+
+
+    Usage:
+    python3 -m benchmark.bench_xmit [--filename /sys/kernel/debug/ieee80211/phy0/ath9k/xmit] [--number 2000]
+"""
+import argparse
+import os
+import tempfile
+import timeit
+
+from cmd.xmit import decode_xmit, XmitReader
+from cmd.synthetic import synthetic_xmit
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the xmit decoders.')
+    parser.add_argument('--filename', type=str, default=None, help='a captured xmit file (default: synthetic)')
+    parser.add_argument('--number', type=int, default=2000, help='number of reads per measure')
+    args = parser.parse_args()
+
+    filename = args.filename
+    if filename is None:
+        fd, filename = tempfile.mkstemp(suffix='-xmit')
+        with os.fdopen(fd, 'w') as f:
+            f.write(synthetic_xmit())
+
+    reader = XmitReader(filename)
+    assert reader.read_dict() == dict([(k, int(v)) for k, v in decode_xmit(filename).items()]), 'different results'
+    measures = [('decode_xmit', lambda: decode_xmit(filename)),
+                ('XmitReader.read', reader.read),
+                ('XmitReader.read_dict', reader.read_dict),
+                ('XmitReader.update', reader.update),
+                ]
+    print("{:<22} {:>12}".format('decoder', 'us/read'))
+    for name, f in measures:
+        t = min(timeit.repeat(f, number=args.number, repeat=3)) / args.number
+        print("{:<22} {:>12.1f}".format(name, t * 1e6))
+    reader.close()
+    if args.filename is None:
+        os.remove(filename)
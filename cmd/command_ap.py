@@ -12,64 +12,333 @@
 import os
 import argparse
 import re
-import glob
 import logging
+import threading
 
-from cmd.xmit import decode_xmit
+from cmd.xmit import XmitReader
 from cmd.ifconfig import decode_ifconfig
+from cmd.netdev import get_netdev, get_netdev_all
 from cmd.iwconfig import decode_iwconfig
-from cmd.station import decode_iw_station, decode_hostapd_status, decode_hostapd_station
+from cmd.station import decode_iw_station, decode_hostapd_status, decode_hostapd_station, decode_hostapd_bss
+from cmd.station_table import StationTable, STATION_FIELDS, FEATURE_COLUMNS, feature_row
 from cmd.survey import decode_survey
 from cmd.scan import decode_scan, decode_scan_mac, decode_scan_basic
+from cmd.hostapd_ctrl import HostapdCtrl, HostapdCtrlError, DEFAULT_CTRL_DIR, list_interfaces
+from cmd.nl80211 import Nl80211, Nl80211Error
+from cmd.snapshot import SnapshotCache
+from cmd.interfaces import InterfaceRegistry
+from cmd.executor import ShellExecutor
 
 
 logging.basicConfig(level=logging.DEBUG)
 LOG = logging.getLogger('CMD')
 
 valid_frequencies = [2412 + i * 5 for i in range(13)]
+
+"""interface name that selects all the AP interfaces (see ap_interfaces())"""
+ALL_INTERFACES = 'all'
 __HOSTAPD_CLI = "hostapd_cli"
 __DEFAULT_HOSTAPD_CLI_PATH = '/usr/sbin/'
 __DEFAULT_IW_PATH = '/sbin/'
 __DEFAULT_IWCONFIG_PATH = '/sbin'
 __PATH_IFCONFIG = '/sbin'
 
+# cached commands that change after a channel switch or a disassociation
+__channel_commands = ['iw_info', 'iwconfig', 'hostapd_status', 'hostapd_config', 'iw_survey']
+__station_commands = ['iw_stations', 'hostapd_stations']
+
+# last sample of each (command, interface), shared by all callers (see set_cache_ttl() and invalidate_cache())
+snapshot_cache = SnapshotCache()
+
+# phy, driver, debugfs paths and mode of the wireless interfaces (see reload_interfaces() and watch_interfaces())
+interface_registry = InterfaceRegistry(mode_of=lambda interface: __interface_mode(interface))
+
+# open xmit files: {path: XmitReader} (see get_xmit_reader()), protected by __xmit_lock
+__xmit_readers = dict()
+__xmit_lock = threading.Lock()
+
+# runs the commands (iw, hostapd_cli, iwconfig, ifconfig), see use_executor()
+__executor = {'executor': ShellExecutor()}
+
+# connections to hostapd's control socket, kept open between calls (see use_hostapd_ctrl())
+__hostapd_ctrl = {'enabled': True, 'ctrl_dir': DEFAULT_CTRL_DIR, 'conns': dict()}
+
+
+def use_hostapd_ctrl(enabled=True, ctrl_dir=DEFAULT_CTRL_DIR):
+    """ selects how the hostapd commands are sent.
+        If enabled, uses the control socket in ctrl_dir and only forks hostapd_cli when the socket is not available.
+
+        @param enabled: False always uses hostapd_cli
+        @param ctrl_dir: hostapd's ctrl_interface directory
+    """
+    for conn in __hostapd_ctrl['conns'].values():
+        conn.close()
+    __hostapd_ctrl.update({'enabled': enabled, 'ctrl_dir': ctrl_dir, 'conns': dict()})
+
+
+def get_hostapd_ctrl(interface=None):
+    """ returns the persistent connection to hostapd's control socket
+
+        @param interface: the wireless interface name, e.g. wlan0. None uses the first hostapd interface
+        @return: the connection or None if the control socket is disabled or not available
+        @rtype: HostapdCtrl
+    """
+    if not __hostapd_ctrl['enabled']:
+        return None
+    conns = __hostapd_ctrl['conns']
+    if interface is None:
+        ifaces = list_interfaces(__hostapd_ctrl['ctrl_dir'])
+        if len(ifaces) == 0:
+            return None
+        interface = ifaces[0]  # same default as hostapd_cli
+    if interface not in conns:
+        try:
+            conn = HostapdCtrl(interface, ctrl_dir=__hostapd_ctrl['ctrl_dir'])
+            conn.open()
+        except HostapdCtrlError as e:
+            LOG.debug("hostapd control socket not available: {}".format(e))
+            return None
+        conns[interface] = conn
+    return conns[interface]
+
+
+def hostapd_request(method, interface=None, *args):
+    """ calls `method` of the HostapdCtrl connected to `interface`
+
+        @return: the method's return or None if the control socket cannot be used
+    """
+    conn = get_hostapd_ctrl(interface)
+    if conn is None:
+        return None
+    try:
+        return getattr(conn, method)(*args)
+    except HostapdCtrlError as e:
+        LOG.debug("{} failed: {}".format(method, e))
+        __hostapd_ctrl['conns'].pop(conn.interface, None)
+        conn.close()
+        return None
+
+
+# nl80211 backend for the "iw" queries (see use_nl80211())
+__nl80211 = {'enabled': False, 'conn': None}
+
+
+def use_nl80211(enabled=True):
+    """ selects the backend of get_iw_stations(), get_iw_survey(), get_iw_info() and get_channel().
+        If enabled, the queries are sent over a persistent nl80211 socket instead of running "iw".
+        The returned fields have the same names and the same signed values (signal and noise in dBm), as numbers.
+
+        @param enabled: False uses the iw command
+    """
+    if __nl80211['conn'] is not None:
+        __nl80211['conn'].close()
+    __nl80211.update({'enabled': enabled, 'conn': None})
+
+
+def nl80211_request(method, interface):
+    """ calls `method` of the shared Nl80211 connection
+
+        @return: the method's return or None if the nl80211 backend is disabled or failed
+    """
+    if not __nl80211['enabled']:
+        return None
+    try:
+        if __nl80211['conn'] is None:
+            __nl80211['conn'] = Nl80211()
+        return getattr(__nl80211['conn'], method)(interface)
+    except Nl80211Error as e:
+        LOG.debug("nl80211 {} failed: {}".format(method, e))
+        return None
+
+
+def use_executor(executor=None):
+    """ selects how the commands are run and where the files (xmit, /proc/net/dev, sysfs) are read, see executor.py.
+        A replay executor also disables hostapd's control socket and nl80211, so all the queries use its outputs.
+        The cached samples, the open xmit files and the interface registry are discarded.
+
+        @param executor: e.g. ReplayExecutor.load(directory) or synthetic_executor(). None runs the commands
+    """
+    executor = ShellExecutor() if executor is None else executor
+    __executor['executor'] = executor
+    with __xmit_lock:
+        readers = list(__xmit_readers.values())
+        __xmit_readers.clear()
+    for reader in readers:
+        reader.close()
+    interface_registry.root = executor.root
+    interface_registry.reload()
+    snapshot_cache.invalidate()
+    use_hostapd_ctrl(not executor.replay)
+    if executor.replay:
+        use_nl80211(False)
+
+
+def get_executor():
+    """ @return: the executor of the commands (see use_executor()) """
+    return __executor['executor']
+
 
+def __popen(cmd):
+    """ helper function: runs cmd with the executor, returns its stdout """
+    return __executor['executor'].popen(cmd)
+
+
+def set_cache_ttl(command, ttl):
+    """ changes how long a command's sample is reused
+
+        @param command: one of 'iw_info', 'iwconfig', 'hostapd_config', 'hostapd_status', 'iw_stations',
+                        'hostapd_stations', 'iw_survey', 'ifconfig', 'xmit'
+        @param ttl: time to live in seconds. 0 disables the cache (concurrent identical requests still share one sample)
+    """
+    snapshot_cache.set_ttl(command, ttl)
+
+
+def invalidate_cache(interface=None, commands=None):
+    """ discards cached samples. Called by the setters, after they change the AP's state
+
+        @param interface: the wireless interface name, e.g. wlan0. None discards all interfaces
+        @param commands: list of commands (see set_cache_ttl()). None discards all commands
+    """
+    snapshot_cache.invalidate(interface, commands)
+
+
+def __interface_mode(interface):
+    """ helper function: the mode of the interface as "iw dev info" shows it, e.g. 'AP' or 'managed' """
+    mode = get_iw_info(interface).get('type')
+    if mode is None:
+        mode = get_iwconfig_info(interface).get('Mode')
+        mode = {'master': 'AP', 'managed': 'managed', 'monitor': 'monitor', 'ad-hoc': 'IBSS'}.get(str(mode).lower())
+    return mode
+
+
+def reload_interfaces():
+    """ rereads the wireless interfaces (phy, driver, debugfs and mode), e.g. after hostapd changes the mode """
+    interface_registry.reload()
+
+
+def watch_interfaces():
+    """ keeps the interface registry up to date with nl80211's notifications, so reload_interfaces() is not needed
+
+        @return: True if the notifications are available
+    """
+    return interface_registry.watch()
+
+
+def ap_interfaces():
+    """ @return: the interfaces of all BSSes of all radios: the interfaces with a hostapd control socket,
+                 or the wireless interfaces in AP mode if the control socket is not used
+        @rtype: list
+    """
+    ifaces = list_interfaces(__hostapd_ctrl['ctrl_dir']) if __hostapd_ctrl['enabled'] else []
+    if len(ifaces) == 0:
+        ifaces = [iface for iface in interface_registry.interfaces() if interface_registry.is_ap(iface)]
+    return ifaces
+
+
+def radios(interfaces=None):
+    """ groups the interfaces by radio
+
+        @param interfaces: None uses ap_interfaces()
+        @return: {phy: [interfaces]}, the first interface of each radio is used for its per radio queries
+        @rtype: dict
+    """
+    ret = dict()
+    for iface in (ap_interfaces() if interfaces is None else interfaces):
+        ret.setdefault(interface_registry.phy(iface) or iface, []).append(iface)
+    return ret
+
+
+def __each(function, interfaces=None):
+    """ helper function: {interface: function(interface)} for the interfaces (None uses ap_interfaces()) """
+    return dict([(iface, function(iface)) for iface in (ap_interfaces() if interfaces is None else interfaces)])
+
+
+def __iface_param(interface):
+    """ helper function: hostapd_cli's "-i <interface> " parameter, or '' for the default interface """
+    return '' if interface is None else '-i {} '.format(interface)
+
+
+def get_xmit_reader(phy_iface='phy0'):
+    """ returns the reader of the phy's xmit file, kept open between calls.
+        use its update() to get the variation of the counters between samples
+
+        @return: the reader or None if the phy has no xmit file (not ath9k)
+        @rtype: XmitReader
+    """
+    path_to_xmit = interface_registry.xmit_path(phy_iface)
+    if path_to_xmit is None:
+        return None
+    with __xmit_lock:  # one reader (and one open file) per path
+        reader = __xmit_readers.get(path_to_xmit)
+        if reader is None:
+            try:
+                reader = __xmit_readers[path_to_xmit] = XmitReader(path_to_xmit)
+            except OSError as e:
+                LOG.debug("cannot open {}: {}".format(path_to_xmit, e))
+                return None
+    return reader
+
+
+@snapshot_cache.cached('xmit', key_arg='phy_iface')
 def get_xmit(phy_iface='phy0'):
     """ get data from the xmit file.
-        looks for it in /sys/kernel/debug/ieee80211/ath*/xmit
+        looks for it in /sys/kernel/debug/ieee80211/<phy_iface>/ath*/xmit (see interface_registry)
 
-        @return: the xmit fields
+        @return: the xmit fields, as integers
         @rtype: dict
     """
-    # TODO: find if it is ath9k, ath10k....
-    path_to_phy = os.path.join('/sys/kernel/debug/ieee80211', phy_iface)
-    try:
-        dir_athk = glob.glob(os.path.join(path_to_phy, 'ath*'))[0]
-    except IndexError:
+    reader = get_xmit_reader(phy_iface)
+    if reader is None:
         return dict()  # error, didn't find ath9k or ath10k
-    path_to_xmit = os.path.join(path_to_phy, dir_athk, 'xmit')
-    ret = decode_xmit(path_to_xmit)
+    try:
+        ret = reader.read_dict()
+    except OSError as e:
+        LOG.debug("cannot read {}: {}".format(reader.filename, e))  # e.g. the driver was reloaded
+        with __xmit_lock:
+            if __xmit_readers.get(reader.filename) is not reader:
+                return dict()  # already replaced by another thread
+            del __xmit_readers[reader.filename]
+        reader.close()  # the threads still holding it get an OSError, not the read of another file
+        return dict()
     LOG.debug("xmit: {}".format(ret))
     return ret
 
 
-def get_ifconfig(interface, path_ifconfig=__PATH_IFCONFIG):
-    """ get data from ifconfig <interface>.
+@snapshot_cache.cached('ifconfig')
+def get_ifconfig(interface, path_ifconfig=__PATH_IFCONFIG, root=None):
+    """ get the counters of ifconfig <interface>.
+        they are read from /proc/net/dev and /sys/class/net (see netdev.py),
+        ifconfig only runs if these files are not available
 
         @param interface: the wireless interface name, e.g. wlan0
         @param path_ifconfig: path to ifconfig
+        @param root: prefix of /proc and /sys. None uses the executor's root (see use_executor())
 
-        @return: the ifconfig fields
+        @return: the ifconfig fields, as integers (as strings if read from ifconfig)
         @rtype: dict
     """
-    cmd = "sudo {} {}".format(os.path.join(path_ifconfig, 'ifconfig'), interface)
-    LOG.debug(cmd)
-    with os.popen(cmd) as p:
-        ret = decode_ifconfig(p.readlines())
+    ret = get_netdev(interface, get_executor().root if root is None else root)
+    if ret is None:
+        cmd = "sudo {} {}".format(os.path.join(path_ifconfig, 'ifconfig'), interface)
+        LOG.debug(cmd)
+        with __popen(cmd) as p:
+            ret = decode_ifconfig(p.readlines())
     LOG.debug("ifconfig: {}".format(ret))
     return ret
 
 
+def get_ifconfig_all(interfaces=None, root=None):
+    """ get the counters of many interfaces with one read of /proc/net/dev
+
+        @param interfaces: list of interfaces. None returns all interfaces
+        @param root: prefix of /proc and /sys. None uses the executor's root (see use_executor())
+        @return: {interface: the fields of get_ifconfig()}
+        @rtype: dict
+    """
+    return get_netdev_all(interfaces, get_executor().root if root is None else root)
+
+
+@snapshot_cache.cached('iw_stations')
 def get_iw_stations(interface, path_iw=__DEFAULT_IW_PATH):
     """ executes "iw station dump"
 
@@ -79,28 +348,95 @@ def get_iw_stations(interface, path_iw=__DEFAULT_IW_PATH):
         @return: the command fields
         @rtype: dict
     """
-    cmd = "sudo {} dev {} station dump".format(os.path.join(path_iw, 'iw'), interface)
-    LOG.debug(cmd)
-    with os.popen(cmd) as p:
-        data = p.read().replace('\t', '').split('\n')
-    result = decode_iw_station(data)
+    result = nl80211_request('get_stations', interface)
+    if result is None:
+        cmd = "sudo {} dev {} station dump".format(os.path.join(path_iw, 'iw'), interface)
+        LOG.debug(cmd)
+        with __popen(cmd) as p:
+            result = decode_iw_station(p)
     LOG.debug("iw stations: {}".format(result))
     return result
 
 
-def get_status(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH):
+def get_station_table(interface, path_iw=__DEFAULT_IW_PATH, fields=STATION_FIELDS):
+    """ get_iw_stations() as columns (needs numpy)
+
+        @param interface: the wireless interface name, e.g. wlan0
+        @param path_iw: path to iw
+        @param fields: the numeric fields to keep, in the order of the columns
+
+        @return: one row per station (sorted by mac), one column per field
+        @rtype: StationTable
+    """
+    return StationTable.from_stations(get_iw_stations(interface, path_iw), fields)
+
+
+def get_feature_table(interface, path_iw=__DEFAULT_IW_PATH):
+    """ the features of /get_features of all stations as a matrix (needs numpy)
+
+        @param interface: the wireless interface name, e.g. wlan0
+        @param path_iw: path to iw
+
+        @return: one row per station, the columns in the order of FEATURE_COLUMNS (see station_table.py)
+        @rtype: StationTable
+    """
+    survey, stations, tx_power = __feature_sources(interface, path_iw)
+    return StationTable.from_stations(stations).features(survey, tx_power)
+
+
+def __feature_sources(interface, path_iw):
+    """ @return: (survey of the channel in use or None, get_iw_stations(), tx power), sampled once """
+    survey = get_iw_survey(interface, path_iw)
+    in_use = [v for v in survey.values() if v.get('in use', False)]
+    return in_use[0] if len(in_use) > 0 else None, get_iw_stations(interface, path_iw), get_power(interface, path_iw)
+
+
+def get_station_features(interface, macs=None, path_iw=__DEFAULT_IW_PATH):
+    """ the features of /get_features of the stations, computed for all stations at once
+        from one survey, one station dump and one tx power sample
+
+        @param interface: the wireless interface name, e.g. wlan0
+        @param macs: the stations returned. None returns all
+        @param path_iw: path to iw
+
+        @return: ({mac: {feature: value}}, {mac: error message}).
+                 the features that cannot be computed (e.g. no channel in use) are left out,
+                 the macs that are not associated are in the errors
+    """
+    survey, stations, tx_power = __feature_sources(interface, path_iw)
+    selected = sorted(stations) if macs is None else [mac.lower() for mac in macs]
+    errors = dict([(mac, 'not associated') for mac in selected if stations.get(mac) is None])
+    selected = [mac for mac in selected if mac not in errors]
+    try:
+        table = StationTable.from_stations(stations).features(survey, tx_power)
+        rows = table.data[[table.index[mac] for mac in selected]].tolist()
+    except ImportError:  # without numpy, one station at a time
+        num_stations = len([v for v in stations.values() if v is not None])
+        rows = [feature_row(stations[mac], survey, tx_power, num_stations) for mac in selected]
+    features = dict()
+    for mac, row in zip(selected, rows):
+        features[mac] = dict([(feature, v) for feature, v in zip(FEATURE_COLUMNS, row) if v == v])
+        features[mac]['num_stations'] = int(features[mac]['num_stations'])
+    return features, errors
+
+
+@snapshot_cache.cached('hostapd_status')
+def get_status(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH, interface=None):
     """ get information from "hostapd_cli status"
-        TODO: what if the interface has multiple SSIDs ???
+        a radio with multiple SSIDs lists each BSS in bss[i], bssid[i], ssid[i] and num_sta[i] (see get_status_all())
 
         @param path_hostapd_cli: path to hostapd_cli
+        @param interface: the wireless interface name, e.g. wlan0. None uses hostapd_cli's default
 
         @return: the returned command fields
         @rtype: dict
     """
-    cmd = "sudo {} status".format(os.path.join(path_hostapd_cli, 'hostapd_cli'))
-    LOG.debug(cmd)
-    with os.popen(cmd) as p:
-        data = p.read()
+    data = hostapd_request('status', interface)
+    if data is None:
+        cmd = "sudo {} {}status".format(os.path.join(path_hostapd_cli, 'hostapd_cli'), __iface_param(interface))
+        LOG.debug(cmd)
+        with __popen(cmd) as p:
+            data = p.read()
     ret = decode_hostapd_status(data)
     LOG.debug("hostapd status: {}".format(ret))
     return ret
@@ -113,7 +449,8 @@ def change_channel(interface, new_channel, count=1, ht_type=None, path_hostapd_c
 
         @param interface: the wireless interface name, e.g. wlan0
         @param new_channel: the new channel number. Trying to change to the current channel returns an error.
-        @param ht_type: Valid values are ['', 'ht', 'vht']. Defines the type of channel. Invalid type return an error, e.g. 'vht' in a 802.11g device.
+        @param ht_type: Valid values are ['', 'ht', 'vht']. Defines the type of channel.
+                        Invalid type return an error, e.g. 'vht' in a 802.11g device.
         @param path_hostapd_cli: path to hostapd_cli
 
         @return: the ifconfig fields
@@ -121,39 +458,53 @@ def change_channel(interface, new_channel, count=1, ht_type=None, path_hostapd_c
     """
     assert new_channel > 0 and new_channel <= len(valid_frequencies), "{} not in valid channels".format(new_channel)
 
-    curr_chann = get_channel(interface)
+    curr_chann = interface_registry.channel(interface)
+    if curr_chann is None:
+        curr_chann = get_channel(interface)
+        interface_registry.set_channel(interface, curr_chann)
     if curr_chann == new_channel:
         LOG.debug("{} same channel. no change needed.".format(new_channel))
         return True  # nothing to do
 
     frequency = valid_frequencies[new_channel - 1]
+    ret = hostapd_request('chan_switch', interface, count, frequency, ht_type)
+    if ret is not None:
+        invalidate_cache(interface, __channel_commands)
+        LOG.debug("change chann: {}".format(ret))
+        return ret
     params = "-i {} chan_switch {} {}".format(interface, count, frequency)
     if ht_type in ['ht', 'vht']:
         params += ' ' + ht_type
     cmd = "sudo {} {}".format(os.path.join(path_hostapd_cli, __HOSTAPD_CLI), params)
     LOG.debug(cmd)
-    with os.popen(cmd) as p:
+    with __popen(cmd) as p:
         # notice that if you to change to the current channel, the program returns FAIL
         ret = p.read().find('OK') >= 0
+    invalidate_cache(interface, __channel_commands)
     LOG.debug("change chann: {}".format(ret))
     return ret
 
 
-def get_stations(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH):
+@snapshot_cache.cached('hostapd_stations')
+def get_stations(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH, interface=None):
     """ returns information about all connected stations
 
         @param path_hostapd_cli: path to hostapd_cli
+        @param interface: the wireless interface name, e.g. wlan0. None uses hostapd_cli's default
         @return: dictionary of dictionary
     """
-    cmd = "sudo {} all_sta".format(os.path.join(path_hostapd_cli, __HOSTAPD_CLI))
-    LOG.debug(cmd)
-    with os.popen(cmd) as p:
-        data = p.read()
+    data = hostapd_request('all_sta', interface)
+    if data is None:
+        cmd = "sudo {} {}all_sta".format(os.path.join(path_hostapd_cli, __HOSTAPD_CLI), __iface_param(interface))
+        LOG.debug(cmd)
+        with __popen(cmd) as p:
+            data = p.read()
     result = decode_hostapd_station(data)
     LOG.debug("hostapd stations: {}".format(result))
     return result
 
 
+@snapshot_cache.cached('iw_info')
 def get_iw_info(interface, path_iw=__DEFAULT_IW_PATH):
     """ executes "iw dev info"
 
@@ -163,9 +514,13 @@ def get_iw_info(interface, path_iw=__DEFAULT_IW_PATH):
         @return: the command fields
         @rtype: dict
     """
+    result = nl80211_request('get_interface', interface)
+    if result is not None:
+        LOG.debug("nl80211 info: {}".format(result))
+        return result
     cmd = "sudo {} dev {} info".format(os.path.join(path_iw, 'iw'), interface)
     LOG.debug(cmd)
-    with os.popen(cmd) as p:
+    with __popen(cmd) as p:
         ret = p.read().replace('\t', '').split('\n')
         result = []
         for i in range(len(ret)):
@@ -189,10 +544,21 @@ def get_iw_info(interface, path_iw=__DEFAULT_IW_PATH):
 
 
 def get_channel(interface, path_iw=__DEFAULT_IW_PATH):
+    """ @param interface: the wireless interface name, e.g. wlan0
+        @param path_iw: path to iw
+
+        @return: the channel number or -1 if not found
+        @rtype: int
+    """
     channel = get_iw_info(interface, path_iw=path_iw).get('channel', -1)
+    try:
+        channel = int(channel)
+    except ValueError:
+        channel = -1
     return channel
 
 
+@snapshot_cache.cached('iwconfig')
 def get_iwconfig_info(interface, path_iwconfig=__DEFAULT_IWCONFIG_PATH):
     """ get the return from "iwconfig <interface>"
         NOTE: this method only supports (tested) two modes = Managed and Master
@@ -205,7 +571,7 @@ def get_iwconfig_info(interface, path_iwconfig=__DEFAULT_IWCONFIG_PATH):
     """
     cmd = "{} {}".format(os.path.join(path_iwconfig, 'iwconfig'), interface)
     LOG.debug(cmd)
-    with os.popen(cmd) as p:
+    with __popen(cmd) as p:
         result = {'interface': interface}
         data = p.read()
         r = decode_iwconfig(data)
@@ -228,6 +594,10 @@ def get_power(interface, path_iw=__DEFAULT_IW_PATH, path_iwconfig=__DEFAULT_IWCO
     if txpower is None:
         ret = get_iwconfig_info(interface, path_iwconfig)
         txpower = ret.get('Tx Power', None)
+    if isinstance(txpower, (int, float)):
+        txpower = float(txpower)  # nl80211 backend or iwconfig already decoded it
+        LOG.debug("txpower: {}".format(txpower))
+        return txpower
     f = re.findall(r"[-+]?\d*\.\d+|\d+", txpower)
     if len(f) > 0:
         v = f[0]
@@ -258,30 +628,38 @@ def set_iw_power(interface, new_power, path_iw=__DEFAULT_IW_PATH):
     else:
         return -1  # error
     LOG.debug(cmd)
-    with os.popen(cmd) as p:
+    with __popen(cmd) as p:
         ret = p.read()
+    invalidate_cache(interface, ['iw_info', 'iwconfig'])
     return ret
 
 
-def disassociate_sta(mac_sta, path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH):
+def disassociate_sta(mac_sta, path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH, interface=None):
     """ sends the command to disassociate a station
 
         @param mac_sta: the MAC address of the station we want to disassociate
+        @param interface: the wireless interface name, e.g. wlan0. None uses hostapd_cli's default
 
         @return: if the command succeded
         @rtype: bool
     """
-    cmd = "sudo {} disassociate {}".format(os.path.join(path_hostapd_cli, __HOSTAPD_CLI), mac_sta)
-    LOG.debug(cmd)
-    with os.popen(cmd) as p:
-        ret = p.read()
-    return 'OK' in ret
+    ret = hostapd_request('disassociate', interface, mac_sta)
+    if ret is None:
+        cmd = "sudo {} {}disassociate {}".format(os.path.join(path_hostapd_cli, __HOSTAPD_CLI), __iface_param(interface),
+                                                 mac_sta)
+        LOG.debug(cmd)
+        with __popen(cmd) as p:
+            ret = 'OK' in p.read()
+    invalidate_cache(interface, __station_commands)
+    return ret
 
 
-def get_config(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH):
+@snapshot_cache.cached('hostapd_config')
+def get_config(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH, interface=None):
     """ executes "hostapd_cli get_config"
 
         @param path_hostapd_cli: path to hostapd_cli
+        @param interface: the wireless interface name, e.g. wlan0. None uses hostapd_cli's default
 
         @return: dictionary {'ssid': 'ethanolQL1',
                             'bssid': 'b0:aa:ab:ab:ac:11',
@@ -291,15 +669,20 @@ def get_config(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH):
                             'wpa': '2',
                             'wps_state': 'disabled'}
     """
-    cmd = "sudo {} get_config".format(os.path.join(path_hostapd_cli, __HOSTAPD_CLI))
-    LOG.debug(cmd)
-    with os.popen(cmd) as p:
-        result = p.read().split('\n')
-    result.pop(0)  # remove first line (blank line)
+    data = hostapd_request('get_config', interface)
+    if data is None:
+        cmd = "sudo {} {}get_config".format(os.path.join(path_hostapd_cli, __HOSTAPD_CLI), __iface_param(interface))
+        LOG.debug(cmd)
+        with __popen(cmd) as p:
+            result = p.read().split('\n')
+        result.pop(0)  # remove first line (blank line)
+    else:
+        result = data.split('\n')
     result = dict([w for w in [v.split('=') for v in result] if len(w) == 2])
     return result
 
 
+@snapshot_cache.cached('iw_survey')
 def get_iw_survey(interface, path_iw=__DEFAULT_IW_PATH):
     """ executes command "iw dev <interface> survey dump"
 
@@ -308,34 +691,113 @@ def get_iw_survey(interface, path_iw=__DEFAULT_IW_PATH):
 
         @return: decoded information from survey
     """
+    result = nl80211_request('get_survey', interface)
+    if result is not None:
+        return result
     cmd = "sudo {} dev {} survey dump".format(os.path.join(path_iw, 'iw'), interface)
     LOG.debug(cmd)
-    with os.popen(cmd) as p:
+    with __popen(cmd) as p:
         data = p.read()
     result = decode_survey(data)
     return result
 
 
+def get_status_all(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH, interfaces=None):
+    """ the BSSes of every radio, with one "hostapd_cli status" per radio
+
+        @param interfaces: None uses ap_interfaces()
+        @return: {bss interface: {'phy', 'radio' (interface queried), 'state', 'channel', 'freq', 'bssid', 'ssid', 'num_sta'}}
+        @rtype: dict
+    """
+    ret = dict()
+    for phy, ifaces in radios(interfaces).items():
+        status = get_status(path_hostapd_cli, interface=ifaces[0])
+        radio = {'phy': status.get('phy', phy), 'radio': ifaces[0], 'state': status.get('state'),
+                 'channel': status.get('channel'), 'freq': status.get('freq')}
+        bsses = decode_hostapd_bss(status)
+        for iface in ifaces:
+            ret[iface] = dict(radio, **bsses.get(iface, {'bssid': None, 'ssid': None, 'num_sta': None}))
+    return ret
+
+
+def get_stations_all(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH, interfaces=None):
+    """ the stations of every BSS, from hostapd (see get_stations())
+
+        @param interfaces: None uses ap_interfaces()
+        @return: {bss interface: {mac: fields}}
+    """
+    return __each(lambda iface: get_stations(path_hostapd_cli, interface=iface), interfaces)
+
+
+def get_config_all(path_hostapd_cli=__DEFAULT_HOSTAPD_CLI_PATH, interfaces=None):
+    """ the configuration of every BSS (see get_config())
+
+        @param interfaces: None uses ap_interfaces()
+        @return: {bss interface: config}
+    """
+    return __each(lambda iface: get_config(path_hostapd_cli, interface=iface), interfaces)
+
+
+def get_iw_stations_all(path_iw=__DEFAULT_IW_PATH, interfaces=None):
+    """ the stations of every BSS, one station dump per interface (see get_iw_stations())
+
+        @param interfaces: None uses ap_interfaces()
+        @return: {bss interface: {mac: fields}}
+    """
+    return __each(lambda iface: get_iw_stations(iface, path_iw), interfaces)
+
+
+def get_iw_info_all(path_iw=__DEFAULT_IW_PATH, interfaces=None):
+    """ "iw dev <interface> info" of every interface
+
+        @param interfaces: None uses ap_interfaces()
+        @return: {interface: info}
+    """
+    return __each(lambda iface: get_iw_info(iface, path_iw), interfaces)
+
+
+def get_iw_survey_all(path_iw=__DEFAULT_IW_PATH, interfaces=None):
+    """ the survey of every radio, with one survey dump per radio (the BSSes of a radio share its channels)
+
+        @param interfaces: None uses ap_interfaces()
+        @return: {interface queried on each radio: survey}
+    """
+    return __each(lambda iface: get_iw_survey(iface, path_iw), [ifaces[0] for ifaces in radios(interfaces).values()])
+
+
+def __scan_command(interface, path_iw=__DEFAULT_IW_PATH):
+    """ @return: the command line of iw dev <interface> scan dump, or scan ap-force if the interface is an AP """
+    if interface_registry.is_ap(interface):
+        cmd = "sudo {} dev {} scan ap-force 2>&1".format(os.path.join(path_iw, 'iw'), interface)
+    else:
+        cmd = "sudo {} dev {} scan dump 2>&1".format(os.path.join(path_iw, 'iw'), interface)
+    LOG.debug(cmd)
+    return cmd
+
+
 def get_scan(interface, path_iw=__DEFAULT_IW_PATH):
     """ helper function that commands iw dev <interface> scan dump or scan ap-force.
         some APs only accept scan ap-force.
-        used by get_iw_scan_full(), get_iw_scan_mac() and get_iw_scan().
 
         @param interface: interface to scan
         @param path_iw: path to iw
 
         @return: return the output of the command
     """
-    if get_iwconfig_info(interface)['Mode'].lower() == 'master':
-        cmd = "sudo {} dev {} scan ap-force 2>&1".format(os.path.join(path_iw, 'iw'), interface)
-    else:
-        cmd = "sudo {} dev {} scan dump 2>&1".format(os.path.join(path_iw, 'iw'), interface)
-    LOG.debug(cmd)
-    with os.popen(cmd) as p:
+    with __popen(__scan_command(interface, path_iw)) as p:
         data = p.read()
     return data
 
 
+def __decode_scan_output(decoder, interface, path_iw=__DEFAULT_IW_PATH):
+    """ decodes the output of the scan while the command writes it (see cmd/scan.py)
+        used by get_iw_scan_full(), get_iw_scan_mac() and get_iw_scan().
+    """
+    with __popen(__scan_command(interface, path_iw)) as p:
+        result = decoder(p)
+    return result
+
+
 def get_iw_scan_full(interface, path_iw=__DEFAULT_IW_PATH):
     """ execute command "iw dev <interface> scan dump"
 
@@ -344,9 +806,7 @@ def get_iw_scan_full(interface, path_iw=__DEFAULT_IW_PATH):
 
         @return: decoded information from scan dump
     """
-    data = get_scan(interface, path_iw)
-    result = decode_scan(data)
-    return result
+    return __decode_scan_output(decode_scan, interface, path_iw)
 
 
 def get_iw_scan_mac(interface, path_iw=__DEFAULT_IW_PATH):
@@ -357,9 +817,7 @@ def get_iw_scan_mac(interface, path_iw=__DEFAULT_IW_PATH):
 
         @return: decoded information from scan dump, only the detected MACs
     """
-    data = get_scan(interface, path_iw)
-    result = decode_scan_mac(data)
-    return result
+    return __decode_scan_output(decode_scan_mac, interface, path_iw)
 
 
 def get_iw_scan(interface, path_iw=__DEFAULT_IW_PATH):
@@ -368,11 +826,9 @@ def get_iw_scan(interface, path_iw=__DEFAULT_IW_PATH):
         @param interface: interface to scan
         @param path_iw: path to iw
 
-        @return: decoded information from scan dump, only the detected MACs
+        @return: decoded information from scan dump: freq, signal, beacon interval, last seen, SSID, channel and TSF
     """
-    data = get_scan(interface, path_iw)
-    result = decode_scan_basic(data)
-    return result
+    return __decode_scan_output(decode_scan_basic, interface, path_iw)
 
 
 def trigger_scan(interface, path_iw=__DEFAULT_IW_PATH):
@@ -387,7 +843,7 @@ def trigger_scan(interface, path_iw=__DEFAULT_IW_PATH):
     """
     cmd = "sudo {} dev {} scan trigger".format(os.path.join(path_iw, 'iw'), interface)
     LOG.debug(cmd)
-    os.system(cmd)
+    __popen(cmd).close()
 
 
 def get_phy_with_wlan(interface, path_iw=__DEFAULT_IW_PATH):
@@ -395,6 +851,9 @@ def get_phy_with_wlan(interface, path_iw=__DEFAULT_IW_PATH):
         @param interface: the name of the interface, e.g. 'wlan0'
         @return: a string with the phy interface name
     """
+    phy = interface_registry.phy(interface)
+    if phy is not None:
+        return phy
     phy_ = get_iw_info(interface, path_iw=path_iw).get('wiphy', '')
     if phy_ == '':
         return None
@@ -410,6 +869,9 @@ if __name__ == '__main__':
     parser.add_argument('--path-iw', type=str, default=__DEFAULT_IW_PATH, help='path to iw')
 
     parser.add_argument('--iface', type=str, default='wlan0', help='interface to query')
+    parser.add_argument('--no-hostapd-ctrl', action='store_true',
+                        help="always use hostapd_cli instead of hostapd's control socket")
+    parser.add_argument('--nl80211', action='store_true', help='use nl80211 instead of iw to query stations, survey and info')
 
     parser.add_argument('--info', action='store_true', help='show hostapd info')
     parser.add_argument('--iw', action='store_true', help='show hostapd info')
@@ -428,6 +890,11 @@ if __name__ == '__main__':
     parser.add_argument('--disassociate', type=str, default=None, help='disassociate station')
     args = parser.parse_args()
 
+    if args.no_hostapd_ctrl:
+        use_hostapd_ctrl(False)
+    if args.nl80211:
+        use_nl80211(True)
+
     if args.iw_stations:
         print(get_iw_stations(args.iface))
 
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    delta encoding of the station counters
+
+    the counters of "iw dev station dump" (tx bytes, tx packets, ...) are monotonic, so only their variation
+    between two samples is useful. StationDeltaTracker keeps the previous sample of each station and returns
+    the deltas and rates of the counters that changed, handling counter wrap and station reconnects.
+
+
+    Usage:
+    ------
+
+    tracker = StationDeltaTracker()
+    tracker.update(get_iw_stations('wlan0'))  # first sample: all stations are 'new'
+    ...
+    deltas = tracker.update(get_iw_stations('wlan0'))
+"""
+import time
+import threading
+
+
+"""monotonic counters in the output of decode_iw_station()"""
+STATION_COUNTERS = ['tx bytes', 'tx packets', 'tx retries', 'tx failed',
+                    'rx bytes', 'rx packets', 'rx drop misc',
+                    'beacon loss', 'beacon rx', 'rx duration', 'tx duration',
+                    ]
+
+"""monotonic counters in the output of /get_features (see get_set/server.py)"""
+FEATURE_COUNTERS = ['txf', 'txr', 'txp', 'txb', 'rxdrop', 'rxb', 'rxp', 'cat', 'cbt', 'crt', 'ctt']
+
+"""the 32 bits counters of STATION_COUNTERS (u32 in nl80211), they wrap. The byte counters, the durations and
+   the survey channel times are 64 bits: they do not wrap, a decrease is a restart"""
+STATION_COUNTER_BITS = {'tx packets': 32, 'rx packets': 32, 'tx retries': 32, 'tx failed': 32, 'beacon loss': 32}
+
+"""the 32 bits counters of FEATURE_COUNTERS"""
+FEATURE_COUNTER_BITS = {'txp': 32, 'rxp': 32, 'txr': 32, 'txf': 32}
+
+"""the station was reconnected if this field decreased"""
+CONNECTED_TIME = 'connected time'
+
+
+class StationDeltaTracker(object):
+    """ keeps the previous sample of each station and computes the per-interval deltas """
+
+    def __init__(self, counters=STATION_COUNTERS, wrap_bits=64, reset_field=CONNECTED_TIME, clock=time.monotonic,
+                 counter_bits=STATION_COUNTER_BITS):
+        """
+            @param counters: fields that are monotonic counters. The other fields are reported when their value changes
+            @param wrap_bits: size of the counters that are not in counter_bits.
+                              64 bits counters never wrap: a decrease is a restart
+            @param reset_field: a field that decreases when the station reconnects (its counters restart). None if unavailable
+            @param clock: function that returns the current time in seconds
+            @param counter_bits: {counter: size in bits} of the counters whose size is not wrap_bits
+                                 (e.g. STATION_COUNTER_BITS, FEATURE_COUNTER_BITS)
+        """
+        self.counters = list(counters)
+        self.wrap = 2 ** wrap_bits
+        self.wraps = dict([(k, 2 ** bits) for k, bits in (counter_bits or dict()).items()])
+        self.reset_field = reset_field
+        self.clock = clock
+        self.previous = dict()  # {mac: (timestamp, fields)}
+        self.last_update = clock()  # clock() of the last update(), to evict the idle trackers
+        self._lock = threading.Lock()
+
+    def counter_delta(self, previous, current, reconnected, counter=None):
+        """ @return: the increment of a counter between two samples """
+        if reconnected:
+            return current  # the counter restarted from zero
+        if current >= previous:
+            return current - previous
+        wrap = self.wraps.get(counter, self.wrap)
+        if wrap < 2 ** 64 and wrap // 2 <= previous < wrap:
+            return current + wrap - previous  # wrapped
+        return current  # restarted (e.g. reconnect without reset_field, or driver reset)
+
+    def update(self, stations, timestamp=None, only_changed=True, partial=False):
+        """ stores the new sample and returns the changes since the previous one
+
+            @param stations: {mac: fields}, e.g. the output of get_iw_stations()
+            @param timestamp: time of the sample in seconds. None uses clock()
+            @param only_changed: False also returns the fields and stations that did not change
+            @param partial: True if stations is a subset of the stations (e.g. the ones requested):
+                            the other stations are kept, and not reported as removed
+            @return: {mac: {'interval': seconds since the previous sample,
+                            'delta': {counter: increment},
+                            'rate': {counter: increment per second},
+                            'value': {other field: new value},
+                            'reconnected': True if the counters restarted}
+                      new stations: {mac: {'new': True, 'value': fields}}
+                      stations that left: {mac: {'removed': True}}
+                     }
+            @rtype: dict
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        result = dict()
+        with self._lock:
+            self.last_update = self.clock()
+            for mac, fields in stations.items():
+                if fields is None:
+                    continue
+                prev = self.previous.get(mac)
+                self.previous[mac] = (timestamp, dict(fields))
+                if prev is None:
+                    result[mac] = {'new': True, 'value': dict(fields)}
+                    continue
+                prev_timestamp, prev_fields = prev
+                entry = self.diff(prev_fields, fields, timestamp - prev_timestamp, only_changed)
+                if entry is not None:
+                    result[mac] = entry
+            for mac in [m for m in self.previous if not partial and m not in stations]:
+                del self.previous[mac]
+                result[mac] = {'removed': True}
+        return result
+
+    def diff(self, prev_fields, fields, interval, only_changed=True):
+        """ @return: the changes of one station (see update()) or None if nothing changed """
+        reconnected = False
+        if self.reset_field is not None and self.reset_field in fields and self.reset_field in prev_fields:
+            try:
+                reconnected = fields[self.reset_field] < prev_fields[self.reset_field]
+            except TypeError:
+                pass
+        delta, rate, value = dict(), dict(), dict()
+        for k, v in fields.items():
+            prev = prev_fields.get(k)
+            if k in self.counters and isinstance(v, (int, float)) and isinstance(prev, (int, float)):
+                d = self.counter_delta(prev, v, reconnected, k)
+                if d != 0 or not only_changed:
+                    delta[k] = d
+                    rate[k] = d / interval if interval > 0 else 0.0
+            elif k == self.reset_field:
+                continue  # always changes
+            elif v != prev or not only_changed:
+                value[k] = v
+        if only_changed and len(delta) == 0 and len(value) == 0 and not reconnected:
+            return None
+        entry = {'interval': interval, 'delta': delta, 'rate': rate, 'value': value}
+        if reconnected:
+            entry['reconnected'] = True
+        return entry
+
+    def reset(self):
+        """ forgets all previous samples """
+        with self._lock:
+            self.previous = dict()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    executors of the commands run by command_ap (iw, hostapd_cli, iwconfig, ifconfig)
+
+    ShellExecutor runs the commands (os.popen), the default.
+    RecordingExecutor runs them and saves each output in a directory.
+    ReplayExecutor runs nothing: it returns the outputs of a directory saved by RecordingExecutor, or given
+    in a dictionary, after a configurable latency. synthetic_executor() generates the outputs of an ath9k AP
+    with N stations (see synthetic.py), so the whole server runs without a wireless card, sudo or hostapd.
+
+    The files (xmit, /proc/net/dev, sysfs) are read below executor.root: '/' for the shell, a directory
+    with a copy of these files for the replay (a recorded directory's "root" subdirectory).
+
+    The outputs are found by the command without sudo, the executable's path and redirections (see command_key()),
+    e.g. "sudo /sbin/iw dev wlan0 station dump 2>&1" -> "iw dev wlan0 station dump".
+
+
+    Usage:
+    ------
+
+    use_executor(synthetic_executor(['wlan0'], stations=50, latency=0.005))  # in command_ap
+    get_iw_stations('wlan0')  # 50 stations
+
+    use_executor(RecordingExecutor('/tmp/ap1'))  # saves the outputs of a real AP
+    ...
+    use_executor(ReplayExecutor.load('/tmp/ap1'))  # replays them
+"""
+import io
+import logging
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from cmd.synthetic import synthetic_interface, synthetic_iw_station, synthetic_hostapd_station, synthetic_scan
+from cmd.synthetic import synthetic_survey, synthetic_xmit, synthetic_proc_net_dev, synthetic_ifconfig
+from cmd.synthetic import iw_info_template, iwconfig_template, hostapd_status_template, hostapd_config_template
+
+
+LOG = logging.getLogger('EXECUTOR')
+
+COMMANDS_DIR = 'commands'
+ROOT_DIR = 'root'
+
+
+def command_key(cmd):
+    """ @return: the command without sudo, the path of the executable and the redirections,
+                 e.g. 'iw dev wlan0 scan dump' for 'sudo /sbin/iw dev wlan0 scan dump 2>&1'
+    """
+    words = [w for w in cmd.split() if w != 'sudo' and not w.startswith('2>') and not w.startswith('>')]
+    if len(words) > 0:
+        words[0] = os.path.basename(words[0])
+    return ' '.join(words)
+
+
+def command_filename(cmd):
+    """ @return: the name of the file with the output of the command (see RecordingExecutor) """
+    return urllib.parse.quote(command_key(cmd), safe='')
+
+
+class ShellExecutor(object):
+    """ runs the commands """
+    root = '/'
+    replay = False
+
+    def popen(self, cmd):
+        """ @return: the command's stdout, a file object like os.popen() """
+        return os.popen(cmd)
+
+    def close(self):
+        pass
+
+
+class RecordingExecutor(ShellExecutor):
+    """ runs the commands and saves their last output in directory/commands, to be replayed by ReplayExecutor """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, COMMANDS_DIR), exist_ok=True)
+
+    def popen(self, cmd):
+        with os.popen(cmd) as p:
+            output = p.read()
+        with open(os.path.join(self.directory, COMMANDS_DIR, command_filename(cmd)), 'w') as f:
+            f.write(output)
+        return io.StringIO(output)
+
+
+class ReplayExecutor(object):
+    """ returns recorded outputs instead of running the commands """
+    replay = True
+
+    def __init__(self, outputs=None, root='/', latency=0.0, jitter=0.0, seed=None, cleanup=None):
+        """
+            @param outputs: {command: output}. The output is a string or a function() that returns it.
+                            The commands are compared with command_key()
+            @param root: directory with the files read by command_ap (xmit, /proc/net/dev, sysfs)
+            @param latency: seconds each command takes
+            @param jitter: the latency varies uniformly up to `jitter` seconds more
+            @param seed: of the jitter
+            @param cleanup: a directory removed by close(), e.g. a temporary root
+        """
+        self.outputs = dict([(command_key(cmd), output) for cmd, output in (outputs or dict()).items()])
+        self.root = root
+        self.latency = latency
+        self.jitter = jitter
+        self.cleanup = cleanup
+        self.calls = dict()  # {command: number of calls}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, directory, **kwargs):
+        """ @param directory: saved by RecordingExecutor. Its "root" subdirectory, if any, is the root
+            @param kwargs: the other parameters of ReplayExecutor
+        """
+        outputs = dict()
+        commands = os.path.join(directory, COMMANDS_DIR)
+        for name in os.listdir(commands):
+            with open(os.path.join(commands, name), 'r') as f:
+                outputs[urllib.parse.unquote(name)] = f.read()
+        root = os.path.join(directory, ROOT_DIR)
+        return cls(outputs, root=root if os.path.isdir(root) else '/', **kwargs)
+
+    def set_output(self, cmd, output):
+        """ replaces the output of a command """
+        self.outputs[command_key(cmd)] = output
+
+    def popen(self, cmd):
+        """ @return: the recorded output, '' for an unknown command (e.g. a setter) """
+        key = command_key(cmd)
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter > 0 else 0)
+        if delay > 0:
+            time.sleep(delay)
+        output = self.outputs.get(key)
+        if output is None:
+            LOG.debug("no output for {}".format(key))
+            output = ''
+        elif callable(output):
+            output = output()
+        return io.StringIO(output)
+
+    def close(self):
+        if self.cleanup is not None:
+            shutil.rmtree(self.cleanup, ignore_errors=True)
+            self.cleanup = None
+
+
+def _write(root, path, content):
+    filename = os.path.join(root, *path.split('/'))
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'w') as f:
+        f.write(content)
+
+
+def synthetic_root(directory, interfaces, seed=1):
+    """ writes the files of an ath9k AP below directory: sysfs of the interfaces, debugfs xmit and /proc/net/dev
+
+        @param interfaces: list of synthetic_interface()
+    """
+    for params in interfaces:
+        net = 'sys/class/net/{}'.format(params['interface'])
+        _write(directory, net + '/phy80211/name', params['phy'] + '\n')
+        _write(directory, net + '/phy80211/index', '{}\n'.format(params['wiphy']))
+        _write(directory, net + '/ifindex', '{}\n'.format(params['ifindex']))
+        _write(directory, net + '/address', params['address'] + '\n')
+        _write(directory, net + '/tx_queue_len', '1000\n')
+        _write(directory, 'sys/kernel/debug/ieee80211/{}/ath9k/xmit'.format(params['phy']), synthetic_xmit(seed))
+    _write(directory, 'proc/net/dev',
+           synthetic_proc_net_dev(['lo', 'eth0'] + [params['interface'] for params in interfaces], seed))
+
+
+def synthetic_executor(interfaces=('wlan0',), stations=10, bss=20, latency=0.0, jitter=0.0, seed=1):
+    """ a ReplayExecutor with the outputs of an ath9k AP, in a temporary root removed by close()
+
+        @param interfaces: the AP interfaces, e.g. ['wlan0']
+        @param stations: number of stations of each interface
+        @param bss: number of BSSes in the scans
+        @param latency, jitter: of each command (see ReplayExecutor)
+    """
+    outputs = dict()
+    params = [synthetic_interface(iface, i, num_stations=stations) for i, iface in enumerate(interfaces)]
+    for p in params:
+        iface = p['interface']
+        iw = 'iw dev {} '.format(iface)
+        outputs[iw + 'station dump'] = synthetic_iw_station(stations, seed, iface)
+        outputs[iw + 'survey dump'] = synthetic_survey(p['channel'], seed, iface)
+        outputs[iw + 'info'] = iw_info_template.format(**p)
+        scan = synthetic_scan(bss, seed, iface)
+        for args in ['scan', 'scan dump', 'scan ap-force']:
+            outputs[iw + args] = scan
+        outputs['iwconfig ' + iface] = iwconfig_template.format(**p)
+        outputs['ifconfig ' + iface] = synthetic_ifconfig(iface, seed)
+        for prefix in ['hostapd_cli -i {} '.format(iface)] + (['hostapd_cli '] if p is params[0] else []):
+            outputs[prefix + 'status'] = hostapd_status_template.format(**p)
+            outputs[prefix + 'all_sta'] = "Selected interface '{}'\n".format(iface) + \
+                synthetic_hostapd_station(stations, seed)
+            outputs[prefix + 'get_config'] = hostapd_config_template.format(**p)
+    root = tempfile.mkdtemp(prefix='synthetic-ap-')
+    synthetic_root(root, params, seed)
+    return ReplayExecutor(outputs, root=root, latency=latency, jitter=jitter, seed=seed, cleanup=root)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    in-process history of the AP metrics
+
+    MetricHistory keeps the last samples of each series (family, entity, metric) in a fixed size ring buffer,
+    e.g. ('wlan0/stations', '00:11:22:33:44:55', 'tx bytes') or ('wlan0/survey', 2437, 'channel busy time'),
+    so the memory does not grow with the uptime. HistorySampler feeds it from a background thread, at one interval
+    for all the families (the server uses the SamplerScheduler of scheduler.py instead, with a period per family).
+    query() returns the samples of a window, their rates, or aggregates (min/mean/max/p95) per step.
+    The samples are stored on a monotonic clock, so a change of the system time does not reorder them or move them
+    out of the window; query() converts their timestamps to the time of day (time.time()).
+
+    The samples come from the command_ap functions, so a period shorter than the snapshot cache TTL of the command
+    repeats the cached sample (see set_cache_ttl()).
+
+
+    Usage:
+    ------
+
+    history = MetricHistory(capacity=600)
+    sampler = HistorySampler(history, interface_sources('wlan0'), interval=0.1)
+    sampler.start()
+    ...
+    history.query('wlan0/stations', metrics=['tx bytes'], seconds=60, step=1, rate=True)
+    {'00:11:22:33:44:55': {'tx bytes': {'t': [...], 'min': [...], 'mean': [...], 'max': [...], 'p95': [...],
+                                        'count': [...]}}}
+"""
+import logging
+import math
+import threading
+import time
+
+from array import array
+
+
+LOG = logging.getLogger('HISTORY')
+
+"""statistics of each step returned by query()"""
+AGGREGATES = ['min', 'mean', 'max', 'p95', 'count']
+
+
+class RingBuffer(object):
+    """ the last `capacity` samples (timestamp, value) of one series, in two preallocated arrays """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = array('d', [0.0]) * capacity
+        self.values = array('d', [0.0]) * capacity
+        self.count = 0
+        self.next = 0  # position of the next sample
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp, value):
+        self.times[self.next] = timestamp
+        self.values[self.next] = value
+        self.next = (self.next + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def last(self):
+        """ @return: (timestamp, value) of the last sample or None """
+        if self.count == 0:
+            return None
+        i = (self.next - 1) % self.capacity
+        return self.times[i], self.values[i]
+
+    def _time(self, first, i):
+        return self.times[(first + i) % self.capacity]
+
+    def window(self, since=None):
+        """ @param since: timestamp of the oldest sample returned. None returns all samples
+            @return: (timestamps, values) in chronological order
+            @rtype: tuple of lists
+        """
+        first = (self.next - self.count) % self.capacity
+        lo, hi = 0, self.count
+        if since is not None:
+            while lo < hi:  # first sample >= since (the timestamps are increasing)
+                mid = (lo + hi) // 2
+                if self._time(first, mid) < since:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        start = (first + lo) % self.capacity
+        n = self.count - lo
+        if start + n <= self.capacity:
+            return self.times[start:start + n].tolist(), self.values[start:start + n].tolist()
+        end = start + n - self.capacity
+        return ((self.times[start:] + self.times[:end]).tolist(),
+                (self.values[start:] + self.values[:end]).tolist())
+
+
+def rates(timestamps, values):
+    """ @return: (timestamps, rates): the increase per second between consecutive samples.
+                 A decrease is a counter reset, it has no rate
+    """
+    t, r = [], []
+    for i in range(1, len(values)):
+        dt = timestamps[i] - timestamps[i - 1]
+        dv = values[i] - values[i - 1]
+        if dt > 0 and dv >= 0:
+            t.append(timestamps[i])
+            r.append(dv / dt)
+    return t, r
+
+
+def percentile(values, p):
+    """ @return: the p-th percentile (nearest rank) of values, which are sorted """
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def aggregate(timestamps, values, step, start):
+    """ @param step: length of each bucket in seconds
+        @param start: timestamp of the first bucket
+        @return: {'t': start of each bucket, 'min', 'mean', 'max', 'p95', 'count'}, without the empty buckets
+    """
+    result = dict([(k, []) for k in ['t'] + AGGREGATES])
+    i, n = 0, len(values)
+    while i < n:
+        b = int((timestamps[i] - start) // step)
+        j = i
+        while j < n and int((timestamps[j] - start) // step) == b:
+            j += 1
+        bucket = sorted(values[i:j])
+        result['t'].append(start + b * step)
+        result['min'].append(bucket[0])
+        result['mean'].append(sum(bucket) / len(bucket))
+        result['max'].append(bucket[-1])
+        result['p95'].append(percentile(bucket, 95))
+        result['count'].append(len(bucket))
+        i = j
+    return result
+
+
+class MetricHistory(object):
+    """ {(family, entity, metric): RingBuffer} """
+
+    def __init__(self, capacity=600, max_series=20000, clock=time.monotonic, capacities=None, wall_clock=time.time):
+        """
+            @param capacity: samples kept in each series
+            @param capacities: {family: samples kept in each series of the family}, for the families sampled
+                               at other periods than the default (see scheduler.py)
+            @param max_series: maximum number of series. When it is reached, the series that were not updated
+                               for the longest time are dropped (e.g. the stations that left)
+            @param clock: function that returns the timestamp of the samples, monotonic
+            @param wall_clock: function that returns the time of day, the timestamps returned by query()
+        """
+        self.capacity = capacity
+        self.capacities = dict(capacities or dict())
+        self.max_series = max_series
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self._series = dict()
+        self._lock = threading.Lock()
+
+    def record(self, family, samples, timestamp=None):
+        """ appends one sample of each numeric metric
+
+            @param family: e.g. 'wlan0/stations'
+            @param samples: {entity: {metric: value}}, e.g. the output of get_iw_stations(). Non numeric values are ignored
+            @param timestamp: time of the samples on clock(). None uses clock()
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            for entity, metrics in samples.items():
+                if not isinstance(metrics, dict):
+                    continue
+                for metric, value in metrics.items():
+                    if isinstance(value, bool) or not isinstance(value, (int, float)):
+                        continue
+                    key = (family, entity, metric)
+                    ring = self._series.get(key)
+                    if ring is None:
+                        if len(self._series) >= self.max_series:
+                            self._evict()
+                        ring = self._series[key] = RingBuffer(self.capacities.get(family, self.capacity))
+                    ring.append(timestamp, value)
+
+    def _evict(self):
+        """ drops a tenth of the series, the ones not updated for the longest time """
+        keys = sorted(self._series, key=lambda k: self._series[k].last()[0])
+        for key in keys[:max(1, len(keys) // 10)]:
+            del self._series[key]
+        LOG.debug("history full, dropped {} series".format(max(1, len(keys) // 10)))
+
+    def series(self, family=None):
+        """ @return: the (family, entity, metric) of the stored series """
+        with self._lock:
+            return [key for key in self._series if family is None or key[0] == family]
+
+    def families(self):
+        """ @return: the names of the families """
+        with self._lock:
+            return sorted(set(key[0] for key in self._series))
+
+    def query(self, family, entities=None, metrics=None, seconds=60.0, step=None, rate=False, now=None):
+        """ @param family: e.g. 'wlan0/stations'
+            @param entities: the entities to return (compared as strings, e.g. '2437' for a frequency). None returns all
+            @param metrics: the metrics to return. None returns all
+            @param seconds: length of the window, ending now
+            @param step: None returns the samples, otherwise aggregates the samples in steps of `step` seconds
+            @param rate: True returns the rates (increase per second) instead of the values, e.g. for the counters
+            @param now: end of the window on clock(). None uses clock()
+            @return: {entity: {metric: {'t': [timestamps], 'v': [values]}}}, the timestamps on wall_clock()
+                     with step: {entity: {metric: {'t': [start of each step], 'min': [...], 'mean': [...],
+                                                   'max': [...], 'p95': [...], 'count': [...]}}},
+                     the steps aligned on multiples of step of wall_clock()
+        """
+        now = self.clock() if now is None else now
+        offset = self.wall_clock() - self.clock()  # clock() to wall_clock()
+        since = now - seconds
+        entities = None if entities is None else set(str(e) for e in entities)
+        metrics = None if metrics is None else set(metrics)
+        with self._lock:
+            selected = [(key, ring.window(since)) for key, ring in self._series.items()
+                        if key[0] == family and
+                        (entities is None or str(key[1]) in entities) and
+                        (metrics is None or key[2] in metrics)]
+        result = dict()
+        for (_, entity, metric), (t, v) in selected:
+            if rate:
+                t, v = rates(t, v)
+            if len(t) == 0:
+                continue
+            t = [timestamp + offset for timestamp in t]
+            if step is None or step <= 0:
+                data = {'t': t, 'v': v}
+            else:
+                start = since + offset
+                data = aggregate(t, v, step, start - start % step)
+            result.setdefault(entity, dict())[metric] = data
+        return result
+
+
+class HistorySampler(object):
+    """ records the samples of the sources in a MetricHistory, every `interval` seconds """
+
+    def __init__(self, history, sources, interval=1.0, clock=time.monotonic):
+        """
+            @param history: the MetricHistory
+            @param sources: {family: function() that returns {entity: {metric: value}}}, see interface_sources()
+            @param interval: seconds between samples
+            @param clock: function that returns the current time in seconds (schedules the samples)
+        """
+        self.history = history
+        self.sources = dict(sources)
+        self.interval = interval
+        self.clock = clock
+        self.samples = 0
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='history-sampler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def sample(self):
+        """ records one sample of each source """
+        for family, source in self.sources.items():
+            try:
+                self.history.record(family, source())
+                self.samples += 1
+            except Exception as e:
+                self.failures += 1
+                LOG.error("history {}: {}".format(family, e))
+
+    def _run(self):
+        deadline = self.clock()
+        while not self._stop.is_set():
+            self.sample()
+            deadline += self.interval
+            delay = deadline - self.clock()
+            if delay < 0:
+                deadline = self.clock()  # late: skip the lost samples instead of running them in a burst
+                delay = 0
+            self._stop.wait(delay)
+
+
+def interface_sources(interface, families=('stations', 'survey', 'ifconfig', 'xmit'), scans=None):
+    """ @param interface: e.g. 'wlan0'
+        @param families: which metrics are sampled: stations, survey, ifconfig, xmit or scan (the last scan results,
+                         the scans are triggered by the ScanManager)
+        @param scans: the ScanManager whose last result the scan family reads. The family does not request scans:
+                      it is empty until the interface is scanned (see ScanManager.add()). Required by the scan family
+        @return: {'<interface>/<family>': function} for HistorySampler.
+                 the entities are the macs (stations), the frequencies (survey), the interface (ifconfig),
+                 the phy (xmit) and the BSSes (scan)
+    """
+    from cmd import command_ap
+    from cmd.scan import decode_scan_basic
+
+    if 'scan' in families and scans is None:
+        raise ValueError("the scan family needs a ScanManager")
+
+    def xmit():
+        phy = command_ap.interface_registry.phy(interface)
+        return {} if phy is None else {phy: command_ap.get_xmit(phy)}
+
+    def scan():
+        result = scans.last(interface, decode_scan_basic)
+        return {} if result is None else result[1]
+
+    functions = {'stations': lambda: command_ap.get_iw_stations(interface),
+                 'survey': lambda: command_ap.get_iw_survey(interface),
+                 'ifconfig': lambda: {interface: command_ap.get_ifconfig(interface)},
+                 'xmit': xmit,
+                 'scan': scan,
+                 }
+    return dict([('{}/{}'.format(interface, f), functions[f]) for f in families])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sample the AP metrics.')
+    parser.add_argument('--iface', type=str, default='wlan0', help='interface')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between samples')
+    parser.add_argument('--seconds', type=float, default=10.0, help='window shown')
+    args = parser.parse_args()
+
+    history = MetricHistory(capacity=int(args.seconds / args.interval) + 1)
+    sampler = HistorySampler(history, interface_sources(args.iface, ['stations']), interval=args.interval)
+    sampler.start()
+    try:
+        while True:
+            time.sleep(args.seconds)
+            print(history.query('{}/stations'.format(args.iface), metrics=['signal avg', 'tx bytes'],
+                                seconds=args.seconds, step=args.seconds))
+    except KeyboardInterrupt:
+        sampler.stop()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    client for the hostapd control interface
+
+    talks directly to the UNIX datagram socket that hostapd creates in its
+    ctrl_interface directory (see ctrl_interface in hostapd.conf), so the socket
+    is kept open between requests and no "sudo hostapd_cli" is forked per call.
+    The replies are the same text hostapd_cli prints, so they can be fed to
+    decode_hostapd_status() and decode_hostapd_station().
+
+
+    Usage:
+    ------
+
+    with HostapdCtrl('wlan0') as ctrl:
+        status = decode_hostapd_status(ctrl.status())
+        stations = decode_hostapd_station(ctrl.all_sta())
+"""
+import os
+import stat
+import socket
+import select
+import tempfile
+import itertools
+import threading
+import collections
+import logging
+import time
+
+
+LOG = logging.getLogger('HOSTAPD_CTRL')
+
+DEFAULT_CTRL_DIR = '/var/run/hostapd'
+BUFFER_SIZE = 65536  # hostapd never sends a datagram larger than this
+MAX_EVENTS = 1024  # unsolicited events kept while waiting for a reply
+
+
+class HostapdCtrlError(Exception):
+    """ raised when hostapd cannot be reached or does not answer in time """
+    pass
+
+
+def list_interfaces(ctrl_dir=DEFAULT_CTRL_DIR):
+    """ list the interfaces that have a control socket in ctrl_dir
+
+        @param ctrl_dir: hostapd's ctrl_interface directory
+        @return: the interface names, sorted
+        @rtype: list
+    """
+    try:
+        names = sorted(os.listdir(ctrl_dir))
+    except OSError:
+        return []
+    ifaces = []
+    for name in names:
+        if name.startswith('.'):
+            continue
+        try:
+            if stat.S_ISSOCK(os.stat(os.path.join(ctrl_dir, name)).st_mode):
+                ifaces.append(name)
+        except OSError:
+            pass  # removed while listing
+    return ifaces
+
+
+def parse_event(msg):
+    """ splits an unsolicited message "<level>TEXT" into (level, text)
+
+        @param msg: message received from hostapd
+        @return: (level, text) or None if msg is not an event
+        @rtype: tuple
+    """
+    if not msg.startswith('<'):
+        return None
+    p = msg.find('>')
+    if p < 0:
+        return None
+    try:
+        level = int(msg[1:p])
+    except ValueError:
+        return None
+    return level, msg[p + 1:]
+
+
+class HostapdCtrl(object):
+    """ persistent connection to the control socket of one hostapd interface
+
+        all requests are serialized by a lock, so the same object can be shared by
+        several threads. When attached, unsolicited events received while waiting
+        for a reply are queued and returned later by recv_event().
+        After a timeout the socket is replaced (and attached again if it was), so a late
+        reply goes to the old socket and is never taken as the reply of the next request.
+    """
+    _counter = itertools.count()
+
+    def __init__(self, interface=None, ctrl_dir=DEFAULT_CTRL_DIR, timeout=2.0, local_dir=None):
+        """
+            @param interface: the wireless interface name, e.g. wlan0.
+                              If None, uses the first socket found in ctrl_dir (as hostapd_cli does)
+            @param ctrl_dir: hostapd's ctrl_interface directory
+            @param timeout: seconds to wait for a reply
+            @param local_dir: where the client socket is created. Defaults to the temporary directory
+        """
+        if interface is None:
+            ifaces = list_interfaces(ctrl_dir)
+            if len(ifaces) == 0:
+                raise HostapdCtrlError("no hostapd control socket in {}".format(ctrl_dir))
+            interface = ifaces[0]
+        self.interface = interface
+        self.ctrl_dir = ctrl_dir
+        self.path = os.path.join(ctrl_dir, interface)
+        self.timeout = timeout
+        self.local_dir = tempfile.gettempdir() if local_dir is None else local_dir
+        self.local_path = None
+        self.sock = None
+        self.attached = False
+        self._reattach = False  # attach again when the socket is reopened after a timeout
+        self.events = collections.deque(maxlen=MAX_EVENTS)
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def open(self):
+        """ creates the client socket and connects it to hostapd """
+        with self._lock:
+            if self.sock is not None:
+                return
+            local_path = os.path.join(self.local_dir,
+                                      'hostapd_ctrl_{}-{}'.format(os.getpid(), next(self._counter)))
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            try:
+                if os.path.exists(local_path):
+                    os.unlink(local_path)
+                sock.bind(local_path)
+                sock.connect(self.path)
+            except (OSError, socket.error) as e:
+                sock.close()
+                if os.path.exists(local_path):
+                    os.unlink(local_path)
+                raise HostapdCtrlError("cannot connect to {}: {}".format(self.path, e))
+            self.sock = sock
+            self.local_path = local_path
+            LOG.debug("connected to {}".format(self.path))
+            if self._reattach:
+                self._reattach = False
+                self.attach()
+
+    def close(self):
+        """ detaches (if needed) and releases the socket """
+        with self._lock:
+            self._reattach = False
+            if self.sock is None:
+                return
+            if self.attached:
+                try:
+                    self._request('DETACH')
+                except HostapdCtrlError:
+                    pass
+                self.attached = False
+            self._release()
+
+    def _release(self):
+        self.sock.close()
+        self.sock = None
+        if self.local_path is not None and os.path.exists(self.local_path):
+            os.unlink(self.local_path)
+        self.local_path = None
+
+    def _discard(self):
+        """ drops the socket without DETACH (its reply could be the late one), the next request opens a new one """
+        self._reattach = self._reattach or self.attached
+        self.attached = False
+        self._release()
+
+    def _recv(self, timeout):
+        """ waits up to `timeout` seconds for one datagram
+
+            @return: the message or None on timeout
+        """
+        r, _, _ = select.select([self.sock], [], [], max(timeout, 0))
+        if len(r) == 0:
+            return None
+        return self.sock.recv(BUFFER_SIZE).decode('utf-8', errors='replace')
+
+    def _request(self, cmd):
+        self.sock.send(cmd.encode('utf-8'))
+        deadline = time.monotonic() + self.timeout
+        while True:
+            msg = self._recv(deadline - time.monotonic())
+            if msg is None:
+                self._discard()  # the reply may still come
+                raise HostapdCtrlError("timeout waiting reply to {} from {}".format(cmd, self.path))
+            event = parse_event(msg)
+            if event is not None and self.attached:
+                self.events.append(event)  # keep it for recv_event()
+                continue
+            return msg
+
+    def request(self, cmd):
+        """ sends a command to hostapd and returns the reply.
+            If hostapd was restarted, the connection is reopened once.
+
+            @param cmd: the control interface command, e.g. 'STATUS'
+            @return: the reply
+            @rtype: str
+        """
+        with self._lock:
+            self.open()
+            try:
+                return self._request(cmd)
+            except (OSError, socket.error):
+                # hostapd restarted: the old socket path is gone
+                attached = self.attached
+                self.attached = False
+                self.close()
+                self.open()
+                if attached:
+                    self.attach()
+                try:
+                    return self._request(cmd)
+                except (OSError, socket.error) as e:
+                    raise HostapdCtrlError("{} failed: {}".format(cmd, e))
+
+    def ping(self):
+        """ @return: True if hostapd answers
+            @rtype: bool
+        """
+        try:
+            return self.request('PING').startswith('PONG')
+        except HostapdCtrlError:
+            return False
+
+    def status(self):
+        """ @return: the reply to STATUS, same as "hostapd_cli status" """
+        return self.request('STATUS')
+
+    def get_config(self):
+        """ @return: the reply to GET_CONFIG, same as "hostapd_cli get_config" """
+        return self.request('GET_CONFIG')
+
+    def sta_first(self):
+        """ @return: the reply to STA-FIRST (the first station) """
+        return self.request('STA-FIRST')
+
+    def sta_next(self, mac):
+        """ @param mac: the MAC address of the previous station
+            @return: the reply to STA-NEXT (the station after mac)
+        """
+        return self.request('STA-NEXT {}'.format(mac))
+
+    def iter_stations(self):
+        """ iterates over the connected stations using STA-FIRST / STA-NEXT
+
+            @return: generator of (mac, reply)
+        """
+        reply = self.sta_first()
+        while len(reply) > 0 and not reply.startswith('FAIL'):
+            mac = reply.split('\n', 1)[0].strip()
+            yield mac, reply
+            reply = self.sta_next(mac)
+
+    def all_sta(self):
+        """ @return: the same output as "hostapd_cli all_sta"
+            @rtype: str
+        """
+        return ''.join(reply for _, reply in self.iter_stations())
+
+    def chan_switch(self, count, frequency, ht_type=None):
+        """ @return: True if hostapd accepted the channel switch
+            @rtype: bool
+        """
+        cmd = 'CHAN_SWITCH {} {}'.format(count, frequency)
+        if ht_type in ['ht', 'vht']:
+            cmd += ' ' + ht_type
+        return self.request(cmd).startswith('OK')
+
+    def disassociate(self, mac):
+        """ @return: True if hostapd accepted the command
+            @rtype: bool
+        """
+        return self.request('DISASSOCIATE {}'.format(mac)).startswith('OK')
+
+    def attach(self):
+        """ registers this socket to receive unsolicited events (e.g. AP-STA-CONNECTED)
+
+            @return: True if hostapd accepted the registration
+            @rtype: bool
+        """
+        with self._lock:
+            self.attached = self.request('ATTACH').startswith('OK')
+            return self.attached
+
+    def detach(self):
+        """ stops receiving unsolicited events """
+        with self._lock:
+            if self.attached:
+                self.attached = False
+                self.request('DETACH')
+            self.events.clear()
+
+    def recv_event(self, timeout=None):
+        """ returns the next unsolicited event. Only useful after attach()
+
+            @param timeout: seconds to wait. None uses the object's timeout
+            @return: (level, text), e.g. (3, 'AP-STA-CONNECTED 00:11:22:33:44:55'), or None on timeout
+            @rtype: tuple
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if len(self.events) > 0:
+                return self.events.popleft()
+            self.open()
+            while True:
+                msg = self._recv(deadline - time.monotonic())
+                if msg is None:
+                    return None
+                event = parse_event(msg)
+                if event is not None:
+                    return event
+                LOG.debug("discarding unexpected reply: {}".format(msg))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Query hostapd through its control socket.')
+    parser.add_argument('--iface', type=str, default=None, help='interface to query')
+    parser.add_argument('--ctrl-dir', type=str, default=DEFAULT_CTRL_DIR, help="hostapd's ctrl_interface")
+    parser.add_argument('--events', action='store_true', help='print unsolicited events (CTRL-C to stop)')
+    parser.add_argument('command', nargs='*', default=['STATUS'], help='command to send')
+    args = parser.parse_args()
+
+    with HostapdCtrl(args.iface, ctrl_dir=args.ctrl_dir) as ctrl:
+        if args.events:
+            ctrl.attach()
+            while True:
+                ev = ctrl.recv_event(timeout=1)
+                if ev is not None:
+                    print(ev)
+        else:
+            print(ctrl.request(' '.join(args.command)))
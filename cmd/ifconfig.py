@@ -8,9 +8,11 @@ import re
 
 def decode_ifconfig(data):
     """
-        read ifconfig's output and returns a dictionary with the data
+        read ifconfig's output and returns a dictionary with the data.
+        accepts the old net-tools format ("RX packets:843246 errors:0 ...")
+        and the newer one ("RX packets 843246  bytes 58009076 (58.0 MB)")
 
-        @param data: is the captured screen from ifconfig output
+        @param data: is the captured screen from ifconfig output (list of lines)
         @return: dictionary with decoded ifconfig output
     """
     iface = 'ERROR'
@@ -18,7 +20,7 @@ def decode_ifconfig(data):
     try:
         for line in lines:
             if len(line.strip()) > 0:
-                iface = line.strip().split()[0]  # first not-blank line contains the interface name
+                iface = line.strip().split()[0].rstrip(':')  # first not-blank line contains the interface name
                 break
     except (ValueError, IndexError):
         pass
@@ -56,9 +58,37 @@ def decode_ifconfig(data):
                         'tx_scale_bytes': tx_scale_bytes,
                         }
                        )
+        else:
+            decode_new_format(line, ret)
     return ret
 
 
+def decode_new_format(line, ret):
+    """ helper function: decodes a line of the newer ifconfig format into ret """
+    line = line.strip()
+    for prefix in ['RX', 'TX']:
+        if line.startswith(prefix + ' packets '):
+            # RX packets 843246  bytes 58009076 (58.0 MB)
+            values = re.findall(r'[+-]?\d*\.\d+|\d+', line)
+            if len(values) >= 3:
+                p = prefix.lower()
+                ret.update({p + '_packets': values[0], p + '_bytes': values[1], p + '_scale_bytes': values[2]})
+        elif line.startswith(prefix + ' errors '):
+            # RX errors 0  dropped 0  overruns 0  frame 0
+            # TX errors 0  dropped 0 overruns 0  carrier 0  collisions 0
+            words = line.split()[1:]
+            names = {'errors': '_errors', 'dropped': '_dropped', 'overruns': '_overruns'}
+            for k, v in zip(words[0::2], words[1::2]):
+                if k in names:
+                    ret[prefix.lower() + names[k]] = v
+                elif k in ['frame', 'carrier', 'collisions']:
+                    ret[k] = v
+    if 'txqueuelen' in line and 'txqueuelen:' not in line:
+        # ether b0:aa:ab:ab:ac:10  txqueuelen 1000  (Ethernet)
+        words = line.split()
+        ret['txqueuelen'] = words[words.index('txqueuelen') + 1]
+
+
 if __name__ == '__main__':
     data = """
 wlan0     Link encap:Ethernet  HWaddr b0:aa:ab:ab:ac:10
@@ -73,4 +103,4 @@ wlan0     Link encap:Ethernet  HWaddr b0:aa:ab:ab:ac:10
     print("Ifconfig output\n{}".format(data))
     r = decode_ifconfig(data)
     print("Decoded:")
-    print("{}".format(r))
\ No newline at end of file
+    print("{}".format(r))
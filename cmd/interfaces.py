@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    registry of the wireless interfaces
+
+    the phy, driver and debugfs paths of an interface do not change while it exists, so they are read once from sysfs:
+        /sys/class/net/<iface>/phy80211/name    phy name, e.g. phy0 (only wireless interfaces have phy80211)
+        /sys/class/net/<iface>/device/driver    link to the driver, e.g. ath9k
+        /sys/class/net/<iface>/ifindex, address
+        /sys/kernel/debug/ieee80211/<phy>/ath*  the driver's debugfs directory, with the xmit file
+    the mode ('AP', 'managed', ...) is looked up the first time it is needed.
+
+    The registry is refreshed by reload(), or automatically by watch(), which listens to nl80211's notifications:
+    new/deleted interfaces reload the registry, mode changes forget the mode and channel switches update the channel.
+
+
+    Usage:
+    ------
+
+    registry = InterfaceRegistry()
+    registry.phy('wlan0')  # 'phy0'
+    registry.xmit_path('phy0')  # '/sys/kernel/debug/ieee80211/phy0/ath9k/xmit'
+    registry.is_ap('wlan0')
+"""
+import copy
+import glob
+import logging
+import os
+import socket
+import threading
+
+from cmd.nl80211 import Nl80211Events, Nl80211Error, freq_to_channel
+from cmd.nl80211 import NL80211_CMD_NEW_INTERFACE, NL80211_CMD_DEL_INTERFACE, NL80211_CMD_SET_INTERFACE
+
+
+LOG = logging.getLogger('INTERFACES')
+
+NL80211_CMD_CH_SWITCH_NOTIFY = 88
+
+
+def _read(path):
+    """ @return: the content of a sysfs file or None """
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+class InterfaceRegistry(object):
+    """ caches {interface: {'name', 'ifindex', 'address', 'phy', 'wiphy', 'driver', 'mode', 'channel'}}
+        and {phy: {'debugfs', 'driver_debugfs', 'xmit'}}
+    """
+
+    def __init__(self, root='/', mode_of=None):
+        """
+            @param root: prefix of /sys, e.g. a directory with a copy of sysfs
+            @param mode_of: function(interface) that returns the interface's mode as "iw dev info" shows it
+                            ('AP', 'managed', ...). None never finds the mode
+        """
+        self.root = root
+        self.mode_of = mode_of
+        self._interfaces = None  # None: not discovered yet
+        self._missing = set()  # names not found in the last discovery
+        self._phys = dict()
+        self._lock = threading.RLock()
+        self._events = None
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def discover(self):
+        """ reads the wireless interfaces from sysfs
+
+            @return: {interface: info}
+        """
+        interfaces = dict()
+        for net in sorted(glob.glob(self._path('sys', 'class', 'net', '*'))):
+            phy = _read(os.path.join(net, 'phy80211', 'name'))
+            if phy is None:
+                continue  # not a wireless interface
+            name = os.path.basename(net)
+            ifindex = _read(os.path.join(net, 'ifindex'))
+            wiphy = _read(os.path.join(net, 'phy80211', 'index'))
+            driver = os.path.join(net, 'device', 'driver')
+            interfaces[name] = {'name': name,
+                                'ifindex': int(ifindex) if ifindex is not None else None,
+                                'address': _read(os.path.join(net, 'address')),
+                                'phy': phy,
+                                'wiphy': int(wiphy) if wiphy is not None else None,
+                                'driver': os.path.basename(os.readlink(driver)) if os.path.islink(driver) else None,
+                                'mode': None,
+                                'channel': None,
+                                }
+        LOG.debug("wireless interfaces: {}".format(list(interfaces)))
+        return interfaces
+
+    def reload(self):
+        """ discards all cached information """
+        with self._lock:
+            self._interfaces = self.discover()
+            self._missing = set()
+            self._phys = dict()
+
+    def _get(self, interface):
+        """ @return: the cached info of the interface (not a copy) or None """
+        with self._lock:
+            if self._interfaces is None or (interface not in self._interfaces and interface not in self._missing):
+                self.reload()  # first use or a new interface
+                if interface not in self._interfaces:
+                    self._missing.add(interface)
+            return self._interfaces.get(interface)
+
+    def interfaces(self):
+        """ @return: the names of the wireless interfaces
+            @rtype: list
+        """
+        with self._lock:
+            if self._interfaces is None:
+                self.reload()
+            return sorted(self._interfaces)
+
+    def info(self, interface):
+        """ @return: the information of the interface (see the class) or None if it is not a wireless interface
+            @rtype: dict
+        """
+        info = self._get(interface)
+        if info is not None and info['mode'] is None:
+            self.mode(interface)
+        return copy.deepcopy(info)
+
+    def phy(self, interface):
+        """ @return: the phy of the interface, e.g. 'phy0', or None """
+        info = self._get(interface)
+        return None if info is None else info['phy']
+
+    def driver(self, interface):
+        """ @return: the driver of the interface, e.g. 'ath9k', or None """
+        info = self._get(interface)
+        return None if info is None else info['driver']
+
+    def mode(self, interface):
+        """ @return: the interface mode as "iw dev info" shows it, e.g. 'AP' or 'managed', or None if unknown """
+        info = self._get(interface)
+        if info is None:
+            return self.mode_of(interface) if self.mode_of is not None else None
+        if info['mode'] is None and self.mode_of is not None:
+            info['mode'] = self.mode_of(interface)
+        return info['mode']
+
+    def is_ap(self, interface):
+        """ @return: True if the interface is in AP mode """
+        return self.mode(interface) == 'AP'
+
+    def channel(self, interface):
+        """ @return: the last channel notified by nl80211, or None if unknown or not watching the notifications """
+        info = self._get(interface)
+        if info is None or self._watcher is None:
+            return None
+        return info['channel']
+
+    def set_channel(self, interface, channel):
+        """ records the channel of the interface, e.g. after reading it from "iw dev info" """
+        info = self._get(interface)
+        if info is not None and self._watcher is not None:
+            info['channel'] = channel
+
+    def debugfs(self, phy):
+        """ @return: {'debugfs': /sys/kernel/debug/ieee80211/<phy>,
+                      'driver_debugfs': its ath* directory or None,
+                      'xmit': the xmit file or None}
+        """
+        with self._lock:
+            if phy not in self._phys:
+                path = self._path('sys', 'kernel', 'debug', 'ieee80211', phy)
+                dirs = sorted(glob.glob(os.path.join(path, 'ath*')))
+                driver_dir = dirs[0] if len(dirs) > 0 else None
+                xmit = os.path.join(driver_dir, 'xmit') if driver_dir is not None else None
+                self._phys[phy] = {'debugfs': path if os.path.isdir(path) else None,
+                                   'driver_debugfs': driver_dir,
+                                   'xmit': xmit if xmit is not None and os.path.exists(xmit) else None,
+                                   }
+            return dict(self._phys[phy])
+
+    def xmit_path(self, phy):
+        """ @return: the path of the phy's xmit file (ath9k), or None """
+        return self.debugfs(phy)['xmit']
+
+    def watch(self):
+        """ keeps the registry up to date with nl80211's notifications
+
+            @return: True if the notifications are available
+        """
+        if self._watcher is not None:
+            return True
+        try:
+            self._events = Nl80211Events(['config', 'mlme'])
+        except Nl80211Error as e:
+            LOG.info("interface notifications not available: {}".format(e))
+            return False
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name='interface-registry', daemon=True)
+        self._watcher.start()
+        return True
+
+    def stop(self):
+        """ stops watching the notifications """
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+            self._events.close()
+            self._events = None
+
+    def _watch(self):
+        while not self._stop.is_set():
+            try:
+                notifications = self._events.recv(1.0)
+            except Nl80211Error as e:
+                LOG.debug(e)  # notifications lost: start over
+                self.reload()
+                continue
+            for cmd, attrs in notifications:
+                self.notify(cmd, attrs)
+
+    def notify(self, cmd, attrs):
+        """ updates the registry with a nl80211 notification
+
+            @param cmd: the nl80211 command
+            @param attrs: its decoded attributes (see cmd.nl80211.decode_genl())
+        """
+        if cmd in [NL80211_CMD_NEW_INTERFACE, NL80211_CMD_DEL_INTERFACE]:
+            LOG.debug("interface added or removed: {}".format(attrs.get('Interface')))
+            self.reload()
+            return
+        if cmd not in [NL80211_CMD_SET_INTERFACE, NL80211_CMD_CH_SWITCH_NOTIFY]:
+            return
+        interface = attrs.get('Interface')
+        if interface is None and 'ifindex' in attrs:
+            try:
+                interface = socket.if_indextoname(attrs['ifindex'])
+            except OSError:
+                return
+        with self._lock:
+            info = None if self._interfaces is None else self._interfaces.get(interface)
+            if info is None:
+                return
+            if cmd == NL80211_CMD_SET_INTERFACE:
+                info['mode'] = None
+                info['channel'] = None
+            elif 'frequency' in attrs:
+                info['channel'] = freq_to_channel(attrs['frequency'])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Show the wireless interfaces.')
+    parser.add_argument('--root', type=str, default='/', help='prefix of /sys')
+    args = parser.parse_args()
+
+    registry = InterfaceRegistry(root=args.root)
+    for iface in registry.interfaces():
+        print(iface, registry.info(iface), registry.debugfs(registry.phy(iface)))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    reads the interface counters from /proc/net/dev and /sys/class/net/<iface>, without running ifconfig
+
+    returns the same fields as decode_ifconfig() (see ifconfig.py), but the values are integers
+    (rx_scale_bytes and tx_scale_bytes are floats, in the unit ifconfig shows: B, KB, MB, GB)
+
+    root is the prefix of /proc and /sys, so the functions can read a copy of these trees.
+
+
+    Usage:
+    ------
+
+    get_netdev('wlan0')
+    {'iface': 'wlan0', 'rx_packets': 843246, 'rx_errors': 0, 'rx_dropped': 0, 'rx_overruns': 0, 'frame': 0,
+     'tx_packets': 1650711, 'tx_errors': 0, 'tx_dropped': 0, 'tx_overruns': 0, 'carrier': 0,
+     'collisions': 0, 'txqueuelen': 1000,
+     'rx_bytes': 58009076, 'rx_scale_bytes': 58.0, 'tx_bytes': 2505374616, 'tx_scale_bytes': 2.5}
+
+    get_netdev_all(['wlan0', 'eth0'])  # one read of /proc/net/dev
+"""
+import os
+
+
+DEFAULT_ROOT = '/'
+
+"""columns of /proc/net/dev, after the interface name"""
+proc_net_dev_columns = ['rx_bytes', 'rx_packets', 'rx_errors', 'rx_dropped', 'rx_overruns', 'frame',
+                        'rx_compressed', 'rx_multicast',
+                        'tx_bytes', 'tx_packets', 'tx_errors', 'tx_dropped', 'tx_overruns', 'collisions',
+                        'carrier', 'tx_compressed',
+                        ]
+
+"""files in /sys/class/net/<iface>/statistics: {file: field}"""
+sysfs_statistics = {'rx_bytes': 'rx_bytes',
+                    'rx_packets': 'rx_packets',
+                    'rx_errors': 'rx_errors',
+                    'rx_dropped': 'rx_dropped',
+                    'rx_fifo_errors': 'rx_overruns',
+                    'rx_frame_errors': 'frame',
+                    'tx_bytes': 'tx_bytes',
+                    'tx_packets': 'tx_packets',
+                    'tx_errors': 'tx_errors',
+                    'tx_dropped': 'tx_dropped',
+                    'tx_fifo_errors': 'tx_overruns',
+                    'tx_carrier_errors': 'carrier',
+                    'collisions': 'collisions',
+                    }
+
+"""fields of decode_ifconfig()"""
+ifconfig_fields = ['rx_packets', 'rx_errors', 'rx_dropped', 'rx_overruns', 'frame',
+                   'tx_packets', 'tx_errors', 'tx_dropped', 'tx_overruns', 'carrier',
+                   'collisions', 'txqueuelen',
+                   'rx_bytes', 'rx_scale_bytes', 'tx_bytes', 'tx_scale_bytes',
+                   ]
+
+
+def scale_bytes(n):
+    """ @return: the number of bytes in the unit ifconfig shows, e.g. 58.0 for 58009076 (58.0 MB) """
+    for unit in [10 ** 9, 10 ** 6, 10 ** 3]:
+        if n >= unit:
+            return round(n / float(unit), 1)
+    return float(n)
+
+
+def _read_int(path):
+    try:
+        with open(path, 'r') as f:
+            return int(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def decode_proc_net_dev(data, interfaces=None):
+    """ @param data: the content of /proc/net/dev
+        @param interfaces: list of interfaces to return. None returns all
+        @return: {interface: {field in proc_net_dev_columns: int}}
+    """
+    wanted = None if interfaces is None else set(interfaces)
+    result = dict()
+    for line in data.split('\n')[2:]:  # two lines of header
+        p = line.find(':')
+        if p < 0:
+            continue
+        iface = line[:p].strip()
+        if wanted is not None and iface not in wanted:
+            continue
+        try:
+            values = [int(v) for v in line[p + 1:].split()]
+        except ValueError:
+            continue
+        result[iface] = dict(zip(proc_net_dev_columns, values))
+    return result
+
+
+def read_proc_net_dev(interfaces=None, root=DEFAULT_ROOT):
+    """ reads the counters of many interfaces in one pass
+
+        @param interfaces: list of interfaces to return. None returns all
+        @param root: prefix of /proc
+        @return: {interface: {field: int}}, empty if /proc/net/dev cannot be read
+    """
+    try:
+        with open(os.path.join(root, 'proc', 'net', 'dev'), 'r') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return dict()
+    return decode_proc_net_dev(data, interfaces)
+
+
+def read_sysfs_statistics(interface, root=DEFAULT_ROOT):
+    """ @param root: prefix of /sys
+        @return: {field: int} from /sys/class/net/<interface>/statistics, or None if the interface does not exist
+    """
+    path = os.path.join(root, 'sys', 'class', 'net', interface, 'statistics')
+    if not os.path.isdir(path):
+        return None
+    result = dict()
+    for name, field in sysfs_statistics.items():
+        v = _read_int(os.path.join(path, name))
+        if v is not None:
+            result[field] = v
+    return result
+
+
+def to_ifconfig(interface, counters, txqueuelen=None):
+    """ @return: the counters with the fields and the shape of decode_ifconfig() """
+    ret = {'iface': interface}
+    for field in ifconfig_fields:
+        if field in counters:
+            ret[field] = counters[field]
+    if txqueuelen is not None:
+        ret['txqueuelen'] = txqueuelen
+    for k in ['rx_bytes', 'tx_bytes']:
+        if k in ret:
+            ret[k.replace('_bytes', '_scale_bytes')] = scale_bytes(ret[k])
+    return ret
+
+
+def _txqueuelen(interface, root):
+    return _read_int(os.path.join(root, 'sys', 'class', 'net', interface, 'tx_queue_len'))
+
+
+def get_netdev(interface, root=DEFAULT_ROOT):
+    """ @param interface: e.g. 'wlan0'
+        @param root: prefix of /proc and /sys
+        @return: the fields of decode_ifconfig() as integers, or None if the interface is not found
+        @rtype: dict
+    """
+    counters = read_proc_net_dev([interface], root).get(interface)
+    if counters is None:
+        counters = read_sysfs_statistics(interface, root)
+        if counters is None:
+            return None
+    return to_ifconfig(interface, counters, _txqueuelen(interface, root))
+
+
+def get_netdev_all(interfaces=None, root=DEFAULT_ROOT):
+    """ reads many interfaces with one pass over /proc/net/dev
+
+        @param interfaces: list of interfaces. None returns all interfaces
+        @param root: prefix of /proc and /sys
+        @return: {interface: fields of decode_ifconfig()}
+    """
+    result = dict()
+    for iface, counters in read_proc_net_dev(interfaces, root).items():
+        result[iface] = to_ifconfig(iface, counters, _txqueuelen(iface, root))
+    for iface in interfaces or []:
+        if iface not in result:
+            ret = get_netdev(iface, root)
+            if ret is not None:
+                result[iface] = ret
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Show the interface counters.')
+    parser.add_argument('--iface', type=str, nargs='*', default=None, help='interfaces (default all)')
+    parser.add_argument('--root', type=str, default=DEFAULT_ROOT, help='prefix of /proc and /sys')
+    args = parser.parse_args()
+
+    for iface, fields in sorted(get_netdev_all(args.iface, args.root).items()):
+        print(iface, fields)
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    native nl80211 (generic netlink) backend
+
+    sends NL80211_CMD_GET_STATION, NL80211_CMD_GET_SURVEY and NL80211_CMD_GET_INTERFACE
+    over a persistent netlink socket and decodes the replies into dictionaries that use the
+    same keys as the decoded "iw" output (see station.py and survey.py), but with numeric values:
+    times in ms (connected time in s), bitrates in MBit/s, signal and noise in dBm (signed), txpower in dBm.
+
+    The decoder functions (parse_messages, decode_genl, decode_attrs and decode_*) are pure python
+    and only work on bytes, so they can be used with recorded netlink messages.
+
+
+    Usage:
+    ------
+
+    nl = Nl80211()
+    stations = nl.get_stations('wlan0')
+    survey = nl.get_survey('wlan0')
+    info = nl.get_interface('wlan0')
+
+    events = Nl80211Events(['scan'])
+    for cmd, attrs in events.recv():  # e.g. (NL80211_CMD_NEW_SCAN_RESULTS, {'ifindex': 3, ...})
+        ...
+"""
+import socket
+import struct
+import itertools
+import threading
+import logging
+
+
+LOG = logging.getLogger('NL80211')
+
+NETLINK_GENERIC = 16
+SOL_NETLINK = 270
+NETLINK_ADD_MEMBERSHIP = 1
+
+# netlink message types and flags (linux/netlink.h)
+NLMSG_NOOP = 1
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLA_F_NESTED = 0x8000
+NLA_F_NET_BYTEORDER = 0x4000
+NLA_TYPE_MASK = ~(NLA_F_NESTED | NLA_F_NET_BYTEORDER)
+
+# generic netlink controller (linux/genetlink.h)
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+CTRL_ATTR_MCAST_GROUPS = 7
+CTRL_ATTR_MCAST_GRP_NAME = 1
+CTRL_ATTR_MCAST_GRP_ID = 2
+
+# nl80211 commands (linux/nl80211.h)
+NL80211_CMD_GET_INTERFACE = 5
+NL80211_CMD_SET_INTERFACE = 6
+NL80211_CMD_NEW_INTERFACE = 7
+NL80211_CMD_DEL_INTERFACE = 8
+NL80211_CMD_GET_STATION = 17
+NL80211_CMD_NEW_STATION = 19
+NL80211_CMD_DEL_STATION = 20
+NL80211_CMD_TRIGGER_SCAN = 33
+NL80211_CMD_NEW_SCAN_RESULTS = 34
+NL80211_CMD_SCAN_ABORTED = 35
+NL80211_CMD_GET_SURVEY = 50
+NL80211_CMD_NEW_SURVEY_RESULTS = 51
+
+# nl80211 attributes
+NL80211_ATTR_WIPHY = 1
+NL80211_ATTR_IFINDEX = 3
+NL80211_ATTR_IFNAME = 4
+NL80211_ATTR_IFTYPE = 5
+NL80211_ATTR_MAC = 6
+NL80211_ATTR_STA_INFO = 21
+NL80211_ATTR_WIPHY_FREQ = 38
+NL80211_ATTR_SSID = 52
+NL80211_ATTR_SURVEY_INFO = 84
+NL80211_ATTR_WIPHY_TX_POWER_LEVEL = 98
+NL80211_ATTR_WDEV = 153
+NL80211_ATTR_CHANNEL_WIDTH = 159
+NL80211_ATTR_CENTER_FREQ1 = 160
+NL80211_ATTR_CENTER_FREQ2 = 161
+
+# values of NL80211_ATTR_IFTYPE, named as "iw dev info" shows them
+iftypes = {0: 'unspecified', 1: 'IBSS', 2: 'managed', 3: 'AP', 4: 'AP/VLAN', 5: 'WDS', 6: 'monitor',
+           7: 'mesh point', 8: 'P2P-client', 9: 'P2P-GO', 10: 'P2P-device', 11: 'outside context of a BSS',
+           12: 'NAN',
+           }
+
+# values of NL80211_ATTR_CHANNEL_WIDTH in MHz
+channel_widths = {0: 20, 1: 20, 2: 40, 3: 80, 4: 80, 5: 160, 6: 5, 7: 10}
+
+# bits of struct nl80211_sta_flag_update -> (key, value if set, value if not set)
+sta_flags = {1: ('authorized', 'yes', 'no'),
+             2: ('preamble', 'short', 'long'),
+             3: ('WMM/WME', 'yes', 'no'),
+             4: ('MFP', 'yes', 'no'),
+             5: ('authenticated', 'yes', 'no'),
+             6: ('TDLS peer', 'yes', 'no'),
+             7: ('associated', 'yes', 'no'),
+             }
+
+"""
+    attribute schemas: {attribute type: (name, kind)}.
+    kind is a struct format, 'flag', 'str', 'mac', 'raw' or a nested schema
+"""
+rate_info_schema = {1: ('bitrate', '=H'),
+                    2: ('mcs', '=B'),
+                    3: ('40MHz', 'flag'),
+                    4: ('short GI', 'flag'),
+                    5: ('bitrate32', '=I'),
+                    6: ('vht mcs', '=B'),
+                    7: ('vht nss', '=B'),
+                    8: ('80MHz', 'flag'),
+                    10: ('160MHz', 'flag'),
+                    }
+
+bss_param_schema = {1: ('CTS protection', 'flag'),
+                    2: ('short preamble', 'flag'),
+                    3: ('short slot time', 'flag'),
+                    4: ('DTIM period', '=B'),
+                    5: ('beacon interval', '=H'),
+                    }
+
+sta_info_schema = {1: ('inactive time', '=I'),
+                   2: ('rx bytes', '=I'),
+                   3: ('tx bytes', '=I'),
+                   7: ('signal', '=b'),
+                   8: ('tx bitrate', rate_info_schema),
+                   9: ('rx packets', '=I'),
+                   10: ('tx packets', '=I'),
+                   11: ('tx retries', '=I'),
+                   12: ('tx failed', '=I'),
+                   13: ('signal avg', '=b'),
+                   14: ('rx bitrate', rate_info_schema),
+                   15: ('bss param', bss_param_schema),
+                   16: ('connected time', '=I'),
+                   17: ('flags', '=II'),
+                   18: ('beacon loss', '=I'),
+                   23: ('rx bytes64', '=Q'),
+                   24: ('tx bytes64', '=Q'),
+                   27: ('expected throughput', '=I'),
+                   28: ('rx drop misc', '=Q'),
+                   29: ('beacon rx', '=Q'),
+                   30: ('beacon signal avg', '=b'),
+                   32: ('rx duration', '=Q'),
+                   34: ('last ack signal', '=b'),
+                   35: ('avg ack signal', '=b'),
+                   39: ('tx duration', '=Q'),
+                   }
+
+survey_info_schema = {1: ('frequency', '=I'),
+                      2: ('noise', '=b'),
+                      3: ('in use', 'flag'),
+                      4: ('channel active time', '=Q'),
+                      5: ('channel busy time', '=Q'),
+                      6: ('extension channel busy time', '=Q'),
+                      7: ('channel receive time', '=Q'),
+                      8: ('channel transmit time', '=Q'),
+                      9: ('channel scan time', '=Q'),
+                      11: ('channel BSS receive time', '=Q'),
+                      }
+
+nl80211_schema = {NL80211_ATTR_WIPHY: ('wiphy', '=I'),
+                  NL80211_ATTR_IFINDEX: ('ifindex', '=I'),
+                  NL80211_ATTR_IFNAME: ('Interface', 'str'),
+                  NL80211_ATTR_IFTYPE: ('type', '=I'),
+                  NL80211_ATTR_MAC: ('addr', 'mac'),
+                  NL80211_ATTR_STA_INFO: ('sta info', sta_info_schema),
+                  NL80211_ATTR_WIPHY_FREQ: ('frequency', '=I'),
+                  NL80211_ATTR_SSID: ('ssid', 'str'),
+                  NL80211_ATTR_SURVEY_INFO: ('survey info', survey_info_schema),
+                  NL80211_ATTR_WIPHY_TX_POWER_LEVEL: ('txpower', '=I'),
+                  NL80211_ATTR_WDEV: ('wdev', '=Q'),
+                  NL80211_ATTR_CHANNEL_WIDTH: ('width', '=I'),
+                  NL80211_ATTR_CENTER_FREQ1: ('center1', '=I'),
+                  NL80211_ATTR_CENTER_FREQ2: ('center2', '=I'),
+                  }
+
+
+class Nl80211Error(Exception):
+    """ raised when the kernel returns an error or nl80211 is not available """
+    pass
+
+
+def align(n):
+    """ netlink attributes and messages are aligned to 4 bytes """
+    return (n + 3) & ~3
+
+
+def pack_attr(attr_type, payload):
+    """ @return: the attribute (header + payload + padding)
+        @rtype: bytes
+    """
+    hdr = struct.pack('=HH', 4 + len(payload), attr_type)
+    return hdr + payload + b'\0' * (align(len(payload)) - len(payload))
+
+
+def pack_genl(family, cmd, attrs=b'', flags=NLM_F_REQUEST, seq=0, version=1):
+    """ @return: a complete generic netlink message
+        @rtype: bytes
+    """
+    payload = struct.pack('=BBH', cmd, version, 0) + attrs
+    return struct.pack('=IHHII', 16 + len(payload), family, flags, seq, 0) + payload
+
+
+def parse_messages(buf):
+    """ splits a datagram received from a netlink socket into messages
+
+        @param buf: bytes received
+        @return: generator of (type, flags, seq, payload)
+    """
+    offset = 0
+    while offset + 16 <= len(buf):
+        length, msg_type, flags, seq, _ = struct.unpack_from('=IHHII', buf, offset)
+        if length < 16:
+            break  # malformed
+        yield msg_type, flags, seq, buf[offset + 16:offset + length]
+        offset += align(length)
+
+
+def iter_attrs(data):
+    """ @return: generator of (type, payload) for each attribute in data """
+    offset = 0
+    while offset + 4 <= len(data):
+        length, attr_type = struct.unpack_from('=HH', data, offset)
+        if length < 4:
+            break  # malformed
+        yield attr_type & NLA_TYPE_MASK, data[offset + 4:offset + length]
+        offset += align(length)
+
+
+def decode_value(payload, kind):
+    """ converts an attribute payload according to its kind (see the schemas) """
+    if isinstance(kind, dict):
+        return decode_attrs(payload, kind)
+    if kind == 'flag':
+        return True
+    if kind == 'str':
+        return payload.split(b'\0', 1)[0].decode('utf-8', errors='replace')
+    if kind == 'mac':
+        return ':'.join('{:02x}'.format(b) for b in bytearray(payload[:6]))
+    if kind == 'raw':
+        return payload
+    v = struct.unpack_from(kind, payload)
+    return v[0] if len(v) == 1 else v
+
+
+def decode_attrs(data, schema=None):
+    """ decodes a sequence of netlink attributes
+
+        @param data: the attributes' bytes
+        @param schema: {type: (name, kind)}. Attributes not in the schema are ignored.
+                       If None, returns {type: payload} for all attributes
+        @return: dictionary
+    """
+    result = dict()
+    for attr_type, payload in iter_attrs(data):
+        if schema is None:
+            result[attr_type] = payload
+        elif attr_type in schema:
+            name, kind = schema[attr_type]
+            try:
+                result[name] = decode_value(payload, kind)
+            except struct.error:
+                LOG.debug("attribute {} is too short".format(name))
+    return result
+
+
+def decode_genl(payload, schema=nl80211_schema):
+    """ @param payload: generic netlink message without the netlink header
+        @return: (cmd, decoded attributes)
+    """
+    cmd = struct.unpack_from('=B', payload)[0]
+    return cmd, decode_attrs(payload[4:], schema)
+
+
+def decode_bitrate(rate):
+    """ @return: the bitrate of a nested rate_info in MBit/s """
+    v = rate.get('bitrate32', rate.get('bitrate', 0))
+    return v / 10.0
+
+
+def freq_to_channel(freq):
+    """ @return: the channel number of the frequency (in MHz) or -1 if unknown """
+    if freq == 2484:
+        return 14
+    if 2412 <= freq < 2484:
+        return (freq - 2407) // 5
+    if 4910 <= freq <= 5895:
+        return (freq - 5000) // 5
+    if 5955 <= freq <= 7115:
+        return (freq - 5950) // 5
+    return -1
+
+
+def decode_station(attrs):
+    """ converts the attributes of a NEW_STATION message into the fields of "iw dev station dump"
+
+        @param attrs: decoded attributes (see decode_genl)
+        @return: (mac, fields)
+    """
+    info = attrs.get('sta info', dict())
+    result = dict()
+    for k, v in info.items():
+        if k in ['tx bitrate', 'rx bitrate']:
+            result[k] = decode_bitrate(v)
+        elif k == 'bss param':
+            for w in ['DTIM period', 'beacon interval']:
+                if w in v:
+                    result[w] = v[w]
+            result['short slot time'] = 'yes' if v.get('short slot time', False) else 'no'
+        elif k == 'flags':
+            mask, value = v
+            for bit, (name, yes, no) in sta_flags.items():
+                if mask & (1 << bit):
+                    result[name] = yes if value & (1 << bit) else no
+        elif k == 'expected throughput':
+            result[k] = v / 1000.0  # kbps -> MBit/s
+        else:
+            result[k] = v
+    # prefer the 64 bits counters
+    for k in ['rx bytes', 'tx bytes']:
+        if k + '64' in result:
+            result[k] = result.pop(k + '64')
+    return attrs.get('addr'), result
+
+
+def decode_survey_info(attrs):
+    """ converts the attributes of a NEW_SURVEY_RESULTS message into the fields of "iw dev survey dump"
+
+        @param attrs: decoded attributes (see decode_genl)
+        @return: (frequency, fields)
+    """
+    info = dict(attrs.get('survey info', dict()))
+    freq = info.pop('frequency', None)
+    return freq, info
+
+
+def decode_interface(attrs):
+    """ converts the attributes of a NEW_INTERFACE message into the fields of "iw dev info"
+
+        @param attrs: decoded attributes (see decode_genl)
+        @return: fields
+        @rtype: dict
+    """
+    result = dict([(k, v) for k, v in attrs.items() if k not in ['sta info', 'survey info']])
+    if 'type' in result:
+        result['type'] = iftypes.get(result['type'], result['type'])
+    if 'width' in result:
+        result['width'] = channel_widths.get(result['width'], result['width'])
+    if 'frequency' in result:
+        result['channel'] = freq_to_channel(result['frequency'])
+    if 'txpower' in result:
+        result['txpower'] = result['txpower'] / 100.0  # mBm -> dBm
+    return result
+
+
+class Nl80211(object):
+    """ persistent generic netlink socket bound to the nl80211 family.
+        Requests are serialized by a lock, so the object can be shared by several threads.
+    """
+
+    def __init__(self, timeout=2.0):
+        self.timeout = timeout
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        try:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_GENERIC)
+            self.sock.bind((0, 0))
+        except (AttributeError, OSError) as e:
+            raise Nl80211Error("cannot open generic netlink socket: {}".format(e))
+        self.sock.settimeout(timeout)
+        self.family_id, self.mcast_groups = self.resolve_family('nl80211')
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def transact(self, family, cmd, attrs=b'', flags=NLM_F_REQUEST | NLM_F_ACK):
+        """ sends one request and collects the replies (all parts of a dump)
+
+            @return: list of generic netlink payloads
+        """
+        with self._lock:
+            seq = next(self._seq)
+            self.sock.send(pack_genl(family, cmd, attrs, flags=flags, seq=seq))
+            replies = []
+            while True:
+                try:
+                    buf = self.sock.recv(1 << 17)
+                except socket.timeout:
+                    raise Nl80211Error("timeout waiting reply to command {}".format(cmd))
+                for msg_type, msg_flags, msg_seq, payload in parse_messages(buf):
+                    if msg_seq != seq:
+                        continue  # late reply of a previous request
+                    if msg_type == NLMSG_DONE:
+                        return replies
+                    if msg_type == NLMSG_ERROR:
+                        error = struct.unpack_from('=i', payload)[0]
+                        if error != 0:
+                            raise Nl80211Error("command {} failed: errno {}".format(cmd, -error))
+                        return replies  # ACK
+                    if msg_type == NLMSG_NOOP:
+                        continue
+                    replies.append(payload)
+                    if not msg_flags & NLM_F_MULTI and not flags & NLM_F_ACK:
+                        return replies
+
+    def resolve_family(self, name):
+        """ @return: (family id, {multicast group name: id})
+        """
+        attrs = pack_attr(CTRL_ATTR_FAMILY_NAME, name.encode() + b'\0')
+        replies = self.transact(GENL_ID_CTRL, CTRL_CMD_GETFAMILY, attrs)
+        if len(replies) == 0:
+            raise Nl80211Error("generic netlink family {} not found".format(name))
+        ctrl = decode_attrs(replies[0][4:])
+        family_id = struct.unpack_from('=H', ctrl[CTRL_ATTR_FAMILY_ID])[0]
+        groups = dict()
+        for _, grp in iter_attrs(ctrl.get(CTRL_ATTR_MCAST_GROUPS, b'')):
+            grp = decode_attrs(grp)
+            grp_name = decode_value(grp[CTRL_ATTR_MCAST_GRP_NAME], 'str')
+            groups[grp_name] = struct.unpack_from('=I', grp[CTRL_ATTR_MCAST_GRP_ID])[0]
+        return family_id, groups
+
+    def dump(self, cmd, interface):
+        """ sends a dump request for the interface
+
+            @return: list of decoded attribute dictionaries
+        """
+        try:
+            ifindex = socket.if_nametoindex(interface)
+        except OSError:
+            raise Nl80211Error("interface {} not found".format(interface))
+        attrs = pack_attr(NL80211_ATTR_IFINDEX, struct.pack('=I', ifindex))
+        replies = self.transact(self.family_id, cmd, attrs, flags=NLM_F_REQUEST | NLM_F_DUMP)
+        return [decode_genl(payload)[1] for payload in replies]
+
+    def get_stations(self, interface):
+        """ equivalent to "iw dev <interface> station dump"
+
+            @return: {mac: fields}
+            @rtype: dict
+        """
+        return dict(decode_station(attrs) for attrs in self.dump(NL80211_CMD_GET_STATION, interface))
+
+    def get_survey(self, interface):
+        """ equivalent to "iw dev <interface> survey dump"
+
+            @return: {frequency: fields}
+            @rtype: dict
+        """
+        return dict(decode_survey_info(attrs) for attrs in self.dump(NL80211_CMD_GET_SURVEY, interface))
+
+    def get_interface(self, interface):
+        """ equivalent to "iw dev <interface> info"
+
+            @return: fields
+            @rtype: dict
+        """
+        try:
+            ifindex = socket.if_nametoindex(interface)
+        except OSError:
+            raise Nl80211Error("interface {} not found".format(interface))
+        attrs = pack_attr(NL80211_ATTR_IFINDEX, struct.pack('=I', ifindex))
+        replies = self.transact(self.family_id, NL80211_CMD_GET_INTERFACE, attrs)
+        if len(replies) == 0:
+            raise Nl80211Error("no reply for interface {}".format(interface))
+        return decode_interface(decode_genl(replies[0])[1])
+
+
+class Nl80211Events(object):
+    """ receives the nl80211 multicast notifications, e.g. of the groups
+        'scan' (TRIGGER_SCAN, NEW_SCAN_RESULTS, SCAN_ABORTED), 'mlme' (NEW_STATION, DEL_STATION)
+        or 'config' (NEW_INTERFACE, DEL_INTERFACE, SET_INTERFACE)
+    """
+
+    def __init__(self, groups, timeout=1.0):
+        """
+            @param groups: names of the multicast groups to join
+            @param timeout: default time recv() waits, in seconds
+        """
+        with Nl80211() as nl:
+            self.family_id, self.mcast_groups = nl.family_id, nl.mcast_groups
+        self.timeout = timeout
+        try:
+            self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_GENERIC)
+            self.sock.bind((0, 0))
+            for group in groups:
+                if group not in self.mcast_groups:
+                    raise Nl80211Error("multicast group {} not found".format(group))
+                self.sock.setsockopt(SOL_NETLINK, NETLINK_ADD_MEMBERSHIP, self.mcast_groups[group])
+        except OSError as e:
+            self.close()
+            raise Nl80211Error("cannot join the multicast groups: {}".format(e))
+
+    def close(self):
+        if getattr(self, 'sock', None) is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def recv(self, timeout=None):
+        """ waits for the next notifications
+
+            @param timeout: seconds to wait. None uses self.timeout
+            @return: list of (cmd, decoded attributes), empty on timeout
+        """
+        self.sock.settimeout(self.timeout if timeout is None else timeout)
+        try:
+            buf = self.sock.recv(1 << 16)
+        except socket.timeout:
+            return []
+        except OSError as e:
+            raise Nl80211Error("cannot receive notifications: {}".format(e))  # e.g. ENOBUFS, events were lost
+        return [decode_genl(payload) for msg_type, _, _, payload in parse_messages(buf)
+                if msg_type == self.family_id]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Query nl80211 directly.')
+    parser.add_argument('--iface', type=str, default='wlan0', help='interface to query')
+    args = parser.parse_args()
+
+    with Nl80211() as nl:
+        print("info", nl.get_interface(args.iface))
+        print("stations", nl.get_stations(args.iface))
+        print("survey", nl.get_survey(args.iface))
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    records the AP metrics in a compressed HDF5 file (PyTables), for offline training and replay
+
+    each family (e.g. 'wlan0/stations') is a chunked, compressed table /wlan0/stations with the columns
+    timestamp, entity (mac, frequency, interface or phy) and one float64 column per numeric metric (NaN if missing).
+    A metric that appears after the first flush gets a new column (see Recorder.flush()), NaN in the older rows.
+
+    Recorder.record() has the signature of MetricHistory.record(), so a HistorySampler (see history.py) feeds it.
+    The samples are buffered in memory (up to max_rows) and written by a background thread every flush_interval
+    seconds; when the buffer is full, record() writes it before returning.
+
+    RecordingReader reads the columns of a family or replays its samples in the format of the command_ap functions.
+    The file is read lazily, one HDF5 chunk at a time, so a recording larger than the memory can be replayed.
+
+    PyTables is optional: the module imports without it, but Recorder and RecordingReader raise ImportError.
+
+
+    Usage:
+    ------
+
+    recorder = Recorder('ap.h5')
+    sampler = HistorySampler(recorder, interface_sources('wlan0'), interval=1.0)
+    recorder.start()
+    sampler.start()
+    ...
+    sampler.stop()
+    recorder.close()
+
+    with RecordingReader('ap.h5') as reader:
+        columns = reader.columns('wlan0/stations', metrics=['tx bytes'])
+        for timestamp, stations in reader.iter_samples('wlan0/stations'):
+            ...
+"""
+import logging
+import re
+import threading
+import time
+
+try:
+    import numpy as np
+    import tables
+except ImportError:
+    np = None
+    tables = None
+
+
+LOG = logging.getLogger('RECORDER')
+
+ENTITY_SIZE = 32  # bytes of the entity column
+DEFAULT_FILTERS = {'complevel': 5, 'complib': 'blosc'}
+
+
+def _require_tables():
+    if tables is None:
+        raise ImportError("the recorder needs numpy and tables (PyTables)")
+
+
+def _column_name(metric):
+    """ @return: the name of the HDF5 column of a metric, e.g. 'm_tx_bytes' for 'tx bytes' """
+    return 'm_' + re.sub(r'\W', '_', metric)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Recorder(object):
+    """ buffers the samples of each family and appends them to the HDF5 file """
+
+    def __init__(self, filename, max_rows=100000, flush_interval=5.0, filters=None, clock=time.time):
+        """
+            @param filename: the HDF5 file. An existing file is appended to
+            @param max_rows: rows kept in memory before they are written
+            @param flush_interval: seconds between the writes of the background thread (see start())
+            @param filters: compression, {'complevel': 0-9, 'complib': 'blosc', 'zlib', ...}
+            @param clock: function that returns the timestamp of the samples
+        """
+        _require_tables()
+        self.filename = filename
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.filters = tables.Filters(**(filters or DEFAULT_FILTERS))
+        self.clock = clock
+        self.rows = 0  # rows written
+        self._h5 = tables.open_file(filename, mode='a')
+        self._buffer = dict()  # {family: [(timestamp, entity, {metric: value})]}
+        self._buffered = 0
+        self._lock = threading.Lock()  # protects the buffer
+        self._write_lock = threading.Lock()  # one writer at a time
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, family, samples, timestamp=None):
+        """ buffers one sample of a family
+
+            @param family: e.g. 'wlan0/stations'
+            @param samples: {entity: {metric: value}}, e.g. the output of get_iw_stations(). Non numeric values are ignored
+            @param timestamp: None uses clock()
+        """
+        timestamp = self.clock() if timestamp is None else timestamp
+        rows = [(timestamp, entity, dict([(k, v) for k, v in metrics.items() if _is_number(v)]))
+                for entity, metrics in samples.items() if isinstance(metrics, dict)]
+        if len(rows) == 0:
+            return
+        with self._lock:
+            self._buffer.setdefault(family, []).extend(rows)
+            self._buffered += len(rows)
+            full = self._buffered >= self.max_rows
+        if full:
+            self.flush()  # the buffer is bounded: the caller waits for the write
+
+    def flush(self):
+        """ writes the buffered rows """
+        with self._lock:
+            buffer, self._buffer, self._buffered = self._buffer, dict(), 0
+        if len(buffer) == 0:
+            return
+        with self._write_lock:
+            for family, rows in buffer.items():
+                self._append(family, rows)
+            self._h5.flush()
+
+    @staticmethod
+    def _description(metrics):
+        description = {'timestamp': tables.Float64Col(pos=0),
+                       'entity': tables.StringCol(ENTITY_SIZE, pos=1)}
+        for i, metric in enumerate(metrics):
+            description[_column_name(metric)] = tables.Float64Col(pos=i + 2, dflt=np.nan)
+        return description
+
+    def _table(self, family, rows):
+        """ @param rows: the rows about to be appended, at least one
+            @return: the table of the family, with a column for each numeric metric of rows
+        """
+        path = '/' + family.strip('/')
+        metrics = sorted(set(k for _, _, values in rows for k in values))
+        entity_int = all(isinstance(entity, int) for _, entity, _ in rows)
+        if path not in self._h5:
+            where, name = path.rsplit('/', 1)
+            table = self._h5.create_table(where or '/', name, self._description(metrics), createparents=True,
+                                          filters=self.filters, expectedrows=1000000)
+            table.attrs.metrics = metrics
+            table.attrs.entity_int = entity_int
+            return table
+        table = self._h5.get_node(path)
+        known = set(table.attrs.metrics)
+        new = [metric for metric in metrics if metric not in known]
+        if len(new) > 0:
+            table = self._add_metrics(table, new)
+        if table.attrs.entity_int and not entity_int:
+            table.attrs.entity_int = False  # e.g. an interface among the frequencies: the entities are read as str
+        return table
+
+    def _add_metrics(self, table, new):
+        """ copies the table, one chunk at a time, into a table with a column for each new metric
+            (the columns of a table are fixed when it is created)
+
+            @return: the new table, at the path of the old one
+        """
+        metrics = list(table.attrs.metrics) + new
+        LOG.info("{}: new metrics {}".format(table._v_pathname, new))
+        copy = self._h5.create_table(table._v_parent, table.name + '_new', self._description(metrics),
+                                     filters=self.filters, expectedrows=max(1000000, table.nrows))
+        step = max(1, table.chunkshape[0])
+        for first in range(0, table.nrows, step):
+            rows = table.read(first, min(first + step, table.nrows))
+            data = np.empty(len(rows), dtype=copy.dtype)
+            for name in rows.dtype.names:
+                data[name] = rows[name]
+            for metric in new:
+                data[_column_name(metric)] = np.nan
+            copy.append(data)
+        copy.attrs.metrics = metrics
+        copy.attrs.entity_int = table.attrs.entity_int
+        name = table.name
+        table.remove()
+        copy.move(newname=name)
+        return copy
+
+    def _append(self, family, rows):
+        if len(rows) == 0:
+            return
+        table = self._table(family, rows)
+        metrics = list(table.attrs.metrics)
+        columns = dict([(metric, j) for j, metric in enumerate(metrics)])
+        data = np.empty(len(rows), dtype=table.dtype)
+        data['timestamp'] = [r[0] for r in rows]
+        data['entity'] = [str(r[1]).encode('utf-8')[:ENTITY_SIZE] for r in rows]
+        values = np.full((len(rows), len(metrics)), np.nan)
+        for i, (_, _, fields) in enumerate(rows):
+            for metric, v in fields.items():
+                values[i, columns[metric]] = v
+        for j, metric in enumerate(metrics):
+            data[_column_name(metric)] = values[:, j]
+        table.append(data)
+        self.rows += len(rows)
+
+    def start(self):
+        """ starts the thread that writes the buffer every flush_interval seconds """
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='recorder', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                LOG.error("recorder flush: {}".format(e))
+
+    def close(self):
+        """ stops the thread, writes the buffer and closes the file """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self._h5.isopen:
+            self.flush()
+            self._h5.close()
+
+
+class RecordingReader(object):
+    """ reads a file written by Recorder """
+
+    def __init__(self, filename):
+        _require_tables()
+        self.filename = filename
+        self._h5 = tables.open_file(filename, mode='r')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._h5.close()
+
+    def families(self):
+        """ @return: the recorded families, e.g. ['wlan0/stations', 'wlan0/survey'] """
+        return sorted(node._v_pathname.lstrip('/') for node in self._h5.walk_nodes('/', classname='Table'))
+
+    def _table(self, family):
+        return self._h5.get_node('/' + family.strip('/'))
+
+    def metrics(self, family):
+        """ @return: the metrics of the family, in the order of the columns """
+        return list(self._table(family).attrs.metrics)
+
+    def __len__(self):
+        return sum(self._table(f).nrows for f in self.families())
+
+    def _entity(self, table, entity):
+        entity = entity.decode('utf-8')
+        return int(entity) if table.attrs.entity_int else entity
+
+    def columns(self, family, metrics=None, start=None, stop=None):
+        """ @param metrics: the metrics to read. None reads all
+            @param start, stop: time range of the rows [start, stop). None does not limit
+            @return: {'timestamp': array, 'entity': list, metric: array}
+        """
+        table = self._table(family)
+        metrics = self.metrics(family) if metrics is None else metrics
+        if start is None and stop is None:
+            rows = table.read()
+        else:
+            conditions = []
+            if start is not None:
+                conditions.append('(timestamp >= {!r})'.format(float(start)))
+            if stop is not None:
+                conditions.append('(timestamp < {!r})'.format(float(stop)))
+            rows = table.read_where(' & '.join(conditions))
+        result = {'timestamp': rows['timestamp'], 'entity': [self._entity(table, e) for e in rows['entity']]}
+        for metric in metrics:
+            result[metric] = rows[_column_name(metric)]
+        return result
+
+    def iter_samples(self, family, start=None, stop=None):
+        """ replays the samples of the family, reading one chunk at a time
+
+            @param start, stop: time range [start, stop). None does not limit
+            @return: iterator of (timestamp, {entity: {metric: value}}), the format recorded
+        """
+        table = self._table(family)
+        metrics = self.metrics(family)
+        names = [_column_name(m) for m in metrics]
+        step = max(1, table.chunkshape[0])
+        timestamp, sample = None, dict()
+        for first in range(0, table.nrows, step):
+            rows = table.read(first, min(first + step, table.nrows))
+            values = np.column_stack([rows[name] for name in names]).tolist() if len(names) > 0 else [[]] * len(rows)
+            for ts, entity, row in zip(rows['timestamp'].tolist(), rows['entity'].tolist(), values):
+                if (start is not None and ts < start) or (stop is not None and ts >= stop):
+                    continue
+                if ts != timestamp:
+                    if timestamp is not None:
+                        yield timestamp, sample
+                    timestamp, sample = ts, dict()
+                sample[self._entity(table, entity)] = dict([(m, v) for m, v in zip(metrics, row) if v == v])  # not NaN
+        if timestamp is not None:
+            yield timestamp, sample
+
+
+if __name__ == '__main__':
+    import argparse
+    from cmd.history import HistorySampler, interface_sources
+
+    parser = argparse.ArgumentParser(description='Record the AP metrics in an HDF5 file.')
+    parser.add_argument('--iface', type=str, nargs='*', default=['wlan0'], help='interfaces')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between samples')
+    parser.add_argument('--output', type=str, default='ap.h5', help='HDF5 file')
+    parser.add_argument('--replay', action='store_true', help='print the samples of --output instead of recording')
+    args = parser.parse_args()
+
+    if args.replay:
+        with RecordingReader(args.output) as reader:
+            for family in reader.families():
+                for timestamp, sample in reader.iter_samples(family):
+                    print(family, time.ctime(timestamp), sample)
+    else:
+        recorder = Recorder(args.output)
+        samplers = [HistorySampler(recorder, interface_sources(iface), interval=args.interval) for iface in args.iface]
+        recorder.start()
+        for sampler in samplers:
+            sampler.start()
+        try:
+            while True:
+                time.sleep(args.interval)
+        except KeyboardInterrupt:
+            for sampler in samplers:
+                sampler.stop()
+            recorder.close()
+            print("recorded {} rows in {}".format(recorder.rows, args.output))
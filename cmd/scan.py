@@ -1,8 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-    convert the output of iw dev station dump into a dictionary
+    convert the output of iw dev <interface> scan dump into a dictionary
 
+    the output is read in a single pass by iter_scan(), which yields one record per BSS as soon as the BSS ends,
+    so it can consume the stdout of the command while iw is still writing it:
+
+        with os.popen('iw dev wlan0 scan dump') as p:
+            for mac, record in iter_scan(p):
+                ...
+
+    decode_scan(), decode_scan_mac() and decode_scan_basic() are views over iter_scan().
+
+    The blocks (RSN, WMM, BSS Load, HT operation, ...) are {key: value} of their "* key: value" items. An item without
+    ':' is keyed by the whole item, e.g. WMM's {'Parameter version 1': 'Parameter version 1', 'u-APSD': 'u-APSD'}
+    (older versions keyed them 'Parameter version' and 'u-APS'), and 'iface' is the interface name without
+    ") -- associated".
 """
 import pickle
 
@@ -14,121 +27,179 @@ cmds = ['TSF', 'freq', 'beacon interval', 'capability', 'signal', 'last seen', '
 
 cmds_sub = ['RSN', 'WMM', 'BSS Load', 'HT operation', 'Overlapping BSS scan params']
 
+"""fields used by decode_scan_basic()"""
+basic_fields = ['TSF', 'freq', 'beacon interval', 'signal', 'last seen', 'SSID', 'DS Parameter set']
+
+# {text before the ':' (or the first word for 'Channels '): field name}
+_field_names = dict([(cmd.strip(), cmd) for cmd in cmds])
+_block_names = frozenset(cmds_sub)
+
+
+def _iter_lines(data):
+    """ @param data: the output as a string, or any iterable of lines (str or bytes), e.g. a file or a pipe
+        @return: iterator over the lines without the line break
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', errors='replace')
+    if isinstance(data, str):
+        return iter(data.split('\n'))
+    return (line.decode('utf-8', errors='replace').rstrip('\r\n') if isinstance(line, bytes) else line.rstrip('\r\n')
+            for line in data)
+
+
+def parse_bss_line(line):
+    """ @param line: e.g. "BSS 50:c7:bf:3b:db:37(on wlan0) -- associated"
+        @return: (mac, interface)
+    """
+    mac = line.split()[1].split('(')[0]
+    p = line.find('(on ')
+    iface = line[p + 4:].split(')')[0].strip() if p >= 0 else ''
+    return mac, iface
+
 
 def find_in_cmd(line):
-    """ searches the line against the text in `cmds`
-        returns the data in a simple dictionary
+    """ searches the line for the fields in `cmds`.
+        a line may carry several fields separated by tab, e.g. "Country: BR\tEnvironment: Indoor/Outdoor"
+
+        @return: the data in a simple dictionary
     """
     ret = {}
-    for cmd in cmds:
-        p = line.find(cmd)
-        if p >= 0:
-            # item found
-            item = line[p + len(cmd.strip()) + 1:].strip()
-            item = item.split('\t')[0]
-            ret.update({cmd: item})
+    for segment in line.strip().split('\t'):
+        p = segment.find(':')
+        if p > 0:
+            key, value = segment[:p].rstrip(), segment[p + 1:]
+        else:
+            key, _, value = segment.partition(' ')  # e.g. "Channels [1 - 13] @ 20 dBm"
+        name = _field_names.get(key)
+        if name is not None:
+            ret[name] = value.strip()
     return ret
 
 
-def get_subitems(_l, lines):
-    r = {}
-    i = 0
-    _first = True
-    while _first or _l.find('\t\t') == 0:
-        _first = False
-        if len(_l) > 0 and _l.find('*') > 0:
-            p = _l.find('*')
-            item = _l[p + 1:].strip()
-            p = item.find(':')
-            k = item[:p].strip()
-            v = item[p + 1:].strip()
-            r.update({k: v})
-        _l = lines[i]
-        i += 1
-    # remove processed lines
-    for j in range(i):
-        lines.pop(0)
-    return r
+def parse_subitem(line):
+    """ @param line: an item of a block, e.g. "\t\t * Group cipher: CCMP"
+        @return: (key, value), or None if the line has no item
+    """
+    p = line.find('*')
+    if p < 0:
+        return None
+    item = line[p + 1:].strip()
+    p = item.find(':')
+    if p < 0:
+        return item, item  # e.g. "u-APSD"
+    return item[:p].strip(), item[p + 1:].strip()
+
+
+def iter_scan(data, fields=None):
+    """ tokenizes the output of scan dump in a single pass
+
+        @param data: the output of scan dump (str) or an iterable of its lines (e.g. the stdout of the command)
+        @param fields: names in `cmds` and `cmds_sub` to decode. None decodes all, an empty list only the macs
+        @return: iterator of (mac, record), where record = {'iface': interface, field: value, block: {key: value}}
+    """
+    wanted = None if fields is None else set(fields)
+    mac, record, block = None, None, None
+    for line in _iter_lines(data):
+        if line.startswith('BSS'):
+            if mac is not None:
+                yield mac, record
+            mac, iface = parse_bss_line(line)
+            record = {'iface': iface}
+            block = None
+            continue
+        if mac is None or (wanted is not None and len(wanted) == 0):
+            continue
+        if block is not None:
+            if line.startswith('\t\t'):
+                # the items of a block ("\t\t * key: value")
+                item = parse_subitem(line)
+                if item is not None and block is not False:
+                    block[item[0]] = item[1]
+                    name = _field_names.get(item[0])
+                    if name is not None and (wanted is None or name in wanted):
+                        record[name] = item[1]  # e.g. the station count of "BSS Load"
+                continue
+            block = None
+        text = line.strip()
+        p = text.find(':')
+        if p > 0:
+            key = text[:p]
+            if key in _block_names:
+                # a block, e.g. "RSN:\t * Version: 1" followed by its items
+                if wanted is not None and key not in wanted:
+                    block = False  # skip its items
+                    continue
+                block = dict()
+                record[key] = block
+                item = parse_subitem(text[p + 1:])
+                if item is not None:
+                    block[item[0]] = item[1]
+                continue
+            if '\t' not in text:
+                # the usual line: "key: value"
+                name = _field_names.get(key.rstrip())
+                if name is not None and (wanted is None or name in wanted):
+                    record[name] = text[p + 1:].strip()
+                continue
+        if len(text) > 0:
+            for name, value in find_in_cmd(text).items():
+                if wanted is None or name in wanted:
+                    record[name] = value
+    if mac is not None:
+        yield mac, record
 
 
 def decode_scan(data):
     """ decodes all the information returned by `scan dump`
         TODO: finish all fields
 
-        @param data: the output of scan dump
+        @param data: the output of scan dump (str or iterable of lines)
         @return: dictionary containing the data
     """
-    lines = data.split('\n')
-    ret = dict()
-    mac = None
-    while len(lines) > 0:
-        _l = lines.pop(0)
-        if _l.find('BSS') == 0:
-            mac = _l.split()[1].split('(')[0]
-            iface = _l.split('on')[1].strip()
-            ret[mac] = {'iface': iface}
-        elif mac is not None:
-            found = False
-            for cmd in cmds_sub:
-                if cmd in _l:
-                    r = get_subitems(_l, lines)
-                    # update result
-                    ret[mac][cmd] = r
-                    found = True  # skip the next process
-            if not found:
-                e = find_in_cmd(_l)
-                ret[mac].update(e)
-
-    return ret
+    return dict(iter_scan(data))
 
 
 def decode_scan_mac(data):
     """ get the list of APs in range
 
-        @param data: the output of scan dump
+        @param data: the output of scan dump (str or iterable of lines)
         @return: list with the macs detected
     """
-    macs = []
-    lines = data.split('\n')
-    while len(lines) > 0:
-        _l = lines.pop(0)
-        if _l.find('BSS') == 0:
-            mac = _l.split()[1].split('(')[0]
-            macs.append(mac)
-    return macs
+    return [mac for mac, record in iter_scan(data, fields=[])]
+
+
+def _first_number(value, cast):
+    """ @return: the first number in value, e.g. -54.0 for "-54.00 dBm" """
+    return cast(value.split()[0])
 
 
 def decode_scan_basic(data):
-    """ get the list of APs in range
+    """ get the list of APs in range with their basic information
 
-        @param data: the output of scan dump
-        @return: list with the macs detected
+        @param data: the output of scan dump (str or iterable of lines)
+        @return: {mac: {'freq', 'signal', 'beacon interval', 'last seen', 'SSID', 'channel', 'TSF'}}
     """
     macs = dict()
-    lines = data.split('\n')
-    while len(lines) > 0:
-        _l = lines.pop(0)
-        if _l.find('BSS') == 0:
-            mac = _l.split()[1].split('(')[0]
-            macs[mac] = dict()
-            i = 0
-            while lines[i].find('BSS') < 0:
-                if 'freq' in lines[i]:
-                    macs[mac]['freq'] = int(lines[i].split(':')[1].strip())
-                elif 'signal' in lines[i]:
-                    macs[mac]['signal'] = float(lines[i].split(':')[1].strip().split()[0])
-                elif 'beacon interval' in lines[i]:
-                    macs[mac]['beacon interval'] = int(lines[i].split(':')[1].strip().split()[0])
-                elif 'last seen' in lines[i]:
-                    macs[mac]['last seen'] = int(lines[i].split(':')[1].strip().split()[0])
-                elif 'SSID' in lines[i]:
-                    macs[mac]['SSID'] = lines[i].split(':')[1].strip()
-                elif 'DS Parameter set: channel' in lines[i]:
-                    macs[mac]['channel'] = lines[i].split('channel')[1].strip()
-                elif 'TSF' in lines[i]:
-                    macs[mac]['TSF'] = lines[i].split('(')[1].strip().split(')')[0]
-
-                i += 1  # next line
+    for mac, record in iter_scan(data, fields=basic_fields):
+        info = dict()
+        try:
+            if 'freq' in record:
+                info['freq'] = int(_first_number(record['freq'], float))  # newer iw: "freq: 2412.0"
+            if 'signal' in record:
+                info['signal'] = _first_number(record['signal'], float)
+            if 'beacon interval' in record:
+                info['beacon interval'] = _first_number(record['beacon interval'], int)
+            if 'last seen' in record:
+                info['last seen'] = _first_number(record['last seen'], int)
+        except (ValueError, IndexError):
+            pass
+        if 'SSID' in record:
+            info['SSID'] = record['SSID']
+        if record.get('DS Parameter set', '').startswith('channel'):
+            info['channel'] = record['DS Parameter set'].split('channel')[1].strip()
+        if '(' in record.get('TSF', ''):
+            info['TSF'] = record['TSF'].split('(')[1].strip().split(')')[0]
+        macs[mac] = info
     return macs
 
 
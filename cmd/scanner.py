@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    background scans
+
+    "iw dev <interface> scan" takes seconds. ScanManager runs the scans of each interface in a background thread,
+    on a fixed interval or when requested, and keeps the last completed result, so the callers return immediately.
+
+    The completion of a scan is tracked with nl80211's scan notifications (NEW_SCAN_RESULTS, SCAN_ABORTED):
+    the thread runs "iw dev <interface> scan trigger", waits for the notification and reads "scan dump".
+    The notifications of scans started by other programs (e.g. wpa_supplicant) also refresh the result.
+    If nl80211 is not available, the thread runs the blocking "iw dev <interface> scan", which returns when the scan ends.
+    In AP mode, the scans use ap-force.
+
+
+    Usage:
+    ------
+
+    manager = ScanManager(interval=30)
+    manager.add('wlan0')  # starts scanning in background
+    timestamp, aps = manager.get('wlan0', decode_scan_basic)  # the last result, without waiting
+    ...
+    manager.stop()
+"""
+import copy
+import logging
+import os
+import socket
+import threading
+import time
+
+from cmd.scan import decode_scan
+from cmd.nl80211 import Nl80211Events, Nl80211Error, NL80211_CMD_NEW_SCAN_RESULTS, NL80211_CMD_SCAN_ABORTED
+
+
+LOG = logging.getLogger('SCANNER')
+
+DEFAULT_IW_PATH = '/sbin/'
+
+"""a result is too old after this many intervals of its interface (see ScanManager.get())"""
+MAX_AGE_INTERVALS = 3
+
+"""seconds before a result is too old, for the interfaces scanned only when requested"""
+ON_REQUEST_MAX_AGE = 30.0
+
+
+def is_ap(interface):
+    """ @return: True if the interface is in AP mode (its scans need ap-force) """
+    from cmd.command_ap import interface_registry
+    return interface_registry.is_ap(interface)
+
+
+def is_wireless(interface):
+    """ @return: True if the interface is a wireless interface of the registry (see interfaces.py) """
+    from cmd.command_ap import interface_registry
+    return interface in interface_registry.interfaces()
+
+
+def popen(cmd):
+    """ runs cmd with command_ap's executor (see use_executor()), so the scans can be replayed """
+    from cmd.command_ap import get_executor
+    return get_executor().popen(cmd)
+
+
+class ScanManager(object):
+    """ scans each interface in its own thread and keeps the last completed result of each one:
+        {'timestamp': time.time() of the completion, 'completed': clock() of the completion,
+         'duration': seconds, 'output': the output of scan dump}
+    """
+
+    def __init__(self, interval=30.0, max_age=None, scan_timeout=10.0, path_iw=DEFAULT_IW_PATH,
+                 use_events=True, is_ap=is_ap, clock=time.monotonic, popen=popen, is_wireless=is_wireless):
+        """
+            @param interval: seconds between the scans of an interface. 0 only scans when requested
+            @param max_age: default max_age of get(). None is MAX_AGE_INTERVALS times the interval of the interface
+                            (ON_REQUEST_MAX_AGE if it only scans when requested): the background scans keep
+                            the result fresh, get() does not request scans of its own
+            @param scan_timeout: seconds to wait for the end of a scan
+            @param path_iw: path to iw
+            @param use_events: wait for the nl80211 notifications. False always runs the blocking scan command
+            @param is_ap: function(interface) that returns True if the interface is an AP
+            @param clock: function that returns the current time in seconds
+            @param popen: function(cmd) that runs the iw commands and returns their stdout
+            @param is_wireless: function(interface) that returns True if the interface can be scanned
+        """
+        self.interval = interval
+        self.max_age = max_age
+        self.scan_timeout = scan_timeout
+        self.path_iw = path_iw
+        self.use_events = use_events
+        self.is_ap = is_ap
+        self.clock = clock
+        self.popen = popen
+        self.is_wireless = is_wireless
+        self._states = dict()  # {interface: state of its thread}
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._events = None  # Nl80211Events, or False if not available
+        self._listener = None
+
+    def add(self, interface, interval=None):
+        """ starts scanning the interface in background. The interfaces scanned periodically are only the ones
+            added here (e.g. the server's --scan-iface): request() and get() add the others with interval 0
+
+            @param interval: seconds between the scans. None uses self.interval, 0 only scans when requested
+            @return: the state of the interface
+        """
+        with self._cond:
+            state = self._states.get(interface)
+            if state is None:
+                state = {'interval': self.interval, 'wakeup': threading.Event(), 'done': threading.Event(),
+                         'scanning': False, 'aborted': False, 'external': False, 'ap': None,
+                         'requested': None, 'started': None, 'result': None, 'scans': 0, 'failures': 0}
+                state['thread'] = threading.Thread(target=self._run, args=(interface, state),
+                                                   name='scan-{}'.format(interface), daemon=True)
+                self._states[interface] = state
+                state['thread'].start()
+            if interval is not None:
+                state['interval'] = interval
+                state['wakeup'].set()  # applies the new interval
+        return state
+
+    def remove(self, interface):
+        """ stops scanning the interface and discards its result """
+        with self._cond:
+            state = self._states.pop(interface, None)
+        if state is not None:
+            state['wakeup'].set()
+
+    def _on_request(self, interface):
+        """ @return: the state of the interface, added with interval 0 if it was not scanned yet
+            @raise ValueError: the interface is not a wireless interface
+        """
+        with self._cond:
+            state = self._states.get(interface)
+            if state is not None:
+                return state
+            if not self.is_wireless(interface):
+                raise ValueError("{} is not a wireless interface".format(interface))
+            return self.add(interface, interval=0)
+
+    def request(self, interface):
+        """ asks for a new scan of the interface. Does not wait for it (see get())
+
+            @raise ValueError: the interface is not a wireless interface
+        """
+        state = self._on_request(interface)
+        state['requested'] = self.clock()
+        state['wakeup'].set()
+
+    def result(self, interface):
+        """ @return: the last completed scan of the interface (see the class) or None """
+        with self._cond:
+            state = self._states.get(interface)
+            return None if state is None else state['result']
+
+    def last(self, interface, decoder=decode_scan):
+        """ the last completed scan of the interface. Never adds the interface nor requests a scan
+
+            @return: (timestamp, decoded result) or None if no scan completed
+        """
+        res = self.result(interface)
+        if res is None:
+            return None
+        return res['timestamp'], self.view(res, decoder)
+
+    def get(self, interface, decoder=decode_scan, max_age=None, timeout=0):
+        """ returns the last completed scan. If it is older than max_age, requests a new scan
+            and waits for it at most timeout seconds.
+
+            @param decoder: decodes the output of scan dump, e.g. decode_scan, decode_scan_basic or decode_scan_mac
+            @param max_age: maximum age of the result in seconds. None uses the default (see __init__())
+            @param timeout: maximum time waiting for a new scan. 0 returns the last result at once,
+                            None waits twice scan_timeout
+            @return: (timestamp, decoded result) or None if no scan completed
+            @raise ValueError: the interface is not a wireless interface
+        """
+        state = self._on_request(interface)
+        max_age = self._max_age(state) if max_age is None else max_age
+        with self._cond:
+            res = state['result']
+        if res is None or self.clock() - res['completed'] > max_age:
+            since = self.clock()
+            self.request(interface)
+            timeout = 2 * self.scan_timeout if timeout is None else timeout
+            with self._cond:
+                self._cond.wait_for(lambda: state['result'] is not None and state['result']['completed'] >= since,
+                                    timeout)
+                res = state['result']
+        if res is None:
+            return None
+        return res['timestamp'], self.view(res, decoder)
+
+    def _max_age(self, state):
+        """ @return: the default max_age of the interface (see __init__()) """
+        if self.max_age is not None:
+            return self.max_age
+        if state['interval'] > 0:
+            return MAX_AGE_INTERVALS * state['interval']
+        return ON_REQUEST_MAX_AGE
+
+    @staticmethod
+    def view(res, decoder):
+        """ @return: the result decoded by decoder. Each view is decoded once per result """
+        views = res['views']
+        if decoder not in views:
+            views[decoder] = decoder(res['output'])
+        return copy.deepcopy(views[decoder])
+
+    def stats(self):
+        """ @return: {interface: {'scans', 'failures', 'age' of the result in seconds or None}} """
+        now = self.clock()
+        with self._cond:
+            return dict([(interface, {'scans': s['scans'], 'failures': s['failures'],
+                                      'age': None if s['result'] is None else now - s['result']['completed']})
+                         for interface, s in self._states.items()])
+
+    def stop(self):
+        """ stops all threads """
+        self._stop.set()
+        with self._cond:
+            states = list(self._states.values())
+            self._states = dict()
+        for state in states:
+            state['wakeup'].set()
+            state['done'].set()
+        for state in states:
+            state['thread'].join(self.scan_timeout)
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+        if self._events:
+            self._events.close()
+        self._events = None
+
+    def _running(self, interface, state):
+        return not self._stop.is_set() and self._states.get(interface) is state
+
+    def _run(self, interface, state):
+        """ the thread of one interface """
+        timed_out = True
+        while self._running(interface, state):
+            requested = state['requested'] is not None and (state['started'] is None or
+                                                            state['requested'] >= state['started'])
+            if timed_out or requested:
+                self._scan(interface, state, trigger=True)
+            elif state['external']:
+                self._scan(interface, state, trigger=False)  # another program scanned, only read the results
+            interval = state['interval']
+            timed_out = not state['wakeup'].wait(interval if interval > 0 else None)
+            state['wakeup'].clear()
+
+    def _iw(self, interface, args):
+        cmd = "sudo {} dev {} {} 2>&1".format(os.path.join(self.path_iw, 'iw'), interface, args)
+        LOG.debug(cmd)
+        with self.popen(cmd) as p:
+            return p.read()
+
+    def _scan(self, interface, state, trigger=True):
+        """ runs one scan and stores its result
+
+            @param trigger: False only reads the results of the last scan
+            @return: True if the scan completed
+        """
+        state['wakeup'].clear()  # the requests made during this scan are answered by it
+        state['external'] = False
+        state['started'] = self.clock()
+        if state['ap'] is None:
+            state['ap'] = self.is_ap(interface)
+        ap_force = ' ap-force' if state['ap'] else ''
+        if not trigger:
+            output = self._iw(interface, 'scan dump')
+        elif self._event_listener():
+            state['done'].clear()
+            state['aborted'] = False
+            state['scanning'] = True
+            try:
+                output = self._iw(interface, 'scan trigger' + ap_force)
+                # busy (-16): a scan is already running, its results are also fine
+                if output.startswith('command failed') and '(-16)' not in output:
+                    return self._failed(interface, state, output.strip())
+                if not state['done'].wait(self.scan_timeout):
+                    return self._failed(interface, state, 'timeout')
+            finally:
+                state['scanning'] = False
+            if state['aborted']:
+                return self._failed(interface, state, 'scan aborted')
+            output = self._iw(interface, 'scan dump')
+        else:
+            output = self._iw(interface, 'scan' + ap_force)  # returns when the scan completes
+        if output.startswith('command failed'):
+            return self._failed(interface, state, output.strip())
+        now = self.clock()
+        with self._cond:
+            state['result'] = {'timestamp': time.time(), 'completed': now, 'duration': now - state['started'],
+                               'output': output, 'views': dict()}
+            state['scans'] += 1
+            self._cond.notify_all()
+        return True
+
+    def _failed(self, interface, state, reason):
+        LOG.error("scan of {} failed: {}".format(interface, reason))
+        state['failures'] += 1
+        state['ap'] = None  # the mode may have changed
+        return False
+
+    def _event_listener(self):
+        """ starts the thread that receives the scan notifications
+
+            @return: True if the notifications are available
+        """
+        with self._cond:
+            if self._events is None:
+                if not self.use_events:
+                    self._events = False
+                else:
+                    try:
+                        self._events = Nl80211Events(['scan'])
+                    except Nl80211Error as e:
+                        LOG.info("scan notifications not available, using the blocking scan: {}".format(e))
+                        self._events = False
+                if self._events:
+                    self._listener = threading.Thread(target=self._listen, name='scan-events', daemon=True)
+                    self._listener.start()
+            return self._events is not False
+
+    def _listen(self):
+        """ the thread that receives the scan notifications """
+        while not self._stop.is_set():
+            try:
+                notifications = self._events.recv(1.0)
+            except Nl80211Error as e:
+                LOG.debug(e)
+                continue
+            for cmd, attrs in notifications:
+                if cmd not in [NL80211_CMD_NEW_SCAN_RESULTS, NL80211_CMD_SCAN_ABORTED]:
+                    continue
+                try:
+                    interface = socket.if_indextoname(attrs['ifindex'])
+                except (KeyError, OSError):
+                    continue
+                with self._cond:
+                    state = self._states.get(interface)
+                if state is None:
+                    continue
+                if state['scanning']:
+                    state['aborted'] = cmd == NL80211_CMD_SCAN_ABORTED
+                    state['done'].set()
+                elif cmd == NL80211_CMD_NEW_SCAN_RESULTS:
+                    state['external'] = True
+                    state['wakeup'].set()
+
+
+if __name__ == '__main__':
+    import argparse
+    from cmd.scan import decode_scan_basic
+
+    parser = argparse.ArgumentParser(description='Scan in background.')
+    parser.add_argument('--iface', type=str, default='wlan0', help='interface to scan')
+    parser.add_argument('--interval', type=float, default=10, help='seconds between scans')
+    args = parser.parse_args()
+
+    manager = ScanManager(interval=args.interval)
+    manager.add(args.iface)
+    try:
+        while True:
+            r = manager.get(args.iface, decode_scan_basic)
+            if r is not None:
+                print(time.ctime(r[0]), r[1])
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        manager.stop()
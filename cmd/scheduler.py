@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    scheduler of all the periodic samples of the AP
+
+    Each collector samples one command at its own period (e.g. xmit every 100 ms, stations every 250 ms, survey every
+    second, scan every minute) and hands the result to its sink (e.g. MetricHistory.record or Recorder.record).
+
+    - the periods are kept on a monotonic clock, on a fixed grid (no drift). The collectors start with different
+      phases, so the commands of different collectors do not run in bursts
+    - collectors with the same key (the underlying command, e.g. ('iw_stations', 'wlan0')) are coalesced:
+      the command runs once, at the shortest of their periods, and every sink gets its result
+    - a collector never runs twice at the same time: a sample that is due while the previous one still runs is
+      skipped. A sample that takes longer than its period doubles the period (up to max_backoff times the configured
+      period); the period comes back when the samples are fast again
+    - stats() returns the timing of each collector: runs, skipped, overruns, errors, duration and lateness
+      (delay between the scheduled and the actual start, bounded by max_jitter when the workers are not busy)
+
+    The scans (ScanManager, scanner.py) and the station events (StationTracker, station_tracker.py) keep their own
+    threads: a scan blocks for seconds and is also triggered on request and by the kernel's scan events, the tracker
+    waits for the hostapd and nl80211 notifications. The scan family of the scheduler only reads their last result.
+
+
+    Usage:
+    ------
+
+    scheduler = SamplerScheduler()
+    history = MetricHistory()
+    for family, (function, period, key) in interface_collectors('wlan0').items():
+        scheduler.add(family, function, period, key=key, sink=lambda result, f=family: history.record(f, result))
+    scheduler.start()
+    ...
+    scheduler.stats()
+    scheduler.stop()
+"""
+import heapq
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+LOG = logging.getLogger('SCHEDULER')
+
+"""default period of each family, in seconds"""
+DEFAULT_PERIODS = {'xmit': 0.1,
+                   'stations': 0.25,
+                   'survey': 1.0,
+                   'ifconfig': 1.0,
+                   'scan': 60.0,
+                   }
+
+"""underlying command of each family (collectors with the same command and interface are coalesced)"""
+FAMILY_COMMANDS = {'xmit': 'xmit',
+                   'stations': 'iw_stations',
+                   'survey': 'iw_survey',
+                   'ifconfig': 'ifconfig',
+                   'scan': 'scan',
+                   }
+
+GOLDEN = (math.sqrt(5) - 1) / 2  # spreads the phases of the collectors
+
+
+class _Job(object):
+    """ the collectors of one key """
+
+    def __init__(self, key, function, period, index):
+        self.key = key
+        self.function = function
+        self.base_period = period  # configured (the shortest of the coalesced collectors)
+        self.period = period  # current, after the back off
+        self.sinks = dict()  # {name: function(result) or None}
+        self.periods = dict()  # {name: configured period}
+        self.phase = (index * GOLDEN) % 1.0  # fraction of the period (at most a second) before the first sample
+        self.running = False
+        self.stats = {'runs': 0, 'skipped': 0, 'overruns': 0, 'errors': 0, 'late': 0,
+                      'duration_last': None, 'duration_max': 0.0, 'duration_sum': 0.0,
+                      'lateness_max': 0.0, 'lateness_sum': 0.0}
+
+
+class SamplerScheduler(object):
+    """ runs the collectors on their periods, in a pool of `workers` threads """
+
+    def __init__(self, workers=4, max_jitter=0.01, max_backoff=8, clock=time.monotonic, executor=None):
+        """
+            @param workers: threads running the collectors
+            @param max_jitter: seconds a sample may start late before it is counted as late
+            @param max_backoff: maximum factor of the period of an overrunning collector
+            @param clock: monotonic function that returns the current time in seconds
+            @param executor: runs the collectors, submit(function, *args). None uses a ThreadPoolExecutor of `workers`
+                             threads, created by start()
+        """
+        self.workers = workers
+        self.max_jitter = max_jitter
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.executor = executor
+        self._jobs = dict()  # {key: _Job}
+        self._names = dict()  # {name: key}
+        self._heap = []  # [(due, sequence, key)]
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def add(self, name, function, period, key=None, sink=None):
+        """ adds a collector
+
+            @param name: unique name, e.g. 'wlan0/stations'
+            @param function: function() that returns the sample
+            @param period: seconds between samples
+            @param key: the underlying command, e.g. ('iw_stations', 'wlan0'). None uses the name.
+                        A collector with the key of another one shares its samples (and its function)
+            @param sink: function(sample) that receives each sample
+        """
+        key = name if key is None else key
+        with self._cond:
+            if name in self._names:
+                raise ValueError("collector {} already exists".format(name))
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = _Job(key, function, period, len(self._jobs))
+                if self._pool is not None:  # scheduled
+                    self._push(job, self.clock() + job.phase * min(job.period, 1.0))
+            else:
+                LOG.debug("{} coalesced with {}".format(name, list(job.sinks)))
+            job.sinks[name] = sink
+            job.periods[name] = period
+            self._update_period(job)
+            self._names[name] = key
+            self._cond.notify()
+
+    def remove(self, name):
+        """ removes a collector. Its command stops when no collector uses it """
+        with self._cond:
+            key = self._names.pop(name)
+            job = self._jobs[key]
+            del job.sinks[name]
+            del job.periods[name]
+            if len(job.sinks) == 0:
+                del self._jobs[key]  # its heap entry is dropped when due
+            else:
+                self._update_period(job)
+
+    def _update_period(self, job):
+        base = min(job.periods.values())
+        job.period = base * max(1.0, job.period / job.base_period)  # keeps the back off
+        job.base_period = base
+
+    def period(self, name):
+        """ @return: the current period of the collector (with the back off), or None """
+        key = self._names.get(name)
+        return None if key is None else self._jobs[key].period
+
+    def _push(self, job, due):
+        heapq.heappush(self._heap, (due, next(self._sequence), job.key))
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self.schedule()
+            self._thread = threading.Thread(target=self._run, name='sampler-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            with self._cond:
+                self._cond.notify()
+            self._thread.join()
+            self._thread = None
+            if self._pool is not self.executor:
+                self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def schedule(self):
+        """ schedules the first sample of each collector, start() calls it.
+            Without start(), run_pending() runs the collectors (e.g. with a fake clock)
+        """
+        self._pool = ThreadPoolExecutor(max_workers=self.workers) if self.executor is None else self.executor
+        now = self.clock()
+        with self._cond:
+            self._heap = []
+            for job in self._jobs.values():
+                self._push(job, now + job.phase * min(job.period, 1.0))
+
+    def run_pending(self):
+        """ submits the collectors that are due
+
+            @return: seconds until the next sample, None if there is no collector
+        """
+        with self._cond:
+            while len(self._heap) > 0:
+                due, _, key = self._heap[0]
+                now = self.clock()
+                if due > now:
+                    return due - now
+                heapq.heappop(self._heap)
+                job = self._jobs.get(key)
+                if job is None:
+                    continue  # removed
+                if job.running:
+                    job.stats['skipped'] += 1  # the previous sample is still running
+                else:
+                    job.running = True
+                    self._pool.submit(self._execute, job, due)
+                due += job.period
+                if due < now:  # late by more than a period: skip the lost samples, stay on the grid
+                    missed = int((now - due) // job.period) + 1
+                    job.stats['skipped'] += missed
+                    due += missed * job.period
+                self._push(job, due)
+            return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                delay = self.run_pending()
+                if not self._stop.is_set():
+                    self._cond.wait(delay)  # or a new collector
+
+    def _execute(self, job, due):
+        start = self.clock()
+        error = None
+        try:
+            sample = job.function()
+        except Exception as e:
+            sample, error = None, e
+        duration = self.clock() - start
+        with self._cond:
+            sinks = list(job.sinks.items())
+            stats = job.stats
+            stats['runs'] += 1
+            stats['duration_last'] = duration
+            stats['duration_sum'] += duration
+            stats['duration_max'] = max(stats['duration_max'], duration)
+            lateness = max(0.0, start - due)
+            stats['lateness_sum'] += lateness
+            stats['lateness_max'] = max(stats['lateness_max'], lateness)
+            if lateness > self.max_jitter:
+                stats['late'] += 1
+            if duration > job.period:
+                stats['overruns'] += 1
+                job.period = min(job.period * 2, job.base_period * self.max_backoff)
+                LOG.debug("{} took {:.3f} s, period {:.3f} s".format(job.key, duration, job.period))
+            elif duration < job.period / 2 and job.period > job.base_period:
+                job.period = max(job.base_period, job.period / 2)
+            if error is not None:
+                stats['errors'] += 1
+            job.running = False
+        if error is not None:
+            LOG.error("collector {}: {}".format(job.key, error))
+            return
+        for name, sink in sinks:
+            if sink is None:
+                continue
+            try:
+                sink(sample)
+            except Exception as e:
+                LOG.error("sink of {}: {}".format(name, e))
+
+    def stats(self):
+        """ @return: {name: {'key', 'coalesced' (the other collectors of the key), 'period', 'base_period',
+                             'runs', 'skipped', 'overruns', 'errors', 'late',
+                             'duration_last', 'duration_mean', 'duration_max', 'lateness_mean', 'lateness_max'}}
+                     in seconds
+        """
+        result = dict()
+        with self._cond:
+            for name, key in self._names.items():
+                job = self._jobs[key]
+                s = dict(job.stats)
+                runs = max(1, s['runs'])
+                s['duration_mean'] = s.pop('duration_sum') / runs
+                s['lateness_mean'] = s.pop('lateness_sum') / runs
+                s.update({'key': str(key), 'coalesced': [n for n in job.sinks if n != name],
+                          'period': job.period, 'base_period': job.base_period})
+                result[name] = s
+        return result
+
+
+def interface_collectors(interface, families=('stations', 'survey', 'ifconfig', 'xmit'), periods=None, scans=None):
+    """ @param interface: e.g. 'wlan0'
+        @param families: which metrics are sampled (see interface_sources()), 'scan' included
+        @param periods: {family: seconds}, updates DEFAULT_PERIODS
+        @param scans: the ScanManager read by the scan family (see interface_sources())
+        @return: {'<interface>/<family>': (function, period, key)} for SamplerScheduler.add()
+    """
+    from cmd.history import interface_sources
+    p = dict(DEFAULT_PERIODS, **(periods or dict()))
+    sources = interface_sources(interface, families, scans)
+    return dict([('{}/{}'.format(interface, f), (sources['{}/{}'.format(interface, f)], p[f],
+                                                 (FAMILY_COMMANDS[f], interface)))
+                 for f in families])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Sample the AP metrics on their periods and show the timing.')
+    parser.add_argument('--iface', type=str, default='wlan0', help='interface')
+    parser.add_argument('--families', type=str, nargs='*', default=['stations', 'survey', 'ifconfig', 'xmit'],
+                        help='metrics sampled: stations, survey, ifconfig, xmit, scan')
+    parser.add_argument('--period', type=str, nargs='*', default=[], metavar='FAMILY=SECONDS',
+                        help='period of a family, e.g. stations=0.5')
+    args = parser.parse_args()
+
+    scheduler = SamplerScheduler()
+    periods = dict([(item.split('=')[0], float(item.split('=')[1])) for item in args.period])
+    scans = None
+    if 'scan' in args.families:
+        from cmd.scanner import ScanManager
+        scans = ScanManager()
+        scans.add(args.iface)
+    for name, (function, period, key) in interface_collectors(args.iface, args.families, periods, scans).items():
+        scheduler.add(name, function, period, key=key)
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(5)
+            for name, s in sorted(scheduler.stats().items()):
+                print("{:<20} period {:6.3f} s  runs {:5}  skipped {:4}  overruns {:4}  errors {:4}  "
+                      "duration {:6.1f}/{:6.1f} ms  lateness {:5.1f}/{:5.1f} ms".format(
+                          name, s['period'], s['runs'], s['skipped'], s['overruns'], s['errors'],
+                          s['duration_mean'] * 1e3, s['duration_max'] * 1e3,
+                          s['lateness_mean'] * 1e3, s['lateness_max'] * 1e3))
+    except KeyboardInterrupt:
+        scheduler.stop()
+        if scans is not None:
+            scans.stop()
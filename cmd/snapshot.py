@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    TTL snapshot cache for the AP queries
+
+    keeps the last sample of each (command, interface) for a configurable time (TTL) per command,
+    so repeated reads inside one request and across clients reuse one sample.
+    Concurrent identical requests are de-duplicated: only the first caller runs the command,
+    the others wait for its result (single-flight).
+    The samples are shared by all the callers: they must not be changed (copy them first).
+"""
+import time
+import inspect
+import functools
+import threading
+import logging
+
+
+LOG = logging.getLogger('SNAPSHOT')
+
+"""default time to live (in seconds) of each command's sample"""
+DEFAULT_TTLS = {'iw_info': 2.0,
+                'iwconfig': 2.0,
+                'hostapd_config': 10.0,
+                'hostapd_status': 1.0,
+                'iw_stations': 0.5,
+                'hostapd_stations': 0.5,
+                'iw_survey': 0.5,
+                'ifconfig': 0.5,
+                'xmit': 0.1,
+                }
+
+
+class _Flight(object):
+    """ a command being executed: the callers that arrive meanwhile wait for its result """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.invalidated = False
+
+
+class SnapshotCache(object):
+    """ stores {(command, interface, variant): (timestamp, value)} """
+
+    def __init__(self, ttls=None, default_ttl=0.0, clock=time.monotonic):
+        """
+            @param ttls: {command: seconds}. Updates DEFAULT_TTLS
+            @param default_ttl: TTL of the commands not in ttls. 0 only de-duplicates concurrent requests
+            @param clock: function that returns the current time in seconds
+        """
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls is not None:
+            self.ttls.update(ttls)
+        self.default_ttl = default_ttl
+        self.clock = clock
+        self.enabled = True
+        self._entries = dict()
+        self._flights = dict()
+        self._lock = threading.Lock()
+
+    def ttl(self, command):
+        """ @return: the TTL of command in seconds """
+        return self.ttls.get(command, self.default_ttl)
+
+    def set_ttl(self, command, ttl):
+        """ @param command: the command's name, e.g. 'iw_stations'
+            @param ttl: time to live in seconds. 0 disables the cache for this command
+        """
+        with self._lock:
+            self.ttls[command] = ttl
+            for key in [k for k in self._entries if k[0] == command]:
+                del self._entries[key]
+
+    def get(self, command, interface, loader, variant=None):
+        """ returns the cached sample of (command, interface, variant) or calls loader() to get a new one
+
+            @param command: the command's name
+            @param interface: the interface (or any hashable) that identifies the sample
+            @param loader: function without parameters that runs the command
+            @param variant: hashable that tells apart the samples of the same interface, e.g. the command's path
+            @return: the sample (shared with other callers, do not change it)
+        """
+        if not self.enabled:
+            return loader()
+        key = (command, interface, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[0] < self.ttl(command):
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None and not flight.invalidated and self.ttl(command) > 0:
+                    self._entries[key] = (self.clock(), flight.value)
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, interface=None, commands=None):
+        """ discards the samples, e.g. after a setter changed the AP's state
+
+            @param interface: only the samples of this interface (and those without interface). None discards all
+            @param commands: list of commands to discard. None discards all commands
+        """
+        def match(key):
+            if commands is not None and key[0] not in commands:
+                return False
+            return interface is None or key[1] is None or key[1] == interface
+
+        with self._lock:
+            for key in [k for k in self._entries if match(k)]:
+                del self._entries[key]
+            for key in [k for k in self._flights if match(k)]:
+                self._flights[key].invalidated = True  # running now, may have read the old state
+        LOG.debug("invalidated {} {}".format(interface, commands))
+
+    def clear(self):
+        """ discards all samples """
+        self.invalidate()
+
+    def cached(self, command, key_arg='interface'):
+        """ decorator: caches the function's return value by (command, value of the parameter key_arg,
+            values of the other parameters). The callers share the returned value: they must not change it.
+
+            @param command: the command's name, used to find the TTL
+            @param key_arg: name of the parameter that identifies the sample, see invalidate()
+        """
+        def decorator(func):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = bound.arguments.get(key_arg)
+                variant = tuple(sorted([(name, value) for name, value in bound.arguments.items() if name != key_arg]))
+                return self.get(command, key, lambda: func(*args, **kwargs), variant)
+            wrapper.uncached = func
+            return wrapper
+        return decorator
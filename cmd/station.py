@@ -1,35 +1,155 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-    convert the output of iw dev station dump into a dictionary
+    convert the output of iw dev station dump and hostapd_cli all_sta into dictionaries
 
+    each field is converted by a schema, {field: (conversion, unit)}, compiled once when the module is imported.
+    The values are numbers in the unit of the schema (see iw_station_units and hostapd_station_units):
+    counters are int, bitrates are float in MBit/s, signals are int in dBm, the same keys, types and units
+    returned by the nl80211 backend (see nl80211.py).
+    The fields that are not in the schema are converted as before: the first number as float, otherwise the first word.
+
+
+    Usage:
+    ------
+
+    with os.popen('iw dev wlan0 station dump') as p:
+        stations = decode_iw_station(p)
+    {'00:11:22:33:44:55': {'inactive time': 10, 'rx bytes': 5420, 'signal': -42, 'tx bitrate': 65.0, ...}}
+
+    iw_station_units['tx bitrate']  # 'MBit/s'
 """
 import re
 
 
+"""fields of "iw dev station dump": {field: (conversion, unit)}. the conversion receives the first word of the value"""
+iw_station_schema = {'inactive time': (int, 'ms'),
+                     'rx bytes': (int, 'bytes'),
+                     'rx packets': (int, 'packets'),
+                     'tx bytes': (int, 'bytes'),
+                     'tx packets': (int, 'packets'),
+                     'tx retries': (int, 'packets'),
+                     'tx failed': (int, 'packets'),
+                     'rx drop misc': (int, 'packets'),
+                     'beacon loss': (int, 'beacons'),
+                     'beacon rx': (int, 'beacons'),
+                     'signal': (int, 'dBm'),  # "-42 [-44, -45] dBm": the combined signal
+                     'signal avg': (int, 'dBm'),
+                     'beacon signal avg': (int, 'dBm'),
+                     'last ack signal': (int, 'dBm'),
+                     'avg ack signal': (int, 'dBm'),
+                     'tx bitrate': (float, 'MBit/s'),  # "65.0 MBit/s MCS 7 short GI"
+                     'rx bitrate': (float, 'MBit/s'),
+                     'expected throughput': (float, 'Mbps'),  # "39.550Mbps"
+                     'tx duration': (int, 'us'),
+                     'rx duration': (int, 'us'),
+                     'airtime weight': (int, None),
+                     'connected time': (int, 's'),
+                     'associated at [boottime]': (float, 's'),
+                     'associated at': (int, 'ms'),
+                     'current time': (int, 'ms'),
+                     'DTIM period': (int, None),
+                     'beacon interval': (int, 'TUs'),
+                     'authorized': (str, None),
+                     'authenticated': (str, None),
+                     'associated': (str, None),
+                     'preamble': (str, None),
+                     'WMM/WME': (str, None),
+                     'MFP': (str, None),
+                     'TDLS peer': (str, None),
+                     'short preamble': (str, None),
+                     'short slot time': (str, None),
+                     }
+
+
+def _rate_100kbps(value):
+    """ @return: hostapd's rate in MBit/s, e.g. 65.0 for "650 mcs 7 shortGI" """
+    return int(value) / 10.0
+
+
+"""fields of "hostapd_cli all_sta": {field: (conversion, unit)}. the conversion receives the first word of the value
+   the other fields are int if they are integers, otherwise str"""
+hostapd_station_schema = {'rx_packets': (int, 'packets'),
+                          'tx_packets': (int, 'packets'),
+                          'rx_bytes': (int, 'bytes'),
+                          'tx_bytes': (int, 'bytes'),
+                          'inactive_msec': (int, 'ms'),
+                          'connected_time': (int, 's'),
+                          'signal': (int, 'dBm'),
+                          'rx_rate_info': (_rate_100kbps, 'MBit/s'),  # "650 mcs 7 shortGI"
+                          'tx_rate_info': (_rate_100kbps, 'MBit/s'),
+                          }
+
+"""{field: unit}"""
+iw_station_units = dict([(k, unit) for k, (conv, unit) in iw_station_schema.items() if unit is not None])
+hostapd_station_units = dict([(k, unit) for k, (conv, unit) in hostapd_station_schema.items() if unit is not None])
+
+_number = re.compile(r'[-+]?\d*\.\d+|[-+]?\d+')
+_mac = re.compile(r'([0-9A-F]{2}[:-]){5}([0-9A-F]{2})', re.I)
+
+
+def _compile(cast):
+    """ @return: function(word) that converts a word with cast. If it fails, converts the first number in the word
+                 (e.g. 39.55 for '39.550Mbps'), otherwise returns the word
+    """
+    if cast is str:
+        return str
+
+    def convert(word):
+        try:
+            return cast(word)
+        except ValueError:
+            m = _number.search(word)
+            if m is None:
+                return word
+            try:
+                return cast(m.group())
+            except ValueError:
+                return cast(float(m.group()))  # e.g. int('1.5')
+    return convert
+
+
+# {field: conversion}: the fast path. _converters: the conversion when the fast path fails
+_iw_casts = dict([(k, conv) for k, (conv, unit) in iw_station_schema.items()])
+_iw_converters = dict([(k, _compile(conv)) for k, (conv, unit) in iw_station_schema.items()])
+_hostapd_converters = dict([(k, _compile(conv)) for k, (conv, unit) in hostapd_station_schema.items()])
+_default_converter = _compile(float)
+
+
+def _lines(data):
+    """ @param data: the output as a string, or an iterable of lines (str or bytes), e.g. a pipe """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8', errors='replace')
+    if isinstance(data, str):
+        return data.split('\n')
+    return (line.decode('utf-8', errors='replace') if isinstance(line, bytes) else line for line in data)
+
+
 def decode_iw_station(data):
     """ return the data from "iw dev station dump"
 
-    @param data: output from "iw dev station dump"
-    @return:
+    @param data: output from "iw dev station dump" (str or iterable of lines, with or without the tabs)
+    @return: {mac: {field: value}}, the values converted by iw_station_schema
     """
     result = dict()
-    station = None
-    for _l in data:
-        if 'Station' in _l:
-            station = _l.split()[1]
-            result[station] = dict()
-        elif station is not None and len(_l.strip()) > 0:
-            _l = _l.split(':')
-            v = _l[1].strip().split()[0]
-            f = re.findall(r"[-+]?\d*\.\d+|\d+", v)
-            if len(f) > 0:
-                v = f[0]
-            try:
-                v = float(v)
-            except ValueError:
-                pass
-            result[station][_l[0]] = v
+    fields = None
+    casts = _iw_casts
+    for line in _lines(data):
+        p = line.find(':')
+        if line.startswith('Station'):
+            fields = dict()
+            result[line.split(None, 2)[1]] = fields
+            continue
+        if fields is None or p < 0:
+            continue
+        words = line[p + 1:].split(None, 1)
+        if len(words) == 0:
+            continue
+        key = line[:p].strip()
+        try:
+            fields[key] = casts[key](words[0])
+        except (KeyError, ValueError):
+            fields[key] = _iw_converters.get(key, _default_converter)(words[0])
     return result
 
 
@@ -74,55 +194,77 @@ def decode_hostapd_status(data):
     return ret
 
 
+def decode_hostapd_bss(status):
+    """ the BSSes of a radio, from the bss[i], bssid[i], ssid[i] and num_sta[i] fields of decode_hostapd_status()
+
+        @param status: the output of decode_hostapd_status()
+        @return: {bss interface: {'bssid', 'ssid', 'num_sta'}}, e.g. {'wlan0': {...}, 'wlan0_1': {...}}
+    """
+    ret = dict()
+    i = 0
+    while 'bss[{}]'.format(i) in status:
+        ret[status['bss[{}]'.format(i)]] = {'bssid': status.get('bssid[{}]'.format(i)),
+                                            'ssid': status.get('ssid[{}]'.format(i)),
+                                            'num_sta': status.get('num_sta[{}]'.format(i)),
+                                            }
+        i += 1
+    return ret
+
+
 def is_mac(s):
     """ verifies if 's' contains a MAC address
 
         @return: the mac address found or None
         @rtype: str
     """
-    try:
-        mac = re.search(r'([0-9A-F]{2}[:-]){5}([0-9A-F]{2})', s, re.I).group()
-        return mac
-    except AttributeError:
-        return None
+    m = _mac.search(s)
+    return None if m is None else m.group()
 
 
 def decode_hostapd_station(data):
-    """
+    """ decodes "hostapd_cli all_sta"'s output: the mac of each station in a line, followed by its key=value lines
 
-    @param data: output from hostapd_cli all_sta
-    @return: dictionary of dictionary
+    @param data: output from hostapd_cli all_sta (str or iterable of lines)
+    @return: dictionary of dictionary, the values converted by hostapd_station_schema
          {station1_mac: {'dot11RSNAStatsSelectedPairwiseCipher': '00-0f-ac-4',
-                         'rx_packets': '164',
-                         'dot11RSNAStatsTKIPLocalMICFailures': '0',
-                         'rx_bytes': '5420',
-                         'inactive_msec': '11828',
-                         'connected_time': '3402',
-                         'hostapdWPAPTKState': '11',
-                         'tx_bytes': '1340',
-                         'dot11RSNAStatsVersion': '1',
-                         'tx_packets': '10',
-                         'hostapdWPAPTKGroupState': '0',
-                         'dot11RSNAStatsTKIPRemoteMICFailures': '0'},
+                         'rx_packets': 164,
+                         'dot11RSNAStatsTKIPLocalMICFailures': 0,
+                         'rx_bytes': 5420,
+                         'inactive_msec': 11828,
+                         'connected_time': 3402,
+                         'hostapdWPAPTKState': 11,
+                         'tx_bytes': 1340,
+                         'dot11RSNAStatsVersion': 1,
+                         'tx_packets': 10,
+                         'hostapdWPAPTKGroupState': 0,
+                         'dot11RSNAStatsTKIPRemoteMICFailures': 0,
+                         'tx_rate_info': 65.0},
          }
     """
     result = dict()
-    lines = data.split('\n')
-    mac = None
-    for _l in lines:
-        _mac = is_mac(_l)
-        if _mac is None and mac is None:
-            continue  # skip line
+    fields = None
+    converters = _hostapd_converters
+    for line in _lines(data):
+        p = line.find('=')
+        if p < 0:
+            # a mac starts a new station. A mac inside a value (e.g. dot11RSNAStatsSTAAddress) does not
+            m = _mac.search(line)
+            if m is not None:
+                fields = dict()
+                result[m.group()] = fields
+            continue
+        if fields is None:
+            continue
+        key, value = line[:p], line[p + 1:].rstrip('\r\n')
+        convert = converters.get(key)
+        if convert is not None:
+            words = value.split(None, 1)
+            if len(words) > 0:
+                value = convert(words[0])
         else:
-            if _mac is not None:
-                # found a new station
-                mac = _mac
-                result[mac] = []
-            else:
-                result[mac].append(_l.split('='))
-    for k in result:
-        try:
-            result[k] = dict([v for v in result[k] if len(v) == 2])
-        except ValueError:
-            result[k] = None
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        fields[key] = value
     return result
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    columnar view of the stations, backed by NumPy
+
+    StationTable keeps one row per station (macs, in a fixed order) and one column per numeric field, in a float64
+    matrix (NaN where a station does not have the field). The deltas, rates and the feature matrix of /get_features
+    are computed on whole columns, without building a dictionary per station.
+
+    FEATURE_COLUMNS has the order of the features of /get_features (see get_station_features() in command_ap.py).
+
+    numpy is optional: the module imports without it, but StationTable raises ImportError.
+
+
+    Usage:
+    ------
+
+    table = StationTable.from_stations(get_iw_stations('wlan0'))
+    table.column('signal avg')  # array([-42., -61.])
+    ...
+    current = StationTable.from_stations(get_iw_stations('wlan0'))
+    delta, rate = current.delta(table)
+    features = current.features(survey_in_use, get_power('wlan0'))  # features.data: len(macs) x len(FEATURE_COLUMNS)
+"""
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from cmd.delta import STATION_COUNTERS, STATION_COUNTER_BITS, CONNECTED_TIME
+
+
+"""numeric fields of decode_iw_station() (and the nl80211 backend), in the default column order"""
+STATION_FIELDS = ['signal', 'signal avg', 'tx failed', 'tx retries', 'tx packets', 'tx bytes',
+                  'rx drop misc', 'rx bytes', 'rx packets', 'tx bitrate', 'rx bitrate',
+                  'inactive time', 'connected time', 'beacon loss', 'beacon rx', 'rx duration', 'tx duration',
+                  'expected throughput',
+                  ]
+
+"""columns of /get_features"""
+FEATURE_COLUMNS = ['num_stations', 'tx_power', 'cat', 'cbt', 'crt', 'ctt',
+                   'avg_signal', 'txf', 'txr', 'txp', 'txb', 'rxdrop', 'rxb', 'rxp', 'tx_bitrate', 'rx_bitrate',
+                   ]
+
+"""{feature: field of the survey of the channel in use}"""
+FEATURE_SURVEY_FIELDS = {'cat': 'channel active time',
+                         'cbt': 'channel busy time',
+                         'crt': 'channel receive time',
+                         'ctt': 'channel transmit time',
+                         }
+
+"""{feature: field of decode_iw_station()}"""
+FEATURE_STATION_FIELDS = {'avg_signal': 'signal avg',
+                          'txf': 'tx failed',
+                          'txr': 'tx retries',
+                          'txp': 'tx packets',
+                          'txb': 'tx bytes',
+                          'rxdrop': 'rx drop misc',
+                          'rxb': 'rx bytes',
+                          'rxp': 'rx packets',
+                          'tx_bitrate': 'tx bitrate',
+                          'rx_bitrate': 'rx bitrate',
+                          }
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("StationTable needs numpy")
+
+
+def _number(v):
+    """ @return: v as float, or NaN if it is not a number """
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return float(v)
+    return float('nan')
+
+
+def feature_row(station, survey=None, tx_power=None, num_stations=1):
+    """ the features of one station, without numpy (see StationTable.features())
+
+        @param station: {field: value} of decode_iw_station()
+        @param survey: the survey of the channel in use, {field: value}
+        @param tx_power: the transmission power in dBm
+        @param num_stations: number of stations of the interface
+        @return: the values in the order of FEATURE_COLUMNS (NaN if missing)
+    """
+    survey = survey or dict()
+    row = []
+    for feature in FEATURE_COLUMNS:
+        if feature == 'num_stations':
+            row.append(float(num_stations))
+        elif feature == 'tx_power':
+            row.append(_number(tx_power))
+        elif feature in FEATURE_SURVEY_FIELDS:
+            row.append(_number(survey.get(FEATURE_SURVEY_FIELDS[feature])))
+        else:
+            row.append(_number(station.get(FEATURE_STATION_FIELDS[feature])))
+    return row
+
+
+class StationTable(object):
+    """ macs[i] is the station of row i, data[i, j] the value of fields[j] (NaN if missing) """
+
+    def __init__(self, macs, fields, data, timestamp=None):
+        """
+            @param macs: list of macs, one per row
+            @param fields: list of field names, one per column
+            @param data: float64 array with shape (len(macs), len(fields))
+            @param timestamp: time of the sample in seconds. None uses time.monotonic()
+        """
+        _require_numpy()
+        self.macs = list(macs)
+        self.fields = list(fields)
+        self.data = data
+        self.timestamp = time.monotonic() if timestamp is None else timestamp
+        self.index = dict([(mac, i) for i, mac in enumerate(self.macs)])
+        self._columns = dict([(field, j) for j, field in enumerate(self.fields)])
+
+    @classmethod
+    def from_stations(cls, stations, fields=STATION_FIELDS, timestamp=None):
+        """ @param stations: {mac: {field: value}}, e.g. the output of get_iw_stations()
+            @param fields: the columns
+            @return: the table, with the macs sorted
+        """
+        _require_numpy()
+        macs = sorted([mac for mac, values in stations.items() if values is not None])
+        nan = float('nan')
+        rows = [[stations[mac].get(field, nan) for field in fields] for mac in macs]
+        try:
+            data = np.array(rows, dtype=np.float64).reshape(len(macs), len(fields))
+        except (TypeError, ValueError):
+            # a field with a value that is not a number
+            data = np.array([[_number(v) for v in row] for row in rows], dtype=np.float64).reshape(len(macs), len(fields))
+        return cls(macs, fields, data, timestamp)
+
+    def __len__(self):
+        return len(self.macs)
+
+    def __contains__(self, mac):
+        return mac in self.index
+
+    def column(self, field):
+        """ @return: the values of the field, one per station (a view, not a copy)
+            @rtype: numpy.ndarray
+        """
+        return self.data[:, self._columns[field]]
+
+    def columns(self, fields):
+        """ @return: the matrix with the fields as columns, one row per station
+            @rtype: numpy.ndarray
+        """
+        return self.data[:, [self._columns[field] for field in fields]]
+
+    def row(self, mac):
+        """ @return: {field: value} of the station, without the missing fields """
+        values = self.data[self.index[mac]]
+        return dict([(field, v) for field, v in zip(self.fields, values.tolist()) if v == v])
+
+    def to_dict(self):
+        """ @return: {mac: {field: value}}, the format of get_iw_stations() """
+        return dict([(mac, self.row(mac)) for mac in self.macs])
+
+    def align(self, macs):
+        """ @return: the data with one row per mac in macs (NaN for the macs that are not in the table)
+            @rtype: numpy.ndarray
+        """
+        data = np.full((len(macs), len(self.fields)), np.nan)
+        rows = [(i, self.index[mac]) for i, mac in enumerate(macs) if mac in self.index]
+        if len(rows) > 0:
+            dst, src = zip(*rows)
+            data[list(dst)] = self.data[list(src)]
+        return data
+
+    def _select(self, data, fields):
+        """ @return: the columns of data (with this table's columns) in the order of fields, NaN if missing """
+        result = np.full((data.shape[0], len(fields)), np.nan)
+        for j, field in enumerate(fields):
+            if field in self._columns:
+                result[:, j] = data[:, self._columns[field]]
+        return result
+
+    def delta(self, previous, counters=STATION_COUNTERS, wrap_bits=64, reset_field=CONNECTED_TIME,
+              counter_bits=STATION_COUNTER_BITS):
+        """ the changes of the counters since the previous sample, with the rules of StationDeltaTracker:
+            a 32 bits counter that decreased wrapped if it was in the upper half of the wrap range, otherwise it
+            restarted (64 bits counters always restart), and all counters restarted if reset_field decreased
+            (the station reconnected)
+
+            @param previous: the StationTable of the previous sample
+            @param counters: the counter fields (those not in the table are ignored)
+            @param wrap_bits: size of the counters that are not in counter_bits
+            @param counter_bits: {counter: size in bits} of the counters whose size is not wrap_bits
+            @return: (delta, rate): StationTables with the rows of this table and the counter columns.
+                     The rows of the new stations are NaN
+        """
+        counters = [field for field in counters if field in self._columns]
+        current = self.columns(counters)
+        prev_data = previous.align(self.macs)
+        prev = previous._select(prev_data, counters)
+        d = current - prev
+        bits = np.array([counter_bits.get(field, wrap_bits) for field in counters], dtype=float)
+        wrap = np.where(bits < 64, 2.0 ** bits, np.inf)
+        with np.errstate(invalid='ignore'):
+            restarted = d < 0
+            wrapped = restarted & (prev >= wrap / 2) & (prev < wrap)
+        d += np.where(wrapped, wrap, 0.0)
+        restarted &= ~wrapped
+        if reset_field is not None and reset_field in self._columns and reset_field in previous._columns:
+            with np.errstate(invalid='ignore'):
+                reconnected = self.column(reset_field) < previous._select(prev_data, [reset_field])[:, 0]
+            restarted |= reconnected[:, None]
+        d[restarted] = current[restarted]
+        interval = self.timestamp - previous.timestamp
+        rate = d / interval if interval > 0 else np.zeros_like(d)
+        return (StationTable(self.macs, counters, d, self.timestamp),
+                StationTable(self.macs, counters, rate, self.timestamp))
+
+    def features(self, survey=None, tx_power=None):
+        """ the features of /get_features of all stations
+
+            @param survey: the survey of the channel in use, {field: value}
+            @param tx_power: the transmission power in dBm
+            @return: StationTable with the FEATURE_COLUMNS columns
+        """
+        survey = survey or dict()
+        data = np.empty((len(self.macs), len(FEATURE_COLUMNS)))
+        for j, feature in enumerate(FEATURE_COLUMNS):
+            if feature == 'num_stations':
+                data[:, j] = len(self.macs)
+            elif feature == 'tx_power':
+                data[:, j] = _number(tx_power)
+            elif feature in FEATURE_SURVEY_FIELDS:
+                data[:, j] = _number(survey.get(FEATURE_SURVEY_FIELDS[feature]))
+            elif FEATURE_STATION_FIELDS[feature] in self._columns:
+                data[:, j] = self.column(FEATURE_STATION_FIELDS[feature])
+            else:
+                data[:, j] = np.nan
+        return StationTable(self.macs, FEATURE_COLUMNS, data, self.timestamp)
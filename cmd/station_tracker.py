@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    event-driven set of the associated stations of each interface
+
+    StationTracker keeps {interface: {mac: connection timestamp}} up to date with the notifications of the
+    associations and disassociations, so the number of stations and their list are read without running a command:
+        hostapd: AP-STA-CONNECTED / AP-STA-DISCONNECTED, on an attached control socket per interface (see hostapd_ctrl.py)
+        nl80211: NEW_STATION / DEL_STATION of the 'mlme' multicast group (see Nl80211Events)
+    Both sources can be used at the same time, the events are idempotent.
+
+    The set is rebuilt with a full station dump (get_iw_stations()) when the tracker starts, every `resync_interval`
+    seconds and when notifications are lost (e.g. a socket error or ENOBUFS). The notifications received while the
+    dump runs are replayed onto its result, so a station that leaves during the dump is not brought back.
+    Without notifications (no hostapd control socket, no nl80211, or a replay executor), the tracker only resyncs.
+
+
+    Usage:
+    ------
+
+    tracker = StationTracker(['wlan0'], resync_interval=60)
+    tracker.start()
+    tracker.num_stations('wlan0')
+    tracker.stations('wlan0')  # {'00:11:22:33:44:55': {'connected_at': 1700000000.0}}
+    tracker.stop()
+"""
+import logging
+import socket
+import threading
+import time
+
+from cmd.hostapd_ctrl import HostapdCtrl, HostapdCtrlError, DEFAULT_CTRL_DIR
+from cmd.nl80211 import Nl80211Events, Nl80211Error, NL80211_CMD_NEW_STATION, NL80211_CMD_DEL_STATION
+
+
+LOG = logging.getLogger('STATION_TRACKER')
+
+CONNECTED = 'connected'
+DISCONNECTED = 'disconnected'
+
+"""hostapd event: tracker event"""
+HOSTAPD_EVENTS = {'AP-STA-CONNECTED': CONNECTED,
+                  'AP-STA-DISCONNECTED': DISCONNECTED,
+                  }
+
+"""nl80211 command: tracker event"""
+NL80211_EVENTS = {NL80211_CMD_NEW_STATION: CONNECTED,
+                  NL80211_CMD_DEL_STATION: DISCONNECTED,
+                  }
+
+
+def replaying():
+    """ @return: True if command_ap replays recorded outputs (see use_executor()): the notifications of the real
+                 hostapd and nl80211 are not about the replayed stations
+    """
+    from cmd import command_ap
+    return command_ap.get_executor().replay
+
+
+def dump_stations(interface):
+    """ @return: a fresh "station dump" of the interface (bypasses the snapshot cache) """
+    from cmd import command_ap
+    command_ap.invalidate_cache(interface, ['iw_stations'])
+    return command_ap.get_iw_stations(interface)
+
+
+class StationTracker(object):
+    """ {interface: {mac: connection timestamp}}, updated by the hostapd and nl80211 notifications """
+
+    def __init__(self, interfaces, resync_interval=60.0, dump=dump_stations, use_hostapd=True, use_nl80211=True,
+                 ctrl_dir=DEFAULT_CTRL_DIR, callbacks=None, clock=time.time):
+        """
+            @param interfaces: the AP interfaces tracked, e.g. ['wlan0', 'wlan1']
+            @param resync_interval: seconds between the full dumps. 0 only resyncs at start and after lost notifications
+            @param dump: function(interface) that returns {mac: fields}, e.g. get_iw_stations()
+            @param use_hostapd: listen to hostapd's control socket
+            @param use_nl80211: listen to nl80211's 'mlme' notifications
+            @param ctrl_dir: hostapd's ctrl_interface directory
+            @param callbacks: list of function(event, interface, mac), called for each change
+                              (event is CONNECTED or DISCONNECTED)
+            @param clock: function that returns the timestamps
+        """
+        self.interfaces = list(interfaces)
+        self.resync_interval = resync_interval
+        self.dump = dump
+        self.use_hostapd = use_hostapd
+        self.use_nl80211 = use_nl80211
+        self.ctrl_dir = ctrl_dir
+        self.callbacks = list(callbacks or [])
+        self.clock = clock
+        self.events = 0  # notifications applied
+        self.resyncs = 0
+        self.sources = []  # the notification sources running, e.g. ['hostapd:wlan0', 'nl80211']
+        self._stations = dict([(iface, dict()) for iface in self.interfaces])
+        self._recording = dict()  # {interface: [[(event, mac, timestamp)] of each dump running]}, see resync()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._resync_needed = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """ resyncs all interfaces and starts listening to the notifications """
+        self._stop.clear()
+        self.resync()
+        self.sources = []
+        replay = replaying()
+        if replay:
+            LOG.info("replay: no station notifications")
+        if self.use_nl80211 and not replay:
+            try:
+                events = Nl80211Events(['mlme'])
+                self._spawn(self._listen_nl80211, events, 'station-tracker-nl80211')
+                self.sources.append('nl80211')
+            except Nl80211Error as e:
+                LOG.info("nl80211 station notifications not available: {}".format(e))
+        if self.use_hostapd and not replay:
+            for iface in self.interfaces:
+                ctrl = HostapdCtrl(iface, ctrl_dir=self.ctrl_dir)
+                try:
+                    ctrl.open()
+                    if not ctrl.attach():
+                        raise HostapdCtrlError("ATTACH refused")
+                except HostapdCtrlError as e:
+                    LOG.info("hostapd events of {} not available: {}".format(iface, e))
+                    ctrl.close()
+                    continue
+                self._spawn(self._listen_hostapd, ctrl, 'station-tracker-{}'.format(iface))
+                self.sources.append('hostapd:{}'.format(iface))
+        if len(self.sources) == 0:
+            LOG.info("no station notifications: the stations are only updated every {} s".format(self.resync_interval))
+        self._spawn(self._resync_loop, None, 'station-tracker-resync')
+
+    def _spawn(self, target, arg, name):
+        thread = threading.Thread(target=target, args=(arg,), name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._resync_needed.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self.sources = []
+
+    def stations(self, interface):
+        """ @return: {mac: {'connected_at': timestamp}} of the interface, or None if it is not tracked """
+        with self._lock:
+            stations = self._stations.get(interface)
+            if stations is None:
+                return None
+            return dict([(mac, {'connected_at': t}) for mac, t in stations.items()])
+
+    def num_stations(self, interface):
+        """ @return: the number of stations of the interface, or None if it is not tracked """
+        stations = self._stations.get(interface)
+        return None if stations is None else len(stations)
+
+    def tracks(self, interface):
+        return interface in self._stations
+
+    def handle_event(self, event, interface, mac, timestamp=None):
+        """ applies an association (CONNECTED) or a disassociation (DISCONNECTED) of mac """
+        mac = mac.lower()
+        timestamp = self.clock() if timestamp is None else timestamp
+        with self._lock:
+            stations = self._stations.get(interface)
+            if stations is None:
+                return
+            for events in self._recording.get(interface, []):
+                events.append((event, mac, timestamp))  # replayed onto the dump (see resync())
+            if event == CONNECTED:
+                if mac in stations:
+                    return  # the same event from the other source
+                stations[mac] = timestamp
+            elif stations.pop(mac, None) is None:
+                return
+            self.events += 1
+        LOG.debug("{} {} {}".format(interface, mac, event))
+        for callback in self.callbacks:
+            callback(event, interface, mac)
+
+    def resync(self, interface=None):
+        """ rebuilds the stations of the interface (None: all) from a full dump. The connection timestamps of the
+            stations already known are kept, the others are estimated from their "connected time".
+            The notifications received during the dump are applied to its result, in their order: the dump
+            may have been taken before or after each of them, the last notification of a station is its state
+        """
+        for iface in (self.interfaces if interface is None else [interface]):
+            events = []
+            with self._lock:
+                self._recording.setdefault(iface, []).append(events)
+            try:
+                dump = self.dump(iface)
+            except Exception as e:
+                LOG.error("station dump of {}: {}".format(iface, e))
+                continue
+            finally:
+                with self._lock:
+                    self._recording[iface].remove(events)
+                    if len(self._recording[iface]) == 0:
+                        del self._recording[iface]
+            now = self.clock()
+            changes = []
+            with self._lock:
+                old = self._stations.get(iface, dict())
+                new = dict()
+                for mac, fields in dump.items():
+                    mac = mac.lower()
+                    connected = fields.get('connected time') if isinstance(fields, dict) else None
+                    new[mac] = old.get(mac, now - connected if isinstance(connected, (int, float)) else now)
+                for event, mac, timestamp in events:
+                    if event == CONNECTED:
+                        new.setdefault(mac, old.get(mac, timestamp))
+                    else:
+                        new.pop(mac, None)
+                changes += [(CONNECTED, mac) for mac in new if mac not in old]
+                changes += [(DISCONNECTED, mac) for mac in old if mac not in new]
+                self._stations[iface] = new
+                self.resyncs += 1
+            if len(changes) > 0:
+                LOG.debug("resync {}: {} changes missed".format(iface, len(changes)))
+            for event, mac in changes:
+                for callback in self.callbacks:
+                    callback(event, iface, mac)
+
+    def _resync_loop(self, _):
+        while not self._stop.is_set():
+            self._resync_needed.wait(self.resync_interval if self.resync_interval > 0 else None)
+            if self._stop.is_set():
+                return
+            self._resync_needed.clear()
+            self.resync()
+
+    def _listen_hostapd(self, ctrl):
+        try:
+            while not self._stop.is_set():
+                try:
+                    event = ctrl.recv_event(1.0)
+                except HostapdCtrlError as e:
+                    LOG.debug("hostapd events of {}: {}".format(ctrl.interface, e))
+                    self._resync_needed.set()  # events lost while reconnecting
+                    if self._stop.wait(1.0):
+                        return
+                    try:
+                        ctrl.close()
+                        ctrl.open()
+                        ctrl.attach()
+                    except HostapdCtrlError:
+                        pass
+                    continue
+                if event is None:
+                    continue
+                words = event[1].split()
+                if len(words) >= 2 and words[0] in HOSTAPD_EVENTS:
+                    self.handle_event(HOSTAPD_EVENTS[words[0]], ctrl.interface, words[1])
+        finally:
+            ctrl.close()
+
+    def _listen_nl80211(self, events):
+        try:
+            while not self._stop.is_set():
+                try:
+                    notifications = events.recv(1.0)
+                except Nl80211Error as e:
+                    LOG.debug(e)
+                    self._resync_needed.set()  # notifications lost
+                    continue
+                for cmd, attrs in notifications:
+                    if cmd not in NL80211_EVENTS or 'addr' not in attrs:
+                        continue
+                    interface = attrs.get('Interface')
+                    if interface is None and 'ifindex' in attrs:
+                        try:
+                            interface = socket.if_indextoname(attrs['ifindex'])
+                        except OSError:
+                            continue
+                    self.handle_event(NL80211_EVENTS[cmd], interface, attrs['addr'])
+        finally:
+            events.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Follow the associations and disassociations.')
+    parser.add_argument('--iface', type=str, nargs='*', default=['wlan0'], help='interfaces')
+    parser.add_argument('--resync-interval', type=float, default=60.0, help='seconds between the full dumps')
+    args = parser.parse_args()
+
+    tracker = StationTracker(args.iface, resync_interval=args.resync_interval,
+                             callbacks=[lambda event, iface, mac: print(time.ctime(), iface, mac, event)])
+    tracker.start()
+    print("sources: {}".format(tracker.sources))
+    try:
+        while True:
+            time.sleep(10)
+            print(dict([(iface, tracker.num_stations(iface)) for iface in args.iface]))
+    except KeyboardInterrupt:
+        tracker.stop()
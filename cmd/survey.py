@@ -1,23 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-    convert the output of iw dev station dump into a dictionary
+    convert the output of iw dev survey dump into a dictionary
 
 """
 import re
 
 
+_number = re.compile(r"[-+]?\d*\.\d+|[-+]?\d+")
+
+
 def decode_survey(data):
     """ decodes the data provided by "iw survey dump"
 
     @param data: output from iw dev survey dump
-    @return: dictionary of dictionary
-             {2432: {'noise': '-95 dBm',
+    @return: dictionary of dictionary, the numbers as float, the noise in signed dBm (as the nl80211 backend)
+             {2432: {'noise': -95.0,
                     'in use': True,
-                    'channel transmit time': '713 ms',
-                    'channel busy time': '9479 ms',
-                    'channel active time': '54259 ms',
-                    'channel receive time': '8279 ms'},
+                    'channel transmit time': 713.0,
+                    'channel busy time': 9479.0,
+                    'channel active time': 54259.0,
+                    'channel receive time': 8279.0},
               2467: {},
               }
     """
@@ -37,10 +40,9 @@ def decode_survey(data):
             try:
                 k = _l[0]
                 v = _l[1]
-                f = re.findall(r"[-+]?\d*\.\d+|\d+", v)
-                if len(f) > 0:
-                    v = f[0]
-                    v = float(v)
+                f = _number.search(v)
+                if f is not None:
+                    v = float(f.group())
                 result[freq][k] = v
             except IndexError:
                 pass
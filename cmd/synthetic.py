@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    synthetic outputs of the commands and files read by command_ap, with the formats of a real ath9k AP
+
+    used by the replay executor (see executor.py) and the benchmarks, to run without a wireless card.
+    The same seed generates the same output.
+
+
+    Usage:
+    ------
+
+    data = synthetic_iw_station(50)  # "iw dev wlan0 station dump" with 50 stations
+    stations = decode_iw_station(data)
+"""
+import random
+
+from cmd.xmit import lines_with_queue_data, ACS
+
+
+iw_station_template = """Station {mac} (on {interface})
+\tinactive time:\t{inactive} ms
+\trx bytes:\t{rxb}
+\trx packets:\t{rxp}
+\ttx bytes:\t{txb}
+\ttx packets:\t{txp}
+\ttx retries:\t{txr}
+\ttx failed:\t{txf}
+\trx drop misc:\t{rxdrop}
+\tsignal:  \t{signal} [{signal}, {signal2}] dBm
+\tsignal avg:\t{signal} [{signal}, {signal2}] dBm
+\ttx bitrate:\t{txrate:.1f} MBit/s MCS 7 short GI
+\trx bitrate:\t{rxrate:.1f} MBit/s MCS 5
+\texpected throughput:\t{throughput:.3f}Mbps
+\tauthorized:\tyes
+\tauthenticated:\tyes
+\tassociated:\tyes
+\tpreamble:\tshort
+\tWMM/WME:\tyes
+\tMFP:\t\tno
+\tTDLS peer:\tno
+\tDTIM period:\t2
+\tbeacon interval:100
+\tshort preamble:yes
+\tshort slot time:yes
+\tconnected time:\t{connected} seconds
+\tassociated at [boottime]:\t{boottime:.3f}s
+\tassociated at:\t{assoc} ms
+\tcurrent time:\t{now} ms
+"""
+
+hostapd_station_template = """{mac}
+flags=[AUTH][ASSOC][AUTHORIZED][SHORT_PREAMBLE][WMM][HT]
+aid=1
+capability=0x431
+listen_interval=10
+supported_rates=82 84 8b 96 0c 12 18 24 30 48 60 6c
+timeout_next=NULLFUNC POLL
+dot11RSNAStatsSTAAddress={mac}
+dot11RSNAStatsVersion=1
+dot11RSNAStatsSelectedPairwiseCipher=00-0f-ac-4
+dot11RSNAStatsTKIPLocalMICFailures=0
+dot11RSNAStatsTKIPRemoteMICFailures=0
+wpa=2
+AKMSuiteSelector=00-0f-ac-2
+hostapdWPAPTKState=11
+hostapdWPAPTKGroupState=0
+rx_packets={rxp}
+tx_packets={txp}
+rx_bytes={rxb}
+tx_bytes={txb}
+inactive_msec={inactive}
+signal={signal}
+rx_rate_info={rxrate10}
+tx_rate_info={txrate10} mcs 7 shortGI
+connected_time={connected}
+"""
+
+bss_template = """BSS {mac}(on {interface}){assoc}
+\tTSF: {tsf} usec (0d, 05:19:27)
+\tfreq: {freq}
+\tbeacon interval: 100 TUs
+\tcapability: ESS Privacy ShortSlotTime (0x0411)
+\tsignal: {signal:.2f} dBm
+\tlast seen: {seen} ms
+\tInformation elements from Probe Response frame:
+\tSSID: {ssid}
+\tSupported rates: 1.0* 2.0* 5.5* 11.0* 6.0 9.0 12.0 18.0
+\tDS Parameter set: channel {channel}
+\tCountry: BR\tEnvironment: Indoor/Outdoor
+\t\tChannels [1 - 13] @ 30 dBm
+\tERP: <no flags>
+\tExtended supported rates: 24.0 36.0 48.0 54.0
+\tRSN:\t * Version: 1
+\t\t * Group cipher: CCMP
+\t\t * Pairwise ciphers: CCMP
+\t\t * Authentication suites: PSK
+\t\t * Capabilities: 16-PTKSA-RC 1-GTKSA-RC (0x000c)
+\tBSS Load:
+\t\t * station count: {stations}
+\t\t * channel utilisation: {util}/255
+\t\t * available admission capacity: 0 [*32us]
+\tHT capabilities:
+\t\tCapabilities: 0x1ad
+\t\t\tRX LDPC
+\t\t\tHT20
+\t\tMaximum RX AMPDU length 65535 bytes (exponent: 0x003)
+\tHT operation:
+\t\t * primary channel: {channel}
+\t\t * secondary channel offset: no secondary
+\t\t * STA channel width: 20 MHz
+\tOverlapping BSS scan params:
+\t\t * passive dwell: 20 TUs
+\t\t * active dwell: 10 TUs
+\tWMM:\t * Parameter version 1
+\t\t * u-APSD
+\t\t * BE: CW 15-1023, AIFSN 3
+\t\t * BK: CW 15-1023, AIFSN 7
+\t\t * VI: CW 7-15, AIFSN 2, TXOP 3008 usec
+\t\t * VO: CW 3-7, AIFSN 2, TXOP 1504 usec
+"""
+
+iw_info_template = """Interface {interface}
+\tifindex {ifindex}
+\twdev 0x1
+\taddr {address}
+\tssid {ssid}
+\ttype AP
+\twiphy {wiphy}
+\tchannel {channel} ({freq} MHz), width: 20 MHz, center1: {freq} MHz
+\ttxpower {txpower:.2f} dBm
+"""
+
+iwconfig_template = """{interface}  IEEE 802.11bgn  Mode:Master  Tx-Power={txpower} dBm
+          Retry short limit:7   RTS thr:off   Fragment thr:off
+          Power Management:off
+
+"""
+
+ifconfig_template = """{interface}  Link encap:Ethernet  HWaddr {address}
+          inet6 addr: fe80::ff:fe01:0/64 Scope:Link
+          UP BROADCAST RUNNING MULTICAST  MTU:1500  Metric:1
+          RX packets:{rxp} errors:0 dropped:{rxdrop} overruns:0 frame:0
+          TX packets:{txp} errors:0 dropped:{txdrop} overruns:0 carrier:0
+          collisions:0 txqueuelen:1000
+          RX bytes:{rxb} ({rxmb:.1f} MB)  TX bytes:{txb} ({txmb:.1f} MB)
+
+"""
+
+hostapd_status_template = """Selected interface '{interface}'
+state=ENABLED
+phy={phy}
+freq={freq}
+num_sta_non_erp=0
+num_sta_no_short_slot_time=0
+num_sta_no_short_preamble=0
+olbc=0
+num_sta_ht_no_gf={num_sta}
+num_sta_no_ht=0
+num_sta_ht_20_mhz={num_sta}
+num_sta_ht40_intolerant=0
+olbc_ht=1
+ht_op_mode=0x15
+cac_time_seconds=0
+cac_time_left_seconds=N/A
+channel={channel}
+secondary_channel=0
+ieee80211n=1
+ieee80211ac=0
+bss[0]={interface}
+bssid[0]={address}
+ssid[0]={ssid}
+num_sta[0]={num_sta}
+"""
+
+hostapd_config_template = """Selected interface '{interface}'
+bssid={address}
+ssid={ssid}
+wps_state=disabled
+wpa=2
+key_mgmt=WPA-PSK
+group_cipher=CCMP
+rsn_pairwise_cipher=CCMP
+"""
+
+
+def channel_to_freq(channel):
+    """ @return: the frequency in MHz of a 2.4 GHz channel """
+    return 2484 if channel == 14 else 2407 + 5 * channel
+
+
+def station_mac(i):
+    """ @return: the mac of the i-th synthetic station """
+    return '02:00:00:00:{:02x}:{:02x}'.format(i // 256 % 256, i % 256)
+
+
+def _station_values(rnd, i):
+    txrate = rnd.choice([6.5, 13.0, 19.5, 26.0, 39.0, 52.0, 58.5, 65.0])
+    rxrate = rnd.choice([1.0, 6.0, 24.0, 54.0, 65.0])
+    return dict(mac=station_mac(i),
+                inactive=rnd.randint(0, 60000), rxb=rnd.randint(0, 10 ** 9), rxp=rnd.randint(0, 10 ** 6),
+                txb=rnd.randint(0, 10 ** 9), txp=rnd.randint(0, 10 ** 6), txr=rnd.randint(0, 10 ** 4),
+                txf=rnd.randint(0, 100), rxdrop=rnd.randint(0, 100),
+                signal=-rnd.randint(30, 90), signal2=-rnd.randint(30, 90),
+                txrate=txrate, rxrate=rxrate, txrate10=int(txrate * 10), rxrate10=int(rxrate * 10),
+                throughput=rnd.uniform(1, 60), connected=rnd.randint(0, 10 ** 5),
+                boottime=rnd.uniform(0, 10 ** 5), assoc=rnd.randint(0, 10 ** 12), now=rnd.randint(0, 10 ** 12))
+
+
+def synthetic_iw_station(num_stations=50, seed=1, interface='wlan0'):
+    """ @return: the output of "iw dev <interface> station dump" with num_stations stations """
+    rnd = random.Random(seed)
+    return ''.join([iw_station_template.format(interface=interface, **_station_values(rnd, i))
+                    for i in range(num_stations)])
+
+
+def synthetic_hostapd_station(num_stations=50, seed=1):
+    """ @return: the output of "hostapd_cli all_sta" with num_stations stations (the same as synthetic_iw_station) """
+    rnd = random.Random(seed)
+    return ''.join([hostapd_station_template.format(**_station_values(rnd, i)) for i in range(num_stations)])
+
+
+def synthetic_scan(num_bss=500, seed=1, interface='wlan0'):
+    """ @return: the output of "iw dev <interface> scan dump" with num_bss BSSes """
+    rnd = random.Random(seed)
+    out = []
+    for i in range(num_bss):
+        channel = rnd.randint(1, 13)
+        out.append(bss_template.format(mac='02:00:00:00:{:02x}:{:02x}'.format(i // 256 % 256, i % 256),
+                                       interface=interface, assoc=' -- associated' if i == 0 else '',
+                                       tsf=rnd.randint(0, 10 ** 10), freq=channel_to_freq(channel), channel=channel,
+                                       signal=-rnd.uniform(30, 95), seen=rnd.randint(0, 5000),
+                                       ssid='net-{}'.format(i), stations=rnd.randint(0, 40),
+                                       util=rnd.randint(0, 255)))
+    return ''.join(out)
+
+
+def synthetic_survey(channel=6, seed=1, interface='wlan0'):
+    """ @return: the output of "iw dev <interface> survey dump" for channels 1-13, channel in use """
+    rnd = random.Random(seed)
+    out = []
+    for c in range(1, 14):
+        out.append('Survey data from {}\n'.format(interface))
+        out.append('\tfrequency:\t\t\t{} MHz{}\n'.format(channel_to_freq(c), ' [in use]' if c == channel else ''))
+        out.append('\tnoise:\t\t\t\t{} dBm\n'.format(-rnd.randint(85, 95)))
+        active = rnd.randint(10 ** 3, 10 ** 9) if c == channel else rnd.randint(100, 5000)
+        busy = rnd.randint(0, active)
+        receive = rnd.randint(0, busy)
+        out.append('\tchannel active time:\t\t{} ms\n'.format(active))
+        out.append('\tchannel busy time:\t\t{} ms\n'.format(busy))
+        out.append('\tchannel receive time:\t\t{} ms\n'.format(receive))
+        out.append('\tchannel transmit time:\t\t{} ms\n'.format(busy - receive))
+    return ''.join(out)
+
+
+def synthetic_xmit(seed=1):
+    """ @return: the content of an ath9k debugfs xmit file """
+    rnd = random.Random(seed)
+    out = ['{:>30}{:>11}{:>10}{:>10}'.format(*ACS)]
+    for name in lines_with_queue_data:
+        values = [rnd.randint(0, 10 ** 8) for _ in ACS]
+        out.append('{:<17}{:>13}{:>11}{:>10}{:>10}'.format(name + ':', *values))
+    out.append('')
+    for q, ac in enumerate(['VO', 'VI', 'BE', 'BK', 'CAB']):
+        out.append('({}):  qnum: {} qdepth: {:2d} ampdu-depth: {:2d} pending: {:3d} stopped: 0'.format(
+            ac, 3 - q if q < 4 else 8, rnd.randint(0, 10), rnd.randint(0, 10), rnd.randint(0, 100)))
+    return '\n'.join(out) + '\n'
+
+
+def synthetic_proc_net_dev(interfaces=('lo', 'eth0', 'wlan0'), seed=1):
+    """ @return: the content of /proc/net/dev """
+    rnd = random.Random(seed)
+    out = ['Inter-|   Receive                                                |  Transmit',
+           ' face |bytes    packets errs drop fifo frame compressed multicast|'
+           'bytes    packets errs drop fifo colls carrier compressed']
+    for iface in interfaces:
+        rx = [rnd.randint(0, 10 ** 10), rnd.randint(0, 10 ** 7), 0, rnd.randint(0, 100), 0, 0, 0, 0]
+        tx = [rnd.randint(0, 10 ** 10), rnd.randint(0, 10 ** 7), 0, rnd.randint(0, 100), 0, 0, 0, 0]
+        out.append('{:>6}: '.format(iface) + ' '.join(['{:>8}'.format(v) for v in rx + tx]))
+    return '\n'.join(out) + '\n'
+
+
+def synthetic_ifconfig(interface='wlan0', seed=1):
+    """ @return: the output of "ifconfig <interface>" (net-tools format) """
+    rnd = random.Random(seed)
+    rxb, txb = rnd.randint(0, 10 ** 10), rnd.randint(0, 10 ** 10)
+    return ifconfig_template.format(interface=interface, address='02:00:00:01:00:00',
+                                    rxp=rnd.randint(0, 10 ** 7), txp=rnd.randint(0, 10 ** 7),
+                                    rxdrop=rnd.randint(0, 100), txdrop=rnd.randint(0, 100),
+                                    rxb=rxb, txb=txb, rxmb=rxb / 1e6, txmb=txb / 1e6)
+
+
+def synthetic_interface(interface='wlan0', index=0, channel=6, txpower=15.0, num_stations=10):
+    """ @return: the parameters of the templates of an AP interface """
+    return dict(interface=interface, ifindex=3 + index, wiphy=index, phy='phy{}'.format(index),
+                address='02:00:00:01:00:{:02x}'.format(index), ssid='synthetic-{}'.format(index),
+                channel=channel, freq=channel_to_freq(channel), txpower=txpower, num_sta=num_stations)
@@ -5,8 +5,20 @@
 
     This module decodes the "xmit" file.
     Returns a dictionary with all decoded fields.
+
+    decode_xmit() opens and decodes the file on each call.
+    XmitReader keeps the file open and decodes it into a fixed layout of numbers, for fast polling:
+
+        reader = XmitReader('/sys/kernel/debug/ieee80211/phy0/ath9k/xmit')
+        timestamp, values, queues = reader.read()   # values[reader.index('AMPDUs Completed', 'BE')]
+        sample, delta, rate = reader.update()       # changes since the previous update()
 """
 from __future__ import print_function
+import errno
+import os
+import threading
+import time
+from array import array
 from os.path import exists
 
 
@@ -72,6 +84,191 @@ def decode_xmit(filename):
     return result
 
 
+"""access categories, in the order of the columns of the xmit file"""
+ACS = ['BE', 'BK', 'VI', 'VO']
+
+# the xmit counters are 32 bits
+COUNTER_WRAP = 2 ** 32
+
+
+class XmitReader(object):
+    """ keeps the xmit file open and decodes it into an array of counters x ACs:
+        values[i * 4 + j] is the counter lines_with_queue_data[i] of the access category ACS[j]
+
+        Thread safe: the reads, the line table and the previous sample of update() are protected by a lock
+    """
+
+    def __init__(self, filename, counters=None, clock=time.monotonic):
+        """
+            @param filename: full path to xmit
+            @param counters: the lines to decode. None uses lines_with_queue_data
+            @param clock: function that returns the time of the samples in seconds
+        """
+        self.filename = filename
+        self.counters = list(lines_with_queue_data if counters is None else counters)
+        self.clock = clock
+        # line table: {title of the line: offset of its first value in the array}
+        self._rows = dict([(name, i * len(ACS)) for i, name in enumerate(self.counters)])
+        self._size = len(self.counters) * len(ACS)
+        self._buffer_size = 8192
+        self._layout = None  # see learn()
+        self._dense = False
+        self._queue_lines = None
+        self._keys = None  # the keys of to_dict()
+        self.previous = None
+        self._lock = threading.RLock()
+        self.fd = os.open(filename, os.O_RDONLY)
+
+    def close(self):
+        """ closes the file. The reads that follow raise OSError """
+        with self._lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def index(self, counter, ac):
+        """ @return: the position of (counter, ac) in the values array """
+        return self._rows[counter] + ACS.index(ac)
+
+    def read_raw(self):
+        """ @return: the current content of the file (debugfs regenerates it on each read from offset 0)
+            @rtype: str
+        """
+        with self._lock:
+            return self._read_raw()
+
+    def _read_raw(self):
+        if self.fd is None:
+            raise OSError(errno.EBADF, "{} is closed".format(self.filename))
+        while True:
+            data = os.pread(self.fd, self._buffer_size, 0)
+            if len(data) < self._buffer_size:
+                return data.decode('ascii', errors='replace')
+            self._buffer_size *= 2  # the file did not fit
+
+    def learn(self, lines):
+        """ builds the line table of the file:
+            counters: [(line number, offset in the values array, text before the values)]
+            queues: [(line number, text before the values, [(key, position of the value in the line's words)])]
+        """
+        layout, queue_lines = [], []
+        for n, line in enumerate(lines):
+            p = line.find(':')
+            if p < 0:
+                continue
+            name = line[:p].strip()
+            if name in self._rows:
+                layout.append((n, self._rows[name], line[:p + 1]))
+            elif name.startswith('('):
+                # (VO):  qnum: 3 qdepth:  0 ampdu-depth:  0 pending:   0
+                words = line[p + 1:].split()
+                keys = [('{}_{}'.format(name[1:-1], words[j].rstrip(':')), j + 1) for j in range(0, len(words) - 1, 2)]
+                queue_lines.append((n, line[:p + 1], keys))
+            elif name.startswith('qlen_'):
+                queue_lines.append((n, line[:p + 1], [(name, 0)]))  # qlen_be: 0
+        self._layout = layout
+        self._queue_lines = queue_lines
+        self._keys = None
+        # all counters, in the order of the array, with one value per AC: decoded by a single conversion
+        self._dense = [i for _, i, _ in layout] == list(range(0, self._size, len(ACS))) and \
+            all(len(lines[k][len(prefix):].split()) == len(ACS) for k, _, prefix in layout)
+
+    def decode(self, data):
+        """ @param data: the content of the xmit file
+            @return: (values, queues), where values is an array of counters x ACs
+                     and queues = {'<AC>_<field>': int} from the queue lines, e.g. 'VO_ampdu-depth'
+        """
+        lines = data.split('\n')
+        with self._lock:
+            return self._decode(lines)
+
+    def _decode(self, lines):
+        if self._layout is None or not self._matches(lines):
+            self.learn(lines)  # first read, or the layout of the file changed
+        values = None
+        if self._dense:
+            fields = []
+            for k, _, prefix in self._layout:
+                fields += lines[k][len(prefix):].split()
+            if len(fields) == self._size:
+                values = array('q', map(int, fields))
+        if values is None:
+            values = array('q', bytes(8 * self._size))
+            n = len(ACS)
+            for k, i, prefix in self._layout:
+                values[i:i + n] = array('q', map(int, lines[k][len(prefix):].split()[:n]))
+        queues = dict()
+        for k, prefix, keys in self._queue_lines:
+            words = lines[k][len(prefix):].split()
+            for key, j in keys:
+                if j < len(words):
+                    queues[key] = int(words[j])
+        return values, queues
+
+    def _matches(self, lines):
+        """ @return: True if the lines have the layout learned before """
+        try:
+            return all(lines[k].startswith(prefix) for k, _, prefix in self._layout) and \
+                all(lines[k].startswith(prefix) for k, prefix, _ in self._queue_lines)
+        except IndexError:
+            return False
+
+    def read(self):
+        """ @return: (timestamp, values, queues) (see decode()) """
+        with self._lock:
+            timestamp = self.clock()
+            values, queues = self.decode(self._read_raw())
+            return timestamp, values, queues
+
+    def to_dict(self, values, queues=None):
+        """ @return: the sample with the keys of decode_xmit(), e.g. {'MPDUs Queued_BE': 10, ...}, as integers """
+        with self._lock:
+            if self._keys is None:
+                # only the lines present in the file, as decode_xmit()
+                present = sorted(i for _, i, _ in self._layout or [])
+                self._keys = [('{}_{}'.format(self.counters[i // len(ACS)], ac), i + j)
+                              for i in present for j, ac in enumerate(ACS)]
+            keys = self._keys
+        result = dict([(k, values[i]) for k, i in keys])
+        if queues is not None:
+            result.update(queues)
+        return result
+
+    def read_dict(self):
+        """ @return: the current sample with the keys of decode_xmit() """
+        with self._lock:  # the keys of the layout of this sample
+            _, values, queues = self.read()
+            return self.to_dict(values, queues)
+
+    @staticmethod
+    def delta(previous, current):
+        """ @return: the increment of each counter between two values arrays (handles 32 bits wrap) """
+        return array('q', [c - p if c >= p else c + COUNTER_WRAP - p for p, c in zip(previous, current)])
+
+    def update(self):
+        """ reads a new sample and compares it with the sample of the previous update()
+
+            @return: (sample, delta, rate), where sample = (timestamp, values, queues),
+                     delta = the increment of each counter and rate = the increment per second.
+                     delta and rate are None in the first call
+        """
+        with self._lock:
+            sample = self.read()
+            previous, self.previous = self.previous, sample
+        if previous is None:
+            return sample, None, None
+        interval = sample[0] - previous[0]
+        delta = self.delta(previous[1], sample[1])
+        rate = [d / interval if interval > 0 else 0.0 for d in delta]
+        return sample, delta, rate
+
+
 if __name__ == "__main__":
     import argparse
 
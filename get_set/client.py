@@ -2,17 +2,36 @@
 # -*- coding: utf-8 -*-
 """
     the server accepts requests from an http client.
-    this module is uses to send commands to the AP, for testing purposes.
+    this module is uses to send commands to the AP.
 
+    APClient keeps a persistent HTTP/1.1 connection to one AP server and
+    APClientPool keeps connections to many APs, so a controller can poll hundreds of APs from one process.
 
-    Usage:
-    python3 server.py [--port 8080]
+    The responses are requested in MessagePack. Pickle (fmt=wire.PICKLE) must be asked for explicitly:
+    unpickling a response runs code chosen by whoever answers, so only use it with trusted servers.
+
+
+    Usage from command line:
+    python3 -m get_set.client [--server localhost] [--port 8080] [--url /get_info]
+
+
+    Usage from program:
+    pool = APClientPool(timeout=2, retries=1)
+    info = pool.request('10.0.0.1', 8080, '/get_info', {'iface': 'wlan0'})
+    results = pool.request_many([('10.0.0.1', 8080, '/get_survey', {'iface': 'wlan0'}),
+                                 ('10.0.0.2', 8080, '/get_survey', {'iface': 'wlan0'})])
 """
 import argparse
-import pickle
 import http.client
+import json
+import queue
+import socket
+import threading
 import urllib.parse
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from get_set import wire
 
 """ used to assert the valid commands.
     does not cover all available commands.
@@ -23,23 +42,248 @@ valid_urls = ['/', '/test',
               '/get_power', '/set_power',
               '/get_channel',
               '/get_iwconfig',
+              '/get_config', '/get_status',
               '/get_stations',
-              '/get_num_stations',
+              '/get_num_stations', '/get_station_list',
               '/get_scan', '/get_scan_mac',
               '/get_xmit',
               '/get_features',
-              '/get_mos_client', '/get_mos_hybrid', '/get_mos_ap'
+              '/history', '/get_sampler_stats',
+              '/batch',
               ]
 
+"""errors that mean the connection must be reopened (e.g. the server closed an idle connection)"""
+connection_errors = (http.client.HTTPException, ConnectionError, socket.timeout, OSError)
+
+"""errors of a reused connection that the server closed before reading the request (idle timeout, see myHandler)"""
+stale_errors = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+
+class APError(Exception):
+    """ raised when the AP server answers with an error, or cannot be reached """
+
+    def __init__(self, msg, status=None):
+        super().__init__(msg)
+        self.status = status
+
+
+class _NotSent(Exception):
+    """ the request did not reach the server: it can be sent again, even a setter """
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+class APClient(object):
+    """ persistent HTTP/1.1 connection to one AP server. Not thread safe: use one client per thread,
+        or APClientPool
+    """
+
+    def __init__(self, host, port=8080, timeout=5.0, retries=1, fmt=wire.MSGPACK):
+        """
+            @param host: the AP server's address
+            @param port: the AP server's port
+            @param timeout: seconds to wait for the connection and for each response
+            @param retries: number of times a request that did not reach the server is sent again
+                            (with a new connection). A request that may have reached it (e.g. a timeout waiting
+                            for the response) is never sent again: the command could run twice
+            @param fmt: the response format requested in Accept (see get_set/wire.py).
+                        A pickled response is refused unless fmt is wire.PICKLE
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.retries = retries
+        self.fmt = fmt
+        self.conn = None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _send(self, method, url, body=None, headers=None):
+        """ @raise _NotSent: the server did not receive the request: the connection failed,
+                             or the server had closed the reused connection
+        """
+        reused = self.conn is not None
+        if not reused:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.connect()
+            except connection_errors as e:
+                raise _NotSent(e)
+        h = {'Accept': self.fmt}
+        if headers is not None:
+            h.update(headers)
+        try:
+            self.conn.request(method, url, body=body, headers=h)
+        except stale_errors as e:
+            if reused:
+                raise _NotSent(e)
+            raise
+        try:
+            resp = self.conn.getresponse()
+        except stale_errors as e:
+            if reused:
+                raise _NotSent(e)  # closed without a byte of response: the request was not read
+            raise
+        data = resp.read()  # the whole body must be read before the connection is reused
+        if resp.will_close:
+            self.close()
+        return resp, data
+
+    def send(self, method, url, body=None, headers=None):
+        """ sends the request, reconnecting and retrying when it did not reach the server
+
+            @return: the decoded response
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                resp, data = self._send(method, url, body, headers)
+                break
+            except _NotSent as e:
+                self.close()
+                if attempt == self.retries:
+                    raise APError("{}:{}{} failed: {}".format(self.host, self.port, url, e.error))
+            except connection_errors as e:
+                self.close()  # the server may have run the command: not sent again
+                raise APError("{}:{}{} failed: {}".format(self.host, self.port, url, e))
+        if resp.status != 200:
+            raise APError("{}:{}{} returned {}".format(self.host, self.port, url, resp.status), resp.status)
+        content_type = resp.getheader('Content-type')
+        media_type = (content_type or '').split(';')[0].strip()
+        if self.fmt != wire.PICKLE and not media_type.startswith('text/') and \
+                wire.media_types.get(media_type, wire.PICKLE) == wire.PICKLE:
+            raise APError("{}:{}{} answered {} instead of {}".format(self.host, self.port, url, content_type, self.fmt))
+        return wire.decode(data, content_type)
+
+    def request(self, url, params=None):
+        """ sends a GET command
+
+            @param url: the command, e.g. '/get_info'
+            @param params: the query parameters, e.g. {'iface': 'wlan0'}
+            @return: the decoded response
+        """
+        if params:
+            url = "{}?{}".format(url, urllib.parse.urlencode(params, doseq=True))
+        return self.send('GET', url)
+
+    def batch(self, items):
+        """ executes several commands in one request (see myHandler.batch())
+
+            @param items: list of {'cmd': url, parameter: value}
+            @return: {'results': [...]}
+        """
+        body = json.dumps(items).encode('utf-8')
+        return self.send('POST', '/batch', body=body, headers={'Content-Type': 'application/json'})
+
+
+class APClientPool(object):
+    """ keeps up to `max_per_ap` idle connections to each AP server. Thread safe. """
+
+    def __init__(self, max_per_ap=2, timeout=5.0, retries=1, fmt=wire.MSGPACK, max_workers=32):
+        """
+            @param max_per_ap: idle connections kept to each AP
+            @param timeout: seconds to wait for the connection and for each response
+            @param retries: number of times a request that did not reach the server is sent again
+            @param fmt: the response format (see get_set/wire.py). wire.PICKLE only with trusted servers
+            @param max_workers: number of concurrent requests in request_many()
+        """
+        self.max_per_ap = max_per_ap
+        self.timeout = timeout
+        self.retries = retries
+        self.fmt = fmt
+        self.max_workers = max_workers
+        self._idle = dict()  # {(host, port): Queue of APClient}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _queue(self, host, port):
+        with self._lock:
+            if (host, port) not in self._idle:
+                self._idle[(host, port)] = queue.LifoQueue(maxsize=self.max_per_ap)
+            return self._idle[(host, port)]
+
+    def acquire(self, host, port):
+        """ @return: an idle client of the AP, or a new one """
+        try:
+            return self._queue(host, port).get_nowait()
+        except queue.Empty:
+            return APClient(host, port, timeout=self.timeout, retries=self.retries, fmt=self.fmt)
+
+    def release(self, client):
+        """ returns the client to the pool (or closes it if the pool is full) """
+        try:
+            self._queue(client.host, client.port).put_nowait(client)
+        except queue.Full:
+            client.close()
+
+    def request(self, host, port, url, params=None):
+        """ sends a GET command to one AP (see APClient.request()) """
+        client = self.acquire(host, port)
+        try:
+            return client.request(url, params)
+        finally:
+            self.release(client)
+
+    def batch(self, host, port, items):
+        """ executes several commands in one AP (see APClient.batch()) """
+        client = self.acquire(host, port)
+        try:
+            return client.batch(items)
+        finally:
+            self.release(client)
+
+    def request_many(self, requests):
+        """ sends the requests concurrently
+
+            @param requests: list of (host, port, url, params)
+            @return: list with the response or the APError of each request, in the same order
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        def run(req):
+            try:
+                return self.request(*req)
+            except APError as e:
+                return e
+        return list(self._executor.map(run, requests))
+
+    def close(self):
+        """ closes all connections """
+        with self._lock:
+            idle, self._idle = self._idle, dict()
+            executor, self._executor = self._executor, None
+        for q in idle.values():
+            while not q.empty():
+                q.get_nowait().close()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Send commands to the AP.')
     parser.add_argument('--server', type=str, default='localhost', help='Set the server address')
     parser.add_argument('--port', type=int, default=8080, help='Set the server port')
     parser.add_argument('--url', type=str, default='/', help='url specifies the command')
-    parser.add_argument('--interface', type=str, default='wlan0', help='wireless interface at the remote device')
+    parser.add_argument('--interface', type=str, default='wlan0',
+                        help='wireless interface at the remote device, all for every interface')
     parser.add_argument('--txpower', type=str, default=15, help='set txpower when used with /set_power')
-    parser.add_argument('--mac', type=str, help='set station mac when used with /get_features')
+    parser.add_argument('--mac', type=str, help='station macs, comma separated, when used with /get_features (default all)')
+    parser.add_argument('--format', type=str, default=wire.MSGPACK, choices=[wire.PICKLE, wire.MSGPACK, wire.JSON],
+                        help='format of the response')
+    parser.add_argument('--cmd', type=str, nargs='*', default=[],
+                        help='commands executed by /batch, e.g. /get_info /get_survey')
 
     args = parser.parse_args()
 
@@ -48,11 +292,10 @@ if __name__ == "__main__":
         parser.print_help()
         sys.exit(0)
 
-    conn = http.client.HTTPConnection(args.server, args.port)
-
-    if args.url in ['/get_info', '/get_iwconfig',
+    if args.url in ['/get_info', '/get_iwconfig', '/get_config', '/get_status',
                     '/get_power',
-                    '/get_stations', '/get_num_stations',
+                    '/get_stations', '/get_num_stations', '/get_station_list',
+                    '/history',
                     ]:
         params = {'iface': args.interface}
         q = urllib.parse.urlencode(params)
@@ -61,6 +304,10 @@ if __name__ == "__main__":
         params = {'iface': args.interface, 'new_power': args.txpower}
         q = urllib.parse.urlencode(params)
         url = "{}?{}".format(args.url, q)
+    elif args.url in ['/batch']:
+        params = [('iface', args.interface)] + [('cmd', c) for c in args.cmd]
+        q = urllib.parse.urlencode(params)
+        url = "{}?{}".format(args.url, q)
     elif args.url in ['/get_features']:
         if args.mac is None:
             params = {'iface': args.interface}
@@ -72,18 +319,10 @@ if __name__ == "__main__":
         url = args.url
 
     # print(url)
-    try:
-        conn.request(method='GET', url=url)
-    except ConnectionRefusedError:
-        print("Error: Cannot connect to the server")
-        sys.exit(1)
-    resp = conn.getresponse()
-    print("status", resp.status)
-    if resp.status == 200:
-            """decode dictionary"""
-            try:
-                data = pickle.loads(resp.read())
-                print(data)
-            # print("received", data.values())
-            except:
-                pass
+    with APClient(args.server, args.port, fmt=args.format) as client:
+        try:
+            data = client.send('GET', url)
+        except APError as e:
+            print("Error: {}".format(e))
+            sys.exit(1)
+        print(data)
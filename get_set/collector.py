@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    collects the same commands from many AP servers concurrently, once per tick
+
+    each AP gets its commands in one /batch request (one round trip), all APs at the same time, so a tick takes
+    as long as the slowest AP that answers before its deadline, not the sum of the latencies.
+    The APs that do not answer before their deadline are stragglers: the tick does not wait for them, and an AP whose
+    previous request is still running is not asked again (it is reported as a straggler until it answers).
+
+    A snapshot is the merge of the answers of one tick:
+    {'tick': n, 'timestamp': time.time() of the start of the tick, 'duration': seconds,
+     'skew': seconds between the first and the last answer,
+     'aps': {name: {'timestamp': time.time() of the answer, 'latency': seconds,
+                    'results': {cmd: result}, 'errors': {cmd: message}}},
+     'stragglers': [names], 'errors': {name: message of the APs that failed},
+     'late_errors': {name: message of a straggler's request of an earlier tick that failed}}
+
+    The inventory is a list of {'name', 'host', 'port', 'iface', 'deadline'} (only host is required),
+    or a JSON file with this list.
+
+
+    Usage from command line:
+    python3 -m get_set.collector --inventory aps.json [--cmd /get_survey /get_features] [--deadline 1] [--interval 5]
+    python3 -m get_set.collector --ap 10.0.0.1:8080 10.0.0.2:8080 --cmd /get_num_stations
+
+
+    Usage from program:
+    collector = Collector(load_inventory('aps.json'), commands=['/get_survey', '/get_features'], deadline=1.0)
+    snapshot = collector.collect()
+    collector.run(interval=5, callback=process_snapshot)
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from get_set.client import APClientPool, APError, valid_urls
+
+
+LOG = logging.getLogger('COLLECTOR')
+
+DEFAULT_PORT = 8080
+DEFAULT_IFACE = 'wlan0'
+
+
+def load_inventory(filename):
+    """ @param filename: JSON file with a list of {'name', 'host', 'port', 'iface', 'deadline'}
+        @return: the inventory
+    """
+    with open(filename, 'r') as f:
+        return json.load(f)
+
+
+def parse_ap(text):
+    """ @return: the inventory entry of 'host[:port]' """
+    host, _, port = text.partition(':')
+    return {'host': host, 'port': int(port) if port else DEFAULT_PORT}
+
+
+class Collector(object):
+    """ sends the commands to all the APs of the inventory concurrently and merges the answers """
+
+    def __init__(self, inventory, commands=('/get_features',), deadline=1.0, params=None, pool=None, max_workers=64):
+        """
+            @param inventory: list of {'host', 'port', 'name', 'iface', 'deadline'}.
+                              The name defaults to host:port, the deadline to `deadline`
+            @param commands: the urls sent to each AP (see valid_urls)
+            @param deadline: seconds to wait for each AP, since the start of the tick
+            @param params: other parameters of the commands, e.g. {'delta': 1}
+            @param pool: the APClientPool. None creates one whose timeout is the largest deadline
+            @param max_workers: number of APs requested at the same time
+        """
+        for cmd in commands:
+            if cmd not in valid_urls:
+                raise ValueError("invalid command {}".format(cmd))
+        self.aps = dict()
+        for ap in inventory:
+            ap = dict(ap)
+            ap.setdefault('port', DEFAULT_PORT)
+            ap.setdefault('name', '{}:{}'.format(ap['host'], ap['port']))
+            ap.setdefault('iface', DEFAULT_IFACE)
+            ap.setdefault('deadline', deadline)
+            self.aps[ap['name']] = ap
+        self.commands = list(commands)
+        self.params = dict(params or dict())
+        timeout = max([ap['deadline'] for ap in self.aps.values()] + [deadline])
+        self.pool = APClientPool(max_per_ap=1, timeout=timeout, retries=0) if pool is None else pool
+        self.ticks = 0
+        self.stats = dict([(name, {'ok': 0, 'late': 0, 'errors': 0}) for name in self.aps])
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._pending = dict()  # {name: future of a request that missed its deadline}
+        self._stop = threading.Event()
+
+    def close(self):
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _request(self, ap):
+        """ sends the commands to one AP
+
+            @return: {'timestamp', 'latency', 'results': {cmd: result}, 'errors': {cmd: message}}
+        """
+        params = dict(self.params, iface=ap['iface'])
+        t0 = time.monotonic()
+        if len(self.commands) == 1:
+            results, errors = {self.commands[0]: self.pool.request(ap['host'], ap['port'], self.commands[0], params)}, {}
+        else:
+            answer = self.pool.batch(ap['host'], ap['port'], [dict(params, cmd=cmd) for cmd in self.commands])
+            results, errors = dict(), dict()
+            for item in answer['results']:
+                if item['status'] == 200:
+                    results[item['cmd']] = item['result']
+                else:
+                    errors[item['cmd']] = item['error']
+        return {'timestamp': time.time(), 'latency': time.monotonic() - t0, 'results': results, 'errors': errors}
+
+    def collect(self):
+        """ runs one tick: requests all APs and waits for each one until its deadline
+
+            @return: the snapshot (see the module's documentation)
+        """
+        self.ticks += 1
+        start, t0 = time.time(), time.monotonic()
+        futures = dict()
+        stragglers = []
+        late_errors = dict()
+        for name, ap in self.aps.items():
+            pending = self._pending.get(name)
+            if pending is not None and not pending.done():
+                stragglers.append(name)  # still waiting for the previous tick's answer
+                continue
+            self._pending.pop(name, None)
+            if pending is not None and pending.exception() is not None:
+                late_errors[name] = self._error(name, pending.exception())
+            futures[name] = self._executor.submit(self._request, ap)
+        snapshot = {'tick': self.ticks, 'timestamp': start, 'aps': dict(), 'stragglers': stragglers, 'errors': dict(),
+                    'late_errors': late_errors}
+        for name in sorted(futures, key=lambda n: self.aps[n]['deadline']):
+            future = futures[name]
+            try:
+                snapshot['aps'][name] = future.result(timeout=max(0.0, t0 + self.aps[name]['deadline'] -
+                                                                  time.monotonic()))
+                self.stats[name]['ok'] += 1
+            except TimeoutError:  # the answer is discarded when it arrives
+                stragglers.append(name)
+                self._pending[name] = future
+            except Exception as e:  # one AP does not stop the tick
+                snapshot['errors'][name] = self._error(name, e)
+        for name in stragglers:
+            self.stats[name]['late'] += 1
+        timestamps = [a['timestamp'] for a in snapshot['aps'].values()]
+        snapshot['skew'] = max(timestamps) - min(timestamps) if len(timestamps) > 0 else 0.0
+        snapshot['duration'] = time.monotonic() - t0
+        if len(stragglers) > 0:
+            LOG.debug("tick {}: stragglers {}".format(self.ticks, stragglers))
+        return snapshot
+
+    def _error(self, name, e):
+        """ counts the failed request of an AP
+
+            @return: the message of the error
+        """
+        self.stats[name]['errors'] += 1
+        if isinstance(e, APError):
+            return str(e)
+        LOG.error("{}: {}: {}".format(name, type(e).__name__, e))  # e.g. an unexpected answer
+        return "{}: {}".format(type(e).__name__, e)
+
+    def run(self, interval, callback, ticks=None):
+        """ collects every `interval` seconds (from the start of each tick) until stop()
+
+            @param callback: function(snapshot)
+            @param ticks: number of ticks. None runs until stop()
+        """
+        self._stop.clear()
+        deadline = time.monotonic()
+        n = 0
+        while not self._stop.is_set() and (ticks is None or n < ticks):
+            callback(self.collect())
+            n += 1
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay < 0:
+                deadline = time.monotonic()  # late: skip the lost ticks
+                delay = 0
+            self._stop.wait(delay)
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Collect the same commands from many APs.')
+    parser.add_argument('--inventory', type=str, default=None, help='JSON file with the list of APs')
+    parser.add_argument('--ap', type=str, nargs='*', default=[], help='APs as host:port, added to the inventory')
+    parser.add_argument('--iface', type=str, default=DEFAULT_IFACE, help='default interface of the APs')
+    parser.add_argument('--cmd', type=str, nargs='*', default=['/get_features'], help='commands sent to each AP')
+    parser.add_argument('--deadline', type=float, default=1.0, help='seconds to wait for each AP')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between ticks')
+    parser.add_argument('--ticks', type=int, default=None, help='number of ticks (default: until Ctrl-C)')
+    args = parser.parse_args()
+
+    inventory = load_inventory(args.inventory) if args.inventory is not None else []
+    inventory += [dict(parse_ap(ap), iface=args.iface) for ap in args.ap]
+
+    def show(snapshot):
+        print("tick {}: {} APs in {:.3f} s (skew {:.3f} s), stragglers {}, errors {}, late errors {}".format(
+            snapshot['tick'], len(snapshot['aps']), snapshot['duration'], snapshot['skew'],
+            snapshot['stragglers'], snapshot['errors'], snapshot['late_errors']))
+
+    with Collector(inventory, args.cmd, deadline=args.deadline) as collector:
+        try:
+            collector.run(args.interval, show, ticks=args.ticks)
+        except KeyboardInterrupt:
+            pass
@@ -8,14 +8,26 @@
     Usage from command line:
     -------------------
 
-    python3 -m get_set.server.py [--port 8080]
+    python3 -m get_set.server.py [--port 8080] [--workers 16]
 
 
     Usage from program:
     -------------------
 
     import get_set.server
-    server.run(port)
+    server.run(port, workers)
+
+    With workers > 0, the requests are handled concurrently by a pool of threads.
+    The endpoints in the same group of `endpoint_groups` are serialized (e.g. the setters),
+    all other endpoints (the reads) run in parallel.
+    The scans run in background (see `scan_manager`), /get_scan and /get_scan_mac return the last completed scan.
+    Only the interfaces of --scan-iface are scanned periodically, the others are scanned when a request finds
+    their result too old.
+    With --track-stations, /get_num_stations and /get_station_list follow the associations without running commands.
+    With --history-iface, the metrics are sampled in background, each family at its own period (--sample-period),
+    /history returns their recent samples and /get_sampler_stats the timing of the samples.
+    With --replay DIR or --synthetic N, the commands are not run: their recorded or synthetic outputs are served,
+    e.g. to benchmark the server without an AP (see cmd/executor.py).
 
 
     Requirements
@@ -24,14 +36,21 @@
     iwconfig version 30
 """
 import argparse
-import pickle
+import json
 import logging
 import os
+import sys
+import threading
+import time
 
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, wait
+from socketserver import ThreadingMixIn
 from http.server import BaseHTTPRequestHandler
 from http.server import HTTPServer
 
+from get_set import wire
+
 # command processed by the AP
 from cmd.command_ap import get_ifconfig
 from cmd.command_ap import get_iw_info
@@ -40,29 +59,193 @@ from cmd.command_ap import get_config
 from cmd.command_ap import get_power
 from cmd.command_ap import set_iw_power
 from cmd.command_ap import get_iw_stations
-from cmd.command_ap import trigger_scan
 from cmd.command_ap import get_iw_survey
-from cmd.command_ap import get_iw_scan
-from cmd.command_ap import get_iw_scan_mac
 from cmd.command_ap import get_xmit
 from cmd.command_ap import change_channel
+from cmd.command_ap import use_nl80211
+from cmd.command_ap import set_cache_ttl
+from cmd.command_ap import watch_interfaces
+from cmd.command_ap import use_executor
+from cmd.command_ap import get_status
+from cmd.command_ap import get_status_all
+from cmd.command_ap import get_config_all
+from cmd.command_ap import get_iw_survey_all
+from cmd.command_ap import get_station_features
+from cmd.command_ap import ap_interfaces
+from cmd.command_ap import ALL_INTERFACES
+from cmd.executor import ReplayExecutor, synthetic_executor
+from cmd.delta import StationDeltaTracker, STATION_COUNTERS, FEATURE_COUNTERS, FEATURE_COUNTER_BITS
+from cmd.scan import decode_scan_basic, decode_scan_mac
+from cmd.scanner import ScanManager
+from cmd.command_ap import snapshot_cache
+from cmd.history import MetricHistory
+from cmd.scheduler import SamplerScheduler, interface_collectors, DEFAULT_PERIODS, FAMILY_COMMANDS
+from cmd.station_tracker import StationTracker
 
 
 logging.basicConfig(level=logging.DEBUG)
 LOG = logging.getLogger('REST_SERVER')
 
 
+class NotFound(Exception):
+    """ the requested resource (e.g. a station or an interface) does not exist: answered with a 404 """
+    pass
+
+
 # creates a global var 'httpd' that receives the httpd handle that runs in the thread,
 # so we can stop it when CTRL-C is hit
 httpd = None
-last_rt = dict()  # save data from AP
-last_tx_bytes = None  # save last read tx_bytes in MOS AP
-last_ampdu = None
+
+# previous samples used by the delta mode: {(url, iface, client): StationDeltaTracker}
+delta_trackers = dict()
+delta_lock = threading.Lock()
+
+""" a delta tracker not used for DELTA_IDLE_TIME seconds is forgotten (its client's next request starts over),
+    and at most MAX_DELTA_TRACKERS are kept (the least recently used ones are forgotten first)
+"""
+DELTA_IDLE_TIME = 600.0
+MAX_DELTA_TRACKERS = 256
+
+
+def evict_delta_trackers(now=None):
+    """ forgets the idle delta trackers, and the least recently used ones above MAX_DELTA_TRACKERS.
+        The caller holds delta_lock
+
+        @param now: time.monotonic() (the clock of the trackers). None uses the current time
+    """
+    now = time.monotonic() if now is None else now
+    by_age = sorted(delta_trackers.items(), key=lambda item: item[1].last_update)
+    excess = len(by_age) - MAX_DELTA_TRACKERS
+    for i, (key, tracker) in enumerate(by_age):
+        if i >= excess and now - tracker.last_update <= DELTA_IDLE_TIME:
+            break
+        del delta_trackers[key]
+
+
+""" endpoints that cannot run concurrently: {url: group}.
+    Only one request of each group runs at a time, e.g. a channel change waits for the power change to finish.
+"""
+endpoint_groups = {'/set_power': 'set',
+                   '/set_channel': 'set',
+                   }
+group_limits = {'set': 1}  # number of concurrent requests allowed in each group
+group_semaphores = dict([(g, threading.BoundedSemaphore(n)) for g, n in group_limits.items()])
+
+# scans the interfaces in background, shared by all requests (see --scan-interval)
+scan_manager = ScanManager()
+
+# recent samples of the metrics, fed by the scheduler (see start_history() and /history)
+history = MetricHistory()
+# runs all the periodic samples, each family at its own period (see /get_sampler_stats)
+scheduler = SamplerScheduler()
+
+# associated stations, updated by the hostapd and nl80211 notifications (see start_station_tracker())
+station_tracker = None
+
+# runs the commands of /batch concurrently
+batch_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def start_history(interfaces, periods=None, seconds=600.0, families=('stations', 'survey', 'ifconfig', 'xmit')):
+    """ samples the metrics of the interfaces in background, each family at its own period
+
+        @param interfaces: list of interfaces, e.g. ['wlan0']
+        @param periods: {family: seconds between samples}, updates DEFAULT_PERIODS of scheduler.py
+        @param seconds: length of the history. Each series keeps seconds / period samples
+        @param families: the metrics sampled: stations, survey, ifconfig, xmit, scan (the last result of scan_manager)
+        The snapshot cache TTL of a command sampled faster than its TTL is lowered to the period.
+    """
+    global history, scheduler
+    scheduler.stop()
+    periods = dict(DEFAULT_PERIODS, **(periods or dict()))
+    history = MetricHistory(capacities=dict([('{}/{}'.format(iface, f), max(1, int(round(seconds / periods[f]))))
+                                             for iface in interfaces for f in families]))
+    scheduler = SamplerScheduler()
+    for f in families:
+        command = FAMILY_COMMANDS[f]
+        if command in snapshot_cache.ttls and snapshot_cache.ttl(command) > periods[f]:
+            set_cache_ttl(command, periods[f])  # otherwise the samples repeat the cached one
+    for iface in interfaces:
+        for name, (function, period, key) in interface_collectors(iface, families, periods, scan_manager).items():
+            scheduler.add(name, function, period, key=key,
+                          sink=lambda samples, family=name: history.record(family, samples))
+    scheduler.start()
+
+
+def start_station_tracker(interfaces, resync_interval=60.0):
+    """ follows the associations of the interfaces, so /get_num_stations and /get_station_list do not run commands
+
+        @param interfaces: list of interfaces, e.g. ['wlan0']
+        @param resync_interval: seconds between the full station dumps
+    """
+    global station_tracker
+    if station_tracker is not None:
+        station_tracker.stop()
+    station_tracker = StationTracker(interfaces, resync_interval=resync_interval)
+    station_tracker.start()
+
+
+def delta_mode(query):
+    """ @return: True if the query asks for the delta mode (delta=1) """
+    return query.get('delta', ['0'])[0].lower() in ['1', 'true', 'yes']
+
+
+class PoolHTTPServer(ThreadingMixIn, HTTPServer):
+    """ HTTPServer that handles the requests in a bounded pool of threads.
+        At most workers + queue_size connections are accepted at the same time, the next ones get a 503
+    """
+    daemon_threads = True
+    busy_response = b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n'
+
+    def __init__(self, server_address, handler_class, workers=16, queue_size=None):
+        """
+            @param server_address: (host, port)
+            @param handler_class: the request handler, e.g. myHandler
+            @param workers: maximum number of connections handled at the same time.
+                            a persistent (HTTP/1.1) connection keeps its worker until it is closed
+                            or idle for myHandler.timeout
+            @param queue_size: connections waiting for a worker. None allows 4 per worker
+        """
+        super().__init__(server_address, handler_class)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.queue_size = 4 * workers if queue_size is None else queue_size
+        self._slots = threading.BoundedSemaphore(workers + self.queue_size)
+        self.rejected = 0
+
+    def process_request(self, request, client_address):
+        """ queues the request for a worker, or answers 503 if the queue is full """
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            LOG.warning("all workers busy, connection from {} rejected".format(client_address[0]))
+            try:
+                request.sendall(self.busy_response)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.executor.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
 
 
 class myHandler(BaseHTTPRequestHandler):
     """"This class will handles any incoming request from the browser
+
+        it speaks HTTP/1.1, so a client can send many requests through the same connection.
+        An idle connection is closed after `timeout` seconds: it keeps a worker of the pool (see PoolHTTPServer)
+        until then, so the timeout is short. A client reopens the connection (see get_set/client.py).
     """
+    protocol_version = 'HTTP/1.1'
+    timeout = 2  # seconds
+
     def __init__(self, request, client_address, server):
         super().__init__(request, client_address, server)
 
@@ -72,25 +255,73 @@ class myHandler(BaseHTTPRequestHandler):
         q = urllib.parse.urlparse(self.path).query
         return urllib.parse.parse_qs(q)
 
-    def send_error(self):
+    def delta(self, query, url, stations):
+        """ in delta mode (query has delta=1), replaces the stations' absolute counters by the changes
+            since the previous request of the same client (query's "client" or the client's address)
+
+            @param url: the endpoint, selects which fields are counters
+            @param stations: {mac: fields}
+            @return: stations unchanged, or the changes (see StationDeltaTracker.update())
+        """
+        if not delta_mode(query):
+            return stations
+        iface = query.get('iface', ['wlan0'])[0]
+        client = query.get('client', [self.client_address[0]])[0]
+        key = (url, iface, client)
+        with delta_lock:
+            evict_delta_trackers()
+            if key not in delta_trackers:
+                if url == '/get_features':
+                    delta_trackers[key] = StationDeltaTracker(FEATURE_COUNTERS, reset_field=None,
+                                                              counter_bits=FEATURE_COUNTER_BITS)
+                else:
+                    delta_trackers[key] = StationDeltaTracker(STATION_COUNTERS)
+            tracker = delta_trackers[key]
+        return tracker.update(stations)
+
+    def each_interface(self, query, function, default='wlan0'):
+        """ @param function: function(iface) that processes the command for one interface
+            @return: function(iface) of the query's iface, or {iface: function(iface)} of all the AP interfaces
+                     with iface=all (see ap_interfaces())
+        """
+        iface = query.get('iface', [default])[0]
+        if iface == ALL_INTERFACES:
+            return dict([(i, function(i)) for i in ap_interfaces()])
+        return function(iface)
+
+    def send_error(self, message="Command unknown"):
         """returns to the web client a 404 error"""
+        msg = message.encode()
         self.send_response(404)  # Not found
         self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(msg)))
         self.end_headers()
         # Send the html message
-        self.wfile.write("Command unknown".encode())
+        self.wfile.write(msg)
+
+    def send_server_error(self, error):
+        """ returns to the web client a 500 error with the exception's message """
+        msg = "{}: {}".format(type(error).__name__, error).encode()
+        self.send_response(500)  # Internal Server Error
+        self.send_header('Content-type', 'text/plain')
+        self.send_header('Content-Length', str(len(msg)))
+        self.end_headers()
+        self.wfile.write(msg)
 
     def send_dictionary(self, d):
         """ returns to the web client a dictionary containing the data.
-            the client should use pickle.loads() to reconvert the data to a python object
+            the format follows the request's Accept header (MessagePack, JSON or pickle, see get_set/wire.py),
+            the client should use wire.decode() (or pickle.loads() for pickle) to reconvert the data to a python object
         """
+        fmt = wire.negotiate(self.headers.get('Accept'))
+        msg = wire.encode(d, fmt)
         self.send_response(200)
-        self.send_header('Content-type', 'text/html')
+        self.send_header('Content-type', fmt)
+        self.send_header('Content-Length', str(len(msg)))
         self.end_headers()
-        msg = pickle.dumps(d, protocol=pickle.HIGHEST_PROTOCOL)
         self.wfile.write(msg)
 
-    def info(self):
+    def info(self, query):
         """ process /get_info
 
         @return: dictionary
@@ -101,12 +332,11 @@ class myHandler(BaseHTTPRequestHandler):
              'wdev': '0x1', 'center1': '2437MHz'}
         @rtype: dict
         """
-        iface = self.query.get('iface', [''])[0]
-        info = get_iw_info(interface=iface)
+        info = self.each_interface(query, lambda iface: get_iw_info(interface=iface), default='')
         LOG.debug(info)
-        self.send_dictionary(info)
+        return info
 
-    def iwconfig(self):
+    def iwconfig(self, query):
         """ process /get_iwconfig
 
         @return: dictionary
@@ -115,61 +345,57 @@ class myHandler(BaseHTTPRequestHandler):
          'interface': 'wlan0'}
 
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        r = get_iwconfig_info(interface=iface)
-        self.send_dictionary(r)
+        r = self.each_interface(query, lambda iface: get_iwconfig_info(interface=iface))
+        return r
 
-    def ifconfig(self):
+    def ifconfig(self, query):
         """ process /get_ifconfig
 
         @return:
             {'iface': 'wlan0',
-             'rx_bytes': '2986426585', 'rx_overruns': '0', 'rx_dropped': '0',
-             'rx_packets': '30257063', 'rx_scale_bytes': '2.9', 'rx_errors': '0'
-             'tx_scale_bytes': '53.9', 'tx_bytes': '53923422941', 'tx_dropped': '0',
-             'tx_packets': '43083207', 'tx_overruns': '0', 'tx_errors': '0',
-             'collisions': '0', 'frame': '0',
-             'txqueuelen': '1000',
-             'carrier': '0',
+             'rx_bytes': 2986426585, 'rx_overruns': 0, 'rx_dropped': 0,
+             'rx_packets': 30257063, 'rx_scale_bytes': 2.9, 'rx_errors': 0
+             'tx_scale_bytes': 53.9, 'tx_bytes': 53923422941, 'tx_dropped': 0,
+             'tx_packets': 43083207, 'tx_overruns': 0, 'tx_errors': 0,
+             'collisions': 0, 'frame': 0,
+             'txqueuelen': 1000,
+             'carrier': 0,
              }
 
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        r = get_ifconfig(interface=iface)
-        self.send_dictionary(r)
+        r = self.each_interface(query, lambda iface: get_ifconfig(interface=iface))
+        return r
 
-    def get_power(self):
+    def get_power(self, query):
         """ process /get_power
 
         @return: the tx power of iface
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        pwr = get_power(interface=iface)
-        self.send_dictionary({'txpower': pwr})
+        return self.each_interface(query, lambda iface: {'txpower': get_power(interface=iface)})
 
-    def set_power(self):
+    def set_power(self, query):
         """ process /set_power
 
             @return: set the tx power of iface to new_power
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        new_power = self.query.get('new_power', [-1])[0]
+        iface = query.get('iface', ['wlan0'])[0]
+        new_power = query.get('new_power', [-1])[0]
         if len(new_power) > 0:
             set_iw_power(interface=iface, new_power=new_power)
-        self.send_dictionary({'txpower': new_power})
+        return {'txpower': new_power}
 
-    def set_channel(self):
+    def set_channel(self, query):
         """ process /set_channel
 
             @return: new channel in a dictionary format {'channel': new_channel}
             @rtype: dict
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        new_channel = int(self.query.get('new_channel', [-1])[0])
+        iface = query.get('iface', ['wlan0'])[0]
+        new_channel = int(query.get('new_channel', [-1])[0])
         change_channel(interface=iface, new_channel=new_channel)
-        self.send_dictionary({'channel': new_channel})
+        return {'channel': new_channel}
 
-    def xmit(self):
+    def xmit(self, query):
         """ process /get_xmit
 
             @return: dictionary
@@ -179,60 +405,112 @@ class myHandler(BaseHTTPRequestHandler):
              'DESC CFG Error_VI': '0', 'AMPDUs Queued HW_VI': '0', 'TX-Pkts-All_BE': '42978693', 'TX-Pkts-All_VI': '0', 'DELIM Underrun_BK': '0', 'MPDUs Completed_BK': '0', 'DELIM Underrun_VO': '0', 'AMPDUs XRetried_BE': '1086', 'TX-Failed_BE': '0', 'AMPDUs XRetried_VI': '0', 'DATA Underrun_VI': '0', 'DESC CFG Error_BK': '0', 'TXERR Filtered_BK': '0', 'HW-put-tx-buf_BE': '34862773', 'AMPDUs Retried_VO': '0', 'TX-Pkts-All_BK': '0', 'TX-Failed_VO': '0', 'TXTIMER Expiry_VI': '0', 'DESC CFG Error_BE': '3', 'AMPDUs Completed_BE': '8317901', 'TX-Failed_BK': '0', 'HW-tx-start_BK': '0', 'TXTIMER Expiry_BK': '0', 'AMPDUs Queued HW_BK': '0', 'FIFO Underrun_BE': '2', 'Aggregates_BE': '1286133', 'AMPDUs Completed_VI': '0', 'AMPDUs Queued SW_BE': '42978305', 'AMPDUs Retried_BE': '811701', 'HW-put-tx-buf_VO': '4441003', 'TX-Bytes-All_VI': '0', 'TX-Bytes-All_BK': '0', 'AMPDUs Queued HW_BE': '0', 'MPDUs XRetried_VI': '0', 'MPDUs Queued_VI': '0', 'Aggregates_VI': '0', 'DATA Underrun_BK': '0', 'MPDUs Completed_VO': '4435505', 'MPDUs XRetried_BK': '0', 'MPDUs Queued_VO': '4280885', 'Aggregates_VO': '0', 'TXOP Exceeded_BK': '0', 'AMPDUs Queued SW_BK': '0', 'FIFO Underrun_VI': '0', 'HW-put-tx-buf_VI': '0', 'MPDUs XRetried_VO': '5831', 'AMPDUs Queued HW_VO': '0', 'TXERR Filtered_VO': '412', 'DELIM Underrun_BE': '0', 'TX-Bytes-All_BE': '2498976381', 'DATA Underrun_BE': '0', 'HW-tx-proc-desc_BK': '0', 'HW-tx-start_BE': '0', 'MPDUs XRetried_BE': '42463', 'TXERR Filtered_VI': '0', 'AMPDUs Queued SW_VI': '0', 'TX-Bytes-All_VO': '796749298', 'AMPDUs Completed_VO': '0', 'TXOP Exceeded_BE': '0', 'AMPDUs XRetried_BK': '0', 'DATA Underrun_VO': '0', 'MPDUs Completed_VI': '0', 'AMPDUs Retried_VI': '0', 'AMPDUs Queued SW_VO': '160451', 'TXOP Exceeded_VI': '0', 'HW-tx-proc-desc_BE': '39331824', 'HW-tx-proc-desc_VI': '0', 'AMPDUs Retried_BK': '0', 'HW-tx-start_VI': '0', 'AMPDUs XRetried_VO': '0', 'TXTIMER Expiry_VO': '0', 'TXERR Filtered_BE': '108810', 'HW-tx-proc-desc_VO': '4441078', 'TX-Failed_VI': '0', 'MPDUs Queued_BK': '0', 'TXTIMER Expiry_BE': '0', 'MPDUs Completed_BE': '34617243', 'AMPDUs Completed_BK': '0', 'HW-tx-start_VO': '0'}
             @rtype: dict
         """
-        phy_iface = self.query.get('phy', ['phy0'])[0]
+        phy_iface = query.get('phy', ['phy0'])[0]
         r = get_xmit(phy_iface)
-        self.send_dictionary(r)
+        return r
 
-    def get_stations(self):
+    def get_stations(self, query):
         """ process /num_stations
 
             @return:
-            {'54:e6:fc:da:ff:34': {'short slot time': 'yes', 'DTIM period': 2.0,
+            {'54:e6:fc:da:ff:34': {'short slot time': 'yes', 'DTIM period': 2,
                                    'authorized': 'yes',
                                    'tx bitrate': 1.0,
-                                   'tx bytes': 322.0, 'tx packets': 2.0, 'tx failed': 0.0,
+                                   'tx bytes': 322, 'tx packets': 2, 'tx failed': 0,
                                    'rx bitrate': 1.0
-                                   'rx bytes': 288.0, 'rx drop misc': 1.0, 'rx packets': 2.0,
+                                   'rx bytes': 288, 'rx drop misc': 1, 'rx packets': 2,
                                    'preamble': 'short',
                                    'WMM/WME': 'yes',
-                                   'signal avg': 58.0, 'MFP': 'no',
-                                   'beacon interval': 100.0, 'signal': 57.0,
-                                   'tx retries': 1.0,
+                                   'signal avg': -58, 'MFP': 'no',
+                                   'beacon interval': 100, 'signal': -57,
+                                   'tx retries': 1,
                                    'authenticated': 'yes', 'TDLS peer': 'no',
-                                   'connected time': 0.0, 'inactive time': 4.0, 'associated': 'yes',
+                                   'connected time': 0, 'inactive time': 4, 'associated': 'yes',
                                    }
              }
+            the signals are signed dBm (e.g. -58). Older versions reported them without the sign (58.0)
+            with delta=1, the counters are replaced by their changes since the previous request
+            of the same client (see StationDeltaTracker.update())
+            with iface=all, {iface: stations} of every BSS (see ap_interfaces())
             @rtype: dict
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        stations = get_iw_stations(interface=iface)
-        self.send_dictionary(stations)
+        def stations(iface):
+            return self.delta(dict(query, iface=[iface]), '/get_stations', get_iw_stations(interface=iface))
+        return self.each_interface(query, stations)
 
-    def get_num_stations(self):
+    def get_num_stations(self, query):
         """ process /get_num_stations
 
-        @return: number of stations
-        @rtype: int
+        @return: number of stations. with iface=all, also the number of each BSS:
+                 {'num_stations': 12, 'interfaces': {'wlan0': 10, 'wlan1': 2}}
+        @rtype: dict
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        stations = get_iw_stations(interface=iface)
-        self.send_dictionary({'num_stations': len(stations)})
-
-    def get_survey(self):
+        iface = query.get('iface', ['wlan0'])[0]
+        if iface == ALL_INTERFACES:
+            counts = dict([(i, self.count_stations(i)) for i in ap_interfaces()])
+            return {'num_stations': sum(counts.values()), 'interfaces': counts}
+        return {'num_stations': self.count_stations(iface)}
+
+    def count_stations(self, iface):
+        """ @return: the number of stations of iface, from the station tracker if it follows iface """
+        if station_tracker is not None and station_tracker.tracks(iface):
+            return station_tracker.num_stations(iface)
+        return len(get_iw_stations(interface=iface))
+
+    def get_station_list(self, query):
+        """ process /get_station_list: the associated stations, without their counters
+
+            @return: {mac: {'connected_at': timestamp}}, from the station tracker if it follows iface
+                     (see start_station_tracker()), otherwise from a station dump (connected_at estimated
+                     from the "connected time"). with iface=all, {iface: stations}
+            @rtype: dict
+        """
+        def stations(iface):
+            if station_tracker is not None and station_tracker.tracks(iface):
+                return station_tracker.stations(iface)
+            now = time.time()
+            return dict([(mac, {'connected_at': now - fields.get('connected time', 0)})
+                         for mac, fields in get_iw_stations(interface=iface).items()])
+        return self.each_interface(query, stations)
+
+    def get_survey(self, query):
         """
             @return:
-                {2432: {'channel busy time': 394.0, 'channel receive time': 285.0, 'channel transmit time': 81.0, 'noise': 81.0, 'channel active time': 1104.0},
-                 2437: {'in use': True, 'channel receive time': 1073537372.0, 'noise': 80.0, 'channel busy time': 1163590333.0, 'channel transmit time': 60790348.0, 'channel active time': 3628159621.0},
-                 2442: {'channel busy time': 682.0, 'channel receive time': 336.0, 'channel transmit time': 310.0, 'noise': 81.0, 'channel active time': 1121.0}, 2412: {'channel busy time': 722824.0, 'channel receive time': 505677.0, 'channel transmit time': 204390.0, 'noise': 80.0, 'channel active time': 1681119.0}, 2447: {'channel busy time': 194.0, 'channel receive time': 135.0, 'channel transmit time': 27.0, 'noise': 81.0, 'channel active time': 1121.0}, 2417: {'channel busy time': 351.0, 'channel receive time': 316.0, 'channel transmit time': 19.0, 'noise': 80.0, 'channel active time': 1200.0}, 2452: {'channel busy time': 242.0, 'channel receive time': 167.0, 'channel transmit time': 27.0, 'noise': 80.0, 'channel active time': 1127.0}, 2422: {'channel busy time': 240.0, 'channel receive time': 189.0, 'channel transmit time': 17.0, 'noise': 80.0, 'channel active time': 1165.0}, 2457: {'channel busy time': 458.0, 'channel receive time': 419.0, 'channel transmit time': 19.0, 'noise': 80.0, 'channel active time': 1110.0}, 2427: {'channel busy time': 823.0, 'channel receive time': 193.0, 'channel transmit time': 575.0, 'noise': 81.0, 'channel active time': 3462.0}, 2462: {'channel busy time': 2614.0, 'channel receive time': 1448.0, 'channel transmit time': 1085.0, 'noise': 80.0, 'channel active time': 3320.0}}
+                {2432: {'channel busy time': 394.0, 'channel receive time': 285.0, 'channel transmit time': 81.0, 'noise': -81.0, 'channel active time': 1104.0},
+                 2437: {'in use': True, 'channel receive time': 1073537372.0, 'noise': -80.0, 'channel busy time': 1163590333.0, 'channel transmit time': 60790348.0, 'channel active time': 3628159621.0},
+                 2442: {'channel busy time': 682.0, 'channel receive time': 336.0, 'channel transmit time': 310.0, 'noise': -81.0, 'channel active time': 1121.0}, 2412: {'channel busy time': 722824.0, 'channel receive time': 505677.0, 'channel transmit time': 204390.0, 'noise': -80.0, 'channel active time': 1681119.0}, 2447: {'channel busy time': 194.0, 'channel receive time': 135.0, 'channel transmit time': 27.0, 'noise': -81.0, 'channel active time': 1121.0}, 2417: {'channel busy time': 351.0, 'channel receive time': 316.0, 'channel transmit time': 19.0, 'noise': -80.0, 'channel active time': 1200.0}, 2452: {'channel busy time': 242.0, 'channel receive time': 167.0, 'channel transmit time': 27.0, 'noise': -80.0, 'channel active time': 1127.0}, 2422: {'channel busy time': 240.0, 'channel receive time': 189.0, 'channel transmit time': 17.0, 'noise': -80.0, 'channel active time': 1165.0}, 2457: {'channel busy time': 458.0, 'channel receive time': 419.0, 'channel transmit time': 19.0, 'noise': -80.0, 'channel active time': 1110.0}, 2427: {'channel busy time': 823.0, 'channel receive time': 193.0, 'channel transmit time': 575.0, 'noise': -81.0, 'channel active time': 3462.0}, 2462: {'channel busy time': 2614.0, 'channel receive time': 1448.0, 'channel transmit time': 1085.0, 'noise': -80.0, 'channel active time': 3320.0}}
                  2467: {},
                  2472: {},
+            the noise is in signed dBm (e.g. -80.0). Older versions reported it without the sign (80.0)
+            with iface=all, {iface: survey} of one interface of each radio
             @rtype: dict
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
+        iface = query.get('iface', ['wlan0'])[0]
+        if iface == ALL_INTERFACES:
+            return get_iw_survey_all()
         survey = get_iw_survey(interface=iface)
-        self.send_dictionary(survey)
+        return survey
+
+    def scan_result(self, query, decoder):
+        """ returns the last completed scan of the interface, decoded by decoder
 
-    def get_scan(self):
+            query's max_age: maximum age of the result in seconds, an older result requests a new scan
+                             (default a few scan intervals, see ScanManager)
+            query's wait: maximum time in seconds waiting for the new scan (default 0 returns the older result)
+            raises NotFound (a 404) if iface is not a wireless interface
+        """
+        iface = query.get('iface', ['wlan0'])[0]
+        max_age = float(query['max_age'][0]) if 'max_age' in query else None
+        timeout = float(query['wait'][0]) if 'wait' in query else 0
+        try:
+            result = scan_manager.get(iface, decoder, max_age=max_age, timeout=timeout)
+        except ValueError as e:
+            raise NotFound(str(e))  # not a wireless interface
+        if result is None:
+            return decoder('')  # no scan completed yet
+        return result[1]
+
+    def get_scan(self, query):
         """ returns the partial results from iw scan dump
 
             {'50:c7:bf:3b:db:37': {'channel': '1',
@@ -251,64 +529,175 @@ class myHandler(BaseHTTPRequestHandler):
                                    'beacon interval': 102}
              }
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        trigger_scan(interface=iface)
-        aps = get_iw_scan(interface=iface)
-        self.send_dictionary(aps)
+        return self.scan_result(query, decode_scan_basic)
 
-    def get_scan_mac(self):
+    def get_scan_mac(self, query):
         """ return the result from iw scan dump
             @return: list[str] each entry is a detected mac
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        trigger_scan(interface=iface)
-        aps = get_iw_scan_mac(interface=iface)
-        self.send_dictionary(aps)
+        return self.scan_result(query, decode_scan_mac)
+
+    def get_history(self, query):
+        """ process /history: the recent samples of a family of metrics (see start_history())
+
+            query's family: stations, survey, ifconfig or xmit (default stations)
+            query's entity (or mac): the macs, frequencies, interface or phy to return. Default all
+            query's metric: the metrics to return, e.g. metric=tx bytes&metric=signal avg. Default all
+            query's seconds: the window, ending now (default 60)
+            query's step: aggregates the samples in steps of `step` seconds (min, mean, max, p95, count)
+            query's rate=1: the increase per second of the metrics (e.g. counters) instead of their values
+
+            @return: {'family': 'wlan0/stations', 'interval': seconds between samples (the current period of the family),
+                      'series': {'00:11:22:33:44:55': {'tx bytes': {'t': [timestamps], 'v': [values]}}}}
+                     with step, each metric has {'t': [start of each step], 'min': [...], 'mean': [...],
+                                                 'max': [...], 'p95': [...], 'count': [...]}
+            @rtype: dict
+        """
+        iface = query.get('iface', ['wlan0'])[0]
+        family = '{}/{}'.format(iface, query.get('family', ['stations'])[0])
+        entities = query.get('entity', query.get('mac'))
+        step = float(query['step'][0]) if 'step' in query else None
+        series = history.query(family, entities=entities, metrics=query.get('metric'),
+                               seconds=float(query.get('seconds', [60])[0]), step=step,
+                               rate=query.get('rate', ['0'])[0].lower() in ['1', 'true', 'yes'])
+        return {'family': family, 'interval': scheduler.period(family), 'series': series}
+
+    def get_sampler_stats(self, query):
+        """ process /get_sampler_stats: the timing of the background samples (see start_history())
+
+            @return: {'wlan0/stations': {'period': current seconds between samples, 'base_period': configured period,
+                      'runs', 'skipped', 'overruns', 'errors', 'late', 'duration_last', 'duration_mean',
+                      'duration_max', 'lateness_mean', 'lateness_max' (seconds), 'key', 'coalesced'}}
+            @rtype: dict
+        """
+        return scheduler.stats()
 
-    def get_config(self):
+    def get_config(self, query):
         """ return the result from hostapd_cli get_config
 
             @return: {'group_cipher': 'CCMP', 'key_mgmt': 'WPA-PSK ', 'rsn_pairwise_cipher': 'CCMP',
              'ssid': 'ethanolQL1', 'bssid': 'b0:aa:ab:ab:ac:11',
              'wps_state': 'disabled'}
+            without iface, hostapd_cli's default interface. with iface=all, {iface: config} of every BSS
+            @rtype: dict
+        """
+        iface = query.get('iface', [None])[0]
+        if iface == ALL_INTERFACES:
+            return get_config_all()
+        conf = get_config(interface=iface)
+        return conf
+
+    def status(self, query):
+        """ process /get_status: "hostapd_cli status"
+
+            @return: the status fields. without iface, hostapd_cli's default interface.
+                     with iface=all, {bss interface: {'phy', 'radio', 'state', 'channel', 'freq', 'bssid', 'ssid',
+                     'num_sta'}} of every BSS, with one status per radio (see get_status_all())
             @rtype: dict
         """
-        conf = get_config()
-        self.send_dictionary(conf)
+        iface = query.get('iface', [None])[0]
+        if iface == ALL_INTERFACES:
+            return get_status_all()
+        return get_status(interface=iface)
 
     def hello(self):
         """standard hello response. white page with 200 code"""
+        msg = "Hello World !".encode()
         self.send_response(200)
         self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(msg)))
         self.end_headers()
         # Send the html message
-        self.wfile.write("Hello World !".encode())
+        self.wfile.write(msg)
+
+    """ {url: name of the method that processes the command}.
+        the method receives the parsed query and returns the data sent to the client
+    """
+    function_handler = {'/get_info': 'info',
+                        '/get_iwconfig': 'iwconfig',
+                        '/get_config': 'get_config',
+                        '/get_status': 'status',
+                        '/get_power': 'get_power',
+                        '/set_power': 'set_power',
+                        '/set_channel': 'set_channel',
+                        '/get_stations': 'get_stations',
+                        '/get_num_stations': 'get_num_stations',
+                        '/get_station_list': 'get_station_list',
+                        '/get_features': 'get_features',
+                        '/get_ifconfig': 'ifconfig',
+                        '/get_xmit': 'xmit',
+                        '/get_survey': 'get_survey',
+                        '/get_scan': 'get_scan',
+                        '/get_scan_mac': 'get_scan_mac',
+                        '/history': 'get_history',
+                        '/get_sampler_stats': 'get_sampler_stats',
+                        }
+
+    def run_command(self, cmd, query):
+        """ executes the command, waiting for the other commands of its group (see endpoint_groups)
+
+            @param cmd: the url, e.g. '/get_info'
+            @param query: the parsed query, e.g. {'iface': ['wlan0']}
+            @return: the command's data
+        """
+        func = getattr(self, self.function_handler[cmd])
+        group = endpoint_groups.get(cmd)
+        if group is None:
+            return func(query)
+        with group_semaphores[group]:
+            return func(query)
+
+    def batch(self, items):
+        """ process /batch: executes several commands and returns all results in one response.
+            Consecutive reads run concurrently (the commands they share, e.g. "iw dev info" for
+            power and channel, are sampled once by the snapshot cache in command_ap).
+            Setters run alone, in the order they were given.
+
+            @param items: list of dictionaries {'cmd': url, parameter: value, ...},
+                          e.g. [{'cmd': '/get_info', 'iface': 'wlan0'}, {'cmd': '/get_survey', 'iface': 'wlan0'}]
+            @return: {'results': [{'cmd': '/get_info', 'status': 200, 'result': {...}},
+                                  {'cmd': '/get_foo', 'status': 404, 'error': 'Command unknown'},
+                                  ...
+                                  ]}
+                     one entry per item, in the same order
+            @rtype: dict
+        """
+        results = [None] * len(items)
+
+        def run(i, item):
+            cmd = item.get('cmd')
+            if cmd not in self.function_handler:
+                results[i] = {'cmd': cmd, 'status': 404, 'error': 'Command unknown'}
+                return
+            query = dict([(k, v if isinstance(v, list) else [str(v)]) for k, v in item.items() if k != 'cmd'])
+            try:
+                results[i] = {'cmd': cmd, 'status': 200, 'result': self.run_command(cmd, query)}
+            except NotFound as e:
+                results[i] = {'cmd': cmd, 'status': 404, 'error': str(e)}
+            except Exception as e:
+                LOG.error("batch {}: {}".format(cmd, e))
+                results[i] = {'cmd': cmd, 'status': 500, 'error': '{}: {}'.format(type(e).__name__, e)}
+
+        pending = []
+        for i, item in enumerate(items):
+            if endpoint_groups.get(item.get('cmd')) == 'set':
+                wait(pending)
+                pending = []
+                run(i, item)
+            else:
+                pending.append(batch_executor.submit(run, i, item))
+        wait(pending)
+        return {'results': results}
 
     def do_GET(self):
         """
             self.path is the command the client wants to execute
 
             function_handler is a dictionary that contains {url : function responds to the command}
+
+            /batch?cmd=/get_info&cmd=/get_survey&iface=wlan0 executes all commands in `cmd`
+            with the other parameters (see batch())
         """
-        function_handler = {'/': self.hello,
-                            '/get_info': self.info,
-                            '/get_iwconfig': self.iwconfig,
-                            '/get_config': self.get_config,
-                            '/get_power': self.get_power,
-                            '/set_power': self.set_power,
-                            '/set_channel': self.set_channel,
-                            '/get_stations': self.get_stations,
-                            '/get_num_stations': self.get_num_stations,
-                            '/get_features': self.get_features,
-                            '/get_ifconfig': self.ifconfig,
-                            '/get_xmit': self.xmit,
-                            '/get_survey': self.get_survey,
-                            '/get_scan': self.get_scan,
-                            '/get_scan_mac': self.get_scan_mac,
-                            '/get_mos_client': self.get_mos_client,
-                            '/get_mos_ap': self.get_mos_ap,
-                            '/get_mos_hybrid': self.get_mos_hybrid,
-                            }
         LOG.info("received {} from {}".format(self.requestline, self.address_string()))
         LOG.debug('path: {}'.format(self.path))
 
@@ -316,96 +705,124 @@ class myHandler(BaseHTTPRequestHandler):
         LOG.debug('cmd : {}'.format(cmd))
 
         """Handler for the GET requests"""
-        func = function_handler.get(cmd, self.send_error)
-        func()
+        if cmd == '/':
+            self.hello()
+        elif cmd == '/batch':
+            query = self.query
+            params = dict([(k, v) for k, v in query.items() if k != 'cmd'])
+            items = [dict(params, cmd=c) for c in query.get('cmd', [])]
+            self.send_dictionary(self.batch(items))
+        elif cmd in self.function_handler:
+            try:
+                result = self.run_command(cmd, self.query)
+            except NotFound as e:
+                LOG.error("{}: {}".format(cmd, e))
+                self.send_error(str(e))
+                return
+            except Exception as e:
+                LOG.error("{}: {}".format(cmd, e))
+                self.send_server_error(e)
+                return
+            self.send_dictionary(result)
+        else:
+            self.send_error()
         return
 
+    def do_POST(self):
+        """ Handler for the POST requests. Only /batch is accepted,
+            its body is a JSON list of commands (see batch())
+        """
+        LOG.info("received {} from {}".format(self.requestline, self.address_string()))
+        cmd = urllib.parse.urlparse(self.path).path
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)  # always consume the body, the connection may be reused
+        if cmd != '/batch':
+            self.send_error()
+            return
+        try:
+            items = json.loads(body.decode('utf-8'))
+        except ValueError:
+            self.send_error()
+            return
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            self.send_error()
+            return
+        self.send_dictionary(self.batch(items))
+
     # ********************************************************
     #
     #  this is specific to the QoS experiments (Marcos, Gilson, Henrique)
     #
     # ********************************************************
-    def fill_feature_results(self, survey, station, k, stations, iface):
-        """ function that returns the features of a station.
-            @param survey: data from iw survey dump
-            @param station: the station data selected from the result of "iw station dump"
-            @param k: the k-th value of the survey
-            @param stations: data from iw station dump
-            @param iface: wireless interface name
-        """
-        results = {'num_stations': len(stations),
-                   'tx_power': get_power(interface=iface),
-                   'cat': survey[k].get('channel active time', ''),
-                   'cbt': survey[k].get('channel busy time', ''),
-                   'crt': survey[k].get('channel receive time', ''),
-                   'ctt': survey[k].get('channel transmit time', ''),
-                   'avg_signal': station['signal avg'],
-                   'txf': station['tx failed'],
-                   'txr': station['tx retries'],
-                   'txp': station['tx packets'],
-                   'txb': station['tx bytes'],
-                   'rxdrop': station['rx drop misc'],
-                   'rxb': station['rx bytes'],
-                   'rxp': station['rx packets'],
-                   'tx_bitrate': station['tx bitrate'],
-                   'rx_bitrate': station['rx bitrate'],
-                   }
-        return results
-
-    def get_features(self):
+    def get_features(self, query):
         """ process /get_features
 
-            here we collect all features necessary to train the QoS predictor
+            here we collect all features necessary to train the QoS predictor.
+            the survey, the station dump and the tx power are sampled once, and the features of all stations
+            are computed together (see get_station_features())
+
+            query's mac: the stations returned, e.g. mac=54:e6:fc:da:ff:34&mac=... or mac=54:e6:fc:da:ff:34,...
+                         Default all
 
             @return: dictionary
                 {'54:e6:fc:da:ff:34': {'tx_bitrate': 1.0, 'rx_bitrate': 1.0,
-                                       'tx_power': 1.0, 'avg_signal': 54.0,
+                                       'tx_power': 1.0, 'avg_signal': -54.0,
                                        'rxdrop': 16.0, 'rxb': 1232.0, 'rxp': 32.0,
                                        'txr': 0.0, 'txp': 3.0, 'txf': 0.0, 'txb': 487.0,
                                        'crt': 1073085286.0, 'cbt': 1163082876.0,
                                        'ctt': 60749755.0, 'cat': 3626867638.0,
                                        'num_stations': 1
-                                       }
+                                       },
+                 '00:11:22:33:44:55': {'error': 'not associated'}
                 }
-
+            the features that cannot be computed are left out, a requested station that is not associated
+            has an error instead of its features.
+            avg_signal is in signed dBm (e.g. -54.0). Older versions reported it without the sign (54.0).
+            with a single mac (and no delta), only the features of this station, a 404 if it is not associated.
+            with delta=1, the counters are replaced by their changes since the previous request
+            of the same client (see StationDeltaTracker.update())
         """
-        iface = self.query.get('iface', ['wlan0'])[0]
-        survey = get_iw_survey(interface=iface)
-        k = [k for k in survey if survey[k].get('in use', False)][0]  # get only the channel in use
-
-        stations = get_iw_stations(interface=iface)
-        if len(self.query.get('mac', [''])[0]) == 0:
-            # in case there is no parameter --mac
-            result = stations
-            for i in stations:
-                try:
-                    station = stations[i]
-                    results = self.fill_feature_results(survey, station, k, stations, iface)
-                    result[i] = results
-                except KeyError:
-                    self.send_error()
+        iface = query.get('iface', ['wlan0'])[0]
+        macs = [mac.lower() for item in query.get('mac', []) for mac in item.split(',') if len(mac) > 0]
+        if delta_mode(query):
+            # the delta of all the stations, so the tracker of the client keeps the history of the others
+            features, _ = get_station_features(iface)
+            result = self.delta(query, '/get_features', features)
+            if len(macs) > 0:
+                result = dict([(mac, result[mac]) for mac in macs if mac in result])
+            errors = dict([(mac, 'not associated') for mac in macs if mac not in features])
         else:
-            # in case there is parameter --mac
-            station_mac = self.query.get('mac', [''])[0]
-            try:
-                station = stations[station_mac]
-                result = self.fill_feature_results(survey, station, k, stations, iface)
-            except KeyError:
-                self.send_error()
-        try:
-            self.send_dictionary(result)
-        except KeyError:
-            self.send_error()
+            result, errors = get_station_features(iface, macs if len(macs) > 0 else None)
+        result.update([(mac, {'error': error}) for mac, error in errors.items()])
+        if len(macs) == 1 and not delta_mode(query):
+            if macs[0] in errors:
+                raise NotFound("station {} {}".format(macs[0], errors[macs[0]]))
+            return result[macs[0]]
+        return result
+
+
+def create_server(port=8080, workers=16, handler_class=myHandler):
+    """ creates the web server
+
+        @param port: number of the server port
+        @param workers: number of threads handling the requests. 0 handles one request at a time
+        @param handler_class: class that handles the requests
+        @return: the server
+    """
+    if workers > 0:
+        return PoolHTTPServer(('', port), handler_class, workers=workers)
+    return HTTPServer(('', port), handler_class)
 
 
-def run(port=8080):
+def run(port=8080, workers=16):
     try:
         """ Create a web server and define the handler to manage the
             incoming request
             @param port: number of the server port. Defaults to 8080
+            @param workers: number of threads handling the requests. 0 handles one request at a time
         """
-        server = HTTPServer(('', port), myHandler)
-        LOG.info('Started httpserver on port {} to command Wi-Fi'.format(port))
+        server = create_server(port, workers)
+        LOG.info('Started httpserver on port {} with {} workers to command Wi-Fi'.format(port, workers))
 
         """Wait forever for incoming htto requests"""
         server.serve_forever()
@@ -419,20 +836,73 @@ def run(port=8080):
 
 
 if __name__ == "__main__":
-    # check if is root
-    if os.geteuid() != 0:
+    parser = argparse.ArgumentParser(description='Receive commands to the AP.')
+    parser.add_argument('--port', type=int, default=8080, help='Set the server port')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='number of threads handling requests (0 = one request at a time)')
+    parser.add_argument('--debug', action='store_true', help='set logging level to debug')
+    parser.add_argument('--nl80211', action='store_true', help='query stations, survey and info using nl80211 instead of iw')
+    parser.add_argument('--cache-ttl', type=str, nargs='*', default=[], metavar='COMMAND=SECONDS',
+                        help='how long a sample is reused, e.g. iw_stations=0.5 (0 disables)')
+    parser.add_argument('--scan-interval', type=float, default=30,
+                        help='seconds between background scans (0 = only on request)')
+    parser.add_argument('--scan-iface', type=str, nargs='*', default=[], help='interfaces scanned every --scan-interval')
+    parser.add_argument('--history-iface', type=str, nargs='*', default=[], help='interfaces sampled for /history')
+    parser.add_argument('--history-families', type=str, nargs='*', default=['stations', 'survey', 'ifconfig', 'xmit'],
+                        help='metrics sampled for /history: stations, survey, ifconfig, xmit, scan')
+    parser.add_argument('--sample-period', type=str, nargs='*', default=[], metavar='FAMILY=SECONDS',
+                        help='seconds between the samples of a family, e.g. stations=0.5 (see scheduler.py)')
+    parser.add_argument('--history-seconds', type=float, default=600, help='seconds kept by /history')
+    parser.add_argument('--track-stations', type=str, nargs='*', default=[],
+                        help='interfaces whose stations are followed with the hostapd and nl80211 notifications')
+    parser.add_argument('--resync-interval', type=float, default=60,
+                        help='seconds between the full station dumps of --track-stations')
+    parser.add_argument('--replay', type=str, default=None, metavar='DIR',
+                        help='serve the command outputs recorded in DIR instead of running the commands (see executor.py)')
+    parser.add_argument('--synthetic', type=int, default=None, metavar='STATIONS',
+                        help='serve synthetic command outputs of an AP with STATIONS stations')
+    parser.add_argument('--synthetic-iface', type=str, nargs='*', default=['wlan0'], help='interfaces of --synthetic')
+    parser.add_argument('--replay-latency', type=float, default=0.0, help='seconds each replayed command takes')
+    args = parser.parse_args()
+
+    # check if is root (not needed to replay the commands)
+    replay = args.replay is not None or args.synthetic is not None
+    if not replay and os.geteuid() != 0:
         print("User is not root.")
         print("Run script with sudo")
+        sys.exit(1)
+
+    for item in args.cache_ttl:
+        command, ttl = item.split('=')
+        set_cache_ttl(command, float(ttl))
+
+    if args.nl80211:
+        use_nl80211(True)
+
+    if args.replay is not None:
+        use_executor(ReplayExecutor.load(args.replay, latency=args.replay_latency))
+    elif args.synthetic is not None:
+        use_executor(synthetic_executor(args.synthetic_iface, stations=args.synthetic, latency=args.replay_latency))
+    if replay:
+        scan_manager.use_events = False  # the replayed scans return immediately
     else:
-        parser = argparse.ArgumentParser(description='Receive commands to the AP.')
-        parser.add_argument('--port', type=int, default=8080, help='Set the server port')
-        parser.add_argument('--debug', action='store_true', help='set logging level to debug')
-        args = parser.parse_args()
-
-        if args.debug:
-            logging.basicConfig(level=logging.DEBUG)
-            LOG.setLevel(logging.DEBUG)
-            LOG.info("Debug activated")
-
-        # run server forever
-        run(args.port)
+        watch_interfaces()  # follows the mode and channel changes of the interfaces
+
+    scan_manager.interval = args.scan_interval
+    for iface in args.scan_iface:
+        scan_manager.add(iface)
+
+    if len(args.track_stations) > 0:
+        start_station_tracker(args.track_stations, args.resync_interval)
+
+    if len(args.history_iface) > 0:
+        periods = dict([(item.split('=')[0], float(item.split('=')[1])) for item in args.sample_period])
+        start_history(args.history_iface, periods, args.history_seconds, args.history_families)
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG)
+        LOG.setLevel(logging.DEBUG)
+        LOG.info("Debug activated")
+
+    # run server forever
+    run(args.port, args.workers)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    wire formats of the server's responses
+
+    the server chooses the format from the request's Accept header:
+        application/msgpack (or application/x-msgpack): MessagePack, compact binary, keeps int keys (e.g. survey frequencies)
+        application/json: JSON, the dictionary keys become strings, NaN and infinities become null
+        anything else: pickle (the original format, only for python clients)
+
+    MessagePack uses the "msgpack" package when it is installed, otherwise the pure python packb()/unpackb() below.
+"""
+import json
+import math
+import pickle
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+PICKLE = 'application/python-pickle'
+MSGPACK = 'application/msgpack'
+JSON = 'application/json'
+
+"""media types accepted in the Accept header: {media type: format}"""
+media_types = {'application/msgpack': MSGPACK,
+               'application/x-msgpack': MSGPACK,
+               'application/json': JSON,
+               'application/python-pickle': PICKLE,
+               }
+
+
+class WireError(ValueError):
+    """ raised when the data cannot be decoded """
+    pass
+
+
+def _pack(obj, out):
+    """ appends the MessagePack encoding of obj to the list out """
+    if obj is None:
+        out.append(b'\xc0')
+    elif obj is True:
+        out.append(b'\xc3')
+    elif obj is False:
+        out.append(b'\xc2')
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(struct.pack('B', obj))
+        elif -0x20 <= obj < 0:
+            out.append(struct.pack('b', obj))
+        elif obj >= 0:
+            if obj < 0x100:
+                out.append(struct.pack('>BB', 0xcc, obj))
+            elif obj < 0x10000:
+                out.append(struct.pack('>BH', 0xcd, obj))
+            elif obj < 0x100000000:
+                out.append(struct.pack('>BI', 0xce, obj))
+            else:
+                out.append(struct.pack('>BQ', 0xcf, obj))
+        else:
+            if obj >= -0x80:
+                out.append(struct.pack('>Bb', 0xd0, obj))
+            elif obj >= -0x8000:
+                out.append(struct.pack('>Bh', 0xd1, obj))
+            elif obj >= -0x80000000:
+                out.append(struct.pack('>Bi', 0xd2, obj))
+            else:
+                out.append(struct.pack('>Bq', 0xd3, obj))
+    elif isinstance(obj, float):
+        f32 = struct.pack('>Bf', 0xca, obj) if abs(obj) < 3.4e38 else None
+        if f32 is not None and struct.unpack('>f', f32[1:])[0] == obj:
+            out.append(f32)  # no precision lost (e.g. 54.0 MBit/s), saves 4 bytes
+        else:
+            out.append(struct.pack('>Bd', 0xcb, obj))
+    elif isinstance(obj, str):
+        b = obj.encode('utf-8')
+        n = len(b)
+        if n < 32:
+            out.append(struct.pack('B', 0xa0 | n))
+        elif n < 0x100:
+            out.append(struct.pack('>BB', 0xd9, n))
+        elif n < 0x10000:
+            out.append(struct.pack('>BH', 0xda, n))
+        else:
+            out.append(struct.pack('>BI', 0xdb, n))
+        out.append(b)
+    elif isinstance(obj, (bytes, bytearray)):
+        n = len(obj)
+        if n < 0x100:
+            out.append(struct.pack('>BB', 0xc4, n))
+        elif n < 0x10000:
+            out.append(struct.pack('>BH', 0xc5, n))
+        else:
+            out.append(struct.pack('>BI', 0xc6, n))
+        out.append(bytes(obj))
+    elif isinstance(obj, (list, tuple)):
+        n = len(obj)
+        if n < 16:
+            out.append(struct.pack('B', 0x90 | n))
+        elif n < 0x10000:
+            out.append(struct.pack('>BH', 0xdc, n))
+        else:
+            out.append(struct.pack('>BI', 0xdd, n))
+        for v in obj:
+            _pack(v, out)
+    elif isinstance(obj, dict):
+        n = len(obj)
+        if n < 16:
+            out.append(struct.pack('B', 0x80 | n))
+        elif n < 0x10000:
+            out.append(struct.pack('>BH', 0xde, n))
+        else:
+            out.append(struct.pack('>BI', 0xdf, n))
+        for k, v in obj.items():
+            _pack(k, out)
+            _pack(v, out)
+    elif hasattr(obj, 'tolist'):
+        _pack(obj.tolist(), out)  # numpy arrays and scalars
+    else:
+        raise TypeError("cannot encode {}".format(type(obj).__name__))
+
+
+def packb(obj):
+    """ @return: the MessagePack encoding of obj
+        @rtype: bytes
+    """
+    out = []
+    _pack(obj, out)
+    return b''.join(out)
+
+
+# formats of the fixed size types: {first byte: (struct format, size)}
+_fixed = {0xca: ('>f', 4), 0xcb: ('>d', 8),
+          0xcc: ('>B', 1), 0xcd: ('>H', 2), 0xce: ('>I', 4), 0xcf: ('>Q', 8),
+          0xd0: ('>b', 1), 0xd1: ('>h', 2), 0xd2: ('>i', 4), 0xd3: ('>q', 8),
+          }
+# types with a length prefix: {first byte: (length format, length size, kind)}
+_sized = {0xc4: ('>B', 1, 'bin'), 0xc5: ('>H', 2, 'bin'), 0xc6: ('>I', 4, 'bin'),
+          0xd9: ('>B', 1, 'str'), 0xda: ('>H', 2, 'str'), 0xdb: ('>I', 4, 'str'),
+          0xdc: ('>H', 2, 'array'), 0xdd: ('>I', 4, 'array'),
+          0xde: ('>H', 2, 'map'), 0xdf: ('>I', 4, 'map'),
+          }
+
+
+def _unpack(data, offset):
+    """ @return: (object, offset after it) """
+    b = data[offset]
+    offset += 1
+    if b < 0x80:
+        return b, offset
+    if b >= 0xe0:
+        return b - 0x100, offset
+    if 0x80 <= b <= 0x8f:
+        return _unpack_map(data, offset, b & 0x0f)
+    if 0x90 <= b <= 0x9f:
+        return _unpack_array(data, offset, b & 0x0f)
+    if 0xa0 <= b <= 0xbf:
+        n = b & 0x1f
+        return data[offset:offset + n].decode('utf-8'), offset + n
+    if b == 0xc0:
+        return None, offset
+    if b == 0xc2:
+        return False, offset
+    if b == 0xc3:
+        return True, offset
+    if b in _fixed:
+        fmt, size = _fixed[b]
+        return struct.unpack_from(fmt, data, offset)[0], offset + size
+    if b in _sized:
+        fmt, size, kind = _sized[b]
+        n = struct.unpack_from(fmt, data, offset)[0]
+        offset += size
+        if kind == 'bin':
+            return bytes(data[offset:offset + n]), offset + n
+        if kind == 'str':
+            return data[offset:offset + n].decode('utf-8'), offset + n
+        if kind == 'array':
+            return _unpack_array(data, offset, n)
+        return _unpack_map(data, offset, n)
+    raise WireError("unsupported MessagePack type 0x{:02x}".format(b))
+
+
+def _unpack_array(data, offset, n):
+    result = []
+    for _ in range(n):
+        v, offset = _unpack(data, offset)
+        result.append(v)
+    return result, offset
+
+
+def _unpack_map(data, offset, n):
+    result = dict()
+    for _ in range(n):
+        k, offset = _unpack(data, offset)
+        v, offset = _unpack(data, offset)
+        result[k] = v
+    return result, offset
+
+
+def unpackb(data):
+    """ @return: the object encoded in data (MessagePack) """
+    try:
+        obj, offset = _unpack(data, 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise WireError("invalid MessagePack data: {}".format(e))
+    return obj
+
+
+def _json_default(obj):
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()  # numpy arrays and scalars
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8', errors='replace')
+    raise TypeError("cannot encode {}".format(type(obj).__name__))
+
+
+def _json_finite(obj):
+    """ @return: obj with NaN and infinities replaced by None (they are not valid JSON) """
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return dict([(k, _json_finite(v)) for k, v in obj.items()])
+    if isinstance(obj, (list, tuple)):
+        return [_json_finite(v) for v in obj]
+    if hasattr(obj, 'tolist'):
+        return _json_finite(obj.tolist())
+    return obj
+
+
+def negotiate(accept):
+    """ chooses the response format from the Accept header
+
+        @param accept: the value of the Accept header, e.g. 'application/msgpack, application/json;q=0.5'
+        @return: MSGPACK, JSON or PICKLE
+    """
+    if not accept:
+        return PICKLE
+    choices = []
+    for i, item in enumerate(accept.split(',')):
+        parts = [p.strip() for p in item.split(';')]
+        q = 1.0
+        for p in parts[1:]:
+            if p.startswith('q='):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if parts[0] in media_types and q > 0:
+            choices.append((-q, i, media_types[parts[0]]))
+    return min(choices)[2] if len(choices) > 0 else PICKLE
+
+
+def encode(d, fmt=PICKLE):
+    """ @param d: the data
+        @param fmt: MSGPACK, JSON or PICKLE (see negotiate())
+        @return: the encoded data
+        @rtype: bytes
+    """
+    if fmt == MSGPACK:
+        if msgpack is not None:
+            return msgpack.packb(d, use_bin_type=True, default=_json_default)
+        return packb(d)
+    if fmt == JSON:
+        try:
+            text = json.dumps(d, default=_json_default, separators=(',', ':'), allow_nan=False)
+        except ValueError:  # NaN or infinity
+            text = json.dumps(_json_finite(d), default=_json_default, separators=(',', ':'), allow_nan=False)
+        return text.encode('utf-8')
+    return pickle.dumps(d, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decode(data, content_type=PICKLE):
+    """ @param data: the response's body
+        @param content_type: the response's Content-type
+        @return: the decoded data
+    """
+    media_type = (content_type or '').split(';')[0].strip()
+    if media_type.startswith('text/'):
+        return data.decode('utf-8', errors='replace')  # e.g. the hello page
+    fmt = media_types.get(media_type, PICKLE)
+    if fmt == MSGPACK:
+        if msgpack is not None:
+            return msgpack.unpackb(data, raw=False, strict_map_key=False)
+        return unpackb(data)
+    if fmt == JSON:
+        return json.loads(data.decode('utf-8'))
+    return pickle.loads(data)
@@ -5,26 +5,177 @@
 #
 # install:
 # pip3 install pyzmq
+"""
+    telemetry publisher
 
+    samples the AP (stations, survey, xmit and ifconfig) on configurable intervals and
+    publishes each sample over a ZMQ PUB socket. Each message has two frames:
+        topic: "<ap id>/<metric family>", e.g. b"ap1/stations"
+        data: MessagePack dictionary {'ap': ap id, 'family': metric family, 'seq': message number in the family,
+                                      'timestamp': time.time() of the sample, 'data': the sample}
+              (see get_set/wire.py, not pickle: the subscriber must not run code sent by the network)
+    see subscriber.py to receive them.
 
-import zmq
-import random
-import sys
+
+    Usage from command line:
+    ------------------------
+
+    python3 -m publisher_subscriber.publisher --ap-id ap1 --iface wlan0 --port 5556 --interval stations=0.5
+
+
+    Usage from program:
+    -------------------
+
+    pub = TelemetryPublisher('ap1', 'tcp://*:5556', iface='wlan0')
+    pub.start()
+    ...
+    pub.stop()
+"""
+import heapq
+import logging
+import threading
 import time
 
-port = "5556"
-if len(sys.argv) > 1:
-    port = sys.argv[1]
-    int(port)
+import zmq
+
+from cmd.delta import StationDeltaTracker
+from get_set import wire
+
+
+LOG = logging.getLogger('PUBLISHER')
+
+"""default sampling interval of each metric family, in seconds"""
+DEFAULT_INTERVALS = {'stations': 1.0,
+                     'survey': 1.0,
+                     'xmit': 1.0,
+                     'ifconfig': 1.0,
+                     }
+
+
+def topic_of(ap_id, family):
+    """ @return: the topic of the messages of the AP's metric family
+        @rtype: bytes
+    """
+    return '{}/{}'.format(ap_id, family).encode('utf-8')
+
+
+def default_samplers(iface='wlan0', phy='phy0'):
+    """ @return: {metric family: function without parameters that returns a sample}
+    """
+    from cmd.command_ap import get_iw_stations, get_iw_survey, get_xmit, get_ifconfig
+    return {'stations': lambda: get_iw_stations(iface),
+            'survey': lambda: get_iw_survey(iface),
+            'xmit': lambda: get_xmit(phy),
+            'ifconfig': lambda: get_ifconfig(iface),
+            }
+
+
+class TelemetryPublisher(object):
+    """ publishes the samples of each metric family on its own interval.
+        sampling and sending run in the same thread, because ZMQ sockets are not thread safe.
+    """
+
+    def __init__(self, ap_id, endpoint='tcp://*:5556', iface='wlan0', phy='phy0',
+                 intervals=None, samplers=None, context=None, delta=False):
+        """
+            @param ap_id: identifies this AP in the topics
+            @param endpoint: where the PUB socket binds, e.g. 'tcp://*:5556' or 'inproc://telemetry'
+            @param iface: the wireless interface, used by the default samplers
+            @param phy: the phy interface, used by the default samplers
+            @param intervals: {metric family: seconds}. Updates DEFAULT_INTERVALS. None or 0 disables the family
+            @param samplers: {metric family: function that returns a sample}. None uses command_ap
+            @param context: the zmq.Context. None uses the global context
+            @param delta: if True, the 'stations' samples only carry the changes since the previous sample
+                          (see StationDeltaTracker.update())
+        """
+        self.ap_id = ap_id
+        self.intervals = dict(DEFAULT_INTERVALS)
+        if intervals is not None:
+            self.intervals.update(intervals)
+        self.samplers = default_samplers(iface, phy) if samplers is None else samplers
+        self.context = zmq.Context.instance() if context is None else context
+        self.socket = self.context.socket(zmq.PUB)
+        self.socket.bind(endpoint)
+        self.seq = dict([(family, 0) for family in self.samplers])
+        self.tracker = StationDeltaTracker() if delta else None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def publish(self, family):
+        """ samples the metric family and sends it
+
+            @return: True if the sample was sent
+        """
+        try:
+            data = self.samplers[family]()
+        except Exception as e:
+            LOG.error("sampling {} failed: {}".format(family, e))
+            return False
+        if family == 'stations' and self.tracker is not None:
+            data = self.tracker.update(data)
+        self.seq[family] += 1
+        msg = {'ap': self.ap_id, 'family': family, 'seq': self.seq[family], 'timestamp': time.time(), 'data': data}
+        self.socket.send_multipart([topic_of(self.ap_id, family), wire.encode(msg, wire.MSGPACK)])
+        return True
+
+    def run(self):
+        """ samples and publishes until stop() is called.
+            if a sample is late, the missed periods are skipped
+        """
+        now = time.monotonic()
+        schedule = [(now, family) for family in self.samplers if self.intervals.get(family)]
+        heapq.heapify(schedule)
+        while len(schedule) > 0 and not self._stop.is_set():
+            when, family = schedule[0]
+            delay = when - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+                continue
+            heapq.heappop(schedule)
+            self.publish(family)
+            interval = self.intervals[family]
+            when += interval
+            now = time.monotonic()
+            if when < now:
+                when = now + interval  # overrun: skip the missed samples
+            heapq.heappush(schedule, (when, family))
+
+    def start(self):
+        """ runs the publisher in a background thread """
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='telemetry-publisher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """ stops the background thread and closes the socket """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.socket.close(linger=0)
+
+
+if __name__ == '__main__':
+    import argparse
 
-context = zmq.Context()
-socket = context.socket(zmq.PUB)
-socket.bind("tcp://*:%s" % port)
+    parser = argparse.ArgumentParser(description='Publish AP telemetry.')
+    parser.add_argument('--ap-id', type=str, default='ap', help='AP identification used in the topics')
+    parser.add_argument('--port', type=int, default=5556, help='publisher port')
+    parser.add_argument('--iface', type=str, default='wlan0', help='wireless interface')
+    parser.add_argument('--phy', type=str, default='phy0', help='phy interface (xmit)')
+    parser.add_argument('--interval', type=str, nargs='*', default=[], metavar='FAMILY=SECONDS',
+                        help='sampling interval, e.g. stations=0.5 (0 disables)')
+    parser.add_argument('--delta', action='store_true', help='publish only the changes of the station counters')
+    args = parser.parse_args()
 
+    intervals = dict()
+    for item in args.interval:
+        family, seconds = item.split('=')
+        intervals[family] = float(seconds)
 
-while True:
-    topic = random.randrange(9999, 10005)
-    messagedata = random.randrange(1, 215) - 80
-    print("topic: %6d msg: %d" % (topic, messagedata))
-    socket.send(b"%d %d" % (topic, messagedata))
-    time.sleep(1)
+    pub = TelemetryPublisher(args.ap_id, 'tcp://*:{}'.format(args.port), iface=args.iface, phy=args.phy,
+                             intervals=intervals, delta=args.delta)
+    try:
+        pub.run()
+    except KeyboardInterrupt:
+        pub.stop()
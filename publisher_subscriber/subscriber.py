@@ -5,41 +5,157 @@
 #
 # install:
 # pip3 install pyzmq
+"""
+    telemetry subscriber
+
+    receives the messages sent by publisher.py from one or more APs through a single SUB socket
+    and keeps the last sample of each AP and metric family.
+
+
+    Usage from command line:
+    ------------------------
+
+    python3 -m publisher_subscriber.subscriber --endpoint tcp://ap1:5556 tcp://ap2:5556 [--ap-id ap1] [--family stations]
+
+
+    Usage from program:
+    -------------------
+
+    sub = TelemetrySubscriber(['tcp://ap1:5556', 'tcp://ap2:5556'], families=['stations'])
+    while True:
+        ap_id, family, msg = sub.recv()
+        print(sub.state[ap_id][family]['data'])
+"""
+import copy
+import logging
+import threading
 
-import sys
 import zmq
 
-port = "5556"
-if len(sys.argv) > 1:
-    port = sys.argv[1]
-    int(port)
+from get_set import wire
+
+
+LOG = logging.getLogger('SUBSCRIBER')
+
+
+class TelemetrySubscriber(object):
+    """ receives telemetry and reassembles the state of each AP:
+        state = {ap id: {metric family: last message}}
+        where a message is {'ap', 'family', 'seq', 'timestamp', 'data'} (see publisher.py)
+        the messages are MessagePack, decoded without running any code; the invalid ones are dropped and counted
+    """
+
+    def __init__(self, endpoints, ap_ids=None, families=None, context=None):
+        """
+            @param endpoints: list of publishers to connect to, e.g. ['tcp://ap1:5556', 'inproc://telemetry']
+            @param ap_ids: receive only these APs. None receives all
+            @param families: receive only these metric families. None receives all
+            @param context: the zmq.Context. None uses the global context
+        """
+        self.context = zmq.Context.instance() if context is None else context
+        self.socket = self.context.socket(zmq.SUB)
+        for endpoint in endpoints:
+            self.socket.connect(endpoint)
+        for topic in self.topics(ap_ids, families):
+            self.socket.setsockopt(zmq.SUBSCRIBE, topic)
+        self.families = None if families is None else set(families)
+        self.state = dict()
+        self.lost = dict()  # {(ap id, metric family): number of messages not received (gaps in seq)}
+        self.invalid = 0  # messages dropped because they could not be decoded
+        self._last_seq = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def topics(ap_ids, families):
+        """ @return: the topic prefixes to subscribe to
+            @rtype: list
+        """
+        if ap_ids is None:
+            return [b'']  # the families are filtered in recv()
+        if families is None:
+            return ['{}/'.format(ap_id).encode('utf-8') for ap_id in ap_ids]
+        return ['{}/{}'.format(ap_id, family).encode('utf-8') for ap_id in ap_ids for family in families]
+
+    def recv(self, timeout=None):
+        """ waits for the next message and updates the state
+
+            @param timeout: seconds to wait. None waits forever
+            @return: (ap id, metric family, message) or None on timeout
+        """
+        while True:
+            if timeout is not None and not self.socket.poll(int(timeout * 1000)):
+                return None
+            frames = self.socket.recv_multipart()
+            msg = self.decode(frames)
+            if msg is None:
+                self.invalid += 1
+                continue
+            ap_id, family = msg['ap'], msg['family']
+            if self.families is not None and family not in self.families:
+                continue
+            with self._lock:
+                key = (ap_id, family)
+                last = self._last_seq.get(key)
+                if last is not None and msg['seq'] > last + 1:
+                    self.lost[key] = self.lost.get(key, 0) + msg['seq'] - last - 1
+                self._last_seq[key] = msg['seq']
+                self.state.setdefault(ap_id, dict())[family] = msg
+            return ap_id, family, msg
+
+    @staticmethod
+    def decode(frames):
+        """ @param frames: [topic, payload] received
+            @return: the message, or None if it is not a valid telemetry message
+        """
+        if len(frames) != 2:
+            LOG.debug("message with {} frames dropped".format(len(frames)))
+            return None
+        try:
+            msg = wire.decode(frames[1], wire.MSGPACK)
+        except (ValueError, TypeError) as e:  # WireError and the msgpack errors are ValueErrors
+            LOG.debug("invalid message on {}: {}".format(frames[0], e))
+            return None
+        if not isinstance(msg, dict) or not all(k in msg for k in ['ap', 'family', 'seq', 'timestamp', 'data']) \
+                or not isinstance(msg['seq'], int):
+            LOG.debug("invalid message on {}".format(frames[0]))
+            return None
+        return msg
 
-if len(sys.argv) > 2:
-    port1 = sys.argv[2]
-    int(port1)
+    def poll(self, timeout=0):
+        """ receives all messages available
 
-# Socket to talk to server
-context = zmq.Context()
-socket = context.socket(zmq.SUB)
+            @param timeout: seconds to wait for the first message
+            @return: number of messages received
+        """
+        n = 0
+        while self.recv(timeout if n == 0 else 0) is not None:
+            n += 1
+        return n
 
-print("Collecting updates from weather server...")
-socket.connect("tcp://localhost:%s" % port)
+    def snapshot(self):
+        """ @return: a copy of the state
+            @rtype: dict
+        """
+        with self._lock:
+            return copy.deepcopy(self.state)
 
-if len(sys.argv) > 2:
-    socket.connect("tcp://localhost:%s" % port1)
+    def close(self):
+        self.socket.close(linger=0)
 
-# Subscribe to zipcode, default is NYC, 10001
-topicfilter = "10001"
-print("For topic", topicfilter)
-socket.setsockopt_string(zmq.SUBSCRIBE, topicfilter)
 
-# Process 5 updates
-total_value = 0
-for update_nbr in range(5):
-    string = socket.recv()
-    topic, messagedata = [int(v) for v in string.split()]
-    total_value += int(messagedata)
-    print('topic', topic, 'msg', messagedata)
+if __name__ == '__main__':
+    import argparse
 
-print("Average messagedata value for topic '%s' was %dF" % (topicfilter, total_value / update_nbr))
+    parser = argparse.ArgumentParser(description='Receive AP telemetry.')
+    parser.add_argument('--endpoint', type=str, nargs='+', default=['tcp://localhost:5556'], help='publishers')
+    parser.add_argument('--ap-id', type=str, nargs='*', default=None, help='receive only these APs')
+    parser.add_argument('--family', type=str, nargs='*', default=None, help='receive only these metric families')
+    args = parser.parse_args()
 
+    sub = TelemetrySubscriber(args.endpoint, ap_ids=args.ap_id, families=args.family)
+    try:
+        while True:
+            ap_id, family, msg = sub.recv()
+            print(ap_id, family, msg['seq'], msg['timestamp'], msg['data'])
+    except KeyboardInterrupt:
+        sub.close()
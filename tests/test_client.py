@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+    APClient against get_set.server: the requests sent again are only the ones that did not reach the server
+"""
+import socket
+import threading
+import time
+
+import pytest
+
+import get_set.server as server
+from get_set import wire
+from get_set.client import APClient, APError
+
+
+class CountingHandler(server.myHandler):
+    timeout = 0.2  # idle connections are closed quickly
+    calls = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def hello(self):
+        self.calls.append(self.path)
+        if 'slow' in self.path:
+            time.sleep(0.5)
+        self.send_dictionary({'calls': len(self.calls)})
+
+
+@pytest.fixture
+def port():
+    CountingHandler.calls = []
+    httpd = server.PoolHTTPServer(('localhost', 0), CountingHandler, workers=2)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_stale_connection_is_reopened(port):
+    with APClient('localhost', port, timeout=2, retries=1, fmt=wire.JSON) as client:
+        assert client.send('GET', '/') == {'calls': 1}
+        time.sleep(0.5)  # the server closes the idle connection
+        assert client.send('GET', '/') == {'calls': 2}
+    assert len(CountingHandler.calls) == 2
+
+
+def test_timeout_is_not_retried(port):
+    with APClient('localhost', port, timeout=0.1, retries=2, fmt=wire.JSON) as client:
+        with pytest.raises(APError):
+            client.send('GET', '/?slow=1')
+    time.sleep(0.6)
+    assert CountingHandler.calls == ['/?slow=1']  # sent once
+
+
+def test_connection_refused():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    free_port = sock.getsockname()[1]
+    sock.close()
+    with APClient('localhost', free_port, timeout=1, retries=2) as client:
+        with pytest.raises(APError, match='failed'):
+            client.request('/get_info')
+
+
+class PickleHandler(CountingHandler):
+    """ answers pickle whatever the Accept header (e.g. an old server) """
+
+    def send_dictionary(self, d):
+        msg = wire.encode(d, wire.PICKLE)
+        self.send_response(200)
+        self.send_header('Content-type', wire.PICKLE)
+        self.send_header('Content-Length', str(len(msg)))
+        self.end_headers()
+        self.wfile.write(msg)
+
+
+def test_default_format_is_msgpack(port):
+    with APClient('localhost', port) as client:
+        assert client.fmt == wire.MSGPACK
+        assert client.send('GET', '/') == {'calls': 1}
+
+
+def test_pickle_is_refused_unless_requested():
+    CountingHandler.calls = []
+    httpd = server.PoolHTTPServer(('localhost', 0), PickleHandler, workers=2)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    port = httpd.server_address[1]
+    try:
+        with APClient('localhost', port) as client:
+            with pytest.raises(APError, match='instead of'):
+                client.send('GET', '/')
+        with APClient('localhost', port, fmt=wire.PICKLE) as client:
+            assert client.send('GET', '/') == {'calls': 2}
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
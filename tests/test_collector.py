@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+    Collector with a fake APClientPool: the answers, errors and delays of each AP are scripted
+"""
+import threading
+
+import pytest
+
+from get_set.client import APError
+from get_set.collector import Collector
+
+
+class FakePool(object):
+    """ behaviours: {host: function(url or items) that returns the answer or raises} """
+
+    def __init__(self, behaviours):
+        self.behaviours = behaviours
+
+    def request(self, host, port, url, params=None):
+        return self.behaviours[host](url)
+
+    def batch(self, host, port, items):
+        return self.behaviours[host](items)
+
+    def close(self):
+        pass
+
+
+def answer(url):
+    return {'num_stations': 3}
+
+
+def broken_answer(items):
+    return {'unexpected': True}  # no 'results': KeyError
+
+
+def unreachable(url):
+    raise APError("10.0.0.3:8080/get_num_stations failed: connection refused")
+
+
+def failure(url):
+    raise RuntimeError("bug")
+
+
+def inventory(*hosts, **kwargs):
+    return [dict({'host': host}, **kwargs) for host in hosts]
+
+
+def test_errors_of_one_ap_do_not_stop_the_tick():
+    pool = FakePool({'ap1': answer, 'ap3': unreachable, 'ap4': failure})
+    with Collector(inventory('ap1', 'ap3', 'ap4'), ['/get_num_stations'], pool=pool) as collector:
+        snapshot = collector.collect()
+    assert list(snapshot['aps']) == ['ap1:8080']
+    assert snapshot['aps']['ap1:8080']['results'] == {'/get_num_stations': {'num_stations': 3}}
+    assert snapshot['errors'] == {'ap3:8080': '10.0.0.3:8080/get_num_stations failed: connection refused',
+                                  'ap4:8080': 'RuntimeError: bug'}
+    assert collector.stats['ap4:8080'] == {'ok': 0, 'late': 0, 'errors': 1}
+
+
+def test_unexpected_batch_answer_is_an_error():
+    pool = FakePool({'ap1': broken_answer})
+    with Collector(inventory('ap1'), ['/get_info', '/get_xmit'], pool=pool) as collector:
+        snapshot = collector.collect()
+    assert snapshot['errors']['ap1:8080'].startswith('KeyError')
+
+
+def test_error_of_a_straggler_is_reported():
+    release = threading.Event()
+
+    def late_failure(url):
+        release.wait(5)
+        raise RuntimeError("late bug")
+    pool = FakePool({'ap1': answer, 'ap2': late_failure})
+    with Collector(inventory('ap1', 'ap2', deadline=0.05), ['/get_num_stations'], pool=pool) as collector:
+        snapshot = collector.collect()
+        assert snapshot['stragglers'] == ['ap2:8080']
+        snapshot = collector.collect()
+        assert snapshot['stragglers'] == ['ap2:8080']  # still running: not asked again
+        release.set()
+        collector._pending['ap2:8080'].exception(5)  # wait for the failure
+        snapshot = collector.collect()
+        assert snapshot['late_errors'] == {'ap2:8080': 'RuntimeError: late bug'}
+        assert collector.stats['ap2:8080']['late'] == 2
+        assert collector.stats['ap2:8080']['errors'] >= 1
+
+
+def test_invalid_command():
+    with pytest.raises(ValueError):
+        Collector(inventory('ap1'), ['/rm_rf'], pool=FakePool({}))
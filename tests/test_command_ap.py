@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+    the iface=all queries of command_ap on a replayed AP with two radios: phy0 with the BSSes wlan0 and wlan0_1,
+    phy1 with wlan1
+"""
+import pytest
+
+import cmd.command_ap as command_ap
+from cmd.executor import ReplayExecutor, synthetic_root
+from cmd.synthetic import synthetic_interface, synthetic_iw_station, hostapd_status_template
+
+INTERFACES = ['wlan0', 'wlan0_1', 'wlan1']
+
+
+@pytest.fixture
+def two_radios(tmp_path):
+    wlan0 = synthetic_interface('wlan0', 0, channel=6, num_stations=2)
+    wlan0_1 = dict(wlan0, interface='wlan0_1', ifindex=5, address='02:00:00:01:00:10', ssid='synthetic-0-guest')
+    wlan1 = synthetic_interface('wlan1', 1, channel=36, num_stations=1)
+    second_bss = 'bss[1]=wlan0_1\nbssid[1]=02:00:00:01:00:10\nssid[1]=synthetic-0-guest\nnum_sta[1]=1\n'
+    outputs = {'hostapd_cli -i wlan0 status': hostapd_status_template.format(**wlan0) + second_bss,
+               'hostapd_cli -i wlan0_1 status': hostapd_status_template.format(**wlan0_1),
+               'hostapd_cli -i wlan1 status': hostapd_status_template.format(**wlan1),
+               'iw dev wlan0 station dump': synthetic_iw_station(2, 1, 'wlan0'),
+               'iw dev wlan0_1 station dump': synthetic_iw_station(1, 2, 'wlan0_1'),
+               'iw dev wlan1 station dump': synthetic_iw_station(1, 3, 'wlan1'),
+               }
+    root = str(tmp_path)
+    synthetic_root(root, [wlan0, wlan0_1, wlan1])
+    executor = ReplayExecutor(outputs, root=root)
+    previous = command_ap.get_executor()
+    command_ap.use_executor(executor)
+    yield executor
+    command_ap.use_executor(previous)
+    executor.close()
+
+
+def test_radios(two_radios):
+    assert command_ap.radios(INTERFACES) == {'phy0': ['wlan0', 'wlan0_1'], 'phy1': ['wlan1']}
+
+
+def test_status_all_one_query_per_radio(two_radios):
+    status = command_ap.get_status_all(interfaces=INTERFACES)
+    assert sorted(status) == INTERFACES
+    assert (status['wlan0']['phy'], status['wlan0']['radio'], status['wlan0']['ssid']) == ('phy0', 'wlan0', 'synthetic-0')
+    assert (status['wlan0_1']['radio'], status['wlan0_1']['bssid'], status['wlan0_1']['num_sta']) == \
+        ('wlan0', '02:00:00:01:00:10', 1)
+    assert status['wlan0_1']['channel'] == status['wlan0']['channel'] == 6  # the radio's
+    assert (status['wlan1']['phy'], status['wlan1']['radio'], status['wlan1']['channel']) == ('phy1', 'wlan1', 36)
+    assert 'hostapd_cli -i wlan0_1 status' not in two_radios.calls
+    assert two_radios.calls['hostapd_cli -i wlan0 status'] == 1
+
+
+def test_iw_stations_all_keyed_by_bss(two_radios):
+    stations = command_ap.get_iw_stations_all(interfaces=INTERFACES)
+    assert sorted(stations) == INTERFACES
+    assert [len(stations[iface]) for iface in INTERFACES] == [2, 1, 1]
+    assert all(two_radios.calls['iw dev {} station dump'.format(iface)] == 1 for iface in INTERFACES)
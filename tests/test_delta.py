@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+    StationDeltaTracker on samples of a station
+"""
+from cmd.delta import StationDeltaTracker, FEATURE_COUNTERS, FEATURE_COUNTER_BITS
+
+
+def test_first_update_and_removal():
+    tracker = StationDeltaTracker(['rx bytes'], reset_field=None)
+    assert tracker.update({'a': {'rx bytes': 10}}, timestamp=0) == {'a': {'new': True, 'value': {'rx bytes': 10}}}
+    result = tracker.update({'b': {'rx bytes': 1}}, timestamp=1)
+    assert result['a'] == {'removed': True}
+    assert result['b']['new']
+
+
+def test_partial_update_keeps_the_other_stations():
+    tracker = StationDeltaTracker(['rx bytes'], reset_field=None)
+    tracker.update({'a': {'rx bytes': 10}, 'b': {'rx bytes': 20}}, timestamp=0)
+    result = tracker.update({'a': {'rx bytes': 15}}, timestamp=1, partial=True)
+    assert list(result) == ['a']
+    assert result['a']['delta'] == {'rx bytes': 5}
+    result = tracker.update({'a': {'rx bytes': 15}, 'b': {'rx bytes': 26}}, timestamp=2)
+    assert result['b']['delta'] == {'rx bytes': 6}  # b kept its history
+
+
+def test_32_bits_counter_wraps():
+    tracker = StationDeltaTracker(['rx packets'], reset_field=None)
+    tracker.update({'a': {'rx packets': 2 ** 32 - 10}}, timestamp=0)
+    assert tracker.update({'a': {'rx packets': 5}}, timestamp=1)['a']['delta'] == {'rx packets': 15}
+
+
+def test_64_bits_byte_counter_decrease_is_a_restart():
+    tracker = StationDeltaTracker(['rx bytes'], reset_field=None)
+    tracker.update({'a': {'rx bytes': 2 ** 32 - 10}}, timestamp=0)
+    assert tracker.update({'a': {'rx bytes': 5}}, timestamp=1)['a']['delta'] == {'rx bytes': 5}
+
+
+def test_feature_counters_sizes():
+    tracker = StationDeltaTracker(FEATURE_COUNTERS, reset_field=None, counter_bits=FEATURE_COUNTER_BITS)
+    tracker.update({'a': {'cbt': 3000000000, 'rxb': 3000000000, 'rxp': 3000000000}}, timestamp=0)
+    delta = tracker.update({'a': {'cbt': 100, 'rxb': 100, 'rxp': 100}}, timestamp=1)['a']['delta']
+    assert delta['cbt'] == 100  # 64 bits: restarted
+    assert delta['rxb'] == 100
+    assert delta['rxp'] == 100 + 2 ** 32 - 3000000000  # 32 bits: wrapped
+
+
+def test_last_update():
+    now = [5.0]
+    tracker = StationDeltaTracker(['rx bytes'], reset_field=None, clock=lambda: now[0])
+    assert tracker.last_update == 5.0
+    now[0] = 8.0
+    tracker.update({'a': {'rx bytes': 1}}, timestamp=1)
+    assert tracker.last_update == 8.0
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+    the command keys, and the lookups of ReplayExecutor (from a dictionary and from a recording)
+"""
+from cmd.executor import command_key, command_filename, ReplayExecutor, RecordingExecutor
+
+
+def test_command_key():
+    assert command_key('sudo /sbin/iw dev wlan0 scan dump 2>&1') == 'iw dev wlan0 scan dump'
+    assert command_key('/usr/sbin/hostapd_cli -i wlan0 all_sta >/dev/null') == 'hostapd_cli -i wlan0 all_sta'
+    assert command_key('iw  dev\twlan0 station dump') == 'iw dev wlan0 station dump'
+    assert command_key('') == ''
+    assert command_filename('sudo iw dev wlan0 info') == 'iw%20dev%20wlan0%20info'
+
+
+def test_replay_lookup():
+    counter = []
+    executor = ReplayExecutor({'/sbin/iw dev wlan0 info': 'Interface wlan0\n',
+                               'iw dev wlan0 station dump': lambda: 'Station {}'.format(counter.append(1) or len(counter))})
+    assert executor.replay
+    assert executor.popen('sudo iw dev wlan0 info 2>&1').read() == 'Interface wlan0\n'
+    assert executor.popen('/usr/bin/iw dev wlan0 station dump').read() == 'Station 1'
+    assert executor.popen('iw dev wlan0 station dump').read() == 'Station 2'  # a function is called each time
+    assert executor.popen('iw dev wlan0 set txpower fixed 1500').read() == ''  # unknown, e.g. a setter
+    executor.set_output('iw dev wlan0 info', 'Interface wlan0\n\ttype AP\n')
+    assert executor.popen('iw dev wlan0 info').read() == 'Interface wlan0\n\ttype AP\n'
+    assert executor.calls == {'iw dev wlan0 info': 2, 'iw dev wlan0 station dump': 2,
+                              'iw dev wlan0 set txpower fixed 1500': 1}
+
+
+def test_replay_a_recording(tmp_path):
+    directory = str(tmp_path)
+    recorder = RecordingExecutor(directory)
+    assert recorder.popen('echo "noise: -95 dBm" 2>&1').read() == 'noise: -95 dBm\n'
+    executor = ReplayExecutor.load(directory)
+    assert executor.root == '/'  # the recording has no root directory
+    assert executor.popen('/bin/echo "noise: -95 dBm"').read() == 'noise: -95 dBm\n'
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+    the ring buffers, the queries of MetricHistory with injected clocks, and the sources of the history families
+"""
+import pytest
+
+from cmd.history import RingBuffer, MetricHistory, interface_sources, aggregate, rates, percentile
+from cmd.scan import decode_scan_basic
+from cmd.scheduler import interface_collectors
+
+
+class FakeScans(object):
+    """ the ScanManager: records the calls of last() """
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+
+    def last(self, interface, decoder):
+        self.calls.append((interface, decoder))
+        return self.result
+
+
+def test_scan_family_reads_the_last_result():
+    aps = {'50:c7:bf:3b:db:37': {'signal': -60.0}}
+    scans = FakeScans((1700000000.0, aps))
+    scan = interface_sources('wlan0', ['scan'], scans)['wlan0/scan']
+    assert scan() == aps
+    assert scans.calls == [('wlan0', decode_scan_basic)]  # does not request a scan
+
+
+def test_scan_family_before_the_first_scan():
+    assert interface_sources('wlan0', ['scan'], FakeScans(None))['wlan0/scan']() == {}
+
+
+def test_scan_family_needs_a_scan_manager():
+    with pytest.raises(ValueError):
+        interface_sources('wlan0', ['stations', 'scan'])
+    assert sorted(interface_sources('wlan0', ['stations'])) == ['wlan0/stations']
+
+
+def test_scan_collector():
+    scans = FakeScans((0.0, {}))
+    (name, (function, period, key)), = interface_collectors('wlan0', ['scan'], scans=scans).items()
+    assert (name, period, key) == ('wlan0/scan', 60.0, ('scan', 'wlan0'))
+    assert function() == {}
+
+
+def test_ring_buffer_wraps():
+    ring = RingBuffer(4)
+    assert ring.window() == ([], []) and ring.last() is None
+    for i in range(6):
+        ring.append(float(i), i * 10.0)
+    assert len(ring) == 4
+    assert ring.window() == ([2.0, 3.0, 4.0, 5.0], [20.0, 30.0, 40.0, 50.0])  # chronological across the wrap
+    assert ring.window(since=3.5) == ([4.0, 5.0], [40.0, 50.0])
+    assert ring.window(since=9.0) == ([], [])
+    assert ring.last() == (5.0, 50.0)
+
+
+def test_rates_skip_the_counter_resets():
+    t, r = rates([0.0, 1.0, 2.0, 2.0, 4.0], [100.0, 150.0, 10.0, 20.0, 30.0])
+    assert (t, r) == ([1.0, 4.0], [50.0, 5.0])  # the reset (150 -> 10) and the interval of 0 s have no rate
+
+
+def test_aggregate_buckets_and_p95():
+    timestamps = [10.0 + i * 0.05 for i in range(20)] + [12.5]
+    values = [float(v) for v in range(1, 21)] + [7.0]
+    result = aggregate(timestamps, values, step=1.0, start=10.0)
+    assert result['t'] == [10.0, 12.0]  # the empty bucket 11 is left out
+    assert result['count'] == [20, 1]
+    assert (result['min'][0], result['max'][0], result['mean'][0]) == (1.0, 20.0, 10.5)
+    assert result['p95'] == [19.0, 7.0]
+    assert percentile([1.0], 95) == 1.0
+
+
+@pytest.fixture
+def clocks():
+    """ {'mono': monotonic time, 'wall': time of day} """
+    return {'mono': 100.0, 'wall': 1700000000.0}
+
+
+def history_of(clocks, capacity=10):
+    return MetricHistory(capacity=capacity, clock=lambda: clocks['mono'], wall_clock=lambda: clocks['wall'])
+
+
+def advance(clocks, seconds):
+    clocks['mono'] += seconds
+    clocks['wall'] += seconds
+
+
+def test_query_returns_the_time_of_day(clocks):
+    history = history_of(clocks)
+    for value in [10, 20, 40]:
+        history.record('wlan0/stations', {'a': {'tx bytes': value, 'flags': 'WMM', 'authorized': True}})
+        advance(clocks, 1.0)
+    series = history.query('wlan0/stations', seconds=60)
+    assert series == {'a': {'tx bytes': {'t': [1700000000.0, 1700000001.0, 1700000002.0], 'v': [10.0, 20.0, 40.0]}}}
+    assert history.query('wlan0/stations', seconds=1.5) == {'a': {'tx bytes': {'t': [1700000002.0], 'v': [40.0]}}}
+    assert history.query('wlan0/stations', seconds=60, rate=True)['a']['tx bytes']['v'] == [10.0, 20.0]
+
+
+def test_query_after_a_change_of_the_system_time(clocks):
+    history = history_of(clocks)
+    history.record('wlan0/survey', {2437: {'noise': -95}})
+    advance(clocks, 1.0)
+    clocks['wall'] -= 3600.0  # e.g. NTP set the time back
+    history.record('wlan0/survey', {2437: {'noise': -94}})
+    series = history.query('wlan0/survey', seconds=10)[2437]['noise']
+    assert series['v'] == [-95.0, -94.0]  # still in the window and in order
+    assert series['t'] == [1700000000.0 - 3600.0, 1700000001.0 - 3600.0]
+
+
+def test_query_steps_aligned_on_the_time_of_day(clocks):
+    clocks['wall'] += 0.5
+    history = history_of(clocks)
+    for value in [1, 2, 3, 4]:
+        history.record('wlan0/stations', {'a': {'signal': value}})
+        advance(clocks, 0.5)
+    result = history.query('wlan0/stations', seconds=10, step=1.0)['a']['signal']
+    assert result['t'] == [1700000000.0, 1700000001.0, 1700000002.0]
+    assert result['count'] == [1, 2, 1]
+    assert result['mean'] == [1.0, 2.5, 4.0]
+
+
+def test_query_filters_and_capacity(clocks):
+    history = history_of(clocks, capacity=2)
+    for value in [1, 2, 3]:
+        history.record('wlan0/stations', {'a': {'signal': value, 'tx bytes': value}, 'b': {'signal': value}})
+        advance(clocks, 1.0)
+    result = history.query('wlan0/stations', entities=['b'], metrics=['signal'], seconds=60)
+    assert result == {'b': {'signal': {'t': [1700000001.0, 1700000002.0], 'v': [2.0, 3.0]}}}
+    assert history.query('wlan0/survey') == {}
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+    HostapdCtrl against a fake hostapd: a UNIX datagram socket that replays captured replies
+"""
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from cmd.hostapd_ctrl import HostapdCtrl, HostapdCtrlError, list_interfaces
+from cmd.station import decode_hostapd_status, decode_hostapd_station
+
+
+STATUS = ("state=ENABLED\nphy=phy0\nfreq=2437\nnum_sta_non_erp=0\nnum_sta_no_short_slot_time=0\n"
+          "num_sta_no_short_preamble=0\nolbc=0\nnum_sta_ht_no_gf=1\nnum_sta_no_ht=0\nnum_sta_ht_20_mhz=1\n"
+          "num_sta_ht40_intolerant=0\nolbc_ht=1\nht_op_mode=0x15\ncac_time_seconds=0\ncac_time_left_seconds=N/A\n"
+          "channel=6\nsecondary_channel=0\nieee80211n=1\nieee80211ac=0\nbeacon_int=100\ndtim_period=2\n"
+          "supported_rates=02 04 0b 16 0c 12 18 24 30 48 60 6c\nmax_txpower=20\nbss[0]=wlan0\n"
+          "bssid[0]=b0:aa:ab:ab:ac:11\nssid[0]=ethanolQL1\nnum_sta[0]=2\n")
+
+STA_1 = ("00:11:22:33:44:55\nflags=[AUTH][ASSOC][AUTHORIZED][SHORT_PREAMBLE][WMM][HT]\naid=1\ncapability=0x431\n"
+         "listen_interval=10\nsupported_rates=82 84 8b 96 0c 12 18 24 30 48 60 6c\ntimeout_next=NULLFUNC POLL\n"
+         "dot11RSNAStatsSTAAddress=00:11:22:33:44:55\ndot11RSNAStatsVersion=1\n"
+         "dot11RSNAStatsSelectedPairwiseCipher=00-0f-ac-4\ndot11RSNAStatsTKIPLocalMICFailures=0\n"
+         "dot11RSNAStatsTKIPRemoteMICFailures=0\nhostapdWPAPTKState=11\nhostapdWPAPTKGroupState=0\n"
+         "rx_packets=164\ntx_packets=14\nrx_bytes=5420\ntx_bytes=1340\ninactive_msec=11828\nsignal=-42\n"
+         "rx_rate_info=10\ntx_rate_info=720 mcs 7 shortGI\nconnected_time=3402\n")
+
+STA_2 = ("66:77:88:99:aa:bb\nflags=[AUTH][ASSOC][AUTHORIZED][WMM]\naid=2\ncapability=0x421\nlisten_interval=10\n"
+         "rx_packets=20\ntx_packets=4\nrx_bytes=1200\ntx_bytes=300\ninactive_msec=250\nsignal=-70\n"
+         "connected_time=12\n")
+
+REPLIES = {'PING': 'PONG\n',
+           'STATUS': STATUS,
+           'STA-FIRST': STA_1,
+           'STA-NEXT 00:11:22:33:44:55': STA_2,
+           'STA-NEXT 66:77:88:99:aa:bb': '',
+           'ATTACH': 'OK\n',
+           'DETACH': 'OK\n',
+           }
+
+
+class FakeHostapd(object):
+    """ answers the requests with REPLIES, 'FAIL\\n' for the others.
+        delays: {command: seconds before the reply}, to simulate a slow hostapd
+    """
+
+    def __init__(self, path, delays=None):
+        self.path = path
+        self.delays = dict(delays or dict())
+        self.requests = []
+        self.monitors = []  # addresses of the attached clients
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.sock.settimeout(0.05)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                data, address = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            cmd = data.decode('utf-8')
+            self.requests.append(cmd)
+            if cmd == 'ATTACH':
+                self.monitors.append(address)
+            elif cmd == 'DETACH' and address in self.monitors:
+                self.monitors.remove(address)
+            if cmd in self.delays:
+                threading.Timer(self.delays[cmd], self._reply, (cmd, address)).start()
+            else:
+                self._reply(cmd, address)
+
+    def _reply(self, cmd, address):
+        try:
+            self.sock.sendto(REPLIES.get(cmd, 'FAIL\n').encode('utf-8'), address)
+        except OSError:
+            pass  # the client socket is gone
+
+    def event(self, text, level=2):
+        for address in list(self.monitors):
+            try:
+                self.sock.sendto('<{}>{}'.format(level, text).encode('utf-8'), address)
+            except OSError:
+                self.monitors.remove(address)  # hostapd drops the monitors it cannot reach
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def hostapd(tmp_path):
+    fake = FakeHostapd(str(tmp_path / 'wlan0'))
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def ctrl(tmp_path, hostapd):
+    client = HostapdCtrl('wlan0', ctrl_dir=str(tmp_path), timeout=0.5, local_dir=str(tmp_path))
+    yield client
+    client.close()
+
+
+def test_list_interfaces(tmp_path, hostapd):
+    (tmp_path / 'not_a_socket').write_text('')
+    assert list_interfaces(str(tmp_path)) == ['wlan0']
+    assert list_interfaces(str(tmp_path / 'missing')) == []
+
+
+def test_request(ctrl, hostapd):
+    assert ctrl.ping()
+    status = decode_hostapd_status(ctrl.status())
+    assert status['state'] == 'ENABLED'
+    assert status['bssid[0]'] == 'b0:aa:ab:ab:ac:11'
+    assert ctrl.request('UNKNOWN') == 'FAIL\n'
+    assert hostapd.requests == ['PING', 'STATUS', 'UNKNOWN']
+
+
+def test_default_interface(tmp_path, hostapd):
+    with HostapdCtrl(ctrl_dir=str(tmp_path), local_dir=str(tmp_path)) as ctrl:
+        assert ctrl.interface == 'wlan0'
+        assert ctrl.ping()
+
+
+def test_no_hostapd(tmp_path):
+    with pytest.raises(HostapdCtrlError):
+        HostapdCtrl(ctrl_dir=str(tmp_path))
+    with pytest.raises(HostapdCtrlError):
+        HostapdCtrl('wlan1', ctrl_dir=str(tmp_path), local_dir=str(tmp_path)).open()
+
+
+def test_iter_stations(ctrl, hostapd):
+    assert [mac for mac, _ in ctrl.iter_stations()] == ['00:11:22:33:44:55', '66:77:88:99:aa:bb']
+    stations = decode_hostapd_station(ctrl.all_sta())
+    assert sorted(stations) == ['00:11:22:33:44:55', '66:77:88:99:aa:bb']
+    assert stations['00:11:22:33:44:55']['rx_bytes'] == 5420
+    assert hostapd.requests[-1] == 'STA-NEXT 66:77:88:99:aa:bb'
+
+
+def test_attach_and_events(ctrl, hostapd):
+    assert ctrl.attach()
+    assert ctrl.recv_event(0.05) is None
+    hostapd.event('AP-STA-CONNECTED 00:11:22:33:44:55', level=3)
+    assert ctrl.recv_event(1.0) == (3, 'AP-STA-CONNECTED 00:11:22:33:44:55')
+    # an event received while waiting for a reply is kept for recv_event()
+    hostapd.event('AP-STA-DISCONNECTED 00:11:22:33:44:55')
+    time.sleep(0.05)
+    assert ctrl.ping()
+    assert ctrl.recv_event(0) == (2, 'AP-STA-DISCONNECTED 00:11:22:33:44:55')
+    ctrl.detach()
+    assert hostapd.monitors == []
+
+
+def test_late_reply_is_not_taken_by_the_next_request(tmp_path):
+    hostapd = FakeHostapd(str(tmp_path / 'wlan0'), delays={'STATUS': 0.3})
+    try:
+        with HostapdCtrl('wlan0', ctrl_dir=str(tmp_path), timeout=0.1, local_dir=str(tmp_path)) as ctrl:
+            assert ctrl.attach()
+            with pytest.raises(HostapdCtrlError):
+                ctrl.status()
+            time.sleep(0.3)  # the STATUS reply arrives after the timeout
+            assert ctrl.request('PING') == 'PONG\n'
+            assert ctrl.attached  # attached again on the new socket
+            hostapd.event('AP-STA-CONNECTED 00:11:22:33:44:55')
+            assert ctrl.recv_event(1.0) == (2, 'AP-STA-CONNECTED 00:11:22:33:44:55')
+        assert len([f for f in os.listdir(str(tmp_path)) if f.startswith('hostapd_ctrl_')]) == 0
+    finally:
+        hostapd.close()
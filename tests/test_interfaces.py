@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+    InterfaceRegistry on a fake sysfs in tmp_path: discovery, debugfs paths and refresh
+"""
+import os
+
+import pytest
+
+from cmd.interfaces import InterfaceRegistry
+from cmd.nl80211 import NL80211_CMD_NEW_INTERFACE, NL80211_CMD_SET_INTERFACE
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(content + '\n')
+
+
+def add_interface(root, name, phy=None, ifindex=3, driver='ath9k'):
+    """ the sysfs files of a network interface, wireless if phy is given """
+    net = os.path.join(root, 'sys', 'class', 'net', name)
+    write(os.path.join(net, 'ifindex'), str(ifindex))
+    write(os.path.join(net, 'address'), '02:00:00:00:00:{:02x}'.format(ifindex))
+    if phy is not None:
+        write(os.path.join(net, 'phy80211', 'name'), phy)
+        write(os.path.join(net, 'phy80211', 'index'), phy[3:])
+        drivers = os.path.join(root, 'sys', 'bus', 'pci', 'drivers', driver)
+        os.makedirs(drivers, exist_ok=True)
+        os.makedirs(os.path.join(net, 'device'), exist_ok=True)
+        os.symlink(drivers, os.path.join(net, 'device', 'driver'))
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path)
+    add_interface(root, 'eth0', ifindex=2)
+    add_interface(root, 'wlan0', phy='phy0', ifindex=3)
+    write(os.path.join(root, 'sys', 'kernel', 'debug', 'ieee80211', 'phy0', 'ath9k', 'xmit'), 'TX-Pkts-All: 0')
+    return root
+
+
+def test_discover(root):
+    modes = []
+    registry = InterfaceRegistry(root, mode_of=lambda interface: modes.append(interface) or 'AP')
+    assert registry.interfaces() == ['wlan0']  # eth0 has no phy80211
+    info = registry.info('wlan0')
+    assert info == {'name': 'wlan0', 'ifindex': 3, 'address': '02:00:00:00:00:03', 'phy': 'phy0', 'wiphy': 0,
+                    'driver': 'ath9k', 'mode': 'AP', 'channel': None}
+    assert registry.is_ap('wlan0') and modes == ['wlan0']  # the mode is looked up once
+    assert registry.info('eth0') is None
+    assert registry.xmit_path('phy0') == os.path.join(root, 'sys', 'kernel', 'debug', 'ieee80211', 'phy0', 'ath9k',
+                                                      'xmit')
+    assert registry.debugfs('phy1') == {'debugfs': None, 'driver_debugfs': None, 'xmit': None}
+
+
+def test_refresh(root):
+    registry = InterfaceRegistry(root, mode_of=lambda interface: 'AP')
+    assert registry.interfaces() == ['wlan0']
+    add_interface(root, 'wlan1', phy='phy1', ifindex=4)
+    assert registry.interfaces() == ['wlan0']  # cached
+    assert registry.phy('wlan1') == 'phy1'  # an unknown interface reloads the registry
+    assert registry.interfaces() == ['wlan0', 'wlan1']
+    add_interface(root, 'wlan2', phy='phy2', ifindex=5)
+    registry.notify(NL80211_CMD_NEW_INTERFACE, {'Interface': 'wlan2'})
+    assert registry.interfaces() == ['wlan0', 'wlan1', 'wlan2']
+    assert registry.phy('wlan9') is None
+    add_interface(root, 'wlan9', phy='phy9', ifindex=9)
+    assert registry.phy('wlan9') is None  # missing in the last discovery: no reload on each lookup
+    registry.reload()
+    assert registry.phy('wlan9') == 'phy9'
+
+
+def test_mode_change_forgets_the_mode(root):
+    modes = ['AP']
+    registry = InterfaceRegistry(root, mode_of=lambda interface: modes[0])
+    assert registry.mode('wlan0') == 'AP'
+    modes[0] = 'managed'
+    assert registry.mode('wlan0') == 'AP'  # cached
+    registry.notify(NL80211_CMD_SET_INTERFACE, {'Interface': 'wlan0'})
+    assert registry.mode('wlan0') == 'managed'
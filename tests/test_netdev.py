@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+    cmd.netdev on a copy of /proc/net/dev and /sys/class/net under tmp_path
+"""
+import pytest
+
+from cmd.netdev import (decode_proc_net_dev, read_proc_net_dev, read_sysfs_statistics, get_netdev, get_netdev_all,
+                        scale_bytes)
+
+
+PROC_NET_DEV = (
+    "Inter-|   Receive                                                |  Transmit\n"
+    " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier "
+    "compressed\n"
+    "    lo:   12345      100    0    0    0     0          0         0    12345      100    0    0    0     0       0"
+    "          0\n"
+    " wlan0: 58009076  843246    1    2    3     4          0         5 2505374616 1650711    6    7    8     9      10"
+    "          0\n"
+    "  eth0: 1000         10    0    0    0     0          0         0      500        5    0    0    0     0       0"
+    "          0\n")
+
+WLAN1_STATISTICS = {'rx_bytes': 999, 'rx_packets': 9, 'rx_errors': 0, 'rx_dropped': 1, 'rx_fifo_errors': 0,
+                    'rx_frame_errors': 0, 'tx_bytes': 1500000, 'tx_packets': 12, 'tx_errors': 0, 'tx_dropped': 0,
+                    'tx_fifo_errors': 0, 'tx_carrier_errors': 0, 'collisions': 0}
+
+
+@pytest.fixture
+def root(tmp_path):
+    """ /proc/net/dev with lo, wlan0 and eth0, /sys/class/net with wlan0 and wlan1 (not in /proc/net/dev) """
+    (tmp_path / 'proc' / 'net').mkdir(parents=True)
+    (tmp_path / 'proc' / 'net' / 'dev').write_text(PROC_NET_DEV)
+    net = tmp_path / 'sys' / 'class' / 'net'
+    (net / 'wlan0' / 'statistics').mkdir(parents=True)
+    (net / 'wlan0' / 'tx_queue_len').write_text('1000\n')
+    statistics = net / 'wlan1' / 'statistics'
+    statistics.mkdir(parents=True)
+    for name, value in WLAN1_STATISTICS.items():
+        (statistics / name).write_text('{}\n'.format(value))
+    (statistics / 'tx_errors').write_text('garbage\n')  # not an integer: left out
+    (net / 'wlan1' / 'tx_queue_len').write_text('500\n')
+    return str(tmp_path)
+
+
+def test_decode_proc_net_dev():
+    result = decode_proc_net_dev(PROC_NET_DEV)
+    assert sorted(result) == ['eth0', 'lo', 'wlan0']
+    wlan0 = result['wlan0']
+    assert (wlan0['rx_bytes'], wlan0['rx_packets'], wlan0['rx_errors'], wlan0['rx_dropped']) == (58009076, 843246, 1, 2)
+    assert (wlan0['rx_overruns'], wlan0['frame'], wlan0['rx_multicast']) == (3, 4, 5)
+    assert (wlan0['tx_bytes'], wlan0['tx_packets'], wlan0['tx_errors'], wlan0['tx_dropped']) == \
+        (2505374616, 1650711, 6, 7)
+    assert (wlan0['tx_overruns'], wlan0['collisions'], wlan0['carrier']) == (8, 9, 10)
+    assert sorted(decode_proc_net_dev(PROC_NET_DEV, ['wlan0', 'wlan9'])) == ['wlan0']
+
+
+def test_get_netdev_from_proc(root):
+    wlan0 = get_netdev('wlan0', root)
+    assert wlan0 == {'iface': 'wlan0', 'rx_packets': 843246, 'rx_errors': 1, 'rx_dropped': 2, 'rx_overruns': 3,
+                     'frame': 4, 'tx_packets': 1650711, 'tx_errors': 6, 'tx_dropped': 7, 'tx_overruns': 8,
+                     'carrier': 10, 'collisions': 9, 'txqueuelen': 1000,
+                     'rx_bytes': 58009076, 'rx_scale_bytes': 58.0, 'tx_bytes': 2505374616, 'tx_scale_bytes': 2.5}
+    assert 'txqueuelen' not in get_netdev('eth0', root)  # no sysfs entry
+
+
+def test_get_netdev_from_sysfs(root):
+    assert read_proc_net_dev(['wlan1'], root) == {}
+    assert read_sysfs_statistics('wlan1', root)['rx_overruns'] == 0
+    wlan1 = get_netdev('wlan1', root)
+    assert (wlan1['rx_bytes'], wlan1['rx_packets'], wlan1['rx_dropped'], wlan1['txqueuelen']) == (999, 9, 1, 500)
+    assert (wlan1['tx_bytes'], wlan1['tx_scale_bytes']) == (1500000, 1.5)
+    assert 'tx_errors' not in wlan1
+
+
+def test_missing_interface(root, tmp_path):
+    assert get_netdev('wlan9', root) is None
+    assert get_netdev('wlan0', str(tmp_path / 'empty')) is None  # neither /proc nor /sys
+
+
+def test_get_netdev_all(root):
+    assert sorted(get_netdev_all(None, root)) == ['eth0', 'lo', 'wlan0']
+    result = get_netdev_all(['wlan0', 'wlan1', 'wlan9'], root)
+    assert sorted(result) == ['wlan0', 'wlan1']
+    assert result['wlan0']['rx_packets'] == 843246
+    assert result['wlan1']['rx_packets'] == 9
+
+
+@pytest.mark.parametrize('n, scaled', [(512, 512.0), (58009076, 58.0), (2505374616, 2.5), (1500, 1.5)])
+def test_scale_bytes(n, scaled):
+    assert scale_bytes(n) == scaled
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+    the netlink and nl80211 decoders against netlink datagrams (hex files in tests/data):
+    nlctrl_getfamily*.hex were received from the kernel's generic netlink controller (one datagram per line),
+    nl80211_get_*.hex are the replies to GET_STATION, GET_SURVEY (dumps) and GET_INTERFACE of an AP interface
+    (ifindex 3), in the kernel's wire format. iw_survey_dump.txt is the "iw dev wlan0 survey dump" of the same survey
+"""
+import itertools
+import os
+import struct
+import threading
+
+import pytest
+
+from cmd.survey import decode_survey
+from cmd.nl80211 import (Nl80211, Nl80211Error, parse_messages, decode_genl, decode_attrs, decode_value, iter_attrs,
+                         decode_station, decode_survey_info, decode_interface, pack_attr, pack_genl, freq_to_channel,
+                         NLMSG_DONE, NLMSG_ERROR, NLM_F_MULTI, GENL_ID_CTRL, CTRL_ATTR_FAMILY_ID,
+                         CTRL_ATTR_FAMILY_NAME, CTRL_ATTR_MCAST_GROUPS, CTRL_ATTR_MCAST_GRP_NAME,
+                         CTRL_ATTR_MCAST_GRP_ID, NL80211_CMD_GET_STATION, NL80211_CMD_NEW_STATION,
+                         NL80211_CMD_NEW_INTERFACE, NL80211_CMD_NEW_SURVEY_RESULTS)
+
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+NL80211_FAMILY = 0x22
+
+
+def load_datagrams(name):
+    """ @return: the datagrams of the file, one hex line each """
+    with open(os.path.join(DATA, name)) as f:
+        return [bytes.fromhex(line.strip()) for line in f if len(line.strip()) > 0]
+
+
+def load(name):
+    return load_datagrams(name)[0]
+
+
+def nl80211_messages(name):
+    """ @return: [(cmd, attrs)] of the nl80211 messages of the datagram """
+    return [decode_genl(payload) for msg_type, _, _, payload in parse_messages(load(name))
+            if msg_type == NL80211_FAMILY]
+
+
+class FakeSocket(object):
+    """ returns the datagrams, one per recv() """
+
+    def __init__(self, datagrams):
+        self.datagrams = list(datagrams)
+        self.sent = []
+
+    def send(self, data):
+        self.sent.append(data)
+
+    def recv(self, size):
+        return self.datagrams.pop(0)
+
+
+def fake_nl80211(datagrams, seq):
+    nl = Nl80211.__new__(Nl80211)
+    nl.sock = FakeSocket(datagrams)
+    nl.family_id = NL80211_FAMILY
+    nl._seq = itertools.count(seq)
+    nl._lock = threading.Lock()
+    return nl
+
+
+def test_parse_messages_of_a_dump():
+    messages = list(parse_messages(load('nl80211_get_station.hex')))
+    assert [(t, f, seq) for t, f, seq, _ in messages] == [(NL80211_FAMILY, NLM_F_MULTI, 7),
+                                                          (NL80211_FAMILY, NLM_F_MULTI, 7),
+                                                          (NLMSG_DONE, NLM_F_MULTI, 7)]
+
+
+def test_parse_messages_truncated():
+    data = load('nl80211_get_survey.hex')
+    assert len(list(parse_messages(data[:10]))) == 0
+    assert len(list(parse_messages(struct.pack('=IHHII', 8, 0, 0, 0, 0)))) == 0  # length < header
+
+
+def test_nlctrl_getfamily():
+    (msg_type, flags, seq, payload), = parse_messages(load('nlctrl_getfamily.hex'))
+    assert (msg_type, seq) == (GENL_ID_CTRL, 1)
+    ctrl = decode_attrs(payload[4:])
+    assert decode_value(ctrl[CTRL_ATTR_FAMILY_NAME], 'str') == 'nlctrl'
+    assert struct.unpack_from('=H', ctrl[CTRL_ATTR_FAMILY_ID])[0] == GENL_ID_CTRL
+    groups = [decode_attrs(g) for _, g in iter_attrs(ctrl[CTRL_ATTR_MCAST_GROUPS])]
+    assert [(decode_value(g[CTRL_ATTR_MCAST_GRP_NAME], 'str'), struct.unpack('=I', g[CTRL_ATTR_MCAST_GRP_ID])[0])
+            for g in groups] == [('notify', 16)]
+
+
+def test_resolve_family():
+    nl = fake_nl80211(load_datagrams('nlctrl_getfamily.hex'), seq=1)  # the reply, then the ACK
+    assert nl.resolve_family('nlctrl') == (GENL_ID_CTRL, {'notify': 16})
+    assert nl.sock.sent[0] == pack_genl(GENL_ID_CTRL, 3, pack_attr(CTRL_ATTR_FAMILY_NAME, b'nlctrl\0'),
+                                        flags=0x5, seq=1)
+
+
+def test_resolve_family_error():
+    nl = fake_nl80211([load('nlctrl_getfamily_enoent.hex')], seq=2)
+    with pytest.raises(Nl80211Error, match='errno 2'):
+        nl.resolve_family('nl80211')
+
+
+def test_decode_station():
+    messages = nl80211_messages('nl80211_get_station.hex')
+    assert [cmd for cmd, _ in messages] == [NL80211_CMD_NEW_STATION] * 2
+    stations = dict(decode_station(attrs) for _, attrs in messages)
+    assert sorted(stations) == ['00:11:22:33:44:55', '66:77:88:99:aa:bb']
+    s = stations['00:11:22:33:44:55']
+    assert s['rx bytes'] == 5000000000  # the 64 bits counter, not the wrapped 32 bits one
+    assert s['tx bytes'] == 1340
+    assert (s['signal'], s['signal avg']) == (-42, -43)
+    assert (s['tx bitrate'], s['rx bitrate']) == (72.2, 65.0)
+    assert (s['rx packets'], s['tx packets'], s['tx retries'], s['tx failed']) == (164, 14, 3, 1)
+    assert s['connected time'] == 3402
+    assert s['rx drop misc'] == 2
+    assert s['expected throughput'] == 46.0
+    assert (s['DTIM period'], s['beacon interval'], s['short slot time']) == (2, 100, 'yes')
+    assert (s['authorized'], s['preamble'], s['WMM/WME'], s['MFP']) == ('yes', 'short', 'yes', 'no')
+    assert (s['authenticated'], s['TDLS peer'], s['associated']) == ('yes', 'no', 'yes')
+    assert (s['rx duration'], s['tx duration']) == (3100000, 1500000)
+    assert 'chain signal' not in s  # not in the schema
+    assert stations['66:77:88:99:aa:bb']['tx bitrate'] == 6.0
+
+
+def test_decode_survey():
+    messages = nl80211_messages('nl80211_get_survey.hex')
+    assert [cmd for cmd, _ in messages] == [NL80211_CMD_NEW_SURVEY_RESULTS] * 3
+    survey = dict(decode_survey_info(attrs) for _, attrs in messages)
+    assert sorted(survey) == [2412, 2437, 2462]
+    assert survey[2412] == {'noise': -92}
+    assert survey[2437] == {'noise': -95, 'in use': True,
+                            'channel active time': 3626867638, 'channel busy time': 1163082876,
+                            'channel receive time': 1073085286, 'channel transmit time': 60749755}
+    assert survey[2462] == {}
+
+
+def test_survey_backends_agree():
+    survey = dict(decode_survey_info(attrs) for _, attrs in nl80211_messages('nl80211_get_survey.hex'))
+    with open(os.path.join(DATA, 'iw_survey_dump.txt')) as f:
+        iw_survey = decode_survey(f.read())
+    assert iw_survey == survey  # same keys and values, e.g. the noise -95 dBm (iw's are float)
+    assert iw_survey[2437]['noise'] == -95
+
+
+def test_decode_interface():
+    (cmd, attrs), = nl80211_messages('nl80211_get_interface.hex')
+    assert cmd == NL80211_CMD_NEW_INTERFACE
+    info = decode_interface(attrs)
+    assert info == {'ifindex': 3, 'Interface': 'wlan0', 'wiphy': 0, 'type': 'AP', 'wdev': 1,
+                    'addr': 'b0:aa:ab:ab:ac:11', 'ssid': 'ethanolQL1', 'frequency': 2437, 'channel': 6,
+                    'width': 20, 'center1': 2437, 'txpower': 20.0}
+
+
+def test_dump_skips_the_replies_of_other_requests():
+    stale = load('nl80211_get_survey.hex')  # seq 9
+    nl = fake_nl80211([stale, load('nl80211_get_station.hex')], seq=7)
+    replies = nl.transact(NL80211_FAMILY, NL80211_CMD_GET_STATION, flags=0x301)
+    assert [decode_station(decode_genl(p)[1])[0] for p in replies] == ['00:11:22:33:44:55', '66:77:88:99:aa:bb']
+
+
+def test_truncated_attribute_is_skipped():
+    attrs = pack_attr(1, struct.pack('=I', 5)) + pack_attr(2, b'\x01')  # rx bytes needs 4 bytes
+    assert decode_attrs(attrs, {1: ('inactive time', '=I'), 2: ('rx bytes', '=I')}) == {'inactive time': 5}
+
+
+def test_error_message_type():
+    (msg_type, _, _, payload), = parse_messages(load('nlctrl_getfamily_enoent.hex'))
+    assert msg_type == NLMSG_ERROR
+    assert struct.unpack_from('=i', payload)[0] == -2
+
+
+@pytest.mark.parametrize('freq, channel', [(2412, 1), (2484, 14), (5180, 36), (5955, 1), (900, -1)])
+def test_freq_to_channel(freq, channel):
+    assert freq_to_channel(freq) == channel
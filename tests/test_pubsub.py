@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+    publisher and subscriber connected through inproc:// with a shared zmq.Context
+"""
+import pickle
+
+import pytest
+
+zmq = pytest.importorskip('zmq')
+
+from get_set import wire  # noqa: E402
+from publisher_subscriber.publisher import TelemetryPublisher, topic_of  # noqa: E402
+from publisher_subscriber.subscriber import TelemetrySubscriber  # noqa: E402
+
+
+STATIONS = {'00:11:22:33:44:55': {'rx bytes': 5420, 'signal avg': -42, 'tx bitrate': 72.2}}
+SURVEY = {2437: {'in use': True, 'channel busy time': 1163082876}}
+
+
+@pytest.fixture
+def context():
+    ctx = zmq.Context()
+    yield ctx
+    ctx.term()
+
+
+@pytest.fixture
+def pair(context):
+    pub = TelemetryPublisher('ap1', 'inproc://telemetry', context=context,
+                             samplers={'stations': lambda: STATIONS, 'survey': lambda: SURVEY})
+    sub = TelemetrySubscriber(['inproc://telemetry'], context=context)
+    yield pub, sub
+    sub.close()
+    pub.stop()
+
+
+def receive(pub, sub, family):
+    """ publishes until the subscriber receives (the subscription takes a moment to reach the publisher) """
+    for _ in range(50):
+        pub.publish(family)
+        received = sub.recv(timeout=0.05)
+        if received is not None:
+            return received
+    raise AssertionError("nothing received")
+
+
+def test_publish_and_receive(pair):
+    pub, sub = pair
+    ap_id, family, msg = receive(pub, sub, 'survey')
+    assert (ap_id, family) == ('ap1', 'survey')
+    assert msg['data'] == SURVEY  # the int keys are kept
+    ap_id, family, msg = receive(pub, sub, 'stations')
+    assert msg['data'] == STATIONS
+    assert sub.snapshot()['ap1']['stations']['seq'] == pub.seq['stations']
+
+
+def test_lost_messages_are_counted(pair):
+    pub, sub = pair
+    receive(pub, sub, 'stations')
+    sub.poll(0.05)
+    pub.seq['stations'] += 2  # two messages "lost"
+    receive(pub, sub, 'stations')
+    assert sub.lost[('ap1', 'stations')] == 2
+
+
+def test_pickle_and_garbage_are_dropped(context, pair):
+    pub, sub = pair
+    receive(pub, sub, 'stations')
+    sub.poll(0.05)
+
+    class Exploit(object):
+        def __reduce__(self):
+            return (exec, ("raise SystemExit('pickle executed')",))
+
+    rogue = context.socket(zmq.PUB)
+    rogue.bind('inproc://rogue')
+    sub.socket.connect('inproc://rogue')
+    try:
+        payloads = [pickle.dumps(Exploit()), b'\xc1', wire.encode([1, 2], wire.MSGPACK),
+                    wire.encode({'ap': 'ap9', 'family': 'stations'}, wire.MSGPACK)]
+        for _ in range(50):
+            for payload in payloads:
+                rogue.send_multipart([topic_of('ap9', 'stations'), payload])
+            assert sub.recv(timeout=0.05) is None
+            if sub.invalid >= len(payloads):
+                break
+    finally:
+        rogue.close(linger=0)
+    assert sub.invalid >= len(payloads)
+    assert 'ap9' not in sub.state
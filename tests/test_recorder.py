@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+    Recorder and RecordingReader on an HDF5 file in tmp_path
+"""
+import pytest
+
+pytest.importorskip('tables')
+
+from cmd.recorder import Recorder, RecordingReader  # noqa: E402
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / 'ap.h5')
+
+
+def test_record_and_replay(filename):
+    with Recorder(filename) as recorder:
+        recorder.record('wlan0/stations', {'00:11:22:33:44:55': {'tx bytes': 10, 'signal': -42, 'flags': 'WMM'}},
+                        timestamp=1.0)
+        recorder.record('wlan0/stations', {'00:11:22:33:44:55': {'tx bytes': 20, 'signal': -43}}, timestamp=2.0)
+        recorder.record('wlan0/survey', {2437: {'noise': -95}}, timestamp=1.0)
+    with RecordingReader(filename) as reader:
+        assert reader.families() == ['wlan0/stations', 'wlan0/survey']
+        assert reader.metrics('wlan0/stations') == ['signal', 'tx bytes']
+        assert list(reader.iter_samples('wlan0/stations')) == [
+            (1.0, {'00:11:22:33:44:55': {'signal': -42.0, 'tx bytes': 10.0}}),
+            (2.0, {'00:11:22:33:44:55': {'signal': -43.0, 'tx bytes': 20.0}})]
+        assert list(reader.iter_samples('wlan0/survey')) == [(1.0, {2437: {'noise': -95.0}})]
+        assert list(reader.columns('wlan0/stations', ['tx bytes'], start=1.5)['tx bytes']) == [20.0]
+
+
+def test_empty_sample_does_not_create_the_table(filename):
+    with Recorder(filename) as recorder:
+        recorder.record('wlan0/survey', {}, timestamp=1.0)  # e.g. the survey failed
+        recorder.flush()
+        recorder.record('wlan0/survey', {'wlan0': {'noise': -90}}, timestamp=2.0)
+    with RecordingReader(filename) as reader:
+        assert reader.metrics('wlan0/survey') == ['noise']
+        assert list(reader.iter_samples('wlan0/survey')) == [(2.0, {'wlan0': {'noise': -90.0}})]
+
+
+def test_new_metrics_get_a_column(filename):
+    with Recorder(filename) as recorder:
+        recorder.record('wlan0/stations', {'a': {'tx bytes': 10}}, timestamp=1.0)
+        recorder.flush()
+        recorder.record('wlan0/stations', {'a': {'tx bytes': 20, 'beacon loss': 1}}, timestamp=2.0)
+        recorder.flush()
+        recorder.record('wlan0/stations', {'a': {'tx bytes': 30}, 'b': {'rx duration': 5}}, timestamp=3.0)
+    with RecordingReader(filename) as reader:
+        assert reader.metrics('wlan0/stations') == ['tx bytes', 'beacon loss', 'rx duration']
+        assert list(reader.iter_samples('wlan0/stations')) == [
+            (1.0, {'a': {'tx bytes': 10.0}}),
+            (2.0, {'a': {'tx bytes': 20.0, 'beacon loss': 1.0}}),
+            (3.0, {'a': {'tx bytes': 30.0}, 'b': {'rx duration': 5.0}})]
+
+
+def test_new_metric_in_an_existing_file(filename):
+    with Recorder(filename) as recorder:
+        recorder.record('wlan0/survey', {2412: {'noise': -92}}, timestamp=1.0)
+    with Recorder(filename) as recorder:  # appends
+        recorder.record('wlan0/survey', {2412: {'noise': -91, 'channel busy time': 7}}, timestamp=2.0)
+    with RecordingReader(filename) as reader:
+        assert len(reader) == 2
+        assert list(reader.iter_samples('wlan0/survey'))[-1] == (2.0, {2412: {'noise': -91.0,
+                                                                              'channel busy time': 7.0}})
+
+
+def test_string_entity_after_int_entities(filename):
+    with Recorder(filename) as recorder:
+        recorder.record('wlan0/survey', {2412: {'noise': -92}}, timestamp=1.0)
+        recorder.flush()
+        recorder.record('wlan0/survey', {'wlan0': {'noise': -90}}, timestamp=2.0)
+    with RecordingReader(filename) as reader:
+        assert [sample for _, sample in reader.iter_samples('wlan0/survey')] == [{'2412': {'noise': -92.0}},
+                                                                                 {'wlan0': {'noise': -90.0}}]
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+    the scan decoders against a captured "iw dev wlan0 scan dump" (tests/data/iw_scan_dump.txt):
+    an associated BSS with RSN, BSS Load, HT/VHT and WMM blocks, a BSS with Country/Channels, a last BSS without blocks
+"""
+import os
+
+from cmd.scan import iter_scan, decode_scan, decode_scan_mac, decode_scan_basic
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+ASSOCIATED, OTHER, LAST = '50:c7:bf:3b:db:37', '84:b8:02:44:07:d2', '00:11:22:33:44:55'
+
+
+def read():
+    with open(os.path.join(DATA, 'iw_scan_dump.txt')) as f:
+        return f.read()
+
+
+def test_bss_fields():
+    scan = decode_scan(read())
+    assert list(scan) == [ASSOCIATED, OTHER, LAST]
+    bss = scan[ASSOCIATED]
+    assert bss['iface'] == 'wlan0'  # without ") -- associated"
+    assert bss['freq'] == '2412'
+    assert bss['signal'] == '-54.00 dBm'
+    assert bss['TSF'] == '458367263488 usec (5d, 07:19:27)'
+    assert bss['SSID'] == 'LAC'
+    assert bss['capability'] == 'ESS Privacy ShortSlotTime (0x0411)'
+    assert bss['Supported rates'] == '1.0* 2.0* 5.5* 11.0* 18.0 24.0 36.0 54.0'
+    assert bss['DS Parameter set'] == 'channel 1'
+    assert scan[OTHER]['iface'] == 'wlan0'
+    assert (scan[OTHER]['Country'], scan[OTHER]['Environment']) == ('BR', 'Indoor/Outdoor')
+    assert scan[OTHER]['Channels '] == '[1 - 13] @ 30 dBm'
+    assert scan[LAST] == {'iface': 'wlan0', 'last seen': '20 ms', 'freq': '5180', 'beacon interval': '100 TUs',
+                          'signal': '-81.00 dBm', 'SSID': ''}
+
+
+def test_blocks():
+    bss = decode_scan(read())[ASSOCIATED]
+    assert bss['RSN'] == {'Version': '1', 'Group cipher': 'CCMP', 'Pairwise ciphers': 'CCMP',
+                          'Authentication suites': 'PSK', 'Capabilities': '1-PTKSA-RC 1-GTKSA-RC (0x0000)'}
+    assert bss['BSS Load'] == {'station count': '3', 'channel utilisation': '43/255',
+                               'available admission capacity': '0 [*32us]'}
+    assert bss['station count'] == '3'  # the BSS Load items are also fields
+    # the items of "VHT operation" are not mixed with those of "HT operation"
+    assert bss['HT operation'] == {'primary channel': '1', 'secondary channel offset': 'no secondary',
+                                   'STA channel width': '20 MHz', 'RIFS': '0'}
+    assert 'VHT operation' not in bss and 'HT capabilities' not in bss
+
+
+def test_wmm_items():
+    """ the items without ':' are keyed by the whole item: 'Parameter version 1' and 'u-APSD' """
+    bss = decode_scan(read())[ASSOCIATED]
+    assert bss['WMM'] == {'Parameter version 1': 'Parameter version 1', 'u-APSD': 'u-APSD',
+                          'BE': 'CW 15-1023, AIFSN 3', 'BK': 'CW 15-1023, AIFSN 7',
+                          'VI': 'CW 7-15, AIFSN 2, TXOP 3008 usec', 'VO': 'CW 3-7, AIFSN 2, TXOP 1504 usec'}
+    other = decode_scan(read())[OTHER]
+    assert other['WMM'] == {'Parameter version 1': 'Parameter version 1', 'BE': 'CW 15-1023, AIFSN 3',
+                            'VO': 'CW 3-7, AIFSN 2, TXOP 1504 usec'}
+    assert other['BSS Load'] == {'station count': '0', 'channel utilisation': '12/255'}  # the block after WMM
+
+
+def test_decode_scan_mac():
+    assert decode_scan_mac(read()) == [ASSOCIATED, OTHER, LAST]
+
+
+def test_decode_scan_basic():
+    scan = decode_scan_basic(read())
+    assert scan[ASSOCIATED] == {'freq': 2412, 'signal': -54.0, 'beacon interval': 100, 'last seen': 104,
+                                'SSID': 'LAC', 'channel': '1', 'TSF': '5d, 07:19:27'}
+    assert scan[OTHER]['freq'] == 2412  # "freq: 2412.0" of newer iw
+    assert scan[LAST] == {'freq': 5180, 'signal': -81.0, 'beacon interval': 100, 'last seen': 20, 'SSID': ''}
+
+
+def test_iter_scan_lines():
+    lines = [line.encode() for line in read().splitlines(True)]  # the stdout of iw
+    assert dict(iter_scan(lines)) == decode_scan(read())
+    rsn_only = dict(iter_scan(read(), fields=['RSN']))
+    assert rsn_only[ASSOCIATED] == {'iface': 'wlan0', 'RSN': decode_scan(read())[ASSOCIATED]['RSN']}
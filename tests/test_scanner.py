@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+    ScanManager with a fake iw: the blocking scan (no nl80211 notifications) returns a numbered output
+"""
+import io
+import time
+
+import pytest
+
+from cmd.scanner import ScanManager, MAX_AGE_INTERVALS, ON_REQUEST_MAX_AGE
+
+
+class FakeIw(object):
+    """ popen() of the scans: each scan takes `duration` seconds """
+
+    def __init__(self, duration=0.0):
+        self.duration = duration
+        self.commands = []
+
+    def __call__(self, cmd):
+        self.commands.append(cmd)
+        time.sleep(self.duration)
+        return io.StringIO('scan {}'.format(len(self.commands)))
+
+
+def identity(output):
+    return output
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    return now
+
+
+def manager_of(iw, clock, interval):
+    return ScanManager(interval=interval, use_events=False, is_ap=lambda interface: True,
+                       clock=lambda: clock[0], popen=iw, is_wireless=lambda interface: interface == 'wlan0')
+
+
+def test_get_returns_the_last_result_without_waiting(clock):
+    iw = FakeIw(duration=0.3)
+    manager = manager_of(iw, clock, interval=0)
+    try:
+        timestamp, output = manager.get('wlan0', identity, timeout=None)
+        assert output == 'scan 1'
+        assert iw.commands[0] == 'sudo /sbin/iw dev wlan0 scan ap-force 2>&1'
+        time.sleep(0.5)  # the scans requested during the first one
+        clock[0] += ON_REQUEST_MAX_AGE + 1  # too old: a new scan is requested
+        scans = len(iw.commands)
+        start = time.monotonic()
+        assert manager.get('wlan0', identity)[1] == 'scan {}'.format(scans)
+        assert time.monotonic() - start < 0.2
+        assert manager.get('wlan0', identity, timeout=None)[1] == 'scan {}'.format(scans + 1)
+    finally:
+        manager.stop()
+
+
+def test_default_max_age_is_above_the_interval(clock):
+    iw = FakeIw()
+    manager = manager_of(iw, clock, interval=10)
+    try:
+        manager.add('wlan0')  # scanned periodically
+        assert manager.get('wlan0', identity, timeout=None) is not None
+        time.sleep(0.1)
+        scans = len(iw.commands)
+        clock[0] += 10.5  # the next background scan is a little late
+        assert manager.get('wlan0', identity)[1] == 'scan {}'.format(scans)
+        time.sleep(0.1)
+        assert len(iw.commands) == scans  # no scan requested
+        assert manager._max_age(manager.add('wlan0')) == MAX_AGE_INTERVALS * 10
+    finally:
+        manager.stop()
+
+
+def test_no_result_yet(clock):
+    iw = FakeIw(duration=0.3)
+    manager = manager_of(iw, clock, interval=0)
+    try:
+        assert manager.get('wlan0', identity) is None
+    finally:
+        manager.stop()
+
+
+def test_requested_interface_is_only_scanned_on_request(clock):
+    iw = FakeIw()
+    manager = manager_of(iw, clock, interval=0.05)
+    try:
+        assert manager.get('wlan0', identity, timeout=None)[1] == 'scan 1'
+        assert manager.add('wlan0')['interval'] == 0
+        time.sleep(0.3)
+        assert len(iw.commands) <= 2  # no periodic scans
+    finally:
+        manager.stop()
+
+
+def test_unknown_interface_is_rejected(clock):
+    iw = FakeIw()
+    manager = manager_of(iw, clock, interval=0)
+    try:
+        with pytest.raises(ValueError):
+            manager.get('junk0', identity)
+        with pytest.raises(ValueError):
+            manager.request('junk0')
+        assert manager.last('wlan0', identity) is None  # does not add the interface
+        assert manager.stats() == {}
+        assert iw.commands == []
+    finally:
+        manager.stop()
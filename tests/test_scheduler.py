@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+    SamplerScheduler with a fake clock and a pool that runs the submitted collectors when the test asks:
+    coalescing, back off and recovery, skipped samples and stats
+"""
+import pytest
+
+from cmd.scheduler import SamplerScheduler
+
+
+class DeferredPool(object):
+    """ the executor: keeps the submitted collectors until run() """
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, function, *args):
+        self.pending.append((function, args))
+
+    def run(self):
+        pending, self.pending = self.pending, []
+        for function, args in pending:
+            function(*args)
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    return now
+
+
+@pytest.fixture
+def pool():
+    return DeferredPool()
+
+
+def scheduler_of(clock, pool, **kwargs):
+    return SamplerScheduler(clock=lambda: clock[0], executor=pool, **kwargs)
+
+
+def tick(scheduler, pool, clock):
+    """ runs the due collectors, then advances the clock to the next sample """
+    delay = scheduler.run_pending()
+    pool.run()
+    clock[0] += delay
+
+
+def test_coalesced_collectors_share_one_command(clock, pool):
+    calls = []
+    received = {'a': [], 'b': []}
+
+    def stations():
+        calls.append(clock[0])
+        return len(calls)
+
+    scheduler = scheduler_of(clock, pool)
+    scheduler.add('wlan0/stations', stations, 1.0, key=('iw_stations', 'wlan0'), sink=received['a'].append)
+    scheduler.add('recorder/stations', stations, 0.5, key=('iw_stations', 'wlan0'), sink=received['b'].append)
+    assert scheduler.period('wlan0/stations') == 0.5  # the shortest period
+    scheduler.schedule()
+    for _ in range(4):
+        tick(scheduler, pool, clock)
+    assert calls == [1000.0, 1000.5, 1001.0, 1001.5]
+    assert received == {'a': [1, 2, 3, 4], 'b': [1, 2, 3, 4]}
+    stats = scheduler.stats()
+    assert stats['wlan0/stations']['coalesced'] == ['recorder/stations']
+    assert stats['wlan0/stations']['runs'] == stats['recorder/stations']['runs'] == 4
+    scheduler.remove('recorder/stations')
+    assert scheduler.period('wlan0/stations') == 1.0
+
+
+def test_back_off_and_recovery(clock, pool):
+    duration = [0.5]
+
+    def slow():
+        clock[0] += duration[0]
+        return {}
+
+    scheduler = scheduler_of(clock, pool, max_backoff=4)
+    scheduler.add('wlan0/xmit', slow, 0.1)
+    scheduler.schedule()
+    periods = []
+    for _ in range(4):
+        tick(scheduler, pool, clock)
+        periods.append(scheduler.period('wlan0/xmit'))
+    assert periods == pytest.approx([0.2, 0.4, 0.4, 0.4])  # doubles up to max_backoff times the period
+    duration[0] = 0.01
+    periods = []
+    for _ in range(3):
+        tick(scheduler, pool, clock)
+        periods.append(scheduler.period('wlan0/xmit'))
+    assert periods == pytest.approx([0.2, 0.1, 0.1])  # halves back to the configured period
+    stats = scheduler.stats()['wlan0/xmit']
+    assert stats['overruns'] == 4
+    assert stats['skipped'] > 0  # the samples due while the slow ones ran
+    assert stats['base_period'] == 0.1
+
+
+def test_skipped_while_running_and_late(clock, pool):
+    scheduler = scheduler_of(clock, pool, max_jitter=0.01)
+    scheduler.add('wlan0/survey', lambda: {}, 1.0)
+    scheduler.schedule()
+    assert scheduler.run_pending() == 1.0  # submitted, not run yet
+    clock[0] += 1.0
+    scheduler.run_pending()
+    assert scheduler.stats()['wlan0/survey']['skipped'] == 1  # the previous one still runs
+    pool.run()
+    clock[0] += 2.5  # late by more than a period
+    assert scheduler.run_pending() == pytest.approx(0.5)  # back on the grid: 1004.0
+    pool.run()
+    stats = scheduler.stats()['wlan0/survey']
+    assert stats['skipped'] == 2  # + the sample due at 1003
+    assert (stats['runs'], stats['late']) == (2, 2)  # due at 1000, started at 1001 (busy pool)
+    assert stats['lateness_max'] == pytest.approx(1.5)  # due at 1002, started at 1003.5
+    assert stats['lateness_mean'] == pytest.approx(1.25)
+
+
+def test_stats_of_a_failing_collector(clock, pool):
+    received = []
+
+    def failing():
+        clock[0] += 0.02
+        raise OSError('iw failed')
+
+    scheduler = scheduler_of(clock, pool)
+    scheduler.add('wlan0/ifconfig', failing, 1.0, sink=received.append)
+    scheduler.schedule()
+    tick(scheduler, pool, clock)
+    stats = scheduler.stats()['wlan0/ifconfig']
+    assert received == []
+    assert (stats['runs'], stats['errors'], stats['overruns']) == (1, 1, 0)
+    assert stats['duration_last'] == stats['duration_max'] == pytest.approx(0.02)
+    assert stats['duration_mean'] == pytest.approx(0.02)
+    assert (stats['period'], stats['key'], stats['coalesced']) == (1.0, 'wlan0/ifconfig', [])
+
+
+def test_add_after_schedule(clock, pool):
+    scheduler = scheduler_of(clock, pool)
+    scheduler.schedule()
+    assert scheduler.run_pending() is None  # no collector
+    scheduler.add('wlan0/stations', lambda: {}, 0.25)
+    assert scheduler.run_pending() == 0.25
+    pool.run()
+    assert scheduler.stats()['wlan0/stations']['runs'] == 1
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+    get_set.server with the commands served by the synthetic executor (see cmd/executor.py)
+"""
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import cmd.command_ap as command_ap
+import get_set.server as server
+from cmd.executor import synthetic_executor
+from cmd.delta import StationDeltaTracker
+
+
+class QuietHandler(server.myHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class SlowHandler(QuietHandler):
+    def hello(self):
+        time.sleep(0.3)
+        self.send_dictionary({})
+
+
+def serve(httpd):
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd.server_address[1]
+
+
+def get(port, url, headers=None):
+    conn = http.client.HTTPConnection('localhost', port, timeout=5)
+    try:
+        conn.request('GET', url, headers=headers or dict())
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def test_pool_rejects_when_the_queue_is_full():
+    httpd = server.PoolHTTPServer(('localhost', 0), SlowHandler, workers=1, queue_size=1)
+    port = serve(httpd)
+    statuses = []
+    threads = [threading.Thread(target=lambda: statuses.append(get(port, '/')[0])) for _ in range(3)]
+    try:
+        for th in threads:
+            th.start()
+            time.sleep(0.05)
+        for th in threads:
+            th.join()
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+    assert sorted(statuses) == [200, 200, 503]
+    assert httpd.rejected == 1
+
+
+def test_handler_error_is_a_500_and_keeps_the_connection():
+    httpd = server.create_server(0, workers=2, handler_class=QuietHandler)
+    port = serve(httpd)
+    conn = http.client.HTTPConnection('localhost', port, timeout=5)
+    try:
+        conn.request('GET', '/set_channel?iface=wlan0&new_channel=abc')
+        response = conn.getresponse()
+        assert response.status == 500
+        assert response.read().startswith(b'ValueError')
+        conn.request('GET', '/')  # same connection
+        response = conn.getresponse()
+        assert (response.status, response.read()) == (200, b'Hello World !')
+    finally:
+        conn.close()
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def test_key_error_of_a_handler_is_a_500(monkeypatch):
+    monkeypatch.setattr(QuietHandler, 'xmit', lambda self, query: dict()['missing'])
+    httpd = server.create_server(0, workers=2, handler_class=QuietHandler)
+    port = serve(httpd)
+    try:
+        status, body = get(port, '/get_xmit')
+        assert (status, body) == (500, b"KeyError: 'missing'")
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def synthetic(monkeypatch):
+    """ @return: the port of a server whose commands are answered by a synthetic AP wlan0 with 3 stations """
+    previous = command_ap.get_executor()
+    command_ap.use_executor(synthetic_executor(['wlan0'], stations=3, latency=0.0, seed=1))
+    command_ap.invalidate_cache()
+    monkeypatch.setattr(server, 'delta_trackers', dict())
+    httpd = server.create_server(0, workers=2, handler_class=QuietHandler)
+    yield serve(httpd)
+    httpd.shutdown()
+    httpd.server_close()
+    command_ap.use_executor(previous)
+    command_ap.invalidate_cache()
+
+
+def get_json(port, url):
+    status, body = get(port, url, {'Accept': 'application/json'})
+    assert status == 200
+    return json.loads(body.decode())
+
+
+def test_features_delta_of_one_station_keeps_the_others(synthetic):
+    macs = sorted(get_json(synthetic, '/get_features?iface=wlan0&delta=1&client=c'))
+    assert len(macs) == 3
+    result = get_json(synthetic, '/get_features?iface=wlan0&delta=1&client=c&mac={}'.format(macs[0]))
+    assert set(result) <= {macs[0]}  # only the requested station, if it changed
+    result = get_json(synthetic, '/get_features?iface=wlan0&delta=1&client=c')
+    assert not any(entry.get('removed') or entry.get('new') for entry in result.values())
+
+
+def test_idle_delta_trackers_are_evicted(monkeypatch):
+    monkeypatch.setattr(server, 'MAX_DELTA_TRACKERS', 2)
+    trackers = dict()
+    for i, last_update in enumerate([10.0, 700.0, 900.0, 950.0]):
+        trackers[i] = StationDeltaTracker(clock=lambda t=last_update: t)
+    monkeypatch.setattr(server, 'delta_trackers', trackers)
+    server.evict_delta_trackers(now=1000.0)
+    assert sorted(trackers) == [2, 3]  # 0 is idle, 1 is the least recently used above the limit
+
+
+def test_features_of_the_requested_stations(synthetic):
+    macs = sorted(get_json(synthetic, '/get_features?iface=wlan0'))
+    unknown = '02:00:00:00:00:99'
+    url = '/get_features?iface=wlan0&delta=1&client=d&mac={},{}'.format(macs[1].upper(), unknown)
+    result = get_json(synthetic, url)
+    assert sorted(result) == sorted([macs[1], unknown])
+    assert result[macs[1]]['new']
+    assert result[unknown] == {'error': 'not associated'}
+    result = get_json(synthetic, '/get_features?iface=wlan0&mac={}'.format(macs[2]))  # without delta
+    assert result['num_stations'] == 3
+
+
+def test_unknown_station_is_a_404(synthetic):
+    status, body = get(synthetic, '/get_features?iface=wlan0&mac=02:00:00:00:00:99')
+    assert (status, body) == (404, b'station 02:00:00:00:00:99 not associated')
+    result = get_json(synthetic, '/batch?cmd=/get_features&cmd=/get_num_stations&iface=wlan0&mac=02:00:00:00:00:99')
+    assert [r['status'] for r in result['results']] == [404, 200]
+
+
+def test_scan_of_an_unknown_interface_is_a_404(synthetic):
+    status, body = get(synthetic, '/get_scan?iface=eth9')
+    assert status == 404
+    assert b'eth9' in body
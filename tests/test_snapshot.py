@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+    SnapshotCache with a fake clock: TTL, single-flight, invalidation and the keys of cached()
+"""
+import threading
+
+import pytest
+
+from cmd.snapshot import SnapshotCache
+
+
+@pytest.fixture
+def clock():
+    now = [1000.0]
+    return now
+
+
+@pytest.fixture
+def cache(clock):
+    return SnapshotCache(ttls={'iw_stations': 0.5}, clock=lambda: clock[0])
+
+
+class Loader(object):
+    """ the command: returns a new sample on each call """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'sample': self.calls}
+
+
+def test_ttl_expiry(cache, clock):
+    loader = Loader()
+    first = cache.get('iw_stations', 'wlan0', loader)
+    clock[0] += 0.4
+    assert cache.get('iw_stations', 'wlan0', loader) is first  # shared, not a copy
+    clock[0] += 0.2
+    assert cache.get('iw_stations', 'wlan0', loader) == {'sample': 2}
+    cache.set_ttl('iw_stations', 0)
+    cache.get('iw_stations', 'wlan0', loader)
+    cache.get('iw_stations', 'wlan0', loader)
+    assert loader.calls == 4
+
+
+def test_single_flight(cache):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'sample': len(calls)}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get('iw_survey', 'wlan0', slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get('iw_survey', 'wlan0', slow)))
+                 for _ in range(3)]
+    for t in followers:
+        t.start()
+    release.set()
+    for t in [leader] + followers:
+        t.join(5)
+    assert len(calls) == 1
+    assert results == [{'sample': 1}] * 4
+
+
+def test_single_flight_error(cache):
+    def failing():
+        raise OSError('iw failed')
+
+    with pytest.raises(OSError):
+        cache.get('iw_survey', 'wlan0', failing)
+    assert cache.get('iw_survey', 'wlan0', Loader()) == {'sample': 1}  # the error is not cached
+
+
+def test_invalidate(cache):
+    loader = Loader()
+    cache.get('iw_stations', 'wlan0', loader)
+    cache.get('iw_stations', 'wlan1', loader)
+    cache.get('iw_info', 'wlan0', loader)
+    cache.invalidate('wlan0', ['iw_stations'])
+    assert cache.get('iw_stations', 'wlan0', loader) == {'sample': 4}
+    assert cache.get('iw_stations', 'wlan1', loader) == {'sample': 2}
+    assert cache.get('iw_info', 'wlan0', loader) == {'sample': 3}
+    cache.invalidate()
+    assert cache.get('iw_info', 'wlan0', loader) == {'sample': 5}
+
+
+def test_cached_keys_on_all_arguments(cache):
+    calls = []
+
+    @cache.cached('ifconfig')
+    def get_ifconfig(interface, path_ifconfig='ifconfig', root=None):
+        calls.append((interface, path_ifconfig, root))
+        return {'root': root}
+
+    assert get_ifconfig('wlan0') == {'root': None}
+    assert get_ifconfig('wlan0', root='/tmp/fake') == {'root': '/tmp/fake'}
+    assert get_ifconfig(interface='wlan0', path_ifconfig='ifconfig') == {'root': None}  # same as the first call
+    assert len(calls) == 2
+    cache.invalidate('wlan0')
+    get_ifconfig('wlan0', root='/tmp/fake')
+    assert len(calls) == 3
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+    the station dump decoders against captured "iw dev wlan0 station dump" and "hostapd_cli all_sta" outputs
+    (tests/data): types, units and the sign of the signals
+"""
+import os
+
+import pytest
+
+from cmd.station import decode_iw_station, decode_hostapd_station
+
+DATA = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def read(name):
+    with open(os.path.join(DATA, name)) as f:
+        return f.read()
+
+
+def test_iw_station_dump():
+    stations = decode_iw_station(read('iw_station_dump.txt'))
+    assert sorted(stations) == ['00:11:22:33:44:55', '54:e6:fc:da:ff:34']
+    sta = stations['54:e6:fc:da:ff:34']
+    assert sta['signal'] == -57  # the combined signal, signed dBm
+    assert sta['signal avg'] == -58
+    assert sta['beacon signal avg'] == -55
+    assert sta['last ack signal'] == -56
+    assert sta['rx bytes'] == 288 and isinstance(sta['rx bytes'], int)
+    assert sta['tx bitrate'] == 1.0
+    assert sta['rx bitrate'] == 65.0
+    assert sta['expected throughput'] == pytest.approx(39.55)
+    assert sta['connected time'] == 35
+    assert sta['associated at [boottime]'] == pytest.approx(1234.567)
+    assert sta['beacon interval'] == 100
+    assert sta['short slot time'] == 'yes'
+    assert sta['MFP'] == 'no'
+    assert stations['00:11:22:33:44:55']['signal avg'] == -70
+
+
+def test_iw_station_dump_lines():
+    lines = [line.encode() for line in read('iw_station_dump.txt').splitlines(True)]  # a pipe in binary mode
+    assert decode_iw_station(lines) == decode_iw_station(read('iw_station_dump.txt'))
+
+
+def test_hostapd_all_sta():
+    stations = decode_hostapd_station(read('hostapd_all_sta.txt'))
+    assert sorted(stations) == ['00:11:22:33:44:55', '54:e6:fc:da:ff:34']  # not dot11RSNAStatsSTAAddress
+    sta = stations['54:e6:fc:da:ff:34']
+    assert sta['signal'] == -58
+    assert sta['rx_rate_info'] == 65.0
+    assert sta['tx_rate_info'] == 1.0
+    assert sta['rx_bytes'] == 5420
+    assert sta['connected_time'] == 3402
+    assert sta['flags'] == '[AUTH][ASSOC][AUTHORIZED][WMM][HT]'
+    assert sta['dot11RSNAStatsSelectedPairwiseCipher'] == '00-0f-ac-4'
+    assert stations['00:11:22:33:44:55']['signal'] == -71
+
+
+def test_features_signal_is_negative():
+    np = pytest.importorskip('numpy')
+    from cmd.station_table import StationTable
+    features = StationTable.from_stations(decode_iw_station(read('iw_station_dump.txt'))).features()
+    assert np.all(features.column('avg_signal') < 0)
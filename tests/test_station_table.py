@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+    StationTable: the features columns and the deltas of the counters
+"""
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from cmd.station_table import StationTable, FEATURE_COLUMNS, feature_row  # noqa: E402
+
+STATIONS = {'02:00:00:00:00:02': {'signal avg': -61, 'tx packets': 2 ** 32 - 5, 'tx bytes': 2 ** 32 - 5,
+                                  'rx bytes': 100, 'connected time': 10, 'tx bitrate': 6.0},
+            '02:00:00:00:00:01': {'signal avg': -42, 'tx packets': 10, 'tx bytes': 1000, 'rx bytes': 'n/a',
+                                  'connected time': 20, 'tx bitrate': 65.0, 'flags': 'WMM'},
+            }
+SURVEY = {'channel active time': 3000, 'channel busy time': 1000, 'channel receive time': 600,
+          'channel transmit time': 300, 'noise': -95}
+
+
+def test_features_columns_in_the_order_of_feature_columns():
+    features = StationTable.from_stations(STATIONS).features(SURVEY, tx_power=20.0)
+    assert features.fields == FEATURE_COLUMNS
+    assert features.macs == ['02:00:00:00:00:01', '02:00:00:00:00:02']  # sorted
+    for i, mac in enumerate(features.macs):
+        expected = feature_row(STATIONS[mac], SURVEY, 20.0, num_stations=2)
+        np.testing.assert_array_equal(features.data[i], np.array(expected))
+    assert features.row('02:00:00:00:00:01')['avg_signal'] == -42.0
+    assert 'rxb' not in features.row('02:00:00:00:00:01')  # not a number: NaN, left out
+
+
+def test_delta_wraps_only_the_32_bits_counters():
+    previous = StationTable.from_stations(STATIONS, timestamp=0.0)
+    stations = dict([(mac, dict(fields)) for mac, fields in STATIONS.items()])
+    stations['02:00:00:00:00:02'].update({'tx packets': 5, 'tx bytes': 5, 'connected time': 11})
+    stations['02:00:00:00:00:03'] = {'tx packets': 1, 'connected time': 1}
+    delta, rate = StationTable.from_stations(stations, timestamp=2.0).delta(previous)
+    row = delta.row('02:00:00:00:00:02')
+    assert row['tx packets'] == 10  # 32 bits: wrapped
+    assert row['tx bytes'] == 5  # 64 bits: restarted
+    assert rate.row('02:00:00:00:00:02')['tx packets'] == 5.0
+    assert delta.row('02:00:00:00:00:03') == {}  # new station: NaN
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+    StationTracker with scripted station dumps, and its notification sources against a fake hostapd
+"""
+import pytest
+
+import cmd.command_ap as command_ap
+from cmd.executor import synthetic_executor
+from cmd.station_tracker import StationTracker, CONNECTED, DISCONNECTED
+from test_hostapd_ctrl import FakeHostapd
+
+
+A = '00:11:22:33:44:55'
+B = '66:77:88:99:aa:bb'
+
+
+def tracker_of(dump, **kwargs):
+    return StationTracker(['wlan0'], dump=dump, use_hostapd=False, use_nl80211=False, clock=lambda: 1000.0, **kwargs)
+
+
+def test_resync():
+    changes = []
+    dumps = [{A: {'connected time': 10}}, {B: {'connected time': 1}}]
+    tracker = tracker_of(lambda iface: dumps.pop(0), callbacks=[lambda *change: changes.append(change)])
+    tracker.resync()
+    assert tracker.stations('wlan0') == {A: {'connected_at': 990.0}}
+    tracker.resync()
+    assert tracker.stations('wlan0') == {B: {'connected_at': 999.0}}
+    assert changes == [(CONNECTED, 'wlan0', A), (CONNECTED, 'wlan0', B), (DISCONNECTED, 'wlan0', A)]
+    assert tracker.stations('wlan1') is None
+
+
+def test_events_during_the_dump_are_replayed():
+    tracker = None
+
+    def dump(iface):
+        result = {A: {'connected time': 10}}  # taken before the events
+        tracker.handle_event(DISCONNECTED, iface, A)
+        tracker.handle_event(CONNECTED, iface, B)
+        return result
+    tracker = tracker_of(lambda iface: {A: {'connected time': 10}})
+    tracker.resync()
+    tracker.dump = dump
+    tracker.resync()
+    assert tracker.stations('wlan0') == {B: {'connected_at': 1000.0}}
+    assert tracker.num_stations('wlan0') == 1
+    assert tracker._recording == {}
+
+
+def test_reconnection_during_the_dump():
+    tracker = None
+
+    def dump(iface):
+        tracker.handle_event(DISCONNECTED, iface, A)
+        tracker.handle_event(CONNECTED, iface, A, timestamp=999.5)
+        return {}  # taken between the events
+    tracker = tracker_of(lambda iface: {A: {'connected time': 10}})
+    tracker.resync()
+    tracker.dump = dump
+    tracker.resync()
+    assert tracker.stations('wlan0') == {A: {'connected_at': 999.5}}
+
+
+@pytest.fixture
+def hostapd(tmp_path):
+    fake = FakeHostapd(str(tmp_path / 'wlan0'))
+    yield fake
+    fake.close()
+
+
+def test_hostapd_events(tmp_path, hostapd):
+    tracker = StationTracker(['wlan0'], dump=lambda iface: {}, use_nl80211=False, ctrl_dir=str(tmp_path))
+    tracker.start()
+    try:
+        assert tracker.sources == ['hostapd:wlan0']
+        assert 'ATTACH' in hostapd.requests
+    finally:
+        tracker.stop()
+
+
+def test_no_notifications_in_a_replay(tmp_path, hostapd):
+    previous = command_ap.get_executor()
+    executor = synthetic_executor(['wlan0'], stations=2, latency=0.0, seed=1)
+    command_ap.use_executor(executor)
+    tracker = StationTracker(['wlan0'], resync_interval=0, ctrl_dir=str(tmp_path))
+    try:
+        tracker.start()
+        assert tracker.sources == []
+        assert tracker.num_stations('wlan0') == 2  # from the replayed station dump
+        assert hostapd.requests == []
+    finally:
+        tracker.stop()
+        command_ap.use_executor(previous)
+        executor.close()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+    the wire formats of get_set/wire.py
+"""
+import json
+
+import pytest
+
+from get_set import wire
+
+
+DATA = {'00:11:22:33:44:55': {'rxb': 1232.0, 'avg_signal': -54}, 2437: {'in use': True}, 'name': 'wlan0'}
+
+
+@pytest.mark.parametrize('fmt', [wire.MSGPACK, wire.JSON, wire.PICKLE])
+def test_round_trip(fmt):
+    decoded = wire.decode(wire.encode(DATA, fmt), fmt)
+    if fmt == wire.JSON:
+        assert decoded['2437'] == {'in use': True}  # the keys become strings
+        del decoded['2437']
+        assert decoded == dict([(k, v) for k, v in DATA.items() if k != 2437])
+    else:
+        assert decoded == DATA
+
+
+def test_pure_python_msgpack():
+    assert wire.unpackb(wire.packb(DATA)) == DATA
+    with pytest.raises(wire.WireError):
+        wire.unpackb(b'\xc1')
+
+
+def test_json_nan_and_infinity_are_null():
+    data = {'rate': float('nan'), 'values': [1.5, float('inf'), -float('inf')], 'nested': {'x': (float('nan'),)}}
+    text = wire.encode(data, wire.JSON).decode('utf-8')
+    assert 'NaN' not in text and 'Infinity' not in text
+    assert json.loads(text) == {'rate': None, 'values': [1.5, None, None], 'nested': {'x': [None]}}
+
+
+def test_json_numpy_nan_is_null():
+    np = pytest.importorskip('numpy')
+    text = wire.encode({'a': np.array([np.nan, 2.0]), 'b': np.float64(np.inf)}, wire.JSON)
+    assert json.loads(text.decode('utf-8')) == {'a': [None, 2.0], 'b': None}
+
+
+@pytest.mark.parametrize('accept, fmt', [(None, wire.PICKLE), ('application/json', wire.JSON),
+                                         ('application/msgpack, application/json;q=0.5', wire.MSGPACK),
+                                         ('application/msgpack;q=0.1, application/json', wire.JSON),
+                                         ('text/html', wire.PICKLE)])
+def test_negotiate(accept, fmt):
+    assert wire.negotiate(accept) == fmt
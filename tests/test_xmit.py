@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+    XmitReader, and the xmit readers shared by the threads of command_ap, on a synthetic ath9k xmit file
+"""
+import threading
+
+import pytest
+
+import cmd.command_ap as command_ap
+from cmd.executor import synthetic_executor
+from cmd.synthetic import synthetic_xmit
+from cmd.xmit import XmitReader, decode_xmit
+
+
+@pytest.fixture
+def xmit_file(tmp_path):
+    path = tmp_path / 'xmit'
+    path.write_text(synthetic_xmit(seed=3))
+    return str(path)
+
+
+@pytest.fixture
+def synthetic():
+    previous = command_ap.get_executor()
+    executor = synthetic_executor(['wlan0'], stations=1, latency=0.0, seed=1)
+    command_ap.use_executor(executor)
+    yield executor
+    command_ap.use_executor(previous)
+    executor.close()
+
+
+def run_threads(function, n=8):
+    """ @return: the results of function() run by n threads at the same time """
+    barrier = threading.Barrier(n)
+    results = [None] * n
+
+    def run(i):
+        barrier.wait()
+        results[i] = function()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return results
+
+
+def test_read_dict_matches_decode_xmit(xmit_file):
+    with XmitReader(xmit_file) as reader:
+        assert reader.read_dict() == dict([(k, int(v)) for k, v in decode_xmit(xmit_file).items()])
+
+
+def test_closed_reader_raises_oserror(xmit_file):
+    reader = XmitReader(xmit_file)
+    reader.close()
+    with pytest.raises(OSError):
+        reader.read()
+
+
+def test_concurrent_updates(xmit_file):
+    with XmitReader(xmit_file) as reader:
+        reader.update()
+        results = run_threads(lambda: [reader.update() for _ in range(50)])
+        for updates in results:
+            for sample, delta, rate in updates:
+                assert delta is not None and not any(delta)  # the file does not change
+
+
+def test_one_reader_per_xmit_file(synthetic):
+    readers = run_threads(lambda: command_ap.get_xmit_reader('phy0'))
+    assert readers[0] is not None
+    assert all(reader is readers[0] for reader in readers)
+
+
+def test_failed_reader_is_replaced(synthetic):
+    command_ap.invalidate_cache()
+    reader = command_ap.get_xmit_reader('phy0')
+    reader.close()  # e.g. the driver was reloaded
+    assert command_ap.get_xmit('phy0') == dict()
+    command_ap.invalidate_cache()
+    replacement = command_ap.get_xmit_reader('phy0')
+    assert replacement is not reader
+    assert len(command_ap.get_xmit('phy0')) > 0